@@ -1,143 +1,162 @@
 import os
-import json
-from flask import Flask, request, jsonify, Response
-import litellm
+import functools
+import time
+from flask import Flask, request, Response
 from dotenv import load_dotenv
 
-# Load environment variables if run directly
+# Load environment variables if run directly, before the modules below read their settings
 load_dotenv()
 
+import adapter_log
+import admission
+import batch_jobs
+import codec
+import cancel_scope
+import capture_store
+import compaction
+import embeddings
+import hedging
+import media
+import metrics
+import prompt_cache
+import translation_cache
+import context_fit
+import response_cache
+import routing
+import single_flight
+import sse_coalesce
+import startup
+import token_counting
+import tracing
+from startup import litellm
+
+# Compile the provider routing table now that the keys are in the environment
+routing.configure()
+routing.install_reload_handler()
+
 app = Flask(__name__)
 
 @app.before_request
 def log_request_info():
-    print(f"DEBUG: Incoming {request.method} {request.path}")
-    if request.is_json:
-        print(f"DEBUG: Body: {json.dumps(request.json, indent=2)}")
-
-# Directory for debug logs
-DEBUG_LOGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "debug_logs")
-
-def save_debug_json(filename, data):
-    """Saves data to a JSON file in the debug_logs directory if DEBUG_SAVE_JSON is enabled"""
-    if os.getenv('DEBUG_SAVE_JSON', '').lower() == 'true':
-        if not os.path.exists(DEBUG_LOGS_DIR):
-            os.makedirs(DEBUG_LOGS_DIR)
-        filepath = os.path.join(DEBUG_LOGS_DIR, filename)
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2)
-        print(f"DEBUG: Saved {filename}")
-
-def trim_payload_for_small_models(openai_req, model):
-    """
-    Trim request payload for models with small context limits (e.g., GitHub models: 8000 tokens)
-    Returns a trimmed copy of the request.
-    """
-    # Models with small input limits (approximate token limit)
-    SMALL_CONTEXT_MODELS = {
-        'github/': 6000,  # GitHub models have 8000 token limit, leave some margin
-    }
-    
-    # Check if this model needs trimming
-    trim_limit = None
-    for prefix, limit in SMALL_CONTEXT_MODELS.items():
-        if model.startswith(prefix):
-            trim_limit = limit
-            break
-    
-    if not trim_limit:
-        return openai_req  # No trimming needed
-    
-    trimmed_req = openai_req.copy()
-    
-    # 1. Remove or limit tools (MCP tools can be very large)
-    tools = trimmed_req.get('tools', [])
-    if tools:
-        tool_count = len(tools)
-        # Keep only essential tools or remove all if too many
-        if tool_count > 10:
-            print(f"DEBUG: Removing {tool_count} tools for small-context model")
-            trimmed_req['tools'] = None
-        elif tool_count > 5:
-            # Keep only first 5 tools
-            print(f"DEBUG: Trimming tools from {tool_count} to 5 for small-context model")
-            trimmed_req['tools'] = tools[:5]
-    
-    # 2. Trim system message if too long (rough estimate: 4 chars ≈ 1 token)
-    messages = trimmed_req.get('messages', [])
-    if messages and messages[0].get('role') == 'system':
-        system_content = messages[0].get('content', '')
-        estimated_tokens = len(system_content) // 4
-        if estimated_tokens > 2000:
-            # Trim to first 2000 tokens worth
-            trimmed_content = system_content[:8000] + "\n...[System instructions trimmed for model compatibility]"
-            print(f"DEBUG: Trimmed system message from ~{estimated_tokens} to ~2000 tokens")
-            trimmed_req['messages'] = [{"role": "system", "content": trimmed_content}] + messages[1:]
-    
-    return trimmed_req
+    adapter_log.begin_request(request.headers.get(adapter_log.REQUEST_ID_HEADER))
+    tracing.activate(None)
+    adapter_log.info("Incoming request", method=request.method, path=request.path)
 
-def google_to_openai_request(google_req, model):
-    """Translates Google GenerateContentRequest to OpenAI ChatCompletionRequest"""
+@app.after_request
+def add_request_id(response):
+    response.headers[adapter_log.REQUEST_ID_HEADER] = adapter_log.request_id()
+    trace = tracing.current()
+    if trace is not None:
+        response.headers[tracing.TRACE_ID_HEADER] = trace.trace_id
+        # Streams finish their trace when the generator ends
+        if not response.is_streamed:
+            response.headers['Server-Timing'] = trace.server_timing()
+            tracing.finish(trace, status_code=response.status_code)
+    return response
+
+def translate_system_instruction(system_instruction):
+    """Translates a Google systemInstruction into a list of zero or one OpenAI system messages"""
     messages = []
-    
-    # 1. Handle systemInstruction
-    system_instruction = google_req.get('systemInstruction', {})
     if system_instruction:
         parts = system_instruction.get('parts', [])
         text = "\n".join([p.get('text', '') for p in parts if 'text' in p])
         if text:
             messages.append({"role": "system", "content": text})
-    
-    # 2. Handle contents (history + current prompt)
-    contents = google_req.get('contents', [])
-    for content in contents:
-        role = content.get('role', 'user')
-        if role == 'model': role = 'assistant'
-        if role == 'function': role = 'tool'
-            
-        parts = content.get('parts', [])
-        text_content = ""
-        tool_calls = []
+    return messages
+
+def translate_content(content):
+    """Translates one Google content entry (a conversation turn) into OpenAI messages"""
+    messages = []
+    role = content.get('role', 'user')
+    if role == 'model': role = 'assistant'
+    if role == 'function': role = 'tool'
         
-        for part in parts:
-            if 'text' in part:
-                text_content += part['text']
-            elif 'functionCall' in part:
-                fc = part['functionCall']
-                call_id = f"call_{fc['name']}"
-                # Ensure args is a dict
-                args = fc.get('args', {})
-                if not isinstance(args, dict):
-                    args = {}
-                tool_calls.append({
-                    "id": call_id,
-                    "type": "function",
-                    "function": {
-                        "name": fc['name'],
-                        "arguments": json.dumps(args)
-                    }
-                })
-            elif 'functionResponse' in part:
-                fr = part['functionResponse']
-                # Ensure response exists and is a dict
-                resp_data = fr.get('response', {})
-                if not isinstance(resp_data, dict):
-                    resp_data = {"result": str(resp_data)}
-                messages.append({
-                    "role": "tool",
-                    "tool_call_id": f"call_{fr['name']}",
-                    "content": json.dumps(resp_data)
-                })
-                role = 'tool' 
+    parts = content.get('parts', [])
+    text_content = ""
+    tool_calls = []
+    media_parts = []  # OpenAI content parts, in order, once there is any inlineData/fileData
+    
+    for part in parts:
+        if 'text' in part:
+            text_content += part['text']
+            if media_parts:
+                media_parts.append({"type": "text", "text": part['text']})
+        elif 'inlineData' in part or 'fileData' in part:
+            if not media_parts and text_content:
+                media_parts.append({"type": "text", "text": text_content})
+            media_parts.append(media.openai_part(part))
+        elif 'functionCall' in part:
+            fc = part['functionCall']
+            call_id = f"call_{fc['name']}"
+            # Ensure args is a dict
+            args = fc.get('args', {})
+            if not isinstance(args, dict):
+                args = {}
+            tool_calls.append({
+                "id": call_id,
+                "type": "function",
+                "function": {
+                    "name": fc['name'],
+                    "arguments": codec.dumps(args)
+                }
+            })
+        elif 'functionResponse' in part:
+            fr = part['functionResponse']
+            # Ensure response exists and is a dict
+            resp_data = fr.get('response', {})
+            if not isinstance(resp_data, dict):
+                resp_data = {"result": str(resp_data)}
+            messages.append({
+                "role": "tool",
+                "tool_call_id": f"call_{fr['name']}",
+                "content": codec.dumps(resp_data)
+            })
+            role = 'tool' 
 
-        if role == 'tool':
-            continue
-            
-        if text_content or tool_calls:
-            msg = {"role": role, "content": text_content if text_content else None}
-            if tool_calls:
-                msg["tool_calls"] = tool_calls
-            messages.append(msg)
+    if role == 'tool':
+        # Files read by a tool (images, PDFs) come as parts beside its functionResponse
+        if media_parts:
+            messages.append({"role": "user", "content": media_parts})
+        return messages
+
+    if media_parts and role == 'user':
+        messages.append({"role": "user", "content": media_parts})
+        return messages
+
+    if text_content or tool_calls:
+        msg = {"role": role, "content": text_content if text_content else None}
+        if tool_calls:
+            msg["tool_calls"] = tool_calls
+        messages.append(msg)
+    return messages
+
+def translate_tool_block(tool):
+    """Translates one Google tool block (a list of functionDeclarations) into OpenAI tools"""
+    tools = []
+    for func in tool.get('functionDeclarations', []):
+        # Google AI SDK / CLI might send parameters as 'parameters' or 'parametersJsonSchema'
+        params = func.get('parameters') or func.get('parametersJsonSchema')
+        tools.append({
+            "type": "function",
+            "function": {
+                "name": func.get('name'),
+                "description": func.get('description'),
+                "parameters": params or {"type": "object", "properties": {}}
+            }
+        })
+    return tools
+
+def google_to_openai_request(google_req, model):
+    """
+    Translates Google GenerateContentRequest to OpenAI ChatCompletionRequest.
+    Goes through the translation cache, so only the new suffix of a growing
+    conversation is translated.
+    """
+    # 1. systemInstruction, 2. contents (history + current prompt), 3. tool definitions
+    cache = translation_cache.get_cache()
+    messages, tools = cache.translate(google_req, translate_system_instruction, translate_content, translate_tool_block)
+    # Same tools, same bytes: a stable prefix for the provider's prompt cache
+    tools = prompt_cache.stable_tools(tools)
         
     # Extract config
     generation_config = google_req.get('generationConfig', {})
@@ -145,23 +164,7 @@ def google_to_openai_request(google_req, model):
     # Extract safety settings (logged for now, as LiteLLM handles them per-provider)
     safety_settings = google_req.get('safetySettings', [])
     if safety_settings:
-        print(f"DEBUG: Received safety settings: {json.dumps(safety_settings)}")
-
-    # Extract tools (definitions)
-    tools = []
-    google_tools = google_req.get('tools', [])
-    for tool in google_tools:
-        for func in tool.get('functionDeclarations', []):
-            # Google AI SDK / CLI might send parameters as 'parameters' or 'parametersJsonSchema'
-            params = func.get('parameters') or func.get('parametersJsonSchema')
-            tools.append({
-                "type": "function",
-                "function": {
-                    "name": func.get('name'),
-                    "description": func.get('description'),
-                    "parameters": params or {"type": "object", "properties": {}}
-                }
-            })
+        adapter_log.debug("Received safety settings", safety_settings=safety_settings)
 
     openai_req = {
         "model": model,
@@ -177,20 +180,41 @@ def google_to_openai_request(google_req, model):
     }
     return {k: v for k, v in openai_req.items() if v is not None}
 
+# Map OpenAI finish reasons to Google
+FINISH_REASON_MAP = {
+    'stop': 'STOP',
+    'length': 'MAX_TOKENS',
+    'content_filter': 'SAFETY',
+    'tool_calls': 'STOP',
+    'function_call': 'STOP'
+}
+
+# Every response reports the same ratings; shared, never mutated
+SAFETY_RATINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "probability": "NEGLIGIBLE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "probability": "NEGLIGIBLE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "probability": "NEGLIGIBLE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "probability": "NEGLIGIBLE"}
+]
+PROMPT_FEEDBACK = {"safetyRatings": SAFETY_RATINGS}
+
+def translate_usage(usage):
+    """Google usageMetadata of a LiteLLM usage object, with the provider's cached prompt tokens"""
+    usage_meta = {
+        "promptTokenCount": getattr(usage, 'prompt_tokens', 0),
+        "candidatesTokenCount": getattr(usage, 'completion_tokens', 0),
+        "totalTokenCount": getattr(usage, 'total_tokens', 0)
+    }
+    cached = prompt_cache.cached_tokens(usage)
+    if cached:
+        usage_meta["cachedContentTokenCount"] = cached
+    return usage_meta
+
 def openai_to_google_response(openai_resp):
     """Translates OpenAI ChatCompletionResponse to Google GenerateContentResponse"""
     choices = openai_resp.choices
     candidates = []
     
-    # Map OpenAI finish reasons to Google
-    FINISH_REASON_MAP = {
-        'stop': 'STOP',
-        'length': 'MAX_TOKENS',
-        'content_filter': 'SAFETY',
-        'tool_calls': 'STOP',
-        'function_call': 'STOP'
-    }
-    
     for choice in choices:
         message = choice.message
         content = message.content
@@ -208,7 +232,7 @@ def openai_to_google_response(openai_resp):
         if tool_calls:
             for tool_call in tool_calls:
                 try:
-                    args = json.loads(tool_call.function.arguments) if tool_call.function.arguments else {}
+                    args = codec.loads(tool_call.function.arguments) if tool_call.function.arguments else {}
                 except:
                     args = {}
                     
@@ -229,276 +253,716 @@ def openai_to_google_response(openai_resp):
             },
             "finishReason": finish_reason,
             "index": getattr(choice, 'index', 0),
-            "safetyRatings": [
-                {"category": "HARM_CATEGORY_HARASSMENT", "probability": "NEGLIGIBLE"},
-                {"category": "HARM_CATEGORY_HATE_SPEECH", "probability": "NEGLIGIBLE"},
-                {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "probability": "NEGLIGIBLE"},
-                {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "probability": "NEGLIGIBLE"}
-            ]
+            "safetyRatings": SAFETY_RATINGS
         })
     
     # Extract usage
     usage = getattr(openai_resp, 'usage', None)
-    usage_metadata = {}
-    if usage:
-        usage_metadata = {
-            "promptTokenCount": getattr(usage, 'prompt_tokens', 0),
-            "candidatesTokenCount": getattr(usage, 'completion_tokens', 0),
-            "totalTokenCount": getattr(usage, 'total_tokens', 0)
-        }
+    usage_metadata = translate_usage(usage) if usage else {}
     
     response = {
         "candidates": candidates,
         "usageMetadata": usage_metadata,
         "modelVersion": "gemini-2.0-flash-001",
-        "promptFeedback": {
-            "safetyRatings": [
-                {"category": "HARM_CATEGORY_HARASSMENT", "probability": "NEGLIGIBLE"},
-                {"category": "HARM_CATEGORY_HATE_SPEECH", "probability": "NEGLIGIBLE"},
-                {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "probability": "NEGLIGIBLE"},
-                {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "probability": "NEGLIGIBLE"}
-            ]
-        }
+        "promptFeedback": PROMPT_FEEDBACK
     }
-    print(f"DEBUG: Translated Google Response: {json.dumps(response)}")
+    adapter_log.debug("Translated Google response", response=response)
     return response
 
+def resolve_target_model(model):
+    """Maps the model name from the request path to a LiteLLM model string"""
+    return routing.resolve(model).target_model
+
+def get_provider_api_key(target_model):
+    """Returns the API key for the provider of target_model, if configured"""
+    return routing.resolve(target_model).api_key
+
+def build_openai_request(google_req, model):
+    """
+    Runs the full request pipeline shared by every serving mode:
+    routing, translation, compaction, context fitting and credentials.
+    Returns (target_model, openai_req).
+    """
+    route = routing.resolve(model)
+    target_model = route.target_model
+
+    with tracing.span("translate"):
+        # Large inline blobs are spooled out of the request before anything copies them
+        has_media = media.spool_request(google_req)
+        openai_req = google_to_openai_request(google_req, target_model)
+
+    # Long sessions: splice in a cached summary of the older turns (never waits for one)
+    if compaction.enabled():
+        with tracing.span("compact"):
+            openai_req = compaction.compact(openai_req, target_model, route)
+
+    # Fit the request into the routed model's context window
+    with tracing.span("context_fit"):
+        openai_req = context_fit.fit_request(openai_req, target_model, route.limits)
+
+    with tracing.span("prepare"):
+        # Messages and tools may be shared with the translation cache, and LiteLLM
+        # rewrites some of them in place (e.g. Gemini tool schemas), so hand it copies
+        openai_req['messages'] = [dict(m) for m in openai_req['messages']]
+        if openai_req.get('tools'):
+            openai_req['tools'] = codec.loads(codec.dumps(openai_req['tools']))
+        if route.cache_markers:
+            prompt_cache.add_breakpoints(openai_req)
+        if has_media:
+            media.fit_capabilities(openai_req, target_model)
+
+        # Explicitly pass API keys for providers that need them
+        # LiteLLM can use environment variables, but being explicit is more reliable
+        if route.api_key:
+            openai_req['api_key'] = route.api_key
+    return target_model, openai_req
+
+def count_tokens_response(google_req, model):
+    """
+    countTokens without an upstream call: the translated request (tools and
+    system instruction included, before context fitting) counted with the
+    routed model's tokenizer.
+    """
+    # The SDK sends either bare contents or a full generateContentRequest
+    google_req = google_req.get('generateContentRequest') or google_req
+    media.spool_request(google_req)
+    target_model = routing.resolve(model).target_model
+    openai_req = google_to_openai_request(google_req, target_model)
+    total = token_counting.count_request_tokens(target_model, openai_req['messages'], openai_req.get('tools') or ())
+    adapter_log.info("Counted tokens", model=target_model, total_tokens=total)
+    return {"totalTokens": total}
+
+def is_streaming_request(path, args):
+    """True if the route or ?alt=sse asks for a server-sent event stream"""
+    return 'streamGenerateContent' in path or args.get('alt') == 'sse'
+
+def sse_frame(payload):
+    """Formats a JSON payload as a single SSE data frame"""
+    return "data: " + codec.dumps(payload) + "\n\n"
+
+@functools.lru_cache(maxsize=None)
+def finish_frame(codec_name, finish_reason):
+    """The constant final frame of a stream without pending tool calls, serialized once per codec"""
+    return sse_frame({"candidates": [{"finishReason": finish_reason, "index": 0}]})
+
+def json_response(payload, status=200):
+    """Like jsonify, but serialized by the codec"""
+    return app.response_class(codec.dumps_bytes(payload) + b"\n", status=status, mimetype='application/json')
+
+def new_stream_state():
+    """Per-stream state carried between calls to translate_stream_chunk"""
+    return {"accumulated_tool_calls": {}, "first_chunk_at": None, "usage": None, "chunks": 0,
+            "output_chars": 0, "coalescer": sse_coalesce.new_coalescer()}
+
+def parse_tool_call_arguments(tc):
+    """The accumulated arguments of a tool call as a dict, None if they aren't a JSON object (yet)"""
+    arguments = "".join(tc["arguments"])
+    if not arguments:
+        return {}
+    try:
+        args = codec.loads(arguments)
+    except ValueError:
+        return None
+    return args if isinstance(args, dict) else None
+
+def tool_call_part(tc):
+    """The Gemini functionCall part of an accumulated tool call; unparseable arguments become {}"""
+    return {"functionCall": {"name": tc["name"], "args": parse_tool_call_arguments(tc) or {}}}
+
+def scan_tool_call_arguments(tc, fragment):
+    """
+    Tracks JSON nesting over an arguments fragment, outside of strings.
+    Returns True when the top-level value closed in this fragment.
+    """
+    depth, in_string, escaped = tc["depth"], tc["in_string"], tc["escaped"]
+    closed = False
+    for ch in fragment:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == '{' or ch == '[':
+            depth += 1
+        elif (ch == '}' or ch == ']') and depth > 0:
+            depth -= 1
+            closed = depth == 0
+    tc["depth"], tc["in_string"], tc["escaped"] = depth, in_string, escaped
+    return closed
+
+def tool_call_frame(tc):
+    data_str = sse_frame({
+        "candidates": [{
+            "content": {
+                "parts": [tool_call_part(tc)],
+                "role": "model"
+            },
+            "index": 0
+        }]
+    })
+    adapter_log.debug("Yielding tool call chunk", frame=data_str)
+    tc["emitted"] = True
+    return data_str
+
+def is_text_only_chunk(chunk):
+    """True for a chunk carrying nothing but (possibly empty) text"""
+    if getattr(chunk, 'usage', None) or not chunk.choices:
+        return False
+    choice = chunk.choices[0]
+    return not getattr(choice, 'finish_reason', None) and not getattr(choice.delta, 'tool_calls', None)
+
+def flush_stream_text(state):
+    """Text still held by the coalescer at the end of a stream"""
+    coalescer = state["coalescer"]
+    return coalescer.flush() if coalescer is not None else []
+
+def translate_stream_chunk(chunk, state):
+    """
+    Translates one OpenAI streaming chunk into zero or more Gemini SSE frames.
+    A tool call is emitted in its own frame as soon as its arguments are complete:
+    when they close as a JSON object, or when the next tool call starts.
+    Calls still open at the finish are emitted with the final chunk.
+    """
+    frames = []
+    accumulated_tool_calls = state["accumulated_tool_calls"]
+    coalescer = state["coalescer"]
+    if coalescer is not None and not is_text_only_chunk(chunk):
+        # Held text goes out before anything else this chunk produces
+        frames.extend(coalescer.flush())
+
+    # 0. Handle Usage (can be in any chunk, typically the last)
+    if hasattr(chunk, 'usage') and chunk.usage:
+        usage_meta = translate_usage(chunk.usage)
+        state["usage"] = usage_meta
+        data_str = sse_frame({'usageMetadata': usage_meta})
+        adapter_log.debug("Yielding usage chunk", frame=data_str)
+        frames.append(data_str)
+
+    if not chunk.choices:
+        return frames
+
+    delta = chunk.choices[0].delta
+    finish_reason = getattr(chunk.choices[0], 'finish_reason', None)
+
+    # 1. Text Content
+    content = getattr(delta, 'content', None) or ""
+    if content:
+        state["output_chars"] += len(content)
+        if coalescer is None:
+            data_str = sse_coalesce.text_frame(content)
+            adapter_log.debug("Yielding text chunk", frame=data_str)
+            frames.append(data_str)
+        else:
+            frames.extend(coalescer.add(content))
+
+    # 2. Tool Calls
+    tool_calls_delta = getattr(delta, 'tool_calls', None)
+    if tool_calls_delta:
+        for tc_delta in tool_calls_delta:
+            idx = tc_delta.index
+            tc = accumulated_tool_calls.get(idx)
+            if tc is None:
+                # A new call starts: the ones before it won't get more arguments
+                for earlier in sorted(accumulated_tool_calls):
+                    if earlier < idx and not accumulated_tool_calls[earlier]["emitted"]:
+                        frames.append(tool_call_frame(accumulated_tool_calls[earlier]))
+                tc = accumulated_tool_calls[idx] = {
+                    "name": getattr(tc_delta.function, 'name', None),
+                    "arguments": [],
+                    "depth": 0,
+                    "in_string": False,
+                    "escaped": False,
+                    "emitted": False,
+                }
+            fragment = tc_delta.function.arguments
+            if not fragment:
+                continue
+            if tc["emitted"]:
+                adapter_log.warning("Arguments after the tool call was emitted, dropped", name=tc["name"], fragment=fragment)
+                continue
+            tc["arguments"].append(fragment)
+            state["output_chars"] += len(fragment)
+            if scan_tool_call_arguments(tc, fragment) and parse_tool_call_arguments(tc) is not None:
+                frames.append(tool_call_frame(tc))
+
+    # 3. Handle Finish
+    if finish_reason:
+        adapter_log.debug("Stream finished", reason=finish_reason)
+        finish_reason_upper = FINISH_REASON_MAP.get(finish_reason, 'STOP')
+
+        parts = []
+        # Tool calls not emitted yet go out with the final chunk
+        for idx in sorted(accumulated_tool_calls.keys()):
+            tc = accumulated_tool_calls[idx]
+            if not tc["emitted"]:
+                tc["emitted"] = True
+                parts.append(tool_call_part(tc))
+
+        # Final terminal chunk
+        final_chunk = {
+            "candidates": [{
+                "finishReason": finish_reason_upper,
+                "index": 0
+            }]
+        }
+
+        # If we have parts (tool calls), insert them into this final chunk
+        if parts:
+            final_chunk["candidates"][0]["content"] = {
+                "parts": parts,
+                "role": "model"
+            }
+            # Log specifically for tool calls
+            data_str = sse_frame(final_chunk)
+            adapter_log.debug("Yielding combined tool+stop chunk", frame=data_str)
+            frames.append(data_str)
+        else:
+            # Just a stop reason
+            data_str = finish_frame(codec.name, finish_reason_upper)
+            adapter_log.debug("Yielding final stop chunk", frame=data_str)
+            frames.append(data_str)
+
+    return frames
+
+def note_upstream_chunk(model, state, upstream_start):
+    """Records the upstream TTFT on the first chunk of a stream"""
+    state["chunks"] += 1
+    if state["first_chunk_at"] is None:
+        state["first_chunk_at"] = time.perf_counter()
+        metrics.UPSTREAM_TTFT.observe((model,), state["first_chunk_at"] - upstream_start)
+        hedging.record_ttft(model, state["first_chunk_at"] - upstream_start)
+
+def finish_upstream_stream(model, state, setup_end):
+    """Token metrics and trace spans of a completed upstream stream"""
+    now = time.perf_counter()
+    first = state["first_chunk_at"]
+    if state["usage"]:
+        metrics.record_usage(model, state["usage"], now - first if first else None)
+    trace = tracing.current()
+    if trace is not None and first is not None:
+        trace.add_span("upstream_ttfb", setup_end, first)
+        trace.add_span("stream", first, now, chunks=state["chunks"])
+
+def close_upstream_stream(response):
+    """Closes the provider stream under a LiteLLM stream, releasing its connection"""
+    stream = getattr(response, 'completion_stream', None)
+    close = getattr(stream, 'close', None) or getattr(response, 'close', None)
+    if close is not None:
+        try:
+            close()
+        except Exception as e:
+            adapter_log.debug("Closing upstream stream failed", error=f"{type(e).__name__}: {e}")
+
+def cancel_upstream_stream(model, state):
+    """Records an upstream stream abandoned by its reader (client disconnect, lost hedge)"""
+    # Usage only arrives with the last chunk; until then estimate from the streamed text
+    usage = state["usage"] or {}
+    streamed = usage.get('candidatesTokenCount') or state["output_chars"] // token_counting.CHARS_PER_TOKEN
+    metrics.record_cancellation(model, streamed)
+    adapter_log.info("Upstream stream cancelled", model=model, chunks=state["chunks"])
+
+def stream_frames(openai_req, route=None, ticket=None):
+    """Yields the Gemini SSE frames of an upstream streaming completion; upstream errors propagate"""
+    adapter_log.debug("Starting incremental stream generation")
+    model = openai_req['model']
+    upstream_start = time.perf_counter()
+    with tracing.span("upstream_setup"):
+        response = litellm.completion(
+            **media.materialize(openai_req),
+            **routing.upstream_kwargs(route),
+            stream=True
+        )
+    setup_end = time.perf_counter()
+    if ticket is not None:
+        ticket.observe(admission.response_headers(response))
+    # A producer thread (single-flight, hedging) may lose its readers while blocked on the provider
+    scope = cancel_scope.current()
+    if scope is not None:
+        scope.add(functools.partial(close_upstream_stream, response))
+
+    state = new_stream_state()
+    chunks = sse_coalesce.timed(response, state["coalescer"])
+    try:
+        for chunk in chunks:
+            if chunk is None:
+                # The coalescing window ended before the next chunk
+                yield from flush_stream_text(state)
+                continue
+            note_upstream_chunk(model, state, upstream_start)
+            for data_str in translate_stream_chunk(chunk, state):
+                yield data_str
+    except GeneratorExit:
+        # Nobody reads the rest: stop the provider generating it
+        if chunks is not response:
+            chunks.close()
+        close_upstream_stream(response)
+        cancel_upstream_stream(model, state)
+        raise
+    except Exception:
+        if scope is not None and scope.cancelled:
+            cancel_upstream_stream(model, state)
+            return
+        yield from flush_stream_text(state)
+        raise
+    if scope is not None and scope.cancelled:
+        cancel_upstream_stream(model, state)
+        return
+    yield from flush_stream_text(state)
+    finish_upstream_stream(model, state, setup_end)
+    if ticket is not None:
+        ticket.settle((state["usage"] or {}).get('totalTokenCount'))
+
+def fallback_frames(google_req, fallback_model, client_id):
+    """Frames of the same request routed to a hedging fallback model"""
+    route = routing.resolve(fallback_model)
+    _, openai_req = build_openai_request(google_req, fallback_model)
+    return admission.stream(route, openai_req, client_id, lambda ticket: stream_frames(openai_req, route, ticket))
+
+def complete(openai_req, route, ticket):
+    """One non-streaming upstream call, once admitted"""
+    with tracing.span("upstream"):
+        response = litellm.completion(**media.materialize(openai_req), **routing.upstream_kwargs(route))
+    ticket.observe(admission.response_headers(response))
+    ticket.settle(getattr(response.usage, 'total_tokens', None))
+    return response
+
+def generate_batch_item(google_req, model, client_id):
+    """The Gemini response of one batch job item: the non-streaming generateContent path"""
+    route = routing.resolve(model)
+    target_model, openai_req = build_openai_request(google_req, model)
+    response = admission.call(route, openai_req, client_id, functools.partial(complete, openai_req, route))
+    google_resp = openai_to_google_response(response)
+    metrics.record_usage(target_model, google_resp["usageMetadata"])
+    return google_resp
+
+def lookup_cached_response(openai_req, headers, is_streaming):
+    """
+    Checks the response cache for a deterministic request.
+    Returns (cache, key, cached); key is None when the request isn't cacheable.
+    """
+    cache = response_cache.get_cache()
+    if cache is None or not response_cache.is_cacheable(openai_req, headers):
+        return cache, None, None
+    key = response_cache.cache_key('stream' if is_streaming else 'json', openai_req)
+    cached = cache.get(key)
+    if cached is not None:
+        adapter_log.info("Response cache hit", key=key[:12])
+    return cache, key, cached
+
+def stream_error_frames(e):
+    """SSE frames sent when the upstream stream fails, so the CLI doesn't just hang"""
+    error_msg = f"Adapter Error: {type(e).__name__}: {str(e)}"
+    adapter_log.error("Streaming error", error=error_msg)
+    error_chunk = {
+        "candidates": [{
+            "content": {
+                "parts": [{"text": f"\n\n[Error from Adapter]: {error_msg}\n\nThis is often due to provider rate limits or configuration issues."}],
+                "role": "model"
+            },
+            "finishReason": "OTHER"
+        }]
+    }
+    return [sse_frame(error_chunk), sse_frame({"error": {"code": 500, "message": str(e)}})]
+
+ERROR_STATUS = {400: "INVALID_ARGUMENT", 404: "NOT_FOUND", 429: "RESOURCE_EXHAUSTED"}
+
+def error_response_body(e):
+    """Returns (body, status_code) in the standard Google API error format"""
+    status_code = 500
+    if hasattr(e, 'status_code'):
+        status_code = e.status_code
+
+    error_response = {
+        "error": {
+            "code": status_code,
+            "message": str(e),
+            # RESOURCE_EXHAUSTED lets the Gemini CLI retry rate-limited requests itself
+            "status": ERROR_STATUS.get(status_code, "INTERNAL")
+        }
+    }
+    return error_response, status_code
+
+def adapter_stats():
+    """Counters of the adapter's caches, served at /adapter/stats"""
+    cache = response_cache.get_cache()
+    return {
+        "translation_cache": translation_cache.get_cache().stats(),
+        "token_counting": token_counting.stats(),
+        "response_cache": cache.stats() if cache is not None else {"enabled": False},
+        "single_flight": single_flight.stats(),
+        "capture": capture_store.stats(),
+        "admission": admission.stats(),
+        "hedging": hedging.stats(),
+        "cancellations": metrics.cancellation_stats(),
+        "compaction": compaction.stats(),
+        "media": media.stats(),
+        "embeddings": embeddings.stats(),
+        "batch_jobs": batch_jobs.stats(),
+    }
+
+def list_models_response():
+    """Static model list served by every serving mode"""
+    return {
+        "models": [
+            {
+                "name": "models/gemini-2.0-flash-001",
+                "version": "001",
+                "displayName": "Gemini 2.0 Flash",
+                "description": "Embedded LiteLLM",
+                "supportedGenerationMethods": ["generateContent"]
+            }
+        ]
+    }
+
 @app.route('/v1beta/models/<path:model>:generateContent', methods=['POST'])
 @app.route('/v1beta/models/<path:model>:streamGenerateContent', methods=['POST'])
 @app.route('/v1/models/<path:model>:generateContent', methods=['POST'])
 @app.route('/v1/models/<path:model>:streamGenerateContent', methods=['POST'])
 def generate_content(model):
     """Handle generateContent request"""
+    started = time.perf_counter()
+    capture = None
+    target_model = model
+    trace = tracing.start("generateContent", request.headers.get('traceparent'), model=model)
     try:
-        print(f"Received request for model: {model}")
-        print(f"Request Headers: {request.headers}")
-        google_req = request.json
-        save_debug_json("google_request.json", google_req)
-        
-        # Smart model routing for different providers
-        # If model already has a provider prefix (e.g., deepseek/, openai/), use it as-is
-        # Otherwise, detect the provider based on model name patterns
-        if '/' in model:
-            # Normalize github_copilot/ to github/ for litellm
-            if model.startswith('github_copilot/'):
-                target_model = model.replace('github_copilot/', 'github/', 1)
-            else:
-                # Model already has provider prefix (e.g., "deepseek/deepseek-chat")
-                target_model = model
-        elif model.startswith('gpt-') or model.startswith('o1-'):
-            # OpenAI models (gpt-4, gpt-3.5-turbo, gpt-4o-mini, o1-preview, etc.)
-            target_model = f"openai/{model}"
-        else:
-            # No prefix and not OpenAI, assume Google Gemini
-            target_model = f"gemini/{model}"
-        
-        openai_req = google_to_openai_request(google_req, target_model)
-        save_debug_json("openai_request.json", openai_req)
-        
-        # Trim payload for models with small context limits
-        openai_req = trim_payload_for_small_models(openai_req, target_model)
-        
-        # Explicitly pass API keys for providers that need them
-        # LiteLLM can use environment variables, but being explicit is more reliable
-        api_key = None
-        if target_model.startswith('github/'):
-            api_key = os.getenv('GITHUB_API_KEY')
-        elif target_model.startswith('openai/'):
-            api_key = os.getenv('OPENAI_API_KEY')
-        elif target_model.startswith('groq/'):
-            api_key = os.getenv('GROQ_API_KEY')
-        elif target_model.startswith('anthropic/'):
-            api_key = os.getenv('ANTHROPIC_API_KEY')
-        elif target_model.startswith('deepseek/'):
-            api_key = os.getenv('DEEPSEEK_API_KEY')
-        elif target_model.startswith('together_ai/'):
-            api_key = os.getenv('TOGETHER_API_KEY')
-        elif target_model.startswith('gemini/'):
-            api_key = os.getenv('GEMINI_API_KEY')
-        
-        # Add api_key to request if found
-        if api_key:
-            openai_req['api_key'] = api_key
+        adapter_log.info("Received request", model=model)
+        if adapter_log.debug_enabled():
+            adapter_log.debug("Request headers", headers=dict(request.headers))
+        with tracing.span("parse"):
+            # Not cached on the request: a large body would stay in memory for the whole stream
+            body = request.get_data(cache=False)
+            google_req = codec.loads(body) if body else {}
+            del body
+            media.spool_request(google_req)
+        # Logged once parsed, so large media shows up as spool references
+        if adapter_log.debug_enabled():
+            adapter_log.debug("Request body", body=google_req)
+
+        target_model, openai_req = build_openai_request(google_req, model)
+        metrics.TRANSLATION.observe((target_model,), time.perf_counter() - started)
+        # Sampled requests are captured with their responses (capture_store)
+        capture = capture_store.start(target_model, request.path, google_req, openai_req, started)
 
         # Check if streaming is requested
-        is_streaming = 'streamGenerateContent' in request.path or request.args.get('alt') == 'sse'
+        is_streaming = is_streaming_request(request.path, request.args)
+        metrics.REQUESTS.inc((target_model, 'true' if is_streaming else 'false'))
+        
+        # Deterministic requests may be answered from the response cache
+        cache, cache_key, cached = lookup_cached_response(openai_req, request.headers, is_streaming)
+        # Identical concurrent requests share one upstream call
+        flights = single_flight.get_flights()
+        if flights is not None:
+            flight_key = cache_key or response_cache.cache_key('stream' if is_streaming else 'json', openai_req)
+        
+        # Upstream calls wait for their provider's admission queue
+        route = routing.resolve(model)
+        client_id = request.headers.get(admission.CLIENT_HEADER) or request.remote_addr
         
         if is_streaming:
+            def upstream_attempt(ticket):
+                frames = stream_frames(openai_req, route, ticket)
+                if cache_key is not None:
+                    frames = cache.record_stream(cache_key, frames)
+                return frames
+
+            # Hedging races fallback models against a slow or failing primary
+            hedged = hedging.enabled() and route.fallbacks
+
+            def upstream_frames():
+                if not hedged:
+                    return admission.stream(route, openai_req, client_id, upstream_attempt)
+                # 429s go to the fallbacks instead of being retried
+                primary = lambda: admission.stream(route, openai_req, client_id, upstream_attempt, retries=0)
+                return hedging.stream([(target_model, primary)] + [
+                    (fallback, functools.partial(fallback_frames, google_req, fallback, client_id))
+                    for fallback in route.fallbacks
+                ])
+
             def generate():
+                # Runs after the view returned; spans still belong to this request
+                tracing.activate(trace)
                 try:
-                    print("DEBUG: Starting incremental stream generation...")
-                    response = litellm.completion(
-                        **openai_req,
-                        stream=True
-                    )
-                    
-                    accumulated_tool_calls = {}
-                    role_sent = False
-                    
-                    for chunk in response:
-                        # 0. Handle Usage (can be in any chunk, typically the last)
-                        if hasattr(chunk, 'usage') and chunk.usage:
-                            usage = chunk.usage
-                            usage_meta = {
-                                "promptTokenCount": getattr(usage, 'prompt_tokens', 0),
-                                "candidatesTokenCount": getattr(usage, 'completion_tokens', 0),
-                                "totalTokenCount": getattr(usage, 'total_tokens', 0)
-                            }
-                            data_str = f"data: {json.dumps({'usageMetadata': usage_meta})}\n\n"
-                            print(f"DEBUG: Yielding usage chunk: {data_str}")
-                            yield data_str
-
-                        if not chunk.choices:
-                            continue
-                            
-                        delta = chunk.choices[0].delta
-                        finish_reason = getattr(chunk.choices[0], 'finish_reason', None)
-                        
-                        # 1. Text Content
-                        content = getattr(delta, 'content', None) or ""
-                        if content:
-                            google_chunk = {
-                                "candidates": [{
-                                    "content": {
-                                        "parts": [{"text": content}],
-                                        "role": "model"
-                                    },
-                                    "index": 0
-                                }]
-                            }
-                            data_str = f"data: {json.dumps(google_chunk)}\n\n"
-                            print(f"DEBUG: Yielding text chunk: {data_str[:100]}...")
+                    if cached is not None:
+                        frames, source = iter(cached), "cache"
+                    elif flights is not None:
+                        frames, source = flights.stream(flight_key, upstream_frames), "single_flight"
+                    else:
+                        frames, source = upstream_frames(), "upstream"
+                    if capture is not None:
+                        frames = capture.record_stream(frames, source)
+                    try:
+                        for data_str in frames:
                             yield data_str
-                            
-                        # 2. Tool Calls
-                        tool_calls_delta = getattr(delta, 'tool_calls', None)
-                        if tool_calls_delta:
-                            for tc_delta in tool_calls_delta:
-                                idx = tc_delta.index
-                                if idx not in accumulated_tool_calls:
-                                    accumulated_tool_calls[idx] = {
-                                        "name": getattr(tc_delta.function, 'name', None),
-                                        "arguments": ""
-                                    }
-                                if tc_delta.function.arguments:
-                                    accumulated_tool_calls[idx]["arguments"] += tc_delta.function.arguments
-                        
-                        # 3. Handle Finish
-                        if finish_reason:
-                            print(f"DEBUG: Stream finished. Reason: {finish_reason}")
-                            
-                            FINISH_REASON_MAP = {
-                                'stop': 'STOP',
-                                'length': 'MAX_TOKENS',
-                                'content_filter': 'SAFETY',
-                                'tool_calls': 'STOP',
-                                'function_call': 'STOP'
-                            }
-                            finish_reason_upper = FINISH_REASON_MAP.get(finish_reason, 'STOP')
-                            
-                            parts = []
-                            # If we have tool calls, include them
-                            if accumulated_tool_calls:
-                                for idx in sorted(accumulated_tool_calls.keys()):
-                                    tc = accumulated_tool_calls[idx]
-                                    try:
-                                        args = json.loads(tc["arguments"]) if tc["arguments"] else {}
-                                    except:
-                                        args = {}
-                                    parts.append({
-                                        "functionCall": {
-                                            "name": tc["name"],
-                                            "args": args
-                                        }
-                                    })
-                            
-                            # Final terminal chunk 
-                            final_chunk = {
-                                "candidates": [{
-                                    "finishReason": finish_reason_upper,
-                                    "index": 0
-                                }]
-                            }
-                            
-                            # If we have parts (tool calls), insert them into this final chunk
-                            if parts:
-                                final_chunk["candidates"][0]["content"] = {
-                                    "parts": parts,
-                                    "role": "model"
-                                }
-                                # Log specifically for tool calls
-                                data_str = f"data: {json.dumps(final_chunk)}\n\n"
-                                print(f"DEBUG: Yielding combined tool+stop chunk: {data_str}")
-                                yield data_str
-                            else:
-                                # Just a stop reason
-                                data_str = f"data: {json.dumps(final_chunk)}\n\n"
-                                print(f"DEBUG: Yielding final stop chunk: {data_str}")
-                                yield data_str
+                    finally:
+                        # On a client disconnect the server closes this generator; pass that on upstream now
+                        if hasattr(frames, 'close'):
+                            frames.close()
+                    metrics.STREAM_DURATION.observe((target_model,), time.perf_counter() - started)
+                    if trace is not None and tracing.stream_trailer_enabled():
+                        yield tracing.stream_trailer(trace)
                             
                 except Exception as e:
-                    error_msg = f"Adapter Error: {type(e).__name__}: {str(e)}"
-                    print(f"DEBUG: Streaming Error: {error_msg}")
+                    metrics.record_error(target_model, e)
                     # Try to yield a message to the CLI so it doesn't just hang
-                    error_chunk = {
-                        "candidates": [{
-                            "content": {
-                                "parts": [{"text": f"\n\n[Error from Adapter]: {error_msg}\n\nThis is often due to provider rate limits or configuration issues."}],
-                                "role": "model"
-                            },
-                            "finishReason": "OTHER"
-                        }]
-                    }
-                    yield f"data: {json.dumps(error_chunk)}\n\n"
-                    error_chunk = {"error": {"code": 500, "message": str(e)}}
-                    yield f"data: {json.dumps(error_chunk)}\n\n"
+                    for data_str in stream_error_frames(e):
+                        yield data_str
+                finally:
+                    tracing.finish(trace, model=target_model)
             
             return app.response_class(generate(), mimetype='text/event-stream')
             
         else:
-            # Non-streaming
-            response = litellm.completion(**openai_req)
+            if cached is not None:
+                if capture is not None:
+                    capture.set_response(cached, "cache")
+                    capture.finish()
+                return json_response(cached)
             
-            # Save raw OpenAI response for analysis
-            save_debug_json("openai_response.json", response.model_dump())
+            # Non-streaming
+            def upstream_response():
+                response = admission.call(route, openai_req, client_id, functools.partial(complete, openai_req, route))
+                
+                # Keep the raw OpenAI response for analysis
+                if capture is not None:
+                    capture.set_openai_response(response.model_dump())
+                
+                google_resp = openai_to_google_response(response)
+                metrics.record_usage(target_model, google_resp["usageMetadata"])
+                if cache_key is not None:
+                    cache.put(cache_key, google_resp)
+                return google_resp
             
-            google_resp = openai_to_google_response(response)
-            save_debug_json("google_response.json", google_resp)
+            if flights is not None:
+                google_resp = flights.call(flight_key, upstream_response)
+            else:
+                google_resp = upstream_response()
             
-            return jsonify(google_resp)
+            metrics.REQUEST_DURATION.observe((target_model,), time.perf_counter() - started)
+            if capture is not None:
+                capture.set_response(google_resp)
+                capture.finish()
+            return json_response(google_resp)
             
     except Exception as e:
-        print(f"Adapter Error: {e}")
+        adapter_log.error("Adapter error", error=f"{type(e).__name__}: {e}")
+        metrics.record_error(target_model, e)
+        if capture is not None:
+            capture.set_error(e)
+            capture.finish()
         # Return standard Google API error format
-        status_code = 500
-        if hasattr(e, 'status_code'):
-            status_code = e.status_code
-            
-        error_response = {
-            "error": {
-                "code": status_code,
-                "message": str(e),
-                "status": "INTERNAL"
-            }
-        }
-        return jsonify(error_response), status_code
+        error_response, status_code = error_response_body(e)
+        return json_response(error_response, status_code)
+
+@app.route('/v1beta/models/<path:model>:countTokens', methods=['POST'])
+@app.route('/v1/models/<path:model>:countTokens', methods=['POST'])
+def count_tokens(model):
+    """Handle countTokens request"""
+    try:
+        body = request.get_data(cache=False)
+        return json_response(count_tokens_response(codec.loads(body) if body else {}, model))
+    except Exception as e:
+        adapter_log.error("Error counting tokens", error=f"{type(e).__name__}: {e}")
+        error_response, status_code = error_response_body(e)
+        return json_response(error_response, status_code)
+
+@app.route('/v1beta/models/<path:model>:embedContent', methods=['POST'])
+@app.route('/v1beta/models/<path:model>:batchEmbedContents', methods=['POST'])
+@app.route('/v1/models/<path:model>:embedContent', methods=['POST'])
+@app.route('/v1/models/<path:model>:batchEmbedContents', methods=['POST'])
+def embed_content(model):
+    """Handle embedContent and batchEmbedContents requests"""
+    batch = request.path.endswith(':batchEmbedContents')
+    try:
+        body = request.get_data(cache=False)
+        requests = embeddings.embed_requests(codec.loads(body) if body else {}, batch)
+        return json_response(embeddings.embed_response(embeddings.embed(requests, model), batch))
+    except Exception as e:
+        adapter_log.error("Error embedding content", error=f"{type(e).__name__}: {e}")
+        error_response, status_code = error_response_body(e)
+        return json_response(error_response, status_code)
+
+@app.route('/v1beta/models/<path:model>:batchGenerateContent', methods=['POST'])
+@app.route('/v1/models/<path:model>:batchGenerateContent', methods=['POST'])
+def batch_generate_content(model):
+    """Handle batchGenerateContent: stores the job and answers with its operation right away"""
+    try:
+        return json_response(batch_jobs.create(model, request.get_data(cache=False), request.content_type or ''))
+    except Exception as e:
+        adapter_log.error("Error creating batch", error=f"{type(e).__name__}: {e}")
+        error_response, status_code = error_response_body(e)
+        return json_response(error_response, status_code)
+
+def batch_job_response(name, args):
+    """(payload, status) of GET batches/{id} and GET batches/{id}:results?offset=N; payload is bytes for results"""
+    job_id, _, method = name.partition(':')
+    if method == 'results':
+        return batch_jobs.results(job_id, int(args.get('offset') or 0))[0], 200
+    if method:
+        return {"error": {"code": 404, "message": f"Unknown batch method {method}", "status": "NOT_FOUND"}}, 404
+    return batch_jobs.get(job_id), 200
+
+@app.route('/v1beta/batches', methods=['GET'])
+@app.route('/v1/batches', methods=['GET'])
+def list_batches():
+    """Handle batch job list request"""
+    return json_response(batch_jobs.list_jobs())
+
+@app.route('/v1beta/batches/<name>', methods=['GET', 'POST'])
+@app.route('/v1/batches/<name>', methods=['GET', 'POST'])
+def batch_job(name):
+    """Handle batch job polling, results (JSONL) and cancel requests"""
+    try:
+        if request.method == 'POST':
+            job_id, _, method = name.partition(':')
+            if method != 'cancel':
+                raise batch_jobs.JobNotFound(name)
+            return json_response(batch_jobs.cancel(job_id))
+        payload, status = batch_job_response(name, request.args)
+        if isinstance(payload, bytes):
+            return app.response_class(payload, status=status, mimetype='application/jsonl')
+        return json_response(payload, status)
+    except Exception as e:
+        error_response, status_code = error_response_body(e)
+        return json_response(error_response, status_code)
+
+@app.route('/adapter/stats', methods=['GET'])
+def stats():
+    """Handle adapter stats request"""
+    return json_response(adapter_stats())
+
+@app.route('/adapter/ready', methods=['GET'])
+def ready():
+    """Handle readiness probe: 503 until upstream clients are loaded"""
+    state = startup.readiness()
+    return json_response(state, 200 if state["ready"] else 503)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Handle Prometheus scrape"""
+    return app.response_class(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 @app.route('/v1beta/models', methods=['GET'])
 @app.route('/v1/models', methods=['GET'])
 def list_models():
     """Handle list models request"""
-    return jsonify({
-        "models": [
-            {
-                "name": "models/gemini-2.0-flash-001",
-                "version": "001",
-                "displayName": "Gemini 2.0 Flash",
-                "description": "Embedded LiteLLM",
-                "supportedGenerationMethods": ["generateContent"]
-            }
-        ]
-    })
+    return json_response(list_models_response())
+
+# Batch jobs go through the generateContent path of every serving mode
+batch_jobs.install(generate_batch_item, error_response_body)
+
+def start_background():
+    """Starts what runs beside a serving process: the LiteLLM preload and warm-up, and the batch job scan"""
+    # LiteLLM (and the provider warm-up) load in the background while the port comes up
+    startup.begin(routing.warm_up if routing.warmup_enabled() else None)
+    batch_jobs.begin()
 
 if __name__ == '__main__':
     print("🚀 Starting Embedded Gemini-LiteLLM Adapter on port 5001...")
+    # The reloader parent only watches files; its child, with WERKZEUG_RUN_MAIN set, serves
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background()
     app.run(host='0.0.0.0', port=5001, debug=True)
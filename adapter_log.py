@@ -0,0 +1,148 @@
+"""
+Leveled, structured logging for the adapter.
+
+Every event is a message plus key/value fields, tagged with the id of the
+request it belongs to. The request thread (or event loop) only builds a
+LogRecord and puts it on a queue; formatting and writing happen on a background
+listener thread. Sinks:
+  console - one readable line per event on stdout (adapter.log under manage_adapter.sh)
+  file    - optional rotating JSONL file named by LOG_FILE, LOG_FILE_MB per file, LOG_FILE_BACKUPS kept
+
+LOG_LEVEL (default INFO) sets the threshold. Payload dumps (request bodies,
+headers, translated responses) and per-chunk events are DEBUG, and callers
+guard them with debug_enabled(), so at INFO the hot path serializes nothing.
+LOG_SAMPLE_RATE (default 1.0) is the fraction of requests whose DEBUG events
+are kept, for debugging under load without logging every stream.
+"""
+import os
+import sys
+import json
+import uuid
+import queue
+import atexit
+import random
+import logging
+import contextvars
+import logging.handlers
+
+REQUEST_ID_HEADER = 'X-Request-Id'
+
+_logger = logging.getLogger('adapter')
+_logger.propagate = False
+
+_request_id = contextvars.ContextVar('adapter_request_id', default='-')
+_sampled = contextvars.ContextVar('adapter_log_sampled', default=True)
+
+_listener = None
+_debug = False
+_sample_rate = 1.0
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records as they are; the stock handler formats them on the calling thread"""
+
+    def prepare(self, record):
+        return record
+
+class ConsoleFormatter(logging.Formatter):
+    def format(self, record):
+        line = f"{record.levelname}: [{record.request_id}] {record.msg}"
+        if record.fields:
+            line += " " + " ".join(f"{k}={_text(v)}" for k, v in record.fields.items())
+        return line
+
+class JSONLFormatter(logging.Formatter):
+    def format(self, record):
+        event = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "request_id": record.request_id,
+            "msg": record.msg,
+        }
+        event.update(record.fields)
+        return json.dumps(event, default=str, separators=(',', ':'))
+
+def _text(value):
+    if isinstance(value, str):
+        return value.rstrip()
+    return json.dumps(value, default=str)
+
+def configure(level=None, log_file=None, sample_rate=None):
+    """(Re)starts the listener from the LOG_* environment variables; arguments override them"""
+    global _listener, _debug, _sample_rate
+    shutdown()
+
+    level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+    log_file = log_file if log_file is not None else os.getenv('LOG_FILE', '')
+    _sample_rate = sample_rate if sample_rate is not None else float(os.getenv('LOG_SAMPLE_RATE', '1.0'))
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(ConsoleFormatter())
+    handlers = [console]
+    if log_file:
+        directory = os.path.dirname(os.path.abspath(log_file))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        sink = logging.handlers.RotatingFileHandler(
+            log_file,
+            maxBytes=int(float(os.getenv('LOG_FILE_MB', '50')) * 1024 * 1024),
+            backupCount=int(os.getenv('LOG_FILE_BACKUPS', '5')),
+        )
+        sink.setFormatter(JSONLFormatter())
+        handlers.append(sink)
+
+    records = queue.SimpleQueue()
+    _logger.handlers = [_QueueHandler(records)]
+    _logger.setLevel(level)
+    _debug = _logger.isEnabledFor(logging.DEBUG)
+    _listener = logging.handlers.QueueListener(records, *handlers)
+    _listener.start()
+
+def shutdown():
+    """Stops the listener after it has written every queued event"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+atexit.register(shutdown)
+
+def begin_request(request_id=None):
+    """Binds a request id (the client's X-Request-Id, or a new one) and the sampling decision to the current context"""
+    request_id = request_id or uuid.uuid4().hex[:16]
+    _request_id.set(request_id)
+    _sampled.set(_sample_rate >= 1.0 or random.random() < _sample_rate)
+    return request_id
+
+def request_id():
+    return _request_id.get()
+
+def debug_enabled():
+    """True when DEBUG events of the current request are kept; guard payload dumps with it"""
+    return _debug and _sampled.get()
+
+def _emit(level, msg, fields):
+    # makeRecord skips the caller lookup logger.log() would do
+    record = _logger.makeRecord(_logger.name, level, '', 0, msg, None, None)
+    record.request_id = _request_id.get()
+    record.fields = fields
+    _logger.handle(record)
+
+def debug(msg, **fields):
+    if _debug and _sampled.get():
+        _emit(logging.DEBUG, msg, fields)
+
+def info(msg, **fields):
+    if _logger.isEnabledFor(logging.INFO):
+        _emit(logging.INFO, msg, fields)
+
+def warning(msg, **fields):
+    if _logger.isEnabledFor(logging.WARNING):
+        _emit(logging.WARNING, msg, fields)
+
+def error(msg, **fields):
+    if _logger.isEnabledFor(logging.ERROR):
+        _emit(logging.ERROR, msg, fields)
+
+configure()
@@ -0,0 +1,540 @@
+"""
+Per-provider admission control: a rate-limit-aware queue in front of upstream calls.
+
+Limits come from the `limits` of a provider in the routing table (routing.py):
+  concurrency  upstream calls in flight at once
+  rpm          requests per minute (token bucket)
+  tpm          tokens per minute (token bucket); a request is charged its prompt
+               tokens plus max_tokens up front, and the difference to the usage
+               the provider reports once it is done
+A provider without limits is only paused after a 429.
+
+Requests that can't start right away wait in a per-provider queue that is fair
+across clients: each client (the X-Adapter-Client header, else the remote
+address) has its own FIFO and the clients take turns. A request waits at most
+ADMISSION_DEADLINE_S (default 120) before it fails with a 429. With
+ADMISSION_KEEPALIVE_S set, queued streaming requests get an SSE comment line
+that often so the connection stays alive. It is off by default: the comment
+comes before the first `data:` frame, which the Gemini SDKs' SSE parser rejects.
+
+A 429 from the provider pauses the provider for its `retry-after` (or, without
+one, an exponential backoff with full jitter, at most ADMISSION_MAX_BACKOFF_S)
+and the request is queued again, up to ADMISSION_RETRIES (default 3) times.
+`x-ratelimit-remaining-*: 0` headers on successful responses pause the provider
+until the matching `x-ratelimit-reset-*`. Streams are only retried before their
+first chunk.
+"""
+import os
+import re
+import time
+import random
+import asyncio
+import threading
+import collections
+from email.utils import parsedate_to_datetime
+
+import adapter_log
+import metrics
+import token_counting
+import tracing
+
+CLIENT_HEADER = 'X-Adapter-Client'
+KEEPALIVE_FRAME = ": queued\n\n"
+
+DEADLINE = float(os.getenv('ADMISSION_DEADLINE_S', '120'))
+KEEPALIVE = float(os.getenv('ADMISSION_KEEPALIVE_S', '0'))
+RETRIES = int(os.getenv('ADMISSION_RETRIES', '3'))
+MAX_BACKOFF = float(os.getenv('ADMISSION_MAX_BACKOFF_S', '30'))
+BASE_BACKOFF = 1.0
+
+QUEUE_WAIT = metrics.Histogram('adapter_queue_wait_seconds', 'Time spent in the admission queue', ('provider',))
+RETRIES_TOTAL = metrics.Counter('adapter_upstream_retries_total', 'Upstream calls retried after a 429', ('provider',))
+TIMEOUTS = metrics.Counter('adapter_queue_timeouts_total', 'Requests that reached their deadline in the queue', ('provider',))
+
+class QueueTimeout(Exception):
+    """Raised when a request is still queued at its deadline"""
+    status_code = 429
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost, now):
+        """Seconds until cost tokens are available (0 if they are)"""
+        self._refill(now)
+        cost = min(cost, self.capacity)
+        return 0.0 if self.tokens >= cost else (cost - self.tokens) / self.rate
+
+    def take(self, cost):
+        self.tokens -= min(cost, self.capacity)
+
+    def adjust(self, amount):
+        # May go negative: tokens used beyond the estimate are a debt paid by later requests
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+class Ticket:
+    """One request's place in a provider queue, and its admission once granted"""
+
+    def __init__(self, provider, client, cost, deadline):
+        self.provider = provider
+        self.client = client
+        self.cost = cost
+        self.deadline = deadline
+        self.enqueued = time.monotonic()
+        self.perf_enqueued = time.perf_counter()
+        self.admitted = False
+        self.released = False
+        self.event = None
+        self.future = None
+        self.loop = None
+
+    def _wake(self):
+        if self.event is not None:
+            self.event.set()
+        elif self.future is not None:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+    def _timeout(self):
+        waited = time.monotonic() - self.enqueued
+        TIMEOUTS.inc((self.provider.name,))
+        adapter_log.warning("Request timed out in the admission queue", provider=self.provider.name, waited=round(waited, 3))
+        return QueueTimeout(f"Request waited {waited:.1f}s for the {self.provider.name} rate limits")
+
+    def _poll_interval(self, now, keepalive):
+        wait = self.deadline - now
+        if keepalive:
+            wait = min(wait, keepalive)
+        ready = self.provider.next_ready
+        if ready:
+            wait = min(wait, max(0.005, ready - now))
+        return max(wait, 0.0)
+
+    def wait(self, keepalive=None):
+        """Blocks until admitted (True) or for at most keepalive seconds (False); raises QueueTimeout at the deadline"""
+        until = time.monotonic() + keepalive if keepalive else None
+        while not self.admitted:
+            now = time.monotonic()
+            if now >= self.deadline:
+                if self.provider.cancel(self):
+                    raise self._timeout()
+                continue
+            if until is not None and now >= until:
+                return False
+            self.event.wait(self._poll_interval(now, until and until - now))
+            self.event.clear()
+            self.provider.dispatch()
+        return True
+
+    async def await_admission(self, keepalive=None):
+        """wait() for the ASGI mode"""
+        until = time.monotonic() + keepalive if keepalive else None
+        while not self.admitted:
+            now = time.monotonic()
+            if now >= self.deadline:
+                if self.provider.cancel(self):
+                    raise self._timeout()
+                continue
+            if until is not None and now >= until:
+                return False
+            try:
+                await asyncio.wait_for(asyncio.shield(self.future), self._poll_interval(now, until and until - now))
+            except asyncio.TimeoutError:
+                pass
+            if self.future.done():
+                self.future = self.loop.create_future()
+            self.provider.dispatch()
+        return True
+
+    def observe(self, headers):
+        """Pauses the provider when rate-limit headers say its quota is used up"""
+        self.provider.observe_headers(headers)
+
+    def settle(self, total_tokens):
+        """Charges the difference between the estimated and the reported tokens"""
+        if total_tokens is not None:
+            self.provider.settle(total_tokens - self.cost)
+
+    def release(self):
+        """Frees the slot, or leaves the queue if the request gave up before its turn"""
+        if self.released:
+            return
+        self.released = True
+        # cancel() is False when the ticket was admitted concurrently
+        if self.admitted or not self.provider.cancel(self):
+            self.provider.release()
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+class Provider:
+    """Queue and limits of one provider"""
+
+    def __init__(self, name, limits):
+        self.name = name
+        self._lock = threading.Lock()
+        self._queues = collections.OrderedDict()  # client -> deque of tickets, in turn order
+        self.active = 0
+        self.paused_until = 0.0
+        self.next_ready = 0.0
+        self.limits = None
+        self.configure(limits)
+
+    def configure(self, limits):
+        limits = dict(limits or {})
+        if limits == self.limits:
+            return
+        with self._lock:
+            self.limits = limits
+            self.concurrency = limits.get('concurrency') or None
+            self.rpm = TokenBucket(limits['rpm']) if limits.get('rpm') else None
+            self.tpm = TokenBucket(limits['tpm']) if limits.get('tpm') else None
+        self.dispatch()
+
+    def uses_tokens(self):
+        return self.tpm is not None
+
+    def _admission_wait(self, ticket, now):
+        """Seconds until ticket may start, 0 if now, None if it waits for a release"""
+        if self.concurrency is not None and self.active >= self.concurrency:
+            return None
+        wait = max(0.0, self.paused_until - now)
+        if self.rpm is not None:
+            wait = max(wait, self.rpm.wait_time(1, now))
+        if self.tpm is not None:
+            wait = max(wait, self.tpm.wait_time(ticket.cost, now))
+        return wait
+
+    def _admit(self, ticket):
+        self.active += 1
+        if self.rpm is not None:
+            self.rpm.take(1)
+        if self.tpm is not None:
+            self.tpm.take(ticket.cost)
+        ticket.admitted = True
+        QUEUE_WAIT.observe((self.name,), time.monotonic() - ticket.enqueued)
+
+    def enter(self, ticket):
+        """Admits ticket right away if nobody is waiting and the limits allow it, else queues it"""
+        with self._lock:
+            if not self._queues and self._admission_wait(ticket, time.monotonic()) == 0:
+                self._admit(ticket)
+                return
+            self._queues.setdefault(ticket.client, collections.deque()).append(ticket)
+        self.dispatch()
+
+    def dispatch(self):
+        """Admits queued tickets, one client at a time, while the limits allow"""
+        admitted = []
+        with self._lock:
+            self.next_ready = 0.0
+            while self._queues:
+                client, queue = next(iter(self._queues.items()))
+                ticket = queue[0]
+                now = time.monotonic()
+                wait = self._admission_wait(ticket, now)
+                if wait is None:
+                    break
+                if wait > 0:
+                    self.next_ready = now + wait
+                    break
+                queue.popleft()
+                # The client goes to the back of the line, or leaves it when it has nothing queued
+                del self._queues[client]
+                if queue:
+                    self._queues[client] = queue
+                self._admit(ticket)
+                admitted.append(ticket)
+        for ticket in admitted:
+            ticket._wake()
+
+    def cancel(self, ticket):
+        """Removes a ticket that gave up waiting; False if it was admitted in the meantime"""
+        with self._lock:
+            if ticket.admitted:
+                return False
+            queue = self._queues.get(ticket.client)
+            if queue is not None and ticket in queue:
+                queue.remove(ticket)
+                if not queue:
+                    del self._queues[ticket.client]
+        return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+        self.dispatch()
+
+    def settle(self, extra_tokens):
+        if self.tpm is not None and extra_tokens:
+            with self._lock:
+                self.tpm.adjust(extra_tokens)
+
+    def pause(self, seconds):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        adapter_log.info("Provider paused by rate limit", provider=self.name, seconds=round(seconds, 3))
+
+    def observe_headers(self, headers):
+        if not headers:
+            return
+        headers = _normalize_headers(headers)
+        for kind in ('requests', 'tokens'):
+            remaining = headers.get(f'x-ratelimit-remaining-{kind}')
+            reset = _parse_duration(headers.get(f'x-ratelimit-reset-{kind}'))
+            if remaining is not None and reset and remaining.strip() == '0':
+                self.pause(reset)
+
+    def queued(self):
+        with self._lock:
+            return sum(len(q) for q in self._queues.values())
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "limits": self.limits,
+                "active": self.active,
+                "queued": sum(len(q) for q in self._queues.values()),
+                "clients_waiting": len(self._queues),
+                "paused_for": round(max(0.0, self.paused_until - now), 3),
+            }
+
+_DURATION_RE = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+def _parse_duration(value):
+    """Seconds from '1.5', '6s', '1m30.5s' or '120ms' (the x-ratelimit-reset-* formats)"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    return sum(float(n) * _DURATION_UNITS[unit] for n, unit in parts) if parts else None
+
+def _normalize_headers(headers):
+    # LiteLLM passes provider headers on with an llm_provider- prefix
+    normalized = {}
+    for key, value in dict(headers).items():
+        key = key.lower()
+        if key.startswith('llm_provider-'):
+            key = key[len('llm_provider-'):]
+        normalized[key] = str(value)
+    return normalized
+
+def retry_after(headers):
+    """Seconds the provider asked us to wait, from retry-after-ms or retry-after"""
+    headers = _normalize_headers(headers or {})
+    if headers.get('retry-after-ms'):
+        try:
+            return float(headers['retry-after-ms']) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def error_headers(e):
+    headers = getattr(e, 'litellm_response_headers', None)
+    if headers is None:
+        response = getattr(e, 'response', None)
+        headers = getattr(response, 'headers', None)
+    return headers
+
+def response_headers(response):
+    """Provider headers of a LiteLLM response or stream, if it kept them"""
+    hidden = getattr(response, '_hidden_params', None) or {}
+    return hidden.get('additional_headers')
+
+def backoff(provider, e, attempt):
+    """Pauses the provider after a 429; returns the delay, or None if e isn't a rate limit"""
+    if getattr(e, 'status_code', None) != 429 or isinstance(e, QueueTimeout):
+        return None
+    delay = retry_after(error_headers(e))
+    if delay is None:
+        # Full jitter: spreads the retries of everyone who hit the limit at once
+        delay = random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt))
+    else:
+        delay = min(MAX_BACKOFF, delay) * random.uniform(1.0, 1.2)
+    provider.pause(delay)
+    RETRIES_TOTAL.inc((provider.name,))
+    return delay
+
+_providers_lock = threading.Lock()
+_providers = {}
+
+def get_provider(route):
+    """The Provider of a routing table route (created on first use, reconfigured when its limits change)"""
+    name = route.provider or route.target_model.split('/', 1)[0]
+    provider = _providers.get(name)
+    if provider is None:
+        with _providers_lock:
+            provider = _providers.get(name)
+            if provider is None:
+                provider = _providers[name] = Provider(name, route.limits)
+    elif route.limits != provider.limits:
+        provider.configure(route.limits)
+    return provider
+
+def estimate_tokens(openai_req):
+    """Prompt and tool definition tokens (memoized counts) plus the requested output tokens"""
+    prompt = token_counting.count_request_tokens(openai_req['model'], openai_req['messages'], openai_req.get('tools') or ())
+    return prompt + (openai_req.get('max_tokens') or 0)
+
+def ticket(route, openai_req, client, deadline):
+    """Enters a request into its provider's queue"""
+    provider = get_provider(route)
+    cost = estimate_tokens(openai_req) if provider.uses_tokens() else 0
+    t = Ticket(provider, client or '-', cost, deadline)
+    t.event = threading.Event()
+    provider.enter(t)
+    return t
+
+def aticket(route, openai_req, client, deadline):
+    provider = get_provider(route)
+    cost = estimate_tokens(openai_req) if provider.uses_tokens() else 0
+    t = Ticket(provider, client or '-', cost, deadline)
+    t.loop = asyncio.get_running_loop()
+    t.future = t.loop.create_future()
+    provider.enter(t)
+    return t
+
+def _note_wait(t):
+    """Queue span for requests that had to wait"""
+    trace = tracing.current()
+    if trace is not None and not trace.finished:
+        trace.add_span("queue", t.perf_enqueued, provider=t.provider.name)
+
+def _retry_or_raise(t, e, attempt, retries=None):
+    delay = backoff(t.provider, e, attempt)
+    if delay is None or attempt >= (RETRIES if retries is None else retries) or time.monotonic() + delay >= t.deadline:
+        raise e
+    adapter_log.info("Retrying after rate limit", provider=t.provider.name, attempt=attempt + 1, delay=round(delay, 3))
+
+def call(route, openai_req, client, fn):
+    """Runs fn(ticket) once admitted, retrying it after 429s"""
+    deadline = time.monotonic() + DEADLINE
+    attempt = 0
+    while True:
+        t = ticket(route, openai_req, client, deadline)
+        if not t.admitted:
+            t.wait()
+            _note_wait(t)
+        try:
+            return fn(t)
+        except Exception as e:
+            _retry_or_raise(t, e, attempt)
+            attempt += 1
+        finally:
+            t.release()
+
+async def acall(route, openai_req, client, fn):
+    deadline = time.monotonic() + DEADLINE
+    attempt = 0
+    while True:
+        t = aticket(route, openai_req, client, deadline)
+        if not t.admitted:
+            await t.await_admission()
+            _note_wait(t)
+        try:
+            return await fn(t)
+        except Exception as e:
+            _retry_or_raise(t, e, attempt)
+            attempt += 1
+        finally:
+            t.release()
+
+def stream(route, openai_req, client, make_frames, retries=None):
+    """
+    Yields the frames of make_frames(ticket) once admitted, and keepalive
+    comments while queued. A 429 before the first frame is retried (up to
+    retries times, default ADMISSION_RETRIES).
+    """
+    deadline = time.monotonic() + DEADLINE
+    attempt = 0
+    while True:
+        t = ticket(route, openai_req, client, deadline)
+        try:
+            if not t.admitted:
+                while not t.wait(KEEPALIVE):
+                    yield KEEPALIVE_FRAME
+                _note_wait(t)
+            frames = make_frames(t)
+            try:
+                first = next(frames)
+            except StopIteration:
+                return
+            except Exception as e:
+                _retry_or_raise(t, e, attempt, retries)
+                attempt += 1
+                continue
+            try:
+                yield first
+                for frame in frames:
+                    yield frame
+            finally:
+                if hasattr(frames, 'close'):
+                    frames.close()
+            return
+        finally:
+            t.release()
+
+async def astream(route, openai_req, client, make_frames, retries=None):
+    deadline = time.monotonic() + DEADLINE
+    attempt = 0
+    while True:
+        t = aticket(route, openai_req, client, deadline)
+        try:
+            if not t.admitted:
+                while not await t.await_admission(KEEPALIVE):
+                    yield KEEPALIVE_FRAME
+                _note_wait(t)
+            frames = make_frames(t)
+            try:
+                first = await frames.__anext__()
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                _retry_or_raise(t, e, attempt, retries)
+                attempt += 1
+                continue
+            try:
+                yield first
+                async for frame in frames:
+                    yield frame
+            finally:
+                await frames.aclose()
+            return
+        finally:
+            t.release()
+
+def reset():
+    """Forgets every provider's queue, pause and buckets (tests)"""
+    with _providers_lock:
+        _providers.clear()
+
+def stats():
+    return {name: provider.stats() for name, provider in list(_providers.items())}
+
+metrics.Gauge('adapter_queue_depth', 'Requests waiting in the admission queue', ('provider',),
+              lambda: {(name, ): p.queued() for name, p in list(_providers.items())})
+metrics.Gauge('adapter_upstream_active', 'Upstream calls in flight', ('provider',),
+              lambda: {(name, ): p.active for name, p in list(_providers.items())})
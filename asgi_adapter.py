@@ -0,0 +1,500 @@
+"""
+Asynchronous ASGI serving mode for the Gemini-LiteLLM adapter.
+
+Serves the same /v1beta and /v1 routes as adapter.py, but every request runs on
+a single asyncio event loop and upstream calls go through litellm.acompletion,
+so long-running streams don't each hold a worker thread.
+
+Run with:
+    python asgi_adapter.py
+    uvicorn asgi_adapter:app --host 0.0.0.0 --port 5001
+"""
+import os
+import re
+import asyncio
+import functools
+import time
+from urllib.parse import parse_qs
+from dotenv import load_dotenv
+
+# Before the modules below read their settings (adapter.py does the same)
+load_dotenv()
+
+import adapter_log
+import admission
+import batch_jobs
+import capture_store
+import codec
+import embeddings
+import hedging
+import media
+import metrics
+import response_cache
+import routing
+import single_flight
+import sse_coalesce
+import startup
+import tracing
+from startup import litellm
+from adapter import (
+    build_openai_request,
+    is_streaming_request,
+    new_stream_state,
+    translate_stream_chunk,
+    flush_stream_text,
+    note_upstream_chunk,
+    finish_upstream_stream,
+    close_upstream_stream,
+    cancel_upstream_stream,
+    stream_error_frames,
+    openai_to_google_response,
+    error_response_body,
+    adapter_stats,
+    list_models_response,
+    count_tokens_response,
+    batch_job_response,
+)
+
+GENERATE_ROUTE = re.compile(r'^/(?:v1beta|v1)/models/(?P<model>.+):(?:generateContent|streamGenerateContent)$')
+COUNT_TOKENS_ROUTE = re.compile(r'^/(?:v1beta|v1)/models/(?P<model>.+):countTokens$')
+EMBED_ROUTE = re.compile(r'^/(?:v1beta|v1)/models/(?P<model>.+):(?P<method>embedContent|batchEmbedContents)$')
+BATCH_CREATE_ROUTE = re.compile(r'^/(?:v1beta|v1)/models/(?P<model>.+):batchGenerateContent$')
+BATCH_ROUTE = re.compile(r'^/(?:v1beta|v1)/batches/(?P<name>[^/]+)$')
+LIST_BATCHES_ROUTES = ('/v1beta/batches', '/v1/batches')
+LIST_MODELS_ROUTES = ('/v1beta/models', '/v1/models')
+
+async def read_body(receive):
+    """Reads the full request body from the ASGI receive channel"""
+    chunks = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        more_body = message.get('more_body', False)
+    return b''.join(chunks)
+
+class Headers(dict):
+    """Request headers of an ASGI scope with case-insensitive .get(), like Flask's request.headers"""
+
+    def __init__(self, scope):
+        super().__init__((k.decode('latin-1').lower(), v.decode('latin-1')) for k, v in scope.get('headers', []))
+
+    def get(self, name, default=None):
+        return super().get(name.lower(), default)
+
+async def send_json(send, payload, status=200):
+    """Sends a complete application/json response"""
+    await send_body(send, codec.dumps_bytes(payload) + b"\n", 'application/json', status)
+
+def trace_headers(server_timing):
+    """X-Trace-Id (and Server-Timing) of the current request's trace"""
+    trace = tracing.current()
+    if trace is None:
+        return []
+    headers = [(b'x-trace-id', trace.trace_id.encode('latin-1'))]
+    if server_timing:
+        headers.append((b'server-timing', trace.server_timing().encode('latin-1')))
+    return headers
+
+async def send_body(send, body, content_type, status=200):
+    """Sends a complete response"""
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', content_type.encode('latin-1')),
+            (b'content-length', str(len(body)).encode('ascii')),
+            (b'x-request-id', adapter_log.request_id().encode('latin-1')),
+        ] + trace_headers(server_timing=True),
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+async def aclose_upstream_stream(response):
+    """Closes the provider stream under a LiteLLM async stream, releasing its connection"""
+    try:
+        if hasattr(response, 'aclose'):
+            await response.aclose()
+        else:
+            close_upstream_stream(response)
+    except Exception as e:
+        adapter_log.debug("Closing upstream stream failed", error=f"{type(e).__name__}: {e}")
+
+async def astream_frames(openai_req, route=None, ticket=None):
+    """Yields the Gemini SSE frames of an upstream streaming completion; upstream errors propagate"""
+    adapter_log.debug("Starting incremental stream generation")
+    model = openai_req['model']
+    upstream_start = time.perf_counter()
+    with tracing.span("upstream_setup"):
+        response = await litellm.acompletion(
+            **await asyncio.to_thread(media.materialize, openai_req),
+            **routing.upstream_kwargs(route, is_async=True),
+            stream=True
+        )
+    setup_end = time.perf_counter()
+    if ticket is not None:
+        ticket.observe(admission.response_headers(response))
+
+    state = new_stream_state()
+    chunks = sse_coalesce.atimed(response, state["coalescer"])
+    try:
+        async for chunk in chunks:
+            if chunk is None:
+                # The coalescing window ended before the next chunk
+                for data_str in flush_stream_text(state):
+                    yield data_str
+                continue
+            note_upstream_chunk(model, state, upstream_start)
+            for data_str in translate_stream_chunk(chunk, state):
+                yield data_str
+    except (GeneratorExit, asyncio.CancelledError):
+        # Nobody reads the rest: stop the provider generating it
+        if chunks is not response:
+            await chunks.aclose()
+        await aclose_upstream_stream(response)
+        cancel_upstream_stream(model, state)
+        raise
+    except Exception:
+        for data_str in flush_stream_text(state):
+            yield data_str
+        raise
+    for data_str in flush_stream_text(state):
+        yield data_str
+    finish_upstream_stream(model, state, setup_end)
+    if ticket is not None:
+        ticket.settle((state["usage"] or {}).get('totalTokenCount'))
+
+async def afallback_frames(google_req, fallback_model, client_id):
+    """Frames of the same request routed to a hedging fallback model"""
+    route = routing.resolve(fallback_model)
+    _, openai_req = await asyncio.to_thread(build_openai_request, google_req, fallback_model)
+    frames = admission.astream(route, openai_req, client_id, lambda ticket: astream_frames(openai_req, route, ticket))
+    try:
+        async for frame in frames:
+            yield frame
+    finally:
+        await frames.aclose()
+
+def parse_request(holder):
+    """The parsed request of the body in holder, a list the caller passes so nothing else keeps the bytes"""
+    with tracing.span("parse"):
+        body = holder.pop()
+        google_req = codec.loads(body) if body else {}
+        del body  # the raw bytes of a large request aren't needed past parsing
+        media.spool_request(google_req)
+    if adapter_log.debug_enabled():
+        adapter_log.debug("Request body", body=google_req)
+    return google_req
+
+async def alookup_cached_response(openai_req, headers, is_streaming):
+    """adapter.lookup_cached_response, hashing the request and reading the disk tier off the event loop"""
+    cache = response_cache.get_cache()
+    if cache is None or not response_cache.is_cacheable(openai_req, headers):
+        return cache, None, None
+    key = await asyncio.to_thread(response_cache.cache_key, 'stream' if is_streaming else 'json', openai_req)
+    cached = await cache.aget(key)
+    if cached is not None:
+        adapter_log.info("Response cache hit", key=key[:12])
+    return cache, key, cached
+
+async def replay_frames(frames):
+    """Async iterator over recorded frames"""
+    for frame in frames:
+        yield frame
+
+async def wait_for_disconnect(receive):
+    """Returns once the client has gone away (the request body was already read)"""
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+async def stream_generate(send, receive, frames, target_model, started):
+    """Streams SSE frames to the client, turning upstream errors into error frames"""
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'x-request-id', adapter_log.request_id().encode('latin-1')),
+        ] + trace_headers(server_timing=False),
+    })
+
+    async def pump():
+        try:
+            async for data_str in frames:
+                await send({'type': 'http.response.body', 'body': data_str.encode('utf-8'), 'more_body': True})
+        finally:
+            await frames.aclose()
+
+    # A client that disconnects while we wait on the provider is noticed right away, not at the next write
+    streaming = asyncio.ensure_future(pump())
+    disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await asyncio.wait([streaming, disconnect], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        disconnect.cancel()
+    if not streaming.done():
+        adapter_log.info("Client disconnected, cancelling stream", model=target_model)
+        streaming.cancel()
+        await asyncio.gather(streaming, return_exceptions=True)
+        return
+
+    try:
+        streaming.result()
+        metrics.STREAM_DURATION.observe((target_model,), time.perf_counter() - started)
+        trace = tracing.current()
+        if trace is not None and tracing.stream_trailer_enabled():
+            await send({'type': 'http.response.body', 'body': tracing.stream_trailer(trace).encode('utf-8'), 'more_body': True})
+
+    except Exception as e:
+        metrics.record_error(target_model, e)
+        # Try to yield a message to the CLI so it doesn't just hang
+        for data_str in stream_error_frames(e):
+            await send({'type': 'http.response.body', 'body': data_str.encode('utf-8'), 'more_body': True})
+
+    await send({'type': 'http.response.body', 'body': b''})
+
+async def generate_content(scope, receive, send, model):
+    """Handle generateContent / streamGenerateContent request"""
+    started = time.perf_counter()
+    capture = None
+    target_model = model
+    trace = tracing.start("generateContent", Headers(scope).get('traceparent'), model=model)
+    try:
+        adapter_log.info("Received request", model=model)
+        # Parsing, spooling and translating a large request would hold up every other stream on the loop
+        google_req = await asyncio.to_thread(parse_request, [await read_body(receive)])
+        target_model, openai_req = await asyncio.to_thread(build_openai_request, google_req, model)
+        metrics.TRANSLATION.observe((target_model,), time.perf_counter() - started)
+        # Sampled requests are captured with their responses (capture_store)
+        capture = capture_store.start(target_model, scope['path'], google_req, openai_req, started)
+
+        args = {k: v[0] for k, v in parse_qs(scope.get('query_string', b'').decode('latin-1')).items()}
+        is_streaming = is_streaming_request(scope['path'], args)
+        metrics.REQUESTS.inc((target_model, 'true' if is_streaming else 'false'))
+
+        # Deterministic requests may be answered from the response cache
+        cache, cache_key, cached = await alookup_cached_response(openai_req, Headers(scope), is_streaming)
+        # Identical concurrent requests share one upstream call
+        flights = single_flight.get_async_flights()
+        if flights is not None:
+            flight_key = cache_key or response_cache.cache_key('stream' if is_streaming else 'json', openai_req)
+
+        # Upstream calls wait for their provider's admission queue
+        route = routing.resolve(model)
+        client_id = Headers(scope).get(admission.CLIENT_HEADER) or (scope.get('client') or ('-',))[0]
+
+        if is_streaming:
+            def upstream_attempt(ticket):
+                frames = astream_frames(openai_req, route, ticket)
+                if cache_key is not None:
+                    frames = cache.arecord_stream(cache_key, frames)
+                return frames
+
+            # Hedging races fallback models against a slow or failing primary
+            hedged = hedging.enabled() and route.fallbacks
+
+            def upstream_frames():
+                if not hedged:
+                    return admission.astream(route, openai_req, client_id, upstream_attempt)
+                # 429s go to the fallbacks instead of being retried
+                primary = lambda: admission.astream(route, openai_req, client_id, upstream_attempt, retries=0)
+                return hedging.astream([(target_model, primary)] + [
+                    (fallback, functools.partial(afallback_frames, google_req, fallback, client_id))
+                    for fallback in route.fallbacks
+                ])
+
+            if cached is not None:
+                frames, source = replay_frames(cached), "cache"
+            elif flights is not None:
+                frames, source = flights.stream(flight_key, upstream_frames), "single_flight"
+            else:
+                frames, source = upstream_frames(), "upstream"
+            if capture is not None:
+                frames = capture.arecord_stream(frames, source)
+            await stream_generate(send, receive, frames, target_model, started)
+            return
+
+        if cached is not None:
+            if capture is not None:
+                capture.set_response(cached, "cache")
+                capture.finish()
+            await send_json(send, cached)
+            return
+
+        # Non-streaming
+        async def upstream_attempt(ticket):
+            with tracing.span("upstream"):
+                upstream_req = await asyncio.to_thread(media.materialize, openai_req)
+                response = await litellm.acompletion(**upstream_req, **routing.upstream_kwargs(route, is_async=True))
+            ticket.observe(admission.response_headers(response))
+            ticket.settle(getattr(response.usage, 'total_tokens', None))
+            return response
+
+        async def upstream_response():
+            response = await admission.acall(route, openai_req, client_id, upstream_attempt)
+
+            # Keep the raw OpenAI response for analysis
+            if capture is not None:
+                capture.set_openai_response(response.model_dump())
+
+            google_resp = openai_to_google_response(response)
+            metrics.record_usage(target_model, google_resp["usageMetadata"])
+            if cache_key is not None:
+                await cache.aput(cache_key, google_resp)
+            return google_resp
+
+        if flights is not None:
+            google_resp = await flights.call(flight_key, upstream_response)
+        else:
+            google_resp = await upstream_response()
+
+        metrics.REQUEST_DURATION.observe((target_model,), time.perf_counter() - started)
+        if capture is not None:
+            capture.set_response(google_resp)
+            capture.finish()
+        await send_json(send, google_resp)
+
+    except Exception as e:
+        adapter_log.error("Adapter error", error=f"{type(e).__name__}: {e}")
+        metrics.record_error(target_model, e)
+        if capture is not None:
+            capture.set_error(e)
+            capture.finish()
+        error_response, status_code = error_response_body(e)
+        await send_json(send, error_response, status_code)
+    finally:
+        tracing.finish(trace, model=target_model)
+
+async def count_tokens(receive, send, model):
+    """Handle countTokens request"""
+    try:
+        body = await read_body(receive)
+        await send_json(send, await asyncio.to_thread(lambda: count_tokens_response(codec.loads(body) if body else {}, model)))
+    except Exception as e:
+        adapter_log.error("Error counting tokens", error=f"{type(e).__name__}: {e}")
+        error_response, status_code = error_response_body(e)
+        await send_json(send, error_response, status_code)
+
+async def embed_content(receive, send, model, batch):
+    """Handle embedContent and batchEmbedContents requests"""
+    try:
+        body = await read_body(receive)
+        requests = embeddings.embed_requests(codec.loads(body) if body else {}, batch)
+        vectors = await embeddings.aembed(requests, model)
+        await send_json(send, embeddings.embed_response(vectors, batch))
+    except Exception as e:
+        adapter_log.error("Error embedding content", error=f"{type(e).__name__}: {e}")
+        error_response, status_code = error_response_body(e)
+        await send_json(send, error_response, status_code)
+
+async def batch_content(scope, receive, send, model=None, name=None):
+    """Handle batchGenerateContent and the batches/{id} polling, results and cancel requests"""
+    try:
+        if model is not None:
+            body = await read_body(receive)
+            content_type = Headers(scope).get('content-type') or ''
+            await send_json(send, await asyncio.to_thread(batch_jobs.create, model, body, content_type))
+        elif scope['method'] == 'POST':
+            job_id, _, method = name.partition(':')
+            if method != 'cancel':
+                raise batch_jobs.JobNotFound(name)
+            await send_json(send, batch_jobs.cancel(job_id))
+        else:
+            args = {k: v[0] for k, v in parse_qs(scope.get('query_string', b'').decode('latin-1')).items()}
+            payload, status = await asyncio.to_thread(batch_job_response, name, args)
+            if isinstance(payload, bytes):
+                await send_body(send, payload, 'application/jsonl', status)
+            else:
+                await send_json(send, payload, status)
+    except Exception as e:
+        if model is not None:
+            adapter_log.error("Error creating batch", error=f"{type(e).__name__}: {e}")
+        error_response, status_code = error_response_body(e)
+        await send_json(send, error_response, status_code)
+
+# Set by the supervisor: its workers start accepting on the shared socket once ready
+wait_ready_at_startup = False
+
+async def awarm_up():
+    try:
+        await routing.awarm_up()
+    finally:
+        startup.warm_done()
+
+async def await_ready(deadline):
+    while not startup.ready() and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+
+async def lifespan(receive, send):
+    """Minimal ASGI lifespan protocol support"""
+    warm_up = None
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # LiteLLM loads in a background thread; the providers are warmed on this loop
+            startup.begin(warming=routing.warmup_enabled())
+            batch_jobs.begin()
+            if routing.warmup_enabled():
+                # Warms the event loop's own clients without holding up the listening socket
+                warm_up = asyncio.get_running_loop().create_task(awarm_up())
+            if wait_ready_at_startup:
+                await await_ready(time.monotonic() + float(os.getenv('ADAPTER_STARTUP_S', '60')))
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if warm_up is not None:
+                warm_up.cancel()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    path = scope['path']
+    method = scope['method']
+    headers = Headers(scope)
+    adapter_log.begin_request(headers.get(adapter_log.REQUEST_ID_HEADER))
+    adapter_log.info("Incoming request", method=method, path=path)
+
+    match = GENERATE_ROUTE.match(path)
+    count_match = COUNT_TOKENS_ROUTE.match(path) if match is None else None
+    embed_match = EMBED_ROUTE.match(path) if match is None and count_match is None else None
+    batch_create = BATCH_CREATE_ROUTE.match(path) if match is None and count_match is None else None
+    batch_match = BATCH_ROUTE.match(path)
+    if match and method == 'POST':
+        await generate_content(scope, receive, send, match.group('model'))
+    elif count_match and method == 'POST':
+        await count_tokens(receive, send, count_match.group('model'))
+    elif embed_match and method == 'POST':
+        await embed_content(receive, send, embed_match.group('model'), embed_match.group('method') == 'batchEmbedContents')
+    elif batch_create and method == 'POST':
+        await batch_content(scope, receive, send, model=batch_create.group('model'))
+    elif batch_match and method in ('GET', 'POST'):
+        await batch_content(scope, receive, send, name=batch_match.group('name'))
+    elif path in LIST_BATCHES_ROUTES and method == 'GET':
+        await send_json(send, batch_jobs.list_jobs())
+    elif path == '/metrics' and method == 'GET':
+        await send_body(send, metrics.render().encode('utf-8'), metrics.CONTENT_TYPE)
+    elif path == '/adapter/stats' and method == 'GET':
+        await send_json(send, adapter_stats())
+    elif path == '/adapter/ready' and method == 'GET':
+        state = startup.readiness()
+        await send_json(send, state, 200 if state["ready"] else 503)
+    elif path in LIST_MODELS_ROUTES and method == 'GET':
+        await send_json(send, list_models_response())
+    else:
+        await send_json(send, {"error": {"code": 404, "message": f"No route for {method} {path}", "status": "NOT_FOUND"}}, 404)
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        print("❌ uvicorn is required for the ASGI serving mode: pip install uvicorn")
+        raise SystemExit(1)
+    print("🚀 Starting Embedded Gemini-LiteLLM Adapter (ASGI) on port 5001...")
+    uvicorn.run(app, host='0.0.0.0', port=5001, log_level='warning')
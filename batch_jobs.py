@@ -0,0 +1,380 @@
+"""
+batchGenerateContent jobs: many GenerateContentRequests run in the background.
+
+POST models/{model}:batchGenerateContent takes either
+  - a Gemini batch: {"batch": {"displayName": ..., "inputConfig": {"requests":
+    {"requests": [{"request": {...}, "metadata": {"key": "k1"}}, ...]}}}}
+  - a plain list: {"requests": [{...GenerateContentRequest...}, ...]}
+  - a JSONL file body (the Gemini batch file format), one
+    {"key": "k1", "request": {...}} per line
+and returns the job as an operation named batches/{id}. Items without a key
+are keyed by their position.
+
+Every item goes through the generateContent path (translation, routing,
+context fitting, admission control) as a non-streaming call, at most
+BATCH_CONCURRENCY (default 8) at a time per job. Admission queues batch items
+as their own client (batch/{id}), so interactive requests keep their turn and
+provider limits hold. Items that still hit a rate limit are retried up to
+BATCH_RETRIES (default 3) times; other failures become error results.
+
+Jobs live in BATCH_DIR (default debug_logs/batches), one directory each:
+  job.json        state and counts (rewritten at most every 0.5 s)
+  requests.jsonl  the items, as submitted
+  results.jsonl   {"key", "response"} or {"key", "error"} per finished item
+A job is run by the process holding its lock file, so with several workers
+each job runs once. Every BATCH_SCAN_S (default 10) seconds, unfinished jobs
+nobody holds are resumed, skipping items that already have a result: a job
+survives restarts and crashed workers (an item in flight at the crash is run
+again).
+
+GET batches/{id} polls the job, GET batches/{id}:results?offset=N returns the
+result lines after the first N as JSONL, POST batches/{id}:cancel stops it.
+"""
+import os
+import json
+import time
+import uuid
+import threading
+import concurrent.futures
+
+import adapter_log
+
+try:
+    import fcntl
+except ImportError:  # no cross-process locks; jobs still run once per process
+    fcntl = None
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "debug_logs", "batches")
+OPERATION_TYPE = "type.googleapis.com/google.ai.generativelanguage.v1beta.GenerateContentBatch"
+PROGRESS_INTERVAL_S = 0.5
+TERMINAL_STATES = ("BATCH_STATE_SUCCEEDED", "BATCH_STATE_FAILED", "BATCH_STATE_CANCELLED")
+
+class BatchError(ValueError):
+    """An invalid batch request"""
+    status_code = 400
+
+class JobNotFound(KeyError):
+    status_code = 404
+
+    def __str__(self):
+        return f"Batch {self.args[0]} not found"
+
+def store_dir():
+    return os.getenv('BATCH_DIR') or DEFAULT_DIR
+
+def _path(job_id, name):
+    return os.path.join(store_dir(), job_id, name)
+
+def _now():
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+
+def _read_job(job_id):
+    if not job_id or os.sep in job_id or job_id.startswith('.'):
+        raise JobNotFound(job_id)
+    try:
+        with open(_path(job_id, 'job.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        raise JobNotFound(job_id) from None
+
+def _write_job(job):
+    path = _path(job['id'], 'job.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(job, f)
+    os.replace(path + '.tmp', path)
+
+def _item(entry, index):
+    if not isinstance(entry, dict):
+        raise BatchError(f"Batch item {index} is not an object")
+    if 'request' in entry:
+        key = entry.get('key') or (entry.get('metadata') or {}).get('key')
+        request = entry['request']
+    else:
+        key, request = None, entry
+    if not isinstance(request, dict) or not request.get('contents'):
+        raise BatchError(f"Batch item {index} has no contents")
+    return {"key": str(key) if key is not None else str(index), "request": request}
+
+def _jsonl(text):
+    try:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    except ValueError as e:
+        raise BatchError(f"Invalid JSONL batch file: {e}") from None
+
+def parse_items(body, content_type=''):
+    """(display name, items) of a batchGenerateContent body"""
+    text = (body.decode('utf-8') if isinstance(body, bytes) else body).strip()
+    display_name = None
+    if 'jsonl' in content_type or 'ndjson' in content_type:
+        entries = _jsonl(text)
+    else:
+        try:
+            payload = json.loads(text or '{}')
+        except ValueError:
+            payload = None
+            entries = _jsonl(text)
+        if isinstance(payload, dict) and ('batch' in payload or 'requests' in payload):
+            batch = payload.get('batch') or payload
+            display_name = batch.get('displayName') or batch.get('display_name')
+            config = batch.get('inputConfig') or batch.get('input_config')
+            if config is not None:
+                if config.get('fileName') or config.get('file_name'):
+                    raise BatchError("File references aren't supported; send the JSONL file as the request body")
+                entries = (config.get('requests') or {}).get('requests') or []
+            else:
+                entries = batch.get('requests') or []
+        elif payload is not None:
+            # A JSONL file of a single line
+            entries = [payload] if payload else []
+    items = [_item(entry, i) for i, entry in enumerate(entries)]
+    if not items:
+        raise BatchError("The batch has no requests")
+    keys = set()
+    for item in items:
+        if item['key'] in keys:
+            raise BatchError(f"Duplicate batch key {item['key']!r}")
+        keys.add(item['key'])
+    return display_name, items
+
+def operation(job):
+    """The Gemini operation shape of a job"""
+    done = job['state'] in TERMINAL_STATES
+    stats = {
+        "requestCount": job['total'],
+        "successfulRequestCount": job['succeeded'],
+        "failedRequestCount": job['failed'],
+        "pendingRequestCount": job['total'] - job['succeeded'] - job['failed'],
+    }
+    metadata = {
+        "@type": OPERATION_TYPE,
+        "name": f"batches/{job['id']}",
+        "model": f"models/{job['model']}",
+        "displayName": job.get('displayName') or job['id'],
+        "state": job['state'],
+        "createTime": job['createTime'],
+        "updateTime": job['updateTime'],
+        "batchStats": stats,
+        "results": f"batches/{job['id']}:results",
+    }
+    return {"name": f"batches/{job['id']}", "metadata": metadata, "done": done}
+
+# Set by install(): generate(google_req, model, client_id) -> Gemini response, error_body(e) -> (body, status)
+_generate = None
+_error_body = None
+_running = {}  # job id -> runner thread of this process
+_running_lock = threading.Lock()
+_scanner = None
+
+def create(model, body, content_type=''):
+    """Stores a new job and starts running it; returns its operation"""
+    display_name, items = parse_items(body, content_type)
+    job_id = uuid.uuid4().hex[:16]
+    os.makedirs(os.path.join(store_dir(), job_id))
+    with open(_path(job_id, 'requests.jsonl'), 'w') as f:
+        for item in items:
+            f.write(json.dumps(item, separators=(',', ':')) + '\n')
+    now = _now()
+    job = {"id": job_id, "model": model, "displayName": display_name, "state": "BATCH_STATE_PENDING",
+           "createTime": now, "updateTime": now, "total": len(items), "succeeded": 0, "failed": 0}
+    # Written last: other workers only look at directories with a job.json
+    _write_job(job)
+    adapter_log.info("Batch job created", job=job_id, model=model, items=len(items))
+    _start(job_id)
+    return operation(job)
+
+def get(job_id):
+    return operation(_read_job(job_id))
+
+def list_jobs():
+    jobs = []
+    for job_id in sorted(os.listdir(store_dir())) if os.path.isdir(store_dir()) else ():
+        try:
+            jobs.append(_read_job(job_id))
+        except JobNotFound:
+            continue
+    jobs.sort(key=lambda job: job['createTime'], reverse=True)
+    return {"operations": [operation(job) for job in jobs]}
+
+def cancel(job_id):
+    job = _read_job(job_id)
+    if job['state'] not in TERMINAL_STATES:
+        # A marker file, so the process running the job sees it whichever worker got the request
+        open(_path(job_id, 'cancel'), 'w').close()
+        _start(job_id)
+    return operation(job)
+
+def results(job_id, offset=0):
+    """(JSONL bytes of the finished result lines after the first offset, number of lines)"""
+    _read_job(job_id)
+    lines = []
+    try:
+        with open(_path(job_id, 'results.jsonl'), 'rb') as f:
+            for i, line in enumerate(f):
+                if not line.endswith(b'\n'):
+                    break  # still being written
+                if i >= offset:
+                    lines.append(line)
+    except FileNotFoundError:
+        pass
+    return b''.join(lines), len(lines)
+
+def _lock(job_id):
+    """An open lock file held exclusively by this process, or None if another one runs the job"""
+    handle = open(_path(job_id, 'lock'), 'w')
+    if fcntl is not None:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return None
+    return handle
+
+def _start(job_id):
+    with _running_lock:
+        if job_id in _running or _generate is None:
+            return
+        runner = threading.Thread(target=_run, args=(job_id,), name=f"batch-{job_id}", daemon=True)
+        _running[job_id] = runner
+    runner.start()
+
+def _finished_keys(job_id):
+    """Keys with a result line, dropping a line cut short by a crash"""
+    path = _path(job_id, 'results.jsonl')
+    keys = {}
+    if not os.path.exists(path):
+        return keys
+    good = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            keys[record['key']] = 'error' not in record
+            good += len(line)
+    if good != os.path.getsize(path):
+        with open(path, 'r+b') as f:
+            f.truncate(good)
+    return keys
+
+def _cancelled(job_id):
+    return os.path.exists(_path(job_id, 'cancel'))
+
+def _run_item(job, item):
+    retries = int(os.getenv('BATCH_RETRIES', '3'))
+    attempt = 0
+    while True:
+        if _cancelled(job['id']):
+            return None
+        try:
+            return {"key": item['key'], "response": _generate(item['request'], job['model'], f"batch/{job['id']}")}
+        except Exception as e:
+            if getattr(e, 'status_code', None) == 429 and attempt < retries:
+                attempt += 1
+                time.sleep(min(2 ** attempt, 30))
+                continue
+            adapter_log.warning("Batch item failed", job=job['id'], key=item['key'], error=f"{type(e).__name__}: {e}")
+            return {"key": item['key'], "error": _error_body(e)[0]["error"]}
+
+def _run(job_id):
+    handle = None
+    try:
+        handle = _lock(job_id)
+        if handle is None:
+            return
+        job = _read_job(job_id)
+        if job['state'] in TERMINAL_STATES:
+            return
+        finished = _finished_keys(job_id)
+        job['succeeded'] = sum(1 for ok in finished.values() if ok)
+        job['failed'] = len(finished) - job['succeeded']
+        job['state'] = "BATCH_STATE_RUNNING"
+        job['updateTime'] = _now()
+        _write_job(job)
+        if finished:
+            adapter_log.info("Batch job resumed", job=job_id, finished=len(finished), total=job['total'])
+
+        with open(_path(job_id, 'requests.jsonl')) as f:
+            pending = [item for item in map(json.loads, f) if item['key'] not in finished]
+        written = time.monotonic()
+        concurrency = int(os.getenv('BATCH_CONCURRENCY', '8'))
+        with open(_path(job_id, 'results.jsonl'), 'a') as out, \
+                concurrent.futures.ThreadPoolExecutor(concurrency, thread_name_prefix=f"batch-{job_id}") as pool:
+            futures = [pool.submit(_run_item, job, item) for item in pending]
+            # Results are written in completion order, so a slow item doesn't hold back the rest
+            for future in concurrent.futures.as_completed(futures):
+                record = future.result()
+                if record is None:
+                    continue
+                out.write(json.dumps(record, separators=(',', ':')) + '\n')
+                out.flush()
+                job['failed' if 'error' in record else 'succeeded'] += 1
+                if time.monotonic() - written >= PROGRESS_INTERVAL_S:
+                    job['updateTime'] = _now()
+                    _write_job(job)
+                    written = time.monotonic()
+        job['state'] = "BATCH_STATE_CANCELLED" if _cancelled(job_id) else "BATCH_STATE_SUCCEEDED"
+        job['updateTime'] = _now()
+        _write_job(job)
+        adapter_log.info("Batch job finished", job=job_id, state=job['state'],
+                         succeeded=job['succeeded'], failed=job['failed'])
+    except Exception as e:
+        adapter_log.error("Batch job failed", job=job_id, error=f"{type(e).__name__}: {e}")
+        try:
+            job = _read_job(job_id)
+            job['state'] = "BATCH_STATE_FAILED"
+            job['updateTime'] = _now()
+            _write_job(job)
+        except JobNotFound:
+            pass
+    finally:
+        if handle is not None:
+            handle.close()
+        with _running_lock:
+            _running.pop(job_id, None)
+
+def resume():
+    """Starts every unfinished job of the store that no process is running"""
+    if not os.path.isdir(store_dir()):
+        return
+    for job_id in os.listdir(store_dir()):
+        try:
+            job = _read_job(job_id)
+        except JobNotFound:
+            continue
+        if job['state'] not in TERMINAL_STATES:
+            _start(job_id)
+
+def wait_idle(timeout=None):
+    """Blocks until this process runs no job (for tests and benchmarks)"""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while _running and (deadline is None or time.monotonic() < deadline):
+        time.sleep(0.01)
+    return not _running
+
+def install(generate, error_body):
+    """Sets the item runner; jobs created or cancelled in this process run from then on"""
+    global _generate, _error_body
+    _generate, _error_body = generate, error_body
+
+def begin():
+    """Starts the background scan that resumes unfinished jobs (the server entry points call this)"""
+    global _scanner
+    if _scanner is not None:
+        return
+
+    def scan():
+        while True:
+            try:
+                resume()
+            except Exception as e:
+                adapter_log.warning("Batch job scan failed", error=f"{type(e).__name__}: {e}")
+            time.sleep(float(os.getenv('BATCH_SCAN_S', '10')))
+    _scanner = threading.Thread(target=scan, name="batch-scan", daemon=True)
+    _scanner.start()
+
+def stats():
+    with _running_lock:
+        return {"running": sorted(_running)}
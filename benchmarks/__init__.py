@@ -0,0 +1 @@
+"""Offline benchmarks for the Gemini-LiteLLM adapter. Run from the repo root with python -m benchmarks.<name>."""
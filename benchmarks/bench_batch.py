@@ -0,0 +1,85 @@
+"""
+Offline evaluation throughput: serial generateContent calls vs a batchGenerateContent job.
+
+Starts the mock provider (--ttft seconds per response) and the adapter in a
+subprocess per serving mode, then pushes --requests prompts through it:
+  serial  - one generateContent request at a time, like an evaluation script
+  batch   - one batchGenerateContent job per BATCH_CONCURRENCY value, polled
+            until done, with its JSONL results fetched at the end
+and reports items per second.
+
+Usage:
+    python -m benchmarks.bench_batch [--modes flask,asgi] [--requests 200] [--concurrency 4,16]
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+import urllib.request
+
+from benchmarks.replay import start_mock, start_adapter
+
+PORT = 5127
+MODEL_PATH = "/v1beta/models/openai/mock-model"
+
+def http(path, body=None, content_type='application/json'):
+    request = urllib.request.Request(f"http://127.0.0.1:{PORT}{path}", data=body, headers={'Content-Type': content_type})
+    with urllib.request.urlopen(request, timeout=120) as response:
+        return response.read()
+
+def prompts(count, tag):
+    return [{"contents": [{"role": "user", "parts": [{"text": f"Evaluate case {i} ({tag})"}]}]} for i in range(count)]
+
+def run_serial(requests):
+    start = time.perf_counter()
+    for body in requests:
+        http(MODEL_PATH + ":generateContent", json.dumps(body).encode())
+    return len(requests) / (time.perf_counter() - start)
+
+def run_batch(requests):
+    jsonl = "".join(json.dumps({"key": str(i), "request": body}) + "\n" for i, body in enumerate(requests))
+    start = time.perf_counter()
+    job = json.loads(http(MODEL_PATH + ":batchGenerateContent", jsonl.encode(), 'application/jsonl'))
+    name = job["name"]
+    while not json.loads(http(f"/v1beta/{name}"))["done"]:
+        time.sleep(0.05)
+    lines = http(f"/v1beta/{name}:results").splitlines()
+    elapsed = time.perf_counter() - start
+    if len(lines) != len(requests):
+        raise RuntimeError(f"job returned {len(lines)} results for {len(requests)} requests")
+    return len(requests) / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='flask,asgi')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', default='4,16')
+    parser.add_argument('--ttft', type=float, default=0.1)
+    args = parser.parse_args()
+
+    mock = start_mock(argparse.Namespace(ttft=args.ttft, tokens=5, rate=0, tool_calls=0, rate_limit=0))
+    try:
+        print(f"{'mode':<6} {'run':<10} {'items/s':>8}")
+        for mode in args.modes.split(','):
+            for concurrency in [None] + [int(c) for c in args.concurrency.split(',')]:
+                with tempfile.TemporaryDirectory() as store:
+                    os.environ['BATCH_DIR'] = store
+                    if concurrency is not None:
+                        os.environ['BATCH_CONCURRENCY'] = str(concurrency)
+                    proc = start_adapter(mode, PORT)
+                    try:
+                        http(MODEL_PATH + ":generateContent", json.dumps(prompts(1, "warm-up")[0]).encode())
+                        requests = prompts(args.requests, f"{mode} {concurrency}")
+                        rate = run_serial(requests) if concurrency is None else run_batch(requests)
+                    finally:
+                        proc.terminate()
+                        proc.wait()
+                label = 'serial' if concurrency is None else f"batch x{concurrency}"
+                print(f"{mode:<6} {label:<10} {rate:>8.1f}")
+    finally:
+        mock.terminate()
+        mock.wait()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+JSON codec throughput: request parsing and response translation per codec.
+
+For each available codec (stdlib json, orjson, msgspec) times parsing a
+large-history Gemini CLI request body, and translating plus serializing a
+non-streaming response and a stream of text frames.
+
+Usage:
+    python -m benchmarks.bench_codec [--turns 400] [--tools 40] [--repeat 20]
+"""
+import os
+import json
+import time
+import argparse
+import statistics
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import adapter
+import codec
+from benchmarks.fake_litellm import make_chunks, make_response
+from benchmarks.bench_translation import make_request, make_tools
+
+def median_seconds(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+def available_codecs():
+    names = []
+    for name in ("json", "orjson", "msgspec"):
+        os.environ['JSON_CODEC'] = name
+        codec.configure()
+        if codec.name == name:
+            names.append(name)
+    return names
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', type=int, default=400)
+    parser.add_argument('--tools', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    body = json.dumps(make_request(args.turns, make_tools(args.tools))).encode('utf-8')
+    response = make_response(2000)
+    chunks = make_chunks(2000)
+
+    def translate_response():
+        codec.dumps_bytes(adapter.openai_to_google_response(response))
+
+    def translate_stream():
+        state = adapter.new_stream_state()
+        for chunk in chunks:
+            adapter.translate_stream_chunk(chunk, state)
+
+    print(f"request body: {len(body) / 1024:.0f} KB ({args.turns} turns, {args.tools} tools)")
+    print(f"{'codec':<10} {'parse ms':>9} {'parse MB/s':>11} {'response us':>12} {'frame us':>9}")
+    for name in available_codecs():
+        os.environ['JSON_CODEC'] = name
+        codec.configure()
+        parse = median_seconds(lambda: codec.loads(body), args.repeat)
+        respond = median_seconds(translate_response, args.repeat * 10)
+        stream = median_seconds(translate_stream, args.repeat)
+        print(f"{name:<10} {parse * 1000:>9.2f} {len(body) / parse / 1e6:>11.0f} {respond * 1e6:>12.1f} "
+              f"{stream / len(chunks) * 1e6:>9.2f}")
+    os.environ.pop('JSON_CODEC', None)
+    codec.configure()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Concurrency benchmark: Flask (threaded Werkzeug) vs the ASGI serving mode.
+
+Starts each serving mode in a subprocess with the fake LiteLLM provider from
+benchmarks/fake_litellm.py, opens N concurrent streamGenerateContent requests
+and reports wall time, time-to-first-byte and stream duration percentiles,
+plus the CPU time the server process spent.
+
+Usage:
+    python -m benchmarks.bench_concurrency [--streams 300] [--modes flask,asgi]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REQUEST_BODY = {"contents": [{"role": "user", "parts": [{"text": "Count to twenty"}]}]}
+PORTS = {'flask': 5101, 'asgi': 5102}
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+def start_server(mode, port):
+    """Launches the adapter in a subprocess and waits until it answers"""
+    env = dict(os.environ, LITELLM_LOCAL_MODEL_COST_MAP='True')
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_litellm", mode, str(port)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/v1beta/models", timeout=1) as response:
+                if response.status == 200:
+                    return proc
+        except OSError:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{mode} server did not start on port {port}")
+
+async def one_stream(port, path, body):
+    """Runs one streaming request over a raw socket, returning (ttfb, total) in seconds"""
+    start = time.perf_counter()
+    ttfb = None
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('ascii') + body
+    )
+    await writer.drain()
+    while True:
+        data = await reader.read(65536)
+        if not data:
+            break
+        if ttfb is None and b'data:' in data:
+            ttfb = time.perf_counter() - start
+    writer.close()
+    return ttfb or 0.0, time.perf_counter() - start
+
+async def run_load(port, streams):
+    """Opens `streams` concurrent streams and collects timings"""
+    # A raw asyncio client keeps the load generator from being the bottleneck
+    path = "/v1beta/models/groq/fake-model:streamGenerateContent?alt=sse"
+    body = json.dumps(REQUEST_BODY).encode('utf-8')
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one_stream(port, path, body) for _ in range(streams)), return_exceptions=True)
+    wall = time.perf_counter() - start
+    ok = [r for r in results if not isinstance(r, Exception)]
+    return wall, ok, len(results) - len(ok)
+
+def process_cpu_seconds(pid):
+    """User+system CPU time of a process, read from /proc (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return float('nan')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--streams', type=int, default=300)
+    parser.add_argument('--modes', default='flask,asgi')
+    args = parser.parse_args()
+
+    print(f"{'mode':<6} {'streams':>7} {'errors':>6} {'wall s':>8} {'ttfb p50':>9} {'ttfb p99':>9} {'dur p50':>8} {'dur p99':>8} {'cpu s':>6}")
+    for mode in args.modes.split(','):
+        proc = start_server(mode, PORTS[mode])
+        try:
+            cpu_before = process_cpu_seconds(proc.pid)
+            wall, ok, errors = asyncio.run(run_load(PORTS[mode], args.streams))
+            cpu = process_cpu_seconds(proc.pid) - cpu_before
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+        ttfbs = [r[0] for r in ok]
+        durations = [r[1] for r in ok]
+        print(f"{mode:<6} {args.streams:>7} {errors:>6} {wall:>8.2f} "
+              f"{percentile(ttfbs, 50):>9.3f} {percentile(ttfbs, 99):>9.3f} "
+              f"{percentile(durations, 50):>8.2f} {percentile(durations, 99):>8.2f} {cpu:>6.2f}")
+
+if __name__ == '__main__':
+    main()
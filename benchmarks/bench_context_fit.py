@@ -0,0 +1,54 @@
+"""
+Benchmark for context_fit.fit_request on growing conversation histories.
+
+Times fitting turn N of a session after turns 1..N-1 were fitted, for a small
+context model (github/, 8000 tokens, forces trimming) and a large context one
+(deepseek/, fits without trimming). Token counts of earlier turns are memoized,
+so only the new turn should cost tokenizer time.
+
+Usage:
+    python -m benchmarks.bench_context_fit [--turns 10,50,100,200]
+"""
+import os
+import json
+import time
+import argparse
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import adapter
+import context_fit
+from benchmarks.bench_translation import make_request, make_tools
+
+def time_fit(google_req_body, model, repeat):
+    """Median seconds per fit_request call on the translated request"""
+    openai_req = adapter.google_to_openai_request(json.loads(google_req_body), model)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        context_fit.fit_request(openai_req, model)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', default='10,50,100,200')
+    parser.add_argument('--tools', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    tools = make_tools(args.tools)
+
+    print(f"{'turns':>6} {'model':<24} {'first fit ms':>12} {'cached fit ms':>13}")
+    for turns in [int(t) for t in args.turns.split(',')]:
+        body = json.dumps(make_request(turns, tools))
+        for model in ("github/gpt-4o", "deepseek/deepseek-chat"):
+            openai_req = adapter.google_to_openai_request(json.loads(body), model)
+            start = time.perf_counter()
+            context_fit.fit_request(openai_req, model)
+            first = time.perf_counter() - start
+            cached = time_fit(body, model, args.repeat)
+            print(f"{turns:>6} {model:<24} {first * 1000:>12.2f} {cached * 1000:>13.3f}")
+
+if __name__ == '__main__':
+    main()
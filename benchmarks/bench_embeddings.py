@@ -0,0 +1,80 @@
+"""
+embedContent throughput against the local mock provider: micro-batching and the vector cache.
+
+Starts the mock provider (MOCK_EMBED_LATENCY seconds per embeddings call,
+whatever its size) and the adapter in a subprocess per serving mode and batch
+window, then sends --requests single-document embedContent requests from
+--concurrency client threads:
+  cold  - documents the adapter hasn't seen: every input goes upstream
+  warm  - the same documents again: every input is a cache hit
+and reports requests per second and how many upstream calls the cold pass made.
+
+Usage:
+    python -m benchmarks.bench_embeddings [--modes flask,asgi] [--requests 2000] [--concurrency 32]
+"""
+import os
+import json
+import time
+import argparse
+import urllib.request
+import concurrent.futures
+
+os.environ.setdefault('MOCK_EMBED_LATENCY', '0.05')
+
+from benchmarks.replay import MOCK_PORT, start_mock, start_adapter
+
+PORT = 5126
+EMBED_PATH = "/v1beta/models/openai/mock-embedding:embedContent"
+
+def post(port, path, payload):
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=json.dumps(payload).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return json.loads(response.read())
+
+def mock_calls():
+    with urllib.request.urlopen(f"http://127.0.0.1:{MOCK_PORT}/mock/stats", timeout=5) as response:
+        return json.loads(response.read())["embedding_calls"]
+
+def run_pass(docs, concurrency):
+    def one(doc):
+        post(PORT, EMBED_PATH, {"content": {"parts": [{"text": doc}]}})
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, docs))
+    return len(docs) / (time.perf_counter() - start)
+
+def measure(mode, window_ms, requests, concurrency):
+    os.environ['EMBED_BATCH_WINDOW_MS'] = str(window_ms)
+    proc = start_adapter(mode, PORT)
+    try:
+        docs = [f"document {mode} {window_ms} {i}: " + "lorem ipsum " * 20 for i in range(requests)]
+        calls_before = mock_calls()
+        cold = run_pass(docs, concurrency)
+        upstream_calls = mock_calls() - calls_before
+        warm = run_pass(docs, concurrency)
+        return cold, upstream_calls, warm
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='flask,asgi')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    args = parser.parse_args()
+
+    mock = start_mock(argparse.Namespace(ttft=0.0, tokens=5, rate=0, tool_calls=0, rate_limit=0))
+    try:
+        print(f"{'mode':<6} {'window ms':>9} {'cold req/s':>11} {'upstream calls':>15} {'warm req/s':>11}")
+        for mode in args.modes.split(','):
+            for window_ms in (0, 5):
+                cold, upstream_calls, warm = measure(mode, window_ms, args.requests, args.concurrency)
+                print(f"{mode:<6} {window_ms:>9} {cold:>11.0f} {upstream_calls:>15} {warm:>11.0f}")
+    finally:
+        mock.terminate()
+        mock.wait()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Logging overhead on the request and chunk hot paths, before and after adapter_log.
+
+"before" replays the print() calls the adapter used to make: the request body
+dumped with json.dumps(indent=2), the request headers, and one line per
+streamed chunk. "after" runs the adapter_log calls at INFO (the default) and
+at DEBUG. stdout goes to a temporary file, like adapter.log under
+manage_adapter.sh, so the numbers include the write.
+
+Usage:
+    python -m benchmarks.bench_logging [--turns 200] [--tools 40] [--chunks 2000]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import adapter
+import adapter_log
+from benchmarks.fake_litellm import make_chunks
+from benchmarks.bench_translation import make_request, make_tools
+
+HEADERS = {"User-Agent": "GeminiCLI/0.1", "Content-Type": "application/json", "Authorization": "Bearer x" * 8}
+
+def legacy_request_log(body):
+    print("DEBUG: Incoming POST /v1beta/models/groq/bench-model:streamGenerateContent")
+    print(f"DEBUG: Body: {json.dumps(body, indent=2)}")
+    print("Received request for model: groq/bench-model")
+    print(f"Request Headers: {HEADERS}")
+
+def request_log(body):
+    adapter_log.begin_request()
+    adapter_log.info("Incoming request", method="POST", path="/v1beta/models/groq/bench-model:streamGenerateContent")
+    if adapter_log.debug_enabled():
+        adapter_log.debug("Request body", body=body)
+    adapter_log.info("Received request", model="groq/bench-model")
+    if adapter_log.debug_enabled():
+        adapter_log.debug("Request headers", headers=HEADERS)
+
+def legacy_translate(chunk, state):
+    frames = adapter.translate_stream_chunk(chunk, state)
+    for data_str in frames:
+        print(f"DEBUG: Yielding text chunk: {data_str[:100]}...")
+    return frames
+
+def per_call(fn, items, repeat=3):
+    """Best-of-repeat microseconds per fn(item)"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        elapsed = (time.perf_counter() - start) / len(items)
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', type=int, default=200)
+    parser.add_argument('--tools', type=int, default=40)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--chunks', type=int, default=2000)
+    args = parser.parse_args()
+
+    bodies = [make_request(args.turns, make_tools(args.tools)) for _ in range(args.requests)]
+    chunks = make_chunks(args.chunks)[:args.chunks]
+    results = []
+
+    real_stdout = sys.stdout
+    with tempfile.TemporaryFile('w') as log:
+        sys.stdout = log
+        try:
+            # Before: print() on the calling thread
+            adapter_log.configure(level="WARNING")
+            state = adapter.new_stream_state()
+            results.append(("print (before)",
+                            per_call(legacy_request_log, bodies),
+                            per_call(lambda c: legacy_translate(c, state), chunks)))
+
+            # After: queued structured events at INFO and DEBUG
+            for level in ("INFO", "DEBUG"):
+                adapter_log.configure(level=level)
+                state = adapter.new_stream_state()
+                results.append((f"adapter_log {level}",
+                                per_call(request_log, bodies),
+                                per_call(lambda c: adapter.translate_stream_chunk(c, state), chunks)))
+                adapter_log.shutdown()
+        finally:
+            sys.stdout = real_stdout
+            adapter_log.configure()
+
+    body_kb = len(json.dumps(bodies[0])) / 1024
+    print(f"request body: {body_kb:.0f} KB ({args.turns} turns, {args.tools} tools)")
+    print(f"{'logging':<20} {'per request us':>15} {'per chunk us':>13}")
+    for name, request_us, chunk_us in results:
+        print(f"{name:<20} {request_us:>15.1f} {chunk_us:>13.2f}")
+
+if __name__ == '__main__':
+    main()
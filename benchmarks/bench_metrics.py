@@ -0,0 +1,69 @@
+"""
+Overhead of the metrics registry on a full adapter request.
+
+Runs streaming requests in-process (Flask test client, fake provider with no
+delay, so the adapter's own work is all that is timed) with recording switched
+on and off, alternating rounds to cancel drift, and reports the difference.
+Also times the individual recording calls.
+
+Usage:
+    python -m benchmarks.bench_metrics [--requests 300] [--rounds 5]
+"""
+import os
+import time
+import argparse
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from benchmarks import fake_litellm
+
+fake_litellm.FAKE_CHUNK_DELAY = 0
+fake_litellm.install()
+
+import metrics
+from adapter import app
+from benchmarks.bench_translation import make_request, make_tools
+
+STREAM_PATH = "/v1beta/models/groq/fake-model:streamGenerateContent?alt=sse"
+
+def time_requests(client, body, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.post(STREAM_PATH, json=body).get_data()
+    return (time.perf_counter() - start) / requests
+
+def time_call(fn, calls=200000):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--turns', type=int, default=5)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    body = make_request(args.turns, make_tools(10))
+    time_requests(client, body, 20)  # warm-up
+
+    on, off = [], []
+    for _ in range(args.rounds):
+        metrics.enabled = False
+        off.append(time_requests(client, body, args.requests))
+        metrics.enabled = True
+        on.append(time_requests(client, body, args.requests))
+    best_on, best_off = min(on), min(off)
+
+    labels = ("groq/fake-model",)
+    print(f"counter inc:       {time_call(lambda: metrics.REQUESTS.inc(labels + ('true',))) * 1e9:8.0f} ns")
+    print(f"histogram observe: {time_call(lambda: metrics.TRANSLATION.observe(labels, 0.0123)) * 1e9:8.0f} ns")
+    print(f"request, metrics off: {best_off * 1000:8.3f} ms")
+    print(f"request, metrics on:  {best_on * 1000:8.3f} ms")
+    print(f"overhead:             {(best_on - best_off) / best_off * 100:8.2f} %")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Peak memory of a large image request, with media spooling on and off.
+
+Starts the adapter in a subprocess per serving mode against the mock provider,
+sends a small warm-up request, then a generateContent request carrying a
+--size MB (default 20) PNG as inlineData, resent --turns times as a Gemini CLI
+session would. Reports the latency of the image requests and the adapter's
+peak RSS (VmHWM) before and after them.
+
+Usage:
+    python -m benchmarks.bench_multimodal [--modes flask,asgi] [--size 20] [--turns 3]
+"""
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import subprocess
+
+os.environ.setdefault('LITELLM_PRELOAD', 'false')
+
+from benchmarks.replay import MOCK_PORT, ROOT, start_mock
+from benchmarks.bench_startup import wait_listening, get
+
+PORT = 5125
+GENERATE_PATH = "/v1beta/models/openai/mock-model:generateContent"
+
+def peak_rss_mb(pid):
+    """Peak resident set size of a process in MB (VmHWM, Linux only)"""
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    return float('nan')
+
+def image_body(size_mb, turns):
+    data = base64.b64encode(b"\x89PNG\r\n" + os.urandom(int(size_mb * 1024 * 1024))).decode()
+    contents = []
+    for turn in range(turns):
+        contents.append({"role": "user", "parts": [{"text": f"Describe the picture, turn {turn}"},
+                                                   {"inlineData": {"mimeType": "image/png", "data": data}}]})
+        yield json.dumps({"contents": list(contents)}).encode()
+        contents.append({"role": "model", "parts": [{"text": "A picture."}]})
+
+def measure(mode, spool, size_mb, turns):
+    env = dict(os.environ, LITELLM_LOCAL_MODEL_COST_MAP='True', MEDIA_SPOOL='true' if spool else 'false',
+               MEDIA_MAX_MB=str(size_mb * turns + 10),
+               OPENAI_API_BASE=f"http://127.0.0.1:{MOCK_PORT}/v1", OPENAI_API_KEY='mock', LOG_LEVEL='WARNING')
+    proc = subprocess.Popen([sys.executable, "-m", "benchmarks.serve", mode, str(PORT)],
+                            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_listening(PORT, proc, time.monotonic() + 60)
+        status, _ = get(PORT, GENERATE_PATH, json.dumps({"contents": [{"role": "user", "parts": [{"text": "Hi"}]}]}).encode())
+        if status != 200:
+            raise RuntimeError(f"warm-up request failed with HTTP {status}")
+        baseline = peak_rss_mb(proc.pid)
+        latencies = []
+        for body in image_body(size_mb, turns):
+            start = time.perf_counter()
+            status, _ = get(PORT, GENERATE_PATH, body)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                raise RuntimeError(f"image request failed with HTTP {status}")
+        return baseline, peak_rss_mb(proc.pid), latencies
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='flask,asgi')
+    parser.add_argument('--size', type=float, default=20.0, help="decoded image size in MB")
+    parser.add_argument('--turns', type=int, default=3)
+    args = parser.parse_args()
+
+    mock = start_mock(argparse.Namespace(ttft=0.0, tokens=5, rate=0, tool_calls=0, rate_limit=0))
+    try:
+        print(f"{'mode':<6} {'spool':<6} {'peak before MB':>15} {'peak after MB':>14} {'first s':>8} {'last s':>7}")
+        for mode in args.modes.split(','):
+            for spool in (True, False):
+                before, after, latencies = measure(mode, spool, args.size, args.turns)
+                print(f"{mode:<6} {'on' if spool else 'off':<6} {before:>15.0f} {after:>14.0f} "
+                      f"{latencies[0]:>8.2f} {latencies[-1]:>7.2f}")
+    finally:
+        mock.terminate()
+        mock.wait()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Time to first byte of back-to-back upstream turns with and without pooled clients.
+
+Starts benchmarks/mock_provider.py and runs streaming completions through
+LiteLLM's real openai/ path, one after the other, with:
+  fresh   - a new OpenAI client (and connection) per turn
+  litellm - no client passed, LiteLLM's own client cache
+  pooled  - the routing table's pooled keep-alive client
+TTFB is measured from the litellm.completion call to the first chunk. The mock
+answers immediately (--ttft 0), so what is left is client setup, connection
+setup and the request itself. On localhost there is no TLS handshake; point
+--api-base at a real provider (with OPENAI_API_KEY set) to see that cost too.
+Also times routing.resolve.
+
+Usage:
+    python -m benchmarks.bench_routing [--turns 200] [--api-base URL] [--model openai/mock-model]
+"""
+import os
+import time
+import argparse
+from types import SimpleNamespace
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx
+import litellm
+from openai import OpenAI
+
+import routing
+from benchmarks.bench_concurrency import percentile
+from benchmarks.replay import MOCK_PORT, start_mock
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+def time_turn(model, **kwargs):
+    start = time.perf_counter()
+    response = litellm.completion(model=model, messages=MESSAGES, stream=True, max_tokens=5, **kwargs)
+    ttfb = None
+    for _ in response:
+        if ttfb is None:
+            ttfb = time.perf_counter() - start
+    return ttfb
+
+def fresh_client(route):
+    return {'client': OpenAI(api_key=route.api_key, base_url=route.pool.api_base, max_retries=0,
+                             http_client=httpx.Client())}
+
+def run(mode, route, turns):
+    samples = []
+    for _ in range(turns):
+        if mode == 'fresh':
+            kwargs = fresh_client(route)
+        elif mode == 'pooled':
+            kwargs = routing.upstream_kwargs(route)
+        else:
+            kwargs = {}
+        samples.append(time_turn(route.target_model, **kwargs))
+        if mode == 'fresh':
+            kwargs['client'].close()
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', type=int, default=200)
+    parser.add_argument('--api-base', help="OpenAI-compatible endpoint to use instead of the local mock")
+    parser.add_argument('--model', default="openai/mock-model")
+    args = parser.parse_args()
+
+    mock = None
+    if args.api_base:
+        os.environ['OPENAI_API_BASE'] = args.api_base
+    else:
+        os.environ['OPENAI_API_BASE'] = f"http://127.0.0.1:{MOCK_PORT}/v1"
+        os.environ.setdefault('OPENAI_API_KEY', 'mock')
+        mock = start_mock(SimpleNamespace(ttft=0, tokens=5, rate=100000, tool_calls=0, rate_limit=0))
+    try:
+        routing.configure()
+        route = routing.resolve(args.model)
+        # One untimed turn per mode, so imports and lazy setup don't count
+        for mode in ('fresh', 'litellm', 'pooled'):
+            run(mode, route, 1)
+
+        print(f"{'mode':8} {'p50 ms':>8} {'p90 ms':>8} {'mean ms':>8}")
+        for mode in ('fresh', 'litellm', 'pooled'):
+            samples = [s * 1000 for s in run(mode, route, args.turns)]
+            print(f"{mode:8} {percentile(samples, 50):8.2f} {percentile(samples, 90):8.2f} {sum(samples) / len(samples):8.2f}")
+    finally:
+        if mock is not None:
+            mock.kill()
+
+    calls = 100000
+    start = time.perf_counter()
+    for _ in range(calls):
+        routing.resolve("gemini-2.5-pro")
+    print(f"routing.resolve: {(time.perf_counter() - start) / calls * 1e9:.0f} ns")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+SSE output cost on a fast provider: chunks per second and CPU per token.
+
+Streams --tokens one-token deltas from the fake provider, one every
+--chunk-us microseconds (Groq-like rates by default), through the Flask
+adapter, with SSE coalescing off and with each --windows-ms window. Also
+times serializing one text frame through the generic sse_frame(dict) path
+against the precomputed template.
+
+Usage:
+    python -m benchmarks.bench_sse [--tokens 4000] [--chunk-us 700] [--windows-ms 5,10,25]
+"""
+import os
+import time
+import timeit
+import argparse
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+from benchmarks import fake_litellm
+
+fake_litellm.install()
+
+import adapter
+import adapter_log
+import sse_coalesce
+
+PATH = "/v1beta/models/groq/bench-model:streamGenerateContent?alt=sse"
+BODY = {"contents": [{"role": "user", "parts": [{"text": "Hello"}]}]}
+
+def run(window_ms):
+    """(wall seconds, CPU seconds, frames, bytes) of one streamed response"""
+    os.environ['SSE_COALESCE_MS'] = str(window_ms)
+    client = adapter.app.test_client()
+    wall, cpu = time.perf_counter(), time.process_time()
+    response = client.post(PATH, json=BODY)
+    frames = size = 0
+    for data in response.response:
+        frames += data.count(b"data: ") if isinstance(data, bytes) else data.count("data: ")
+        size += len(data)
+    return time.perf_counter() - wall, time.process_time() - cpu, frames, size
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tokens', type=int, default=4000)
+    parser.add_argument('--chunk-us', type=float, default=700)
+    parser.add_argument('--windows-ms', default='5,10,25')
+    args = parser.parse_args()
+
+    adapter_log.configure(level="WARNING")
+    fake_litellm.FAKE_CHUNK_DELAY = args.chunk_us / 1e6
+    chunks = fake_litellm.make_chunks(args.tokens)
+    fake_litellm.make_chunks = lambda count=None, tools=None: chunks
+
+    run(0)  # warm-up
+    print(f"{args.tokens} tokens, one every {args.chunk_us:g} us")
+    print(f"{'coalescing':<12} {'chunks/s':>10} {'frames':>8} {'KB':>8} {'CPU us/token':>13}")
+    for window_ms in [0] + [float(w) for w in args.windows_ms.split(',') if w]:
+        wall, cpu, frames, size = run(window_ms)
+        name = "off" if window_ms == 0 else f"{window_ms:g} ms"
+        print(f"{name:<12} {args.tokens / wall:>10.0f} {frames:>8} {size / 1024:>8.0f} {cpu / args.tokens * 1e6:>13.1f}")
+    os.environ.pop('SSE_COALESCE_MS', None)
+
+    payload = {"candidates": [{"content": {"parts": [{"text": "token "}], "role": "model"}, "index": 0}]}
+    number = 200000
+    generic = timeit.timeit(lambda: adapter.sse_frame(payload), number=number) / number * 1e6
+    template = timeit.timeit(lambda: sse_coalesce.text_frame("token "), number=number) / number * 1e6
+    print(f"text frame serialization: dict + json.dumps {generic:.2f} us, template {template:.2f} us")
+
+if __name__ == '__main__':
+    main()
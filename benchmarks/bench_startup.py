@@ -0,0 +1,96 @@
+"""
+Cold start: time to first listen, time to first successful request and idle RSS.
+
+Starts the adapter in a subprocess per serving mode, with the background
+LiteLLM preload on and off, and measures from the spawn:
+  listen    - the port accepts connections
+  first ok  - a generateContent request (sent as soon as the port listens)
+              got a 200 from the mock provider
+  ready     - /adapter/ready turned 200 (as the adapter reports it)
+  RSS       - resident memory once idle, before and after the first request
+
+Usage:
+    python -m benchmarks.bench_startup [--modes flask,asgi] [--runs 3]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+
+# The replay helpers import the adapter; this process shouldn't load LiteLLM alongside the measured one
+os.environ.setdefault('LITELLM_PRELOAD', 'false')
+
+from benchmarks.replay import MOCK_PORT, ROOT, start_mock, process_rss_mb
+
+PORT = 5121
+GENERATE_PATH = "/v1beta/models/openai/mock-model:generateContent"
+REQUEST_BODY = json.dumps({"contents": [{"role": "user", "parts": [{"text": "Hello"}]}]}).encode()
+
+def wait_listening(port, proc, deadline):
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"adapter exited with code {proc.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.005)
+    raise RuntimeError(f"adapter did not listen on port {port}")
+
+def get(port, path, data=None):
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=data,
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b'{}')
+
+def measure(mode, preload):
+    env = dict(os.environ, LITELLM_LOCAL_MODEL_COST_MAP='True', LITELLM_PRELOAD='true' if preload else 'false',
+               OPENAI_API_BASE=f"http://127.0.0.1:{MOCK_PORT}/v1", OPENAI_API_KEY='mock', LOG_LEVEL='WARNING')
+    start = time.monotonic()
+    proc = subprocess.Popen([sys.executable, "-m", "benchmarks.serve", mode, str(PORT)],
+                            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_listening(PORT, proc, start + 60)
+        listen = time.monotonic() - start
+        idle_rss = process_rss_mb(proc.pid)
+        status, _ = get(PORT, GENERATE_PATH, REQUEST_BODY)
+        first_ok = time.monotonic() - start
+        if status != 200:
+            raise RuntimeError(f"first request failed with HTTP {status}")
+        _, readiness = get(PORT, "/adapter/ready")
+        time.sleep(1)
+        return listen, first_ok, readiness["ready_after_s"] or float('nan'), idle_rss, process_rss_mb(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='flask,asgi')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    mock = start_mock(argparse.Namespace(ttft=0.0, tokens=5, rate=0, tool_calls=0, rate_limit=0))
+    try:
+        print(f"{'mode':<6} {'preload':<8} {'listen s':>9} {'first ok s':>11} {'ready s':>8} "
+              f"{'RSS at listen MB':>17} {'RSS idle MB':>12}")
+        for mode in args.modes.split(','):
+            for preload in (True, False):
+                runs = [measure(mode, preload) for _ in range(args.runs)]
+                listen, first_ok, ready, listen_rss, idle_rss = (statistics.median(column) for column in zip(*runs))
+                print(f"{mode:<6} {'on' if preload else 'off':<8} {listen:>9.2f} {first_ok:>11.2f} {ready:>8.2f} "
+                      f"{listen_rss:>17.0f} {idle_rss:>12.0f}")
+    finally:
+        mock.terminate()
+        mock.wait()
+
+if __name__ == '__main__':
+    main()
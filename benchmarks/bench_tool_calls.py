@@ -0,0 +1,65 @@
+"""
+Time to first tool call for a stream of parallel tool calls.
+
+Builds an OpenAI chunk sequence in which the model calls --calls tools in
+parallel, each call's arguments streamed as --arg-chunks deltas, one chunk
+every --chunk-ms like a provider generating tokens. The sequence goes through
+translate_stream_chunk and reports when each functionCall frame was emitted,
+in provider time, next to when all calls used to arrive (with the final chunk).
+
+Usage:
+    python -m benchmarks.bench_tool_calls [--calls 4] [--arg-chunks 40] [--chunk-ms 20]
+"""
+import os
+import json
+import time
+import argparse
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import adapter
+from benchmarks.fake_litellm import make_chunk, make_tool_call_delta
+
+def make_tool_call_chunks(calls, arg_chunks):
+    """Parallel tool calls with arguments split into arg_chunks deltas each, then the finish"""
+    chunks = []
+    for index in range(calls):
+        arguments = json.dumps({"path": f"/src/module_{index}/" + "x" * (arg_chunks * 4), "recursive": True})
+        size = max(1, len(arguments) // arg_chunks)
+        pieces = [arguments[i:i + size] for i in range(0, len(arguments), size)]
+        chunks.append(make_chunk(tool_calls=[make_tool_call_delta(index, f"list_files_{index}", pieces[0])]))
+        chunks.extend(make_chunk(tool_calls=[make_tool_call_delta(index, None, piece)]) for piece in pieces[1:])
+    chunks.append(make_chunk(finish_reason='tool_calls'))
+    return chunks
+
+def emission_times(chunks, chunk_ms):
+    """Provider time (ms) at which each functionCall frame left the translator, and the per-chunk cost"""
+    state = adapter.new_stream_state()
+    emitted = []
+    translate_s = 0.0
+    for i, chunk in enumerate(chunks):
+        start = time.perf_counter()
+        frames = adapter.translate_stream_chunk(chunk, state)
+        translate_s += time.perf_counter() - start
+        for frame in frames:
+            emitted.extend([(i + 1) * chunk_ms + translate_s * 1000] * frame.count('"functionCall"'))
+    return emitted, translate_s / len(chunks) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=4)
+    parser.add_argument('--arg-chunks', type=int, default=40)
+    parser.add_argument('--chunk-ms', type=float, default=20)
+    args = parser.parse_args()
+
+    chunks = make_tool_call_chunks(args.calls, args.arg_chunks)
+    emitted, chunk_us = emission_times(chunks, args.chunk_ms)
+    stream_ms = len(chunks) * args.chunk_ms
+    print(f"{args.calls} parallel tool calls, {len(chunks)} chunks, {args.chunk_ms:g} ms per chunk")
+    print(f"time to first tool call: {emitted[0]:8.1f} ms  (end of stream: {stream_ms:.1f} ms)")
+    for i, ms in enumerate(emitted):
+        print(f"  call {i}: {ms:8.1f} ms")
+    print(f"translation cost: {chunk_us:.2f} us per chunk")
+
+if __name__ == '__main__':
+    main()
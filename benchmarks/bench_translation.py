@@ -0,0 +1,92 @@
+"""
+Micro-benchmark for google_to_openai_request over growing conversation histories.
+
+Builds synthetic Gemini CLI sessions (text turns, functionCall/functionResponse
+pairs and a set of MCP tool declarations) and times translating turn N after
+turns 1..N-1 were already translated, with the translation cache on and off.
+
+Usage:
+    python -m benchmarks.bench_translation [--turns 10,50,100,200,400] [--tools 40]
+"""
+import os
+import json
+import time
+import argparse
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import adapter
+import translation_cache
+
+def make_tools(count):
+    """One tool block with `count` MCP-style function declarations"""
+    return [{"functionDeclarations": [{
+        "name": f"tool_{i}",
+        "description": f"Does thing number {i} on the workspace. " * 4,
+        "parametersJsonSchema": {
+            "type": "object",
+            "properties": {
+                "path": {"type": "string", "description": "Absolute path"},
+                "recursive": {"type": "boolean"},
+                "limit": {"type": "integer", "minimum": 1},
+            },
+            "required": ["path"],
+        },
+    } for i in range(count)]}]
+
+def make_turn(i):
+    """A user prompt, a model functionCall and the matching functionResponse"""
+    return [
+        {"role": "user", "parts": [{"text": f"Step {i}: list the files under /src/module_{i} and summarise them."}]},
+        {"role": "model", "parts": [{"functionCall": {"name": f"tool_{i % 10}", "args": {"path": f"/src/module_{i}", "recursive": True}}}]},
+        {"role": "user", "parts": [{"functionResponse": {"name": f"tool_{i % 10}", "response": {"output": "file.py\n" * 100}}}]},
+    ]
+
+def make_request(turns, tools):
+    contents = []
+    for i in range(turns):
+        contents.extend(make_turn(i))
+    return {
+        "systemInstruction": {"parts": [{"text": "You are an interactive CLI agent. " * 200}]},
+        "contents": contents,
+        "tools": tools,
+        "generationConfig": {"temperature": 0.2},
+    }
+
+def time_translation(body, repeat):
+    """Median seconds per google_to_openai_request call on freshly parsed bodies"""
+    samples = []
+    for _ in range(repeat):
+        google_req = json.loads(body)  # every request arrives as a new parsed object
+        start = time.perf_counter()
+        adapter.google_to_openai_request(google_req, "groq/bench-model")
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', default='10,50,100,200,400')
+    parser.add_argument('--tools', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=15)
+    args = parser.parse_args()
+    tools = make_tools(args.tools)
+
+    print(f"{'turns':>6} {'messages':>8} {'uncached ms':>12} {'cached ms':>10} {'speedup':>8}")
+    for turns in [int(t) for t in args.turns.split(',')]:
+        body = json.dumps(make_request(turns, tools))
+        previous = json.dumps(make_request(turns - 1, tools))
+
+        translation_cache.configure(0)
+        uncached = time_translation(body, args.repeat)
+
+        # Warm the cache with the previous turn's request, as a live session would
+        translation_cache.configure(64)
+        adapter.google_to_openai_request(json.loads(previous), "groq/bench-model")
+        cached = time_translation(body, args.repeat)
+
+        messages = len(adapter.google_to_openai_request(json.loads(body), "groq/bench-model")["messages"])
+        print(f"{turns:>6} {messages:>8} {uncached * 1000:>12.3f} {cached * 1000:>10.3f} {uncached / cached:>7.1f}x")
+
+if __name__ == '__main__':
+    main()
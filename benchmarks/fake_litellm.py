@@ -0,0 +1,98 @@
+"""
+In-process stand-in for litellm.completion / litellm.acompletion.
+
+Produces OpenAI-shaped streaming chunks with a fixed per-chunk delay, so the
+adapter's serving path can be exercised without any network access.
+
+Can also launch the adapter with the fake installed:
+    python -m benchmarks.fake_litellm flask 5101
+    python -m benchmarks.fake_litellm asgi 5102
+"""
+import os
+import sys
+import time
+import asyncio
+from types import SimpleNamespace
+
+import litellm
+
+FAKE_CHUNKS = int(os.getenv('FAKE_CHUNKS', '20'))
+FAKE_CHUNK_DELAY = float(os.getenv('FAKE_CHUNK_DELAY', '0.05'))
+
+# Number of upstream calls made, for tests that check caching and coalescing
+calls = 0
+
+def make_chunk(content=None, finish_reason=None, usage=None, tool_calls=None):
+    """Builds an object with the attributes the adapter reads from a LiteLLM chunk"""
+    delta = SimpleNamespace(content=content, tool_calls=tool_calls)
+    choice = SimpleNamespace(delta=delta, finish_reason=finish_reason, index=0)
+    return SimpleNamespace(choices=[choice], usage=usage)
+
+def make_tool_call_delta(index, name=None, arguments=None):
+    return SimpleNamespace(index=index, function=SimpleNamespace(name=name, arguments=arguments))
+
+def make_chunks(count=FAKE_CHUNKS, tools=None):
+    """
+    The chunk sequence of one fake completion: text deltas, a stop and a usage chunk.
+    When the request has tools, the model calls the first one instead of stopping.
+    """
+    chunks = [make_chunk(content=f"token{i} ") for i in range(count)]
+    if tools:
+        name = tools[0]['function']['name']
+        chunks.append(make_chunk(tool_calls=[make_tool_call_delta(0, name, '{"path": ')]))
+        chunks.append(make_chunk(tool_calls=[make_tool_call_delta(0, None, '"/tmp"}')]))
+        chunks.append(make_chunk(finish_reason='tool_calls'))
+    else:
+        chunks.append(make_chunk(finish_reason='stop'))
+    usage = SimpleNamespace(prompt_tokens=10, completion_tokens=count, total_tokens=10 + count)
+    chunks.append(SimpleNamespace(choices=[], usage=usage))
+    return chunks
+
+def make_response(count=FAKE_CHUNKS):
+    """A non-streaming response object"""
+    message = SimpleNamespace(content="".join(f"token{i} " for i in range(count)), tool_calls=None)
+    choice = SimpleNamespace(message=message, finish_reason='stop', index=0)
+    usage = SimpleNamespace(prompt_tokens=10, completion_tokens=count, total_tokens=10 + count)
+    return SimpleNamespace(choices=[choice], usage=usage, model_dump=lambda: {})
+
+def completion(stream=False, **kwargs):
+    """Blocking fake, sleeps between chunks like a real provider would"""
+    global calls
+    calls += 1
+    if not stream:
+        time.sleep(FAKE_CHUNK_DELAY * FAKE_CHUNKS)
+        return make_response()
+
+    def generate():
+        for chunk in make_chunks(tools=kwargs.get('tools')):
+            time.sleep(FAKE_CHUNK_DELAY)
+            yield chunk
+    return generate()
+
+async def acompletion(stream=False, **kwargs):
+    """Async fake, awaits between chunks instead of blocking a thread"""
+    global calls
+    calls += 1
+    if not stream:
+        await asyncio.sleep(FAKE_CHUNK_DELAY * FAKE_CHUNKS)
+        return make_response()
+
+    async def generate():
+        for chunk in make_chunks(tools=kwargs.get('tools')):
+            await asyncio.sleep(FAKE_CHUNK_DELAY)
+            yield chunk
+    return generate()
+
+def install():
+    """Replaces the LiteLLM entry points used by the adapter with the fakes"""
+    litellm.completion = completion
+    litellm.acompletion = acompletion
+
+def serve(mode, port):
+    """Runs the adapter in the given serving mode with the fake provider installed"""
+    install()
+    from benchmarks import serve as adapter_server
+    adapter_server.run(mode, port)
+
+if __name__ == '__main__':
+    serve(sys.argv[1], int(sys.argv[2]))
@@ -0,0 +1,216 @@
+"""
+Local OpenAI-compatible provider for offline load tests.
+
+Serves POST /v1/chat/completions (streaming and non-streaming) and
+POST /v1/embeddings as a raw ASGI app, so the adapter can run its real LiteLLM path against it: route the adapter
+to `openai/<any-model>` with OPENAI_API_BASE=http://127.0.0.1:<port>/v1.
+
+Behavior (command line flags, or MOCK_* environment variables):
+  --ttft           seconds before the first token (MOCK_TTFT, default 0.2)
+  --tokens         tokens per response (MOCK_TOKENS, default 50)
+  --rate           tokens per second after the first (MOCK_TOKEN_RATE, default 200)
+  --tool-calls     probability of calling the first tool when the request has tools (MOCK_TOOL_CALLS, default 0)
+  --rate-limit     probability of answering 429 (MOCK_RATE_LIMIT, default 0)
+  --embed-latency  seconds per embeddings call, whatever its size (MOCK_EMBED_LATENCY, default 0.05)
+
+GET /mock/stats returns request, 429 and tool call counters, the streams
+still open, how many streams the client disconnected from early and the
+embeddings calls and inputs.
+
+Usage:
+    python -m benchmarks.mock_provider [--port 5201] [--ttft 0.2] [--rate 200] [--rate-limit 0.05]
+"""
+import os
+import json
+import hashlib
+import time
+import random
+import asyncio
+import argparse
+
+class MockConfig:
+    def __init__(self, ttft=None, tokens=None, rate=None, tool_calls=None, rate_limit=None, embed_latency=None):
+        self.ttft = ttft if ttft is not None else float(os.getenv('MOCK_TTFT', '0.2'))
+        self.tokens = tokens if tokens is not None else int(os.getenv('MOCK_TOKENS', '50'))
+        self.rate = rate if rate is not None else float(os.getenv('MOCK_TOKEN_RATE', '200'))
+        self.tool_calls = tool_calls if tool_calls is not None else float(os.getenv('MOCK_TOOL_CALLS', '0'))
+        self.rate_limit = rate_limit if rate_limit is not None else float(os.getenv('MOCK_RATE_LIMIT', '0'))
+        self.embed_latency = embed_latency if embed_latency is not None else float(os.getenv('MOCK_EMBED_LATENCY', '0.05'))
+
+config = MockConfig()
+stats = {"requests": 0, "streams": 0, "rate_limited": 0, "tool_calls": 0, "open_streams": 0, "disconnects": 0,
+         "embedding_calls": 0, "embedding_inputs": 0}
+
+async def read_json(receive):
+    chunks = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        more_body = message.get('more_body', False)
+    body = b''.join(chunks)
+    return json.loads(body) if body else {}
+
+async def send_json(send, payload, status=200, headers=()):
+    body = json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode('ascii'))] + list(headers),
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+def tool_call(tools):
+    fn = tools[0].get('function', {})
+    return {"index": 0, "id": f"call_{random.getrandbits(32):08x}", "type": "function",
+            "function": {"name": fn.get('name', 'tool'), "arguments": json.dumps({"path": "/tmp"})}}
+
+def usage():
+    return {"prompt_tokens": 10, "completion_tokens": config.tokens, "total_tokens": 10 + config.tokens}
+
+async def pace(start, index):
+    """Sleeps until token `index` is due, scheduled from start so delays don't drift"""
+    due = start + config.ttft + (index / config.rate if config.rate > 0 else 0)
+    delay = due - time.perf_counter()
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+async def stream_completion(send, req, call):
+    start = time.perf_counter()
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'text/event-stream')],
+    })
+    base = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": req.get('model', 'mock')}
+
+    async def event(payload):
+        await send({'type': 'http.response.body', 'body': f"data: {json.dumps(payload)}\n\n".encode('utf-8'), 'more_body': True})
+
+    for i in range(config.tokens):
+        await pace(start, i)
+        delta = {"content": f"tok{i} "}
+        if i == 0:
+            delta["role"] = "assistant"
+        await event(dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": None}]))
+    if call is not None:
+        await event(dict(base, choices=[{"index": 0, "delta": {"tool_calls": [call]}, "finish_reason": None}]))
+    await event(dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "tool_calls" if call else "stop"}]))
+    await event(dict(base, choices=[], usage=usage()))
+    await send({'type': 'http.response.body', 'body': b"data: [DONE]\n\n"})
+
+async def stream_until_disconnect(receive, send, req, call):
+    """Streams a completion, stopping as soon as the client closes the connection"""
+    streaming = asyncio.ensure_future(stream_completion(send, req, call))
+
+    async def disconnected():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    watcher = asyncio.ensure_future(disconnected())
+    stats["open_streams"] += 1
+    try:
+        await asyncio.wait([streaming, watcher], return_when=asyncio.FIRST_COMPLETED)
+        if not streaming.done():
+            stats["disconnects"] += 1
+            streaming.cancel()
+        await asyncio.gather(streaming, return_exceptions=True)
+    finally:
+        watcher.cancel()
+        stats["open_streams"] -= 1
+
+async def completion(send, req, call):
+    await pace(time.perf_counter(), config.tokens)
+    message = {"role": "assistant", "content": "".join(f"tok{i} " for i in range(config.tokens))}
+    if call is not None:
+        message["tool_calls"] = [{k: v for k, v in call.items() if k != 'index'}]
+    await send_json(send, {
+        "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()), "model": req.get('model', 'mock'),
+        "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if call else "stop"}],
+        "usage": usage(),
+    })
+
+def mock_vector(text, dimensions):
+    """A deterministic unit-range vector of a text"""
+    digest = hashlib.sha256(text.encode('utf-8')).digest()
+    return [(digest[i % len(digest)] - 128) / 128 for i in range(dimensions)]
+
+async def embeddings(send, req):
+    inputs = req.get('input') or []
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    stats["embedding_calls"] += 1
+    stats["embedding_inputs"] += len(inputs)
+    await asyncio.sleep(config.embed_latency)
+    dimensions = req.get('dimensions') or 8
+    await send_json(send, {
+        "object": "list", "model": req.get('model', 'mock'),
+        "data": [{"object": "embedding", "index": i, "embedding": mock_vector(text, dimensions)} for i, text in enumerate(inputs)],
+        "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+    })
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+
+    path = scope['path']
+    if scope['method'] == 'GET' and path == '/mock/stats':
+        await send_json(send, stats)
+        return
+    if scope['method'] == 'GET' and path.endswith('/models'):
+        await send_json(send, {"object": "list", "data": [{"id": "mock-model", "object": "model"}]})
+        return
+    if scope['method'] == 'POST' and path.endswith('/embeddings'):
+        await embeddings(send, await read_json(receive))
+        return
+    if scope['method'] != 'POST' or not path.endswith('/chat/completions'):
+        await send_json(send, {"error": {"message": f"No route for {path}"}}, 404)
+        return
+
+    req = await read_json(receive)
+    stats["requests"] += 1
+    if random.random() < config.rate_limit:
+        stats["rate_limited"] += 1
+        await send_json(send, {"error": {"message": "Rate limit reached (mock provider)", "type": "rate_limit_error",
+                                         "code": "rate_limit_exceeded"}}, 429, [(b'retry-after', b'1')])
+        return
+
+    call = None
+    if req.get('tools') and random.random() < config.tool_calls:
+        stats["tool_calls"] += 1
+        call = tool_call(req['tools'])
+    if req.get('stream'):
+        stats["streams"] += 1
+        await stream_until_disconnect(receive, send, req, call)
+    else:
+        await completion(send, req, call)
+
+def main():
+    global config
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=5201)
+    parser.add_argument('--ttft', type=float)
+    parser.add_argument('--tokens', type=int)
+    parser.add_argument('--rate', type=float)
+    parser.add_argument('--tool-calls', type=float)
+    parser.add_argument('--rate-limit', type=float)
+    parser.add_argument('--embed-latency', type=float)
+    args = parser.parse_args()
+    config = MockConfig(args.ttft, args.tokens, args.rate, args.tool_calls, args.rate_limit, args.embed_latency)
+
+    import uvicorn
+    uvicorn.run(app, host='127.0.0.1', port=args.port, log_level='warning', backlog=4096)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+"""
+Record/replay load test of the adapter against the local mock provider.
+
+Starts benchmarks/mock_provider.py and the adapter (each serving mode asked
+for) as subprocesses, routes the adapter to the mock through LiteLLM's real
+openai/ path, and replays Gemini CLI requests into streamGenerateContent at a
+target concurrency. Runs entirely offline.
+
+Request sources (--input, repeatable):
+  - capture files or directories written by capture_store (CAPTURE=true)
+  - JSONL files of Gemini requests, or of capture records
+  - single google_request.json bodies
+With no --input, synthetic sessions from bench_translation are used.
+
+Reported per serving mode:
+  - TTFT: time to the first SSE frame, as seen by the client
+  - added: TTFT minus the mock's configured TTFT, i.e. latency the adapter adds
+  - chunks/s: SSE frames per second of each stream after its first frame
+  - CPU seconds and peak RSS of the adapter process (Linux /proc)
+
+Gates: --max-added-p99-ms and --max-error-rate make the run exit non-zero
+when exceeded, so it can guard against regressions.
+
+Usage:
+    python -m benchmarks.replay [--input debug_logs/captures] [--requests 500] [--concurrency 50]
+                                [--modes flask,asgi] [--ttft 0.2] [--rate 200] [--rate-limit 0]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+import urllib.request
+
+from benchmarks.bench_concurrency import ROOT, percentile, process_cpu_seconds
+from benchmarks.bench_translation import make_request, make_tools
+
+PORTS = {'flask': 5111, 'asgi': 5112}
+MOCK_PORT = 5201
+
+def load_requests(paths):
+    """Gemini request bodies from capture files/directories, JSONL files and JSON files"""
+    import capture_store
+
+    bodies = []
+    for path in paths:
+        if os.path.isdir(path) or path.endswith('.gz'):
+            records = capture_store.load(path)
+        elif path.endswith('.jsonl'):
+            with open(path) as f:
+                records = [json.loads(line) for line in f if line.strip()]
+        else:
+            with open(path) as f:
+                data = json.load(f)
+            records = data if isinstance(data, list) else [data]
+        for record in records:
+            if 'google_request' in record:
+                bodies.append(record['google_request'])
+            elif 'contents' in record:
+                bodies.append(record)
+    return bodies
+
+def synthetic_requests():
+    tools = make_tools(40)
+    return [make_request(turns, tools) for turns in (1, 5, 20, 50)]
+
+def wait_until_up(port, path, proc, name):
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{name} exited with code {proc.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{name} did not start on port {port}")
+
+def start_mock(args):
+    cmd = [sys.executable, "-m", "benchmarks.mock_provider", "--port", str(MOCK_PORT),
+           "--ttft", str(args.ttft), "--tokens", str(args.tokens), "--rate", str(args.rate),
+           "--tool-calls", str(args.tool_calls), "--rate-limit", str(args.rate_limit)]
+    proc = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_until_up(MOCK_PORT, "/mock/stats", proc, "mock provider")
+    return proc
+
+def start_adapter(mode, port):
+    env = dict(
+        os.environ,
+        LITELLM_LOCAL_MODEL_COST_MAP='True',
+        OPENAI_API_BASE=f"http://127.0.0.1:{MOCK_PORT}/v1",
+        OPENAI_API_KEY='mock',
+        LOG_LEVEL=os.getenv('LOG_LEVEL', 'WARNING'),
+    )
+    proc = subprocess.Popen([sys.executable, "-m", "benchmarks.serve", mode, str(port)],
+                            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_until_up(port, "/v1beta/models", proc, f"{mode} adapter")
+    return proc
+
+def process_rss_mb(pid):
+    """Resident set size of a process in MB, read from /proc (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return float('nan')
+
+async def one_request(port, path, body):
+    """Runs one streaming request over a raw socket and returns its timings"""
+    start = time.perf_counter()
+    ttfb = None
+    received = []
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('ascii') + body
+    )
+    await writer.drain()
+    while True:
+        data = await reader.read(65536)
+        if not data:
+            break
+        if ttfb is None and b'data:' in data:
+            ttfb = time.perf_counter() - start
+        received.append(data)
+    writer.close()
+    total = time.perf_counter() - start
+    response = b''.join(received)
+    status = int(response.split(b' ', 2)[1]) if response.startswith(b'HTTP/') else 0
+    return {
+        "ttfb": ttfb,
+        "total": total,
+        "frames": response.count(b'data: '),
+        "error": status != 200 or b'"error"' in response,
+    }
+
+async def run_replay(port, path, bodies, requests, concurrency, pid):
+    """Replays `requests` bodies (cycling through them) with `concurrency` in flight"""
+    results = []
+    next_index = iter(range(requests))
+    peak_rss = [process_rss_mb(pid)]
+
+    async def worker():
+        for i in next_index:
+            try:
+                results.append(await one_request(port, path, bodies[i % len(bodies)]))
+            except OSError:
+                results.append({"ttfb": None, "total": 0.0, "frames": 0, "error": True})
+
+    async def sample_rss():
+        while True:
+            peak_rss.append(process_rss_mb(pid))
+            await asyncio.sleep(0.1)
+
+    sampler = asyncio.ensure_future(sample_rss())
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    sampler.cancel()
+    return wall, results, max(peak_rss)
+
+def summarize(mode, wall, results, cpu, rss, mock_ttft):
+    ok = [r for r in results if not r["error"] and r["ttfb"] is not None]
+    ttfbs = [r["ttfb"] for r in ok]
+    added = [(r["ttfb"] - mock_ttft) * 1000 for r in ok]
+    rates = [(r["frames"] - 1) / (r["total"] - r["ttfb"]) for r in ok if r["frames"] > 1 and r["total"] > r["ttfb"]]
+    return {
+        "mode": mode,
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "error_rate": (len(results) - len(ok)) / len(results) if results else 0.0,
+        "rps": len(results) / wall if wall else 0.0,
+        "ttft_p50_ms": percentile(ttfbs, 50) * 1000,
+        "ttft_p99_ms": percentile(ttfbs, 99) * 1000,
+        "added_p50_ms": percentile(added, 50),
+        "added_p99_ms": percentile(added, 99),
+        "chunks_per_s_p50": percentile(rates, 50),
+        "cpu_s": cpu,
+        "cpu_ms_per_request": cpu * 1000 / len(results) if results else 0.0,
+        "peak_rss_mb": rss,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', action='append', default=[])
+    parser.add_argument('--model', default='openai/mock-model')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--modes', default='flask,asgi')
+    parser.add_argument('--ttft', type=float, default=0.2)
+    parser.add_argument('--tokens', type=int, default=50)
+    parser.add_argument('--rate', type=float, default=200)
+    parser.add_argument('--tool-calls', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=float, default=0.0)
+    parser.add_argument('--json', help="also write the report to this file")
+    parser.add_argument('--max-added-p99-ms', type=float)
+    parser.add_argument('--max-error-rate', type=float)
+    args = parser.parse_args()
+
+    bodies = load_requests(args.input) if args.input else synthetic_requests()
+    if not bodies:
+        parser.error("no Gemini requests found in --input")
+    encoded = [json.dumps(b).encode('utf-8') for b in bodies]
+    path = f"/v1beta/models/{args.model}:streamGenerateContent?alt=sse"
+    print(f"replaying {args.requests} requests ({len(bodies)} distinct) at concurrency {args.concurrency}")
+
+    report = []
+    mock = start_mock(args)
+    try:
+        for mode in args.modes.split(','):
+            proc = start_adapter(mode, PORTS[mode])
+            try:
+                # One warm-up request so imports and connection setup aren't measured
+                asyncio.run(one_request(PORTS[mode], path, encoded[0]))
+                cpu_before = process_cpu_seconds(proc.pid)
+                wall, results, rss = asyncio.run(run_replay(PORTS[mode], path, encoded, args.requests, args.concurrency, proc.pid))
+                cpu = process_cpu_seconds(proc.pid) - cpu_before
+            finally:
+                proc.terminate()
+                proc.wait(timeout=10)
+            report.append(summarize(mode, wall, results, cpu, rss, args.ttft))
+    finally:
+        mock.terminate()
+        mock.wait(timeout=10)
+
+    print(f"{'mode':<6} {'reqs':>5} {'errors':>6} {'rps':>7} {'ttft p50':>9} {'ttft p99':>9} "
+          f"{'added p50':>10} {'added p99':>10} {'chunks/s':>9} {'cpu ms/req':>10} {'rss MB':>7}")
+    for r in report:
+        print(f"{r['mode']:<6} {r['requests']:>5} {r['errors']:>6} {r['rps']:>7.1f} {r['ttft_p50_ms']:>9.1f} {r['ttft_p99_ms']:>9.1f} "
+              f"{r['added_p50_ms']:>10.1f} {r['added_p99_ms']:>10.1f} {r['chunks_per_s_p50']:>9.0f} "
+              f"{r['cpu_ms_per_request']:>10.2f} {r['peak_rss_mb']:>7.1f}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    failed = []
+    for r in report:
+        if args.max_added_p99_ms is not None and r['added_p99_ms'] > args.max_added_p99_ms:
+            failed.append(f"{r['mode']}: added p99 {r['added_p99_ms']:.1f} ms > {args.max_added_p99_ms} ms")
+        if args.max_error_rate is not None and r['error_rate'] > args.max_error_rate:
+            failed.append(f"{r['mode']}: error rate {r['error_rate']:.3f} > {args.max_error_rate}")
+    for message in failed:
+        print(f"FAIL {message}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
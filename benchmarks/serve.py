@@ -0,0 +1,25 @@
+"""
+Runs the adapter in a given serving mode and port, for benchmarks that need it in a subprocess.
+
+Unlike `python adapter.py`, this never enables the Flask reloader, so the
+process measured is the one serving requests.
+
+Usage:
+    python -m benchmarks.serve flask 5101
+    python -m benchmarks.serve asgi 5102
+"""
+import sys
+
+def run(mode, port):
+    if mode == 'asgi':
+        import uvicorn
+        from asgi_adapter import app
+        uvicorn.run(app, host='127.0.0.1', port=port, log_level='warning', backlog=4096)
+    else:
+        from werkzeug.serving import run_simple
+        from adapter import app, start_background
+        start_background()
+        run_simple('127.0.0.1', port, app, threaded=True)
+
+if __name__ == '__main__':
+    run(sys.argv[1], int(sys.argv[2]))
@@ -0,0 +1,63 @@
+"""
+Closing an upstream stream from another thread.
+
+The producer threads of single-flight and hedging read upstream streams that
+nobody may want any more. A generator blocked in a read can't be closed from
+another thread, so stream_frames registers the close of its upstream response
+with the current Scope instead. Scope.cancel() runs it from whichever thread
+noticed that the readers are gone, and the blocked read fails right away
+instead of at the provider's next chunk.
+
+    scope = cancel_scope.Scope()
+    context.run(cancel_scope.enter, scope)   # in the producer thread's context
+    cancel_scope.current()                   # the scope stream_frames registers with
+    scope.cancel()                           # from any thread
+"""
+import threading
+import contextvars
+
+import adapter_log
+
+_current = contextvars.ContextVar('cancel_scope', default=None)
+
+class Scope:
+    """Close callbacks of the upstream calls made on behalf of one producer"""
+
+    def __init__(self):
+        self.cancelled = False
+        self._lock = threading.Lock()
+        self._closers = []
+
+    def add(self, closer):
+        """Registers closer(); it runs at once if the scope is already cancelled"""
+        with self._lock:
+            if not self.cancelled:
+                self._closers.append(closer)
+                return
+        _run(closer)
+
+    def cancel(self):
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            closers, self._closers = self._closers, []
+        for closer in closers:
+            _run(closer)
+
+def _run(closer):
+    try:
+        closer()
+    except Exception as e:
+        adapter_log.debug("Closing upstream call failed", error=f"{type(e).__name__}: {e}")
+
+def enter(scope):
+    """Makes scope the current one of this context"""
+    _current.set(scope)
+
+def current():
+    return _current.get()
+
+def cancelled():
+    scope = _current.get()
+    return scope is not None and scope.cancelled
@@ -0,0 +1,319 @@
+"""
+Request/response capture store, replacing the four overwritten debug_logs/*.json files.
+
+Opt-in with CAPTURE=true (DEBUG_SAVE_JSON=true is still honored). Each captured
+request becomes one JSON line holding the Gemini request, the OpenAI request as
+sent (api_key excluded), the response (the non-streaming JSON or every SSE
+frame of a stream), the request id and timings. Lines are appended to gzip
+files in CAPTURE_DIR (default debug_logs/captures), rotated at CAPTURE_FILE_MB
+compressed and pruned to the newest CAPTURE_FILES.
+
+Sampling: CAPTURE_RATE (default 1.0) of requests, optionally only for target
+models starting with one of the comma separated CAPTURE_MODELS prefixes.
+
+Records are serialized and written by a background thread. At most
+CAPTURE_QUEUE records and CAPTURE_QUEUE_MB (default 64) of their estimated size
+wait for it; further ones are dropped and counted, so capturing never blocks or
+grows memory without bound.
+
+load(path) reads records back from a file or a directory of files, for replay.
+"""
+import os
+import glob
+import gzip
+import json
+import time
+import queue
+import atexit
+import random
+import threading
+
+import adapter_log
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "debug_logs", "captures")
+VALUE_OVERHEAD = 8  # bytes of JSON punctuation counted per value
+
+def record_size(record):
+    """Approximate serialized bytes of a record: its strings plus a little per value"""
+    size = 0
+    stack = [record]
+    while stack:
+        value = stack.pop()
+        size += VALUE_OVERHEAD
+        if isinstance(value, (str, bytes)):
+            size += len(value)
+        elif isinstance(value, dict):
+            size += sum(len(k) for k in value if isinstance(k, str))
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return size
+
+class Capture:
+    """One sampled request being captured; finish() hands it to the writer"""
+
+    def __init__(self, store, model, path, google_req, openai_req, started):
+        self.store = store
+        self.started = started
+        self.first_frame = None
+        self.frames = None
+        self.finished = False
+        self.record = {
+            "request_id": adapter_log.request_id(),
+            "ts": time.time(),
+            "model": model,
+            "path": path,
+            "stream": False,
+            "google_request": google_req,
+            "openai_request": {k: v for k, v in openai_req.items() if k != 'api_key'},
+            "timings": {"translate_ms": round((time.perf_counter() - started) * 1000, 3)},
+        }
+
+    def set_openai_response(self, openai_resp):
+        self.record["openai_response"] = openai_resp
+
+    def set_response(self, google_resp, source="upstream"):
+        self.record["google_response"] = google_resp
+        self.record["source"] = source
+
+    def set_error(self, e):
+        self.record["error"] = f"{type(e).__name__}: {e}"
+
+    def _on_frame(self, frame):
+        if self.first_frame is None:
+            self.first_frame = time.perf_counter()
+        self.frames.append(frame)
+
+    def _begin_stream(self, source):
+        self.record["stream"] = True
+        self.record["source"] = source
+        self.frames = self.record["frames"] = []
+
+    def _end_stream(self, completed):
+        if not completed and "error" not in self.record:
+            self.record["error"] = "client disconnected"
+        self.finish()
+
+    def record_stream(self, frames, source="upstream"):
+        """Passes SSE frames through, capturing them; upstream errors are recorded and re-raised"""
+        self._begin_stream(source)
+        completed = False
+        try:
+            for frame in frames:
+                self._on_frame(frame)
+                yield frame
+            completed = True
+        except Exception as e:
+            self.set_error(e)
+            raise
+        finally:
+            self._end_stream(completed)
+
+    async def arecord_stream(self, frames, source="upstream"):
+        """Async variant of record_stream for the ASGI serving mode"""
+        self._begin_stream(source)
+        completed = False
+        try:
+            async for frame in frames:
+                self._on_frame(frame)
+                yield frame
+            completed = True
+        except Exception as e:
+            self.set_error(e)
+            raise
+        finally:
+            self._end_stream(completed)
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        now = time.perf_counter()
+        timings = self.record["timings"]
+        timings["total_ms"] = round((now - self.started) * 1000, 3)
+        if self.first_frame is not None:
+            timings["ttfb_ms"] = round((self.first_frame - self.started) * 1000, 3)
+        self.store.submit(self.record, record_size(self.record))
+
+class CaptureStore:
+    """Background writer of gzip JSONL capture files"""
+
+    def __init__(self, directory, rate=1.0, models=(), max_file_bytes=64 * 1024 * 1024, max_files=10, max_queue=1000,
+                 max_queue_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.rate = rate
+        self.models = tuple(models)
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.max_queue_bytes = max_queue_bytes
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._queued_bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {"captured": 0, "written": 0, "dropped": 0, "errors": 0, "files": 0}
+        self._raw = None
+        self._gz = None
+        self._thread = threading.Thread(target=self._run, name="capture-writer", daemon=True)
+        self._thread.start()
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def sampled(self, model):
+        if self.models and not model.startswith(self.models):
+            return False
+        return self.rate >= 1.0 or random.random() < self.rate
+
+    def start(self, model, path, google_req, openai_req, started):
+        """A Capture for this request, or None when it isn't sampled"""
+        if not self.sampled(model):
+            return None
+        return Capture(self, model, path, google_req, openai_req, started)
+
+    def submit(self, record, size=0):
+        with self._lock:
+            if self._queued_bytes + size > self.max_queue_bytes:
+                self.counters["dropped"] += 1
+                return
+            self._queued_bytes += size
+        try:
+            self._queue.put_nowait((record, size))
+            self._count("captured")
+        except queue.Full:
+            with self._lock:
+                self._queued_bytes -= size
+                self.counters["dropped"] += 1
+
+    def _open(self):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        name = time.strftime("capture-%Y%m%d-%H%M%S") + f"-{os.getpid()}-{self.counters['files']}.jsonl.gz"
+        self._raw = open(os.path.join(self.directory, name), 'ab')
+        self._count("files")
+        # Keep only the newest max_files
+        for old in sorted(glob.glob(os.path.join(self.directory, "capture-*.jsonl.gz")), key=os.path.getmtime)[:-self.max_files]:
+            os.remove(old)
+
+    def _end_member(self):
+        """Ends the current gzip member, so everything written so far is a complete, readable file"""
+        if self._gz is not None:
+            self._gz.close()
+            self._gz = None
+            self._raw.flush()
+
+    def _close(self):
+        self._end_member()
+        if self._raw is not None:
+            self._raw.close()
+            self._raw = None
+
+    def _write(self, record):
+        line = json.dumps(record, default=str, separators=(',', ':')).encode('utf-8') + b"\n"
+        if self._raw is None:
+            self._open()
+        if self._gz is None:
+            self._gz = gzip.GzipFile(fileobj=self._raw, mode='ab')
+        self._gz.write(line)
+        if self._raw.tell() >= self.max_file_bytes:
+            self._close()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    self._close()
+                    return
+                record, size = item
+                with self._lock:
+                    self._queued_bytes -= size
+                self._write(record)
+                self._count("written")
+                if self._queue.empty():
+                    self._end_member()
+            except Exception as e:
+                self._count("errors")
+                adapter_log.warning("Capture write failed", error=f"{type(e).__name__}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Blocks until every queued record is written and flushed"""
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["queued_bytes"] = self._queued_bytes
+        stats["queued"] = self._queue.qsize()
+        stats["directory"] = self.directory
+        return stats
+
+_store = None
+_configured = False
+
+def configure(enabled=None, directory=None):
+    """(Re)creates the process-wide store from the CAPTURE* environment variables"""
+    global _store, _configured
+    if _store is not None:
+        _store.close()
+    if enabled is None:
+        enabled = (os.getenv('CAPTURE', '').lower() == 'true'
+                   or os.getenv('DEBUG_SAVE_JSON', '').lower() == 'true')
+    _configured = True
+    if not enabled:
+        _store = None
+        return None
+    models = [m.strip() for m in os.getenv('CAPTURE_MODELS', '').split(',') if m.strip()]
+    _store = CaptureStore(
+        directory or os.getenv('CAPTURE_DIR') or DEFAULT_DIR,
+        rate=float(os.getenv('CAPTURE_RATE', '1.0')),
+        models=models,
+        max_file_bytes=int(float(os.getenv('CAPTURE_FILE_MB', '64')) * 1024 * 1024),
+        max_files=int(os.getenv('CAPTURE_FILES', '10')),
+        max_queue=int(os.getenv('CAPTURE_QUEUE', '1000')),
+        max_queue_bytes=int(float(os.getenv('CAPTURE_QUEUE_MB', '64')) * 1024 * 1024),
+    )
+    return _store
+
+def get_store():
+    """Returns the process-wide store, or None when capturing is disabled"""
+    if not _configured:
+        return configure()
+    return _store
+
+def start(model, path, google_req, openai_req, started):
+    """A Capture for this request, or None when capturing is off or it isn't sampled"""
+    store = get_store()
+    if store is None:
+        return None
+    return store.start(model, path, google_req, openai_req, started)
+
+def stats():
+    store = get_store()
+    return store.stats() if store is not None else {"enabled": False}
+
+def _close_at_exit():
+    if _store is not None:
+        _store.close()
+
+atexit.register(_close_at_exit)
+
+def load(path):
+    """Yields captured records from a capture file or a directory of them, oldest first"""
+    if os.path.isdir(path):
+        files = sorted(glob.glob(os.path.join(path, "capture-*.jsonl.gz")), key=os.path.getmtime)
+    else:
+        files = [path]
+    for name in files:
+        opener = gzip.open if name.endswith('.gz') else open
+        with opener(name, 'rt', encoding='utf-8') as f:
+            try:
+                for line in f:
+                    yield json.loads(line)
+            except (EOFError, ValueError):
+                continue  # the batch the writer is still compressing
@@ -0,0 +1,66 @@
+"""
+JSON codec for request parsing, translation and response emission.
+
+Uses orjson, else msgspec, when installed, and the stdlib json module
+otherwise. JSON_CODEC=orjson|msgspec|json picks one explicitly. The fast
+codecs write compact JSON with raw UTF-8; every Gemini CLI and OpenAI client
+parses that the same as the stdlib's output.
+
+    loads(bytes or str)   -> object; invalid JSON raises ValueError
+    dumps(obj)            -> str
+    dumps_bytes(obj)      -> bytes (UTF-8)
+"""
+import os
+import json
+
+def _stdlib():
+    def dumps_bytes(obj):
+        return json.dumps(obj).encode('utf-8')
+    return "json", json.loads, json.dumps, dumps_bytes
+
+def _orjson():
+    import orjson
+    options = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj):
+        return orjson.dumps(obj, option=options).decode('utf-8')
+
+    def dumps_bytes(obj):
+        return orjson.dumps(obj, option=options)
+    # orjson.JSONDecodeError is a ValueError
+    return "orjson", orjson.loads, dumps, dumps_bytes
+
+def _msgspec():
+    import msgspec
+    encoder = msgspec.json.Encoder()
+    decoder = msgspec.json.Decoder()
+
+    def loads(data):
+        try:
+            return decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+
+    def dumps(obj):
+        return encoder.encode(obj).decode('utf-8')
+    return "msgspec", loads, dumps, encoder.encode
+
+_BACKENDS = {"orjson": _orjson, "msgspec": _msgspec, "json": _stdlib}
+
+def _select(preferred):
+    order = [preferred] if preferred in _BACKENDS else ["orjson", "msgspec"]
+    for name in order:
+        try:
+            return _BACKENDS[name]()
+        except ImportError:
+            pass
+    return _stdlib()
+
+name, loads, dumps, dumps_bytes = None, None, None, None
+
+def configure():
+    """(Re)selects the codec from JSON_CODEC"""
+    global name, loads, dumps, dumps_bytes
+    name, loads, dumps, dumps_bytes = _select(os.getenv('JSON_CODEC', '').lower())
+
+configure()
@@ -0,0 +1,245 @@
+"""
+Background conversation compaction for long agent sessions.
+
+Opt-in with COMPACTION=true. Once a translated request's history is over
+COMPACTION_TOKENS (default 32000, and at most half the routed model's input
+window), the older turns are summarized in a background thread by
+COMPACTION_MODEL (any model name the routing table accepts; default: the
+request's own model). The summary is cached under the hash of the history
+prefix it replaces, and later requests that start with that prefix get it
+spliced in instead, ahead of the user turn it precedes:
+
+    system, [summary of turns 1..k] + turn k+1, ..., latest turn
+
+The current turn never waits: until its summary is ready a request is sent
+as is (context fitting still applies). The last COMPACTION_KEEP_TURNS (default
+4) user turns stay verbatim, and the prefix only ever ends at a user turn with
+every tool call before it answered, so tool call/response pairs are never
+split. When the remaining history grows past the threshold again, the next
+summary is built from the previous one plus the turns after it. Summaries are
+requested through the admission queue of the summarizer's provider, as the
+client "compaction".
+"""
+import os
+import time
+import hashlib
+import threading
+import concurrent.futures
+
+import adapter_log
+import admission
+import context_fit
+import routing
+import token_counting
+from startup import litellm
+from translation_cache import LRUCache, content_hash
+
+SUMMARY_CACHE_BYTES = 16 * 1024 * 1024
+# Characters of one message shown to the summarizer; large tool outputs are cut
+MAX_MESSAGE_CHARS = 4000
+# Seconds before a prefix whose summary failed is tried again
+RETRY_AFTER_S = 60
+SUMMARY_PREFIX = "Summary of the earlier part of this conversation (compacted by the adapter):\n\n"
+SUMMARIZER_PROMPT = (
+    "You compress the earlier part of a conversation between a user and a coding agent. "
+    "Write a dense summary the agent can continue from: the user's goals and instructions, "
+    "decisions made, files and identifiers involved, results of tool calls that still matter, "
+    "and open tasks. Do not address the user."
+)
+
+_summaries = LRUCache(SUMMARY_CACHE_BYTES)  # prefix digest -> summary text
+_lock = threading.Lock()
+_pending = set()
+_failed = {}  # prefix digest -> monotonic time of the failure
+_digests = {}  # id(message) -> (message, digest); messages are shared with the translation cache
+_executor = None
+_counters = {"scheduled": 0, "summarized": 0, "failed": 0, "applied": 0}
+
+def enabled():
+    return os.getenv('COMPACTION', '').lower() == 'true'
+
+def threshold(route, model):
+    """History tokens above which older turns get summarized"""
+    tokens = int(os.getenv('COMPACTION_TOKENS', '32000'))
+    limits = route.limits if route.limits.get('max_input_tokens') else None
+    if limits is None:
+        limits = context_fit.get_model_limits(model)
+    if limits and limits.get('max_input_tokens'):
+        tokens = min(tokens, limits['max_input_tokens'] // 2)
+    return tokens
+
+def _digest(message):
+    entry = _digests.get(id(message))
+    if entry is not None and entry[0] is message:
+        return entry[1]
+    digest = content_hash(message)
+    if len(_digests) >= 100000:
+        _digests.clear()
+    _digests[id(message)] = (message, digest)
+    return digest
+
+def _boundaries(history):
+    """Indexes at which history may be cut: user turns with no tool call left unanswered before them"""
+    open_calls = set()
+    cuts = []
+    for i, message in enumerate(history):
+        role = message.get('role')
+        if role == 'user' and not open_calls and i > 0:
+            cuts.append(i)
+        if role == 'assistant':
+            open_calls.update(tc.get('id') for tc in message.get('tool_calls') or ())
+        elif role == 'tool':
+            open_calls.discard(message.get('tool_call_id'))
+    return cuts
+
+def _prefix_digests(history, cuts):
+    """{cut: digest of history[:cut]}, chained so each prefix costs one hash of the new messages"""
+    digests = {}
+    rolling = b''
+    position = 0
+    for cut in cuts:
+        h = hashlib.blake2b(rolling, digest_size=16)
+        for message in history[position:cut]:
+            h.update(_digest(message))
+        rolling = h.digest()
+        position = cut
+        digests[cut] = rolling
+    return digests
+
+def compact(openai_req, model, route):
+    """Returns openai_req with a cached summary spliced in, scheduling a new summary when due"""
+    if not enabled():
+        return openai_req
+    messages = openai_req['messages']
+    system = [m for m in messages[:1] if m.get('role') == 'system']
+    history = messages[len(system):]
+    cuts = _boundaries(history)
+    keep = int(os.getenv('COMPACTION_KEEP_TURNS', '4'))
+    user_turns = [i for i, m in enumerate(history) if m.get('role') == 'user']
+    if len(user_turns) <= keep:
+        return openai_req
+    # The prefix must end before the kept turns
+    latest_cut = user_turns[-keep] if keep > 0 else len(history)
+    cuts = [c for c in cuts if c <= latest_cut]
+    if not cuts:
+        return openai_req
+    digests = _prefix_digests(history, cuts)
+
+    # Longest prefix that already has a summary; only the lookup that decides counts as a hit or miss
+    summary, summarized = None, 0
+    for cut in reversed(cuts):
+        if cut == cuts[0] or _summaries.peek(digests[cut]) is not None:
+            summary = _summaries.get(digests[cut])
+            if summary is not None:
+                summarized = cut
+            break
+
+    rest = history[summarized:]
+    if summary is not None:
+        rest = [with_summary(rest[0], summary)] + rest[1:]
+    compacted = system + rest
+    tokens = token_counting.count_request_tokens(model, compacted)
+    if tokens > threshold(route, model) and cuts[-1] > summarized:
+        _schedule(digests[cuts[-1]], summary, history[summarized:cuts[-1]], model)
+
+    if summary is None:
+        return openai_req
+    with _lock:
+        _counters["applied"] += 1
+    adapter_log.info("Compacted conversation history", model=model, messages_replaced=summarized,
+                     messages_before=len(messages), messages_after=len(compacted))
+    return dict(openai_req, messages=compacted)
+
+def with_summary(message, summary):
+    """The user turn after a summarized prefix, with the summary ahead of its own content"""
+    note = SUMMARY_PREFIX + summary + "\n\n"
+    content = message.get('content')
+    if isinstance(content, list):
+        content = [{"type": "text", "text": note}] + content
+    else:
+        content = note + (content or "")
+    return dict(message, content=content)
+
+def _schedule(key, previous_summary, messages, model):
+    global _executor
+    with _lock:
+        failed_at = _failed.get(key)
+        if key in _pending or (failed_at is not None and time.monotonic() - failed_at < RETRY_AFTER_S):
+            return
+        _pending.add(key)
+        _counters["scheduled"] += 1
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=int(os.getenv('COMPACTION_WORKERS', '2')), thread_name_prefix="compaction")
+    _executor.submit(_summarize, key, previous_summary, list(messages), model)
+
+def _render(message):
+    role = message.get('role')
+    parts = []
+    content = message.get('content')
+    if isinstance(content, list):
+        parts.extend(part['text'] if part.get('type') == 'text' else f"[{part.get('type')} attachment]" for part in content)
+    elif content:
+        parts.append(content)
+    for tc in message.get('tool_calls') or ():
+        parts.append(f"[calls {tc['function']['name']}({tc['function']['arguments']})]")
+    text = "\n".join(parts)
+    if len(text) > MAX_MESSAGE_CHARS:
+        text = text[:MAX_MESSAGE_CHARS] + " ...[cut]"
+    return f"{'tool result' if role == 'tool' else role}: {text}"
+
+def summary_request(previous_summary, messages):
+    """Messages of the summarizer call: the previous summary (if any) and the turns to fold into it"""
+    transcript = "\n\n".join(_render(m) for m in messages)
+    if previous_summary is not None:
+        transcript = f"Earlier summary:\n{previous_summary}\n\nConversation since then:\n\n{transcript}"
+    return [{"role": "system", "content": SUMMARIZER_PROMPT}, {"role": "user", "content": transcript}]
+
+def _summarize(key, previous_summary, messages, model):
+    started = time.perf_counter()
+    summarizer = os.getenv('COMPACTION_MODEL') or model
+    route = routing.resolve(summarizer)
+    openai_req = {
+        'model': route.target_model,
+        'messages': summary_request(previous_summary, messages),
+        'max_tokens': int(os.getenv('COMPACTION_SUMMARY_TOKENS', '1024')),
+    }
+    if route.api_key:
+        openai_req['api_key'] = route.api_key
+
+    def complete(ticket):
+        response = litellm.completion(**openai_req, **routing.upstream_kwargs(route))
+        ticket.observe(admission.response_headers(response))
+        ticket.settle(getattr(getattr(response, 'usage', None), 'total_tokens', None))
+        return response
+    try:
+        # Queued with the interactive requests, so the provider's limits hold
+        response = admission.call(route, openai_req, "compaction", complete)
+        summary = response.choices[0].message.content
+        if not summary:
+            raise ValueError("empty summary")
+    except Exception as e:
+        adapter_log.warning("Conversation summary failed", model=route.target_model, error=f"{type(e).__name__}: {e}")
+        with _lock:
+            _pending.discard(key)
+            _failed[key] = time.monotonic()
+            _counters["failed"] += 1
+        return
+    _summaries.put(key, summary, len(summary) + 200)
+    with _lock:
+        _pending.discard(key)
+        _failed.pop(key, None)
+        _counters["summarized"] += 1
+    adapter_log.info("Summarized conversation prefix", model=route.target_model, messages=len(messages),
+                     seconds=round(time.perf_counter() - started, 3))
+
+def wait_idle(timeout=None):
+    """Blocks until no summary is being computed (for tests and benchmarks)"""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while _pending and (deadline is None or time.monotonic() < deadline):
+        time.sleep(0.01)
+    return not _pending
+
+def stats():
+    with _lock:
+        return {"enabled": enabled(), "pending": len(_pending), **_counters, "cache": _summaries.stats()}
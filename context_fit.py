@@ -0,0 +1,323 @@
+"""
+Context fitting engine: makes a translated request fit the routed model's window.
+
+Model limits come from MODEL_LIMITS (longest matching prefix, extendable with a
+JSON file named by MODEL_LIMITS_FILE) and otherwise from LiteLLM's model info.
+Token counts are real tokenizer counts, memoized per message (token_counting).
+
+When a request is over budget, the policies named in CONTEXT_FIT_POLICIES
+(default "tools,history,system") run in order until it fits:
+  tools   - keep the tool definitions most relevant to the latest user turn
+  history - truncate large tool responses, then drop the oldest turns
+  system  - truncate the system message as a last resort
+Custom policies can be added with register_policy(name, fn); a policy receives
+the FitState and shrinks it in place.
+"""
+import os
+import re
+import json
+import functools
+import threading
+
+import adapter_log
+import token_counting
+from startup import litellm
+
+# Input/output token limits by model prefix; the longest matching prefix wins
+MODEL_LIMITS = {
+    # GitHub Models cap input at 8000 tokens regardless of the underlying model
+    'github/': {'max_input_tokens': 8000, 'max_output_tokens': 4000},
+}
+
+# Fraction of the input limit kept free for tokenizer mismatch between us and the provider
+SAFETY_MARGIN = float(os.getenv('CONTEXT_FIT_MARGIN', '0.05'))
+# Tool definitions may use at most this share of the input budget
+TOOL_BUDGET_SHARE = 0.4
+# Tool responses above this share of the budget are truncated before turns are dropped
+TOOL_RESPONSE_SHARE = 0.125
+TRUNCATION_MARKER = "\n...[trimmed by adapter to fit the model context]"
+
+_limits_lock = threading.Lock()
+_limits_cache = {}
+
+def _load_limits_file():
+    path = os.getenv('MODEL_LIMITS_FILE')
+    if not path:
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        adapter_log.warning("Could not load MODEL_LIMITS_FILE", path=path, error=str(e))
+        return {}
+
+def get_model_limits(model):
+    """Returns {'max_input_tokens', 'max_output_tokens'} for model, or None if unknown"""
+    with _limits_lock:
+        if model in _limits_cache:
+            return _limits_cache[model]
+
+    table = dict(MODEL_LIMITS)
+    table.update(_load_limits_file())
+    matches = [prefix for prefix in table if model.startswith(prefix)]
+    if matches:
+        limits = table[max(matches, key=len)]
+    else:
+        try:
+            info = litellm.get_model_info(model)
+            limits = {
+                'max_input_tokens': info.get('max_input_tokens') or info.get('max_tokens'),
+                'max_output_tokens': info.get('max_output_tokens'),
+            }
+        except Exception:
+            limits = None
+        if limits and not limits['max_input_tokens']:
+            limits = None
+
+    with _limits_lock:
+        _limits_cache[model] = limits
+    return limits
+
+def text_of(message):
+    """The string content of a message ('' for None or multi-part content)"""
+    content = message.get('content')
+    return content if isinstance(content, str) else ''
+
+class FitState:
+    """A request being fitted: its messages, tools and memoized token counts"""
+
+    def __init__(self, openai_req, model, budget):
+        self.model = model
+        self.budget = budget
+        messages = openai_req.get('messages', [])
+        if messages and messages[0].get('role') == 'system':
+            self.system = messages[0]
+            self.history = messages[1:]
+        else:
+            self.system = None
+            self.history = list(messages)
+        self.tools = list(openai_req.get('tools') or [])
+        # Per-fit counts by id, so repeated passes don't go back to the memo tables
+        self._counts = {}
+
+    # Policies replace history/tools with new lists; the cached totals reset on assignment
+    @property
+    def history(self):
+        return self._history
+
+    @history.setter
+    def history(self, value):
+        self._history = value
+        self._history_total = None
+
+    @property
+    def tools(self):
+        return self._tools
+
+    @tools.setter
+    def tools(self, value):
+        self._tools = value
+        self._tools_total = None
+
+    def message_tokens(self, message):
+        key = id(message)
+        tokens = self._counts.get(key)
+        if tokens is None:
+            tokens = self._counts[key] = token_counting.count_message_tokens(self.model, message)
+        return tokens
+
+    def history_tokens(self):
+        if self._history_total is None:
+            self._history_total = sum(self.message_tokens(m) for m in self._history)
+        return self._history_total
+
+    def system_tokens(self):
+        return self.message_tokens(self.system) if self.system else 0
+
+    def tool_tokens(self, tool):
+        key = id(tool)
+        tokens = self._counts.get(key)
+        if tokens is None:
+            tokens = self._counts[key] = token_counting.count_tool_tokens(self.model, tool)
+        return tokens
+
+    def tools_tokens(self):
+        if self._tools_total is None:
+            self._tools_total = sum(self.tool_tokens(t) for t in self._tools)
+        return self._tools_total
+
+    def total_tokens(self):
+        return self.system_tokens() + self.history_tokens() + self.tools_tokens()
+
+    def fits(self):
+        return self.total_tokens() <= self.budget
+
+    def truncate(self, message, max_tokens):
+        """A copy of message with its content cut to roughly max_tokens"""
+        text = text_of(message)
+        tokens = self.message_tokens(message)
+        if not text or tokens <= max_tokens:
+            return message
+        keep_chars = max(0, int(len(text) * max_tokens / tokens) - len(TRUNCATION_MARKER))
+        return dict(message, content=text[:keep_chars] + TRUNCATION_MARKER)
+
+    def latest_user_text(self):
+        for message in reversed(self.history):
+            if message.get('role') == 'user' and text_of(message):
+                return text_of(message)
+        return ''
+
+    def to_request(self, openai_req):
+        fitted = dict(openai_req)
+        fitted['messages'] = ([self.system] if self.system else []) + self.history
+        if 'tools' in openai_req:
+            if self.tools:
+                fitted['tools'] = self.tools
+            else:
+                fitted.pop('tools')
+        return fitted
+
+WORD_RE = re.compile(r'[A-Za-z][a-z]+|[A-Z]+(?![a-z])|\d+')
+
+@functools.lru_cache(maxsize=4096)
+def words(text):
+    """Lower-cased words, splitting snake_case and camelCase identifiers"""
+    return frozenset(w.lower() for w in WORD_RE.findall(text or ''))
+
+def rank_tools(state):
+    """Orders tools by relevance to the latest user turn and to tools already used"""
+    query = words(state.latest_user_text())
+    used = set()
+    for message in state.history:
+        for tc in message.get('tool_calls') or ():
+            used.add(tc['function']['name'])
+
+    def score(tool):
+        fn = tool['function']
+        name_words = words(fn.get('name'))
+        desc_words = words(fn.get('description'))
+        s = 3 * len(query & name_words) + len(query & desc_words)
+        if fn.get('name') in used:
+            s += 2
+        return s
+
+    return sorted(state.tools, key=score, reverse=True)
+
+def keep_relevant_tools(state, tool_budget):
+    """Keeps the highest ranked tools that fit in tool_budget, in their original order"""
+    kept = set()
+    spent = 0
+    for tool in rank_tools(state):
+        tokens = state.tool_tokens(tool)
+        if spent + tokens <= tool_budget:
+            kept.add(id(tool))
+            spent += tokens
+    before = len(state.tools)
+    state.tools = [t for t in state.tools if id(t) in kept]
+    if len(state.tools) != before:
+        adapter_log.debug("Kept the tools most relevant to the latest turn", kept=len(state.tools), total=before)
+
+def tools_policy(state):
+    """Caps tool definitions at TOOL_BUDGET_SHARE of the budget, or whatever the rest leaves if more"""
+    if not state.tools:
+        return
+    other = state.system_tokens() + state.history_tokens()
+    tool_budget = max(int(state.budget * TOOL_BUDGET_SHARE), state.budget - other)
+    tool_budget = min(tool_budget, state.budget)
+    if state.tools_tokens() > tool_budget:
+        keep_relevant_tools(state, tool_budget)
+
+def history_units(history):
+    """Groups history into droppable units: an assistant tool call travels with its tool responses"""
+    units = []
+    for message in history:
+        if message.get('role') == 'tool' and units and units[-1][0].get('tool_calls'):
+            units[-1].append(message)
+        else:
+            units.append([message])
+    return units
+
+def history_policy(state):
+    """Truncates oversized tool responses (oldest first), then drops the oldest turns"""
+    total = state.total_tokens()
+
+    # 1. Large tool responses
+    cap = max(1, int(state.budget * TOOL_RESPONSE_SHARE))
+    history = list(state.history)
+    for i, message in enumerate(history):
+        if total <= state.budget:
+            break
+        if message.get('role') == 'tool':
+            tokens = state.message_tokens(message)
+            if tokens > cap:
+                history[i] = state.truncate(message, cap)
+                total += state.message_tokens(history[i]) - tokens
+    state.history = history
+    if total <= state.budget:
+        return
+
+    # 2. Oldest turns, never the latest user turn or anything after it
+    units = history_units(history)
+    last_user = max((i for i, u in enumerate(units) if u[0].get('role') == 'user'), default=len(units) - 1)
+    dropped = 0
+    while dropped < last_user and total > state.budget:
+        total -= sum(state.message_tokens(m) for m in units[dropped])
+        dropped += 1
+    # Histories should still start with a user turn
+    while dropped < last_user and units[dropped][0].get('role') != 'user':
+        dropped += 1
+    if dropped:
+        state.history = [m for unit in units[dropped:] for m in unit]
+        adapter_log.debug("Dropped oldest turns to fit context", turns=dropped, model=state.model)
+
+def system_policy(state):
+    """Truncates the system message to whatever budget the rest leaves"""
+    if not state.system:
+        return
+    available = state.budget - state.history_tokens() - state.tools_tokens()
+    state.system = state.truncate(state.system, max(available, state.budget // 10))
+    # If the system message alone can't make room, spend less on tools
+    if not state.fits() and state.tools:
+        keep_relevant_tools(state, max(0, state.budget - state.system_tokens() - state.history_tokens()))
+
+POLICIES = {
+    'tools': tools_policy,
+    'history': history_policy,
+    'system': system_policy,
+}
+
+def register_policy(name, fn):
+    """Adds or replaces a fitting policy usable in CONTEXT_FIT_POLICIES"""
+    POLICIES[name] = fn
+
+def fit_request(openai_req, model, limits=None):
+    """
+    Returns openai_req, or a fitted copy of it if it exceeds the model's input budget.
+    limits (e.g. from the routing table) take precedence over the model's known limits.
+    """
+    if not (limits and limits.get('max_input_tokens')):
+        limits = get_model_limits(model)
+    if not limits:
+        return openai_req
+
+    max_output = limits.get('max_output_tokens')
+    if max_output and openai_req.get('max_tokens', 0) > max_output:
+        openai_req = dict(openai_req, max_tokens=max_output)
+
+    budget = int(limits['max_input_tokens'] * (1 - SAFETY_MARGIN))
+    state = FitState(openai_req, model, budget)
+    before = state.total_tokens()
+    if before <= budget:
+        return openai_req
+
+    for name in os.getenv('CONTEXT_FIT_POLICIES', 'tools,history,system').split(','):
+        policy = POLICIES.get(name.strip())
+        if policy is None:
+            adapter_log.warning("Unknown context fit policy", policy=name)
+            continue
+        policy(state)
+        if state.fits():
+            break
+
+    adapter_log.info("Fitted request to model context", model=model, tokens_before=before, tokens_after=state.total_tokens(), budget=budget)
+    return state.to_request(openai_req)
@@ -0,0 +1,332 @@
+"""
+embedContent / batchEmbedContents through litellm.embedding.
+
+Requests are routed like generateContent (routing.resolve), and every input
+text goes through the same path:
+
+  cache    - vectors keyed on (target model, outputDimensionality, text hash):
+             an LRU in memory (EMBED_CACHE_MB, default 64) and optionally a
+             SQLite file (EMBED_CACHE_DB, bounded by EMBED_CACHE_DB_MB), so
+             re-embedding an unchanged document is free and survives restarts
+  batching - inputs that miss the cache are collected per (target model,
+             dimensions) for EMBED_BATCH_WINDOW_MS (default 5) after the first
+             one, and sent as one upstream call. A batch is sent as soon as it
+             holds the provider's limit (routing `embed_batch_size`, else
+             EMBED_BATCH_MAX, default 256), so larger requests are chunked.
+             Identical texts in a batch are sent once.
+
+The Gemini taskType and title fields have no equivalent in LiteLLM's
+OpenAI-style embedding call and are ignored. EMBED_CACHE=false and
+EMBED_BATCH_WINDOW_MS=0 turn the two parts off.
+"""
+import os
+import time
+import array
+import asyncio
+import weakref
+import threading
+import concurrent.futures
+
+import adapter_log
+import metrics
+import routing
+from response_cache import DiskTier
+from startup import litellm
+from translation_cache import LRUCache, content_hash
+
+class EmbedRequestError(ValueError):
+    """An invalid embedContent / batchEmbedContents request"""
+    status_code = 400
+
+def batch_window():
+    return float(os.getenv('EMBED_BATCH_WINDOW_MS', '5')) / 1000
+
+def batch_size(route):
+    limit = int(os.getenv('EMBED_BATCH_MAX', '256'))
+    return min(limit, route.embed_batch_size) if route.embed_batch_size else limit
+
+def request_text(embed_req):
+    """The text of one EmbedContentRequest"""
+    content = embed_req.get('content') or {}
+    return "".join(part.get('text', '') for part in content.get('parts') or ())
+
+class EmbeddingCache:
+    """Memory LRU plus optional SQLite tier of float64 vectors"""
+
+    def __init__(self, max_bytes, ttl, db_path=None, db_max_bytes=0):
+        self.ttl = ttl
+        self.memory = LRUCache(max_bytes)
+        self.disk = DiskTier(db_path, db_max_bytes) if db_path else None
+
+    def get(self, key):
+        payload = self.memory.get(key)
+        if payload is None and self.disk is not None:
+            payload = self.disk.get(key)
+            if payload is not None:
+                self.memory.put(key, payload, len(payload))
+        if payload is None:
+            return None
+        values = array.array('d')
+        values.frombytes(payload)
+        return values.tolist()
+
+    def put(self, key, values):
+        payload = array.array('d', values).tobytes()
+        self.memory.put(key, payload, len(payload))
+        if self.disk is not None:
+            self.disk.put(key, payload, self.ttl)
+
+    def stats(self):
+        stats = {"memory": self.memory.stats()}
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
+
+_cache = None
+_configured = False
+
+def configure(enabled=None):
+    """(Re)creates the process-wide vector cache from the EMBED_CACHE* environment variables"""
+    global _cache, _configured
+    if enabled is None:
+        enabled = os.getenv('EMBED_CACHE', 'true').lower() != 'false'
+    _configured = True
+    if not enabled:
+        _cache = None
+        return None
+    _cache = EmbeddingCache(
+        max_bytes=int(float(os.getenv('EMBED_CACHE_MB', '64')) * 1024 * 1024),
+        ttl=float(os.getenv('EMBED_CACHE_TTL', str(30 * 24 * 3600))),
+        db_path=os.getenv('EMBED_CACHE_DB') or None,
+        db_max_bytes=int(float(os.getenv('EMBED_CACHE_DB_MB', '512')) * 1024 * 1024),
+    )
+    return _cache
+
+def get_cache():
+    if not _configured:
+        return configure()
+    return _cache
+
+class Counters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values = {"requests": 0, "inputs": 0, "cache_hits": 0, "upstream_calls": 0, "upstream_inputs": 0}
+
+    def add(self, name, amount=1):
+        with self._lock:
+            self.values[name] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.values)
+
+_counters = Counters()
+
+class Batch:
+    """Distinct input texts collected for one upstream call, each with the future of its vector"""
+
+    def __init__(self, full):
+        self.futures = {}
+        self.full = full
+
+def _vectors(response, count):
+    data = sorted(response.data, key=lambda item: item['index'] if isinstance(item, dict) else item.index)
+    if len(data) != count:
+        raise ValueError(f"Provider returned {len(data)} embeddings for {count} inputs")
+    return [item['embedding'] if isinstance(item, dict) else item.embedding for item in data]
+
+def _call_kwargs(route, dimensions, texts):
+    kwargs = {'model': route.target_model, 'input': texts}
+    if route.api_key:
+        kwargs['api_key'] = route.api_key
+    if dimensions:
+        kwargs['dimensions'] = dimensions
+    return kwargs
+
+def _record_call(route, texts, started):
+    _counters.add("upstream_calls")
+    _counters.add("upstream_inputs", len(texts))
+    metrics.EMBEDDING_INPUTS.inc((route.target_model, 'upstream'), len(texts))
+    adapter_log.debug("Embedded batch", model=route.target_model, inputs=len(texts),
+                      seconds=round(time.perf_counter() - started, 3))
+
+def _settle(batch, vectors=None, error=None):
+    for i, future in enumerate(batch.futures.values()):
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(vectors[i])
+
+class MicroBatcher:
+    """Thread-based batcher for the Flask serving mode: the thread that opens a batch sends it"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._open = {}
+
+    def _add(self, key, texts, limit):
+        """Futures of texts, and the batches this caller opened and must send"""
+        futures = []
+        opened = []
+        with self._lock:
+            for text in texts:
+                batch = self._open.get(key)
+                if batch is None:
+                    batch = self._open[key] = Batch(threading.Event())
+                    opened.append(batch)
+                future = batch.futures.get(text)
+                if future is None:
+                    future = batch.futures[text] = concurrent.futures.Future()
+                    if len(batch.futures) >= limit:
+                        del self._open[key]
+                        batch.full.set()
+                futures.append(future)
+        return futures, opened
+
+    def embed(self, route, dimensions, texts):
+        key = (route.target_model, dimensions)
+        futures, opened = self._add(key, texts, batch_size(route))
+        for batch in opened:
+            batch.full.wait(batch_window())
+            with self._lock:
+                if self._open.get(key) is batch:
+                    del self._open[key]
+            sent = list(batch.futures)
+            started = time.perf_counter()
+            try:
+                response = litellm.embedding(**_call_kwargs(route, dimensions, sent), **routing.upstream_kwargs(route))
+                vectors = _vectors(response, len(sent))
+            except Exception as e:
+                _settle(batch, error=e)
+                continue
+            _settle(batch, vectors)
+            _record_call(route, sent, started)
+        return [future.result() for future in futures]
+
+class AsyncMicroBatcher:
+    """Event-loop batcher for the ASGI serving mode (one loop, no locks); batches are sent by their own tasks"""
+
+    def __init__(self):
+        self._open = {}
+
+    async def _send(self, key, batch, route, dimensions):
+        try:
+            await asyncio.wait_for(batch.full.wait(), batch_window())
+        except asyncio.TimeoutError:
+            pass
+        if self._open.get(key) is batch:
+            del self._open[key]
+        texts = list(batch.futures)
+        started = time.perf_counter()
+        try:
+            response = await litellm.aembedding(**_call_kwargs(route, dimensions, texts),
+                                                **routing.upstream_kwargs(route, is_async=True))
+            vectors = _vectors(response, len(texts))
+        except Exception as e:
+            _settle(batch, error=e)
+            return
+        _settle(batch, vectors)
+        _record_call(route, texts, started)
+
+    async def embed(self, route, dimensions, texts):
+        key = (route.target_model, dimensions)
+        limit = batch_size(route)
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            batch = self._open.get(key)
+            if batch is None:
+                batch = self._open[key] = Batch(asyncio.Event())
+                # Not tied to this request: the batch is sent even if its opener goes away
+                loop.create_task(self._send(key, batch, route, dimensions))
+            future = batch.futures.get(text)
+            if future is None:
+                future = batch.futures[text] = loop.create_future()
+                if len(batch.futures) >= limit:
+                    del self._open[key]
+                    batch.full.set()
+            futures.append(future)
+        return [await asyncio.shield(future) for future in futures]
+
+_batcher = MicroBatcher()
+_async_batchers = weakref.WeakKeyDictionary()  # event loop -> AsyncMicroBatcher
+
+def _cache_lookup(target_model, dimensions, texts):
+    """(vectors with None for misses, keys) of the input texts"""
+    cache = get_cache()
+    keys = [content_hash(target_model, dimensions, text).hex() for text in texts]
+    vectors = [cache.get(key) if cache is not None else None for key in keys]
+    hits = sum(1 for v in vectors if v is not None)
+    if hits:
+        _counters.add("cache_hits", hits)
+        metrics.EMBEDDING_INPUTS.inc((target_model, 'cache'), hits)
+    return vectors, keys
+
+def _store(vectors, keys, missing, fetched):
+    cache = get_cache()
+    for i, vector in zip(missing, fetched):
+        vectors[i] = vector
+        if cache is not None:
+            cache.put(keys[i], vector)
+    return vectors
+
+def _parse(requests, model):
+    route = routing.resolve(model)
+    dimensions = requests[0].get('outputDimensionality') if requests else None
+    if any(r.get('outputDimensionality') != dimensions for r in requests):
+        raise EmbedRequestError("All requests of a batch must have the same outputDimensionality")
+    texts = [request_text(r) for r in requests]
+    _counters.add("requests")
+    _counters.add("inputs", len(texts))
+    return route, dimensions, texts
+
+def embed(requests, model):
+    """Vectors of a list of EmbedContentRequests (Flask serving mode)"""
+    route, dimensions, texts = _parse(requests, model)
+    vectors, keys = _cache_lookup(route.target_model, dimensions, texts)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        fetched = _batcher.embed(route, dimensions, [texts[i] for i in missing])
+        _store(vectors, keys, missing, fetched)
+    return vectors
+
+async def aembed(requests, model):
+    """Vectors of a list of EmbedContentRequests (ASGI serving mode)"""
+    route, dimensions, texts = _parse(requests, model)
+    cache = get_cache()
+    # The SQLite tier is read and written off the event loop
+    on_disk = cache is not None and cache.disk is not None
+    if on_disk:
+        vectors, keys = await asyncio.to_thread(_cache_lookup, route.target_model, dimensions, texts)
+    else:
+        vectors, keys = _cache_lookup(route.target_model, dimensions, texts)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        loop = asyncio.get_running_loop()
+        batcher = _async_batchers.get(loop)
+        if batcher is None:
+            batcher = _async_batchers[loop] = AsyncMicroBatcher()
+        fetched = await batcher.embed(route, dimensions, [texts[i] for i in missing])
+        if on_disk:
+            await asyncio.to_thread(_store, vectors, keys, missing, fetched)
+        else:
+            _store(vectors, keys, missing, fetched)
+    return vectors
+
+def embed_requests(google_req, batch):
+    """The EmbedContentRequests of an embedContent (batch=False) or batchEmbedContents body"""
+    if batch:
+        requests = google_req.get('requests') or []
+        if not requests:
+            raise EmbedRequestError("batchEmbedContents needs at least one request")
+        return requests
+    return [google_req]
+
+def embed_response(vectors, batch):
+    if batch:
+        return {"embeddings": [{"values": v} for v in vectors]}
+    return {"embedding": {"values": vectors[0]}}
+
+def stats():
+    cache = get_cache()
+    return {**_counters.snapshot(), "cache": cache.stats() if cache is not None else None}
@@ -0,0 +1,269 @@
+"""
+Hedged streaming requests: race a fallback model when the primary is slow to start.
+
+Opt-in with HEDGING=true, for streamGenerateContent requests whose target model
+has fallbacks in the routing table (the `fallbacks` of ROUTING_FILE, see
+routing.py). The primary stream starts alone. If it has not produced content
+within its hedge threshold, the next fallback is started alongside it; an
+upstream error (5xx, or a 429 the primary is not retried on) starts the next
+fallback right away. The first stream to produce content wins and the others
+are cancelled: their upstream responses are closed at once (see cancel_scope). Once a stream has won, its errors are the request's errors.
+
+The threshold of a model is the HEDGE_PERCENTILE (default 90) of its recent
+upstream TTFTs, clamped to HEDGE_MIN_MS..HEDGE_MAX_MS (default 250..10000).
+Until HEDGE_MIN_SAMPLES (default 20) TTFTs were seen, HEDGE_DEFAULT_MS
+(default 3000) is used.
+"""
+import os
+import time
+import queue
+import asyncio
+import threading
+import contextvars
+import collections
+
+import adapter_log
+import cancel_scope
+import metrics
+
+WINDOW = 200
+
+HEDGES = metrics.Counter('adapter_hedges_total', 'Hedged streams by how they ended', ('model', 'outcome'))
+
+_ttfts_lock = threading.Lock()
+_ttfts = {}  # model -> recent TTFTs in seconds
+_counters_lock = threading.Lock()
+_counters = collections.Counter()
+
+def enabled():
+    return os.getenv('HEDGING', '').lower() == 'true'
+
+def record_ttft(model, seconds):
+    samples = _ttfts.get(model)
+    if samples is None:
+        with _ttfts_lock:
+            samples = _ttfts.setdefault(model, collections.deque(maxlen=WINDOW))
+    samples.append(seconds)
+
+def threshold(model):
+    """Seconds to wait for model's first chunk before hedging"""
+    low = float(os.getenv('HEDGE_MIN_MS', '250')) / 1000
+    high = float(os.getenv('HEDGE_MAX_MS', '10000')) / 1000
+    samples = sorted(_ttfts.get(model) or ())
+    if len(samples) < int(os.getenv('HEDGE_MIN_SAMPLES', '20')):
+        value = float(os.getenv('HEDGE_DEFAULT_MS', '3000')) / 1000
+    else:
+        pct = float(os.getenv('HEDGE_PERCENTILE', '90'))
+        value = samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+    return min(high, max(low, value))
+
+def _count(name):
+    with _counters_lock:
+        _counters[name] += 1
+
+def is_content(frame):
+    # SSE comment lines (keepalives) don't count as the stream having started
+    return not frame.startswith(':')
+
+def is_retriable_error(e):
+    status = getattr(e, 'status_code', None)
+    return status is None or status == 429 or status >= 500
+
+_DONE = object()
+
+class _Candidate:
+    """One model's stream, pumped into the shared event queue by its own thread"""
+
+    def __init__(self, model, make_frames, events):
+        self.model = model
+        self.make_frames = make_frames
+        self.events = events
+        self.cancelled = False
+        self.scope = cancel_scope.Scope()
+
+    def start(self):
+        # Cancelling the caller's scope (a single flight) cancels the candidates too
+        parent = cancel_scope.current()
+        if parent is not None:
+            parent.add(self.cancel)
+        context = contextvars.copy_context()
+        context.run(cancel_scope.enter, self.scope)
+        threading.Thread(target=context.run, args=(self._pump,), daemon=True).start()
+
+    def _pump(self):
+        frames = None
+        try:
+            frames = self.make_frames()
+            for frame in frames:
+                if self.cancelled:
+                    break
+                self.events.put((self, frame))
+            self.events.put((self, _DONE))
+        except Exception as e:
+            self.events.put((self, e))
+        finally:
+            if frames is not None and hasattr(frames, 'close'):
+                frames.close()
+
+    def cancel(self):
+        self.cancelled = True
+        self.scope.cancel()
+
+def _commit(primary_model, winner_is_primary, winner_model, errors, started):
+    if winner_is_primary:
+        outcome = "primary"
+    else:
+        outcome = "fallback_after_error" if errors else "fallback"
+    _count(outcome)
+    HEDGES.inc((primary_model, outcome))
+    adapter_log.info("Hedged stream committed", model=winner_model, outcome=outcome, started=started)
+
+def stream(candidates):
+    """
+    Yields the frames of the first of candidates, [(model, make_frames)], to
+    produce content; later candidates start when the earlier ones are slow or fail.
+    """
+    events = queue.Queue()
+    pending = [_Candidate(model, make_frames, events) for model, make_frames in candidates]
+    started = []
+
+    def start():
+        started.append(pending.pop(0))
+        started[-1].start()
+        # Keepalive comments don't push the hedge back: the threshold runs from the start
+        return time.monotonic() + threshold(started[-1].model)
+
+    hedge_at = start()
+    running = 1
+    errors = []
+    winner = None
+    try:
+        while winner is None:
+            timeout = max(0.0, hedge_at - time.monotonic()) if pending else None
+            try:
+                candidate, event = events.get(timeout=timeout)
+            except queue.Empty:
+                adapter_log.info("Primary slow to start, hedging", model=started[-1].model, fallback=pending[0].model)
+                _count("hedged")
+                hedge_at = start()
+                running += 1
+                continue
+            if isinstance(event, Exception) or event is _DONE:
+                running -= 1
+                if isinstance(event, Exception):
+                    errors.append(event)
+                    adapter_log.warning("Hedged stream failed", model=candidate.model, error=f"{type(event).__name__}: {event}")
+                    if pending and is_retriable_error(event):
+                        hedge_at = start()
+                        running += 1
+                if running == 0:
+                    if errors:
+                        raise errors[-1]
+                    return
+                continue
+            if not is_content(event):
+                yield event
+                continue
+            winner = candidate
+            _commit(candidates[0][0], winner is started[0], winner.model, errors, len(started))
+            for other in started:
+                if other is not winner:
+                    other.cancel()
+            yield event
+
+        while True:
+            candidate, event = events.get()
+            if candidate is not winner:
+                continue
+            if event is _DONE:
+                return
+            if isinstance(event, Exception):
+                raise event
+            yield event
+    finally:
+        for candidate in started:
+            candidate.cancel()
+
+async def astream(candidates):
+    """stream() for the ASGI mode: candidates are (model, make_async_frames) and run as tasks"""
+    events = asyncio.Queue()
+    pending = list(enumerate(candidates))
+    tasks = []
+
+    async def pump(index, make_frames):
+        frames = make_frames()
+        try:
+            async for frame in frames:
+                await events.put((index, frame))
+            await events.put((index, _DONE))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await events.put((index, e))
+        finally:
+            await frames.aclose()
+
+    def start():
+        index, (model, make_frames) = pending.pop(0)
+        tasks.append(asyncio.ensure_future(pump(index, make_frames)))
+        return model, time.monotonic() + threshold(model)
+
+    last, hedge_at = start()
+    running = 1
+    errors = []
+    winner = None
+    try:
+        while winner is None:
+            timeout = max(0.0, hedge_at - time.monotonic()) if pending else None
+            try:
+                index, event = await asyncio.wait_for(events.get(), timeout)
+            except asyncio.TimeoutError:
+                adapter_log.info("Primary slow to start, hedging", model=last, fallback=pending[0][1][0])
+                _count("hedged")
+                last, hedge_at = start()
+                running += 1
+                continue
+            if isinstance(event, Exception) or event is _DONE:
+                running -= 1
+                if isinstance(event, Exception):
+                    errors.append(event)
+                    adapter_log.warning("Hedged stream failed", model=candidates[index][0], error=f"{type(event).__name__}: {event}")
+                    if pending and is_retriable_error(event):
+                        last, hedge_at = start()
+                        running += 1
+                if running == 0:
+                    if errors:
+                        raise errors[-1]
+                    return
+                continue
+            if not is_content(event):
+                yield event
+                continue
+            winner = index
+            _commit(candidates[0][0], index == 0, candidates[index][0], errors, len(tasks))
+            for i, task in enumerate(tasks):
+                if i != winner:
+                    task.cancel()
+            yield event
+
+        while True:
+            index, event = await events.get()
+            if index != winner:
+                continue
+            if event is _DONE:
+                return
+            if isinstance(event, Exception):
+                raise event
+            yield event
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def stats():
+    with _counters_lock:
+        counts = dict(_counters)
+    return {
+        "enabled": enabled(),
+        "counts": counts,
+        "thresholds_ms": {model: round(threshold(model) * 1000, 1) for model in list(_ttfts)},
+    }
@@ -5,6 +5,12 @@ PID_FILE=".adapter.pid"
 LOG_FILE="adapter.log"
 START_SCRIPT="start.py"
 PORT=5001
+# Multi-worker mode (ADAPTER_WORKERS > 1): the supervisor's status lives here
+RUN_DIR=".adapter_run"
+# Seconds to let a supervisor drain open streams on stop (ADAPTER_DRAIN_S + margin)
+DRAIN_WAIT=${DRAIN_WAIT:-310}
+# Seconds start waits for GET /adapter/ready to answer 200
+READY_WAIT=${READY_WAIT:-60}
 
 # Find python3
 if [ -z "$PYTHON_CMD" ]; then
@@ -24,6 +30,10 @@ fi
 # Ensure we're in the script's directory
 cd "$(dirname "$0")"
 
+function supervised() {
+    [ -f "$RUN_DIR/supervisor.json" ]
+}
+
 function start() {
     if [ -f "$PID_FILE" ]; then
         PID=$(cat "$PID_FILE")
@@ -36,6 +46,9 @@ function start() {
         fi
     fi
 
+    # Status left behind by a supervisor that didn't exit cleanly
+    rm -rf "$RUN_DIR"
+
     echo "🚀 Starting Adapter..."
     # Run start.py in background, redirect output to log file
     # We use nohup to keep it running if the shell closes
@@ -44,12 +57,12 @@ function start() {
     PID=$!
     echo "$PID" > "$PID_FILE"
     
-    # Wait a moment for it to start
-    sleep 2
-    
-    if ps -p "$PID" > /dev/null 2>&1; then
-        echo "✅ Adapter started (PID: $PID)"
+    # Wait until it answers its readiness probe (LiteLLM loads after the port is up)
+    if wait_ready "$PID"; then
+        echo "✅ Adapter ready (PID: $PID)"
         echo "📄 Logs are being written to $LOG_FILE"
+    elif ps -p "$PID" > /dev/null 2>&1; then
+        echo "⚠️  Adapter started (PID: $PID) but not ready after ${READY_WAIT}s. Check $LOG_FILE."
     else
         echo "❌ Failed to start adapter. Check $LOG_FILE for details."
         rm "$PID_FILE"
@@ -57,17 +70,43 @@ function start() {
     fi
 }
 
+function wait_ready() {
+    if ! command -v curl >/dev/null 2>&1; then
+        sleep 2
+        ps -p "$1" > /dev/null 2>&1
+        return
+    fi
+    local ready_port=${ADAPTER_PORT:-$PORT}
+    local deadline=$((SECONDS + READY_WAIT))
+    while [ $SECONDS -lt $deadline ]; do
+        ps -p "$1" > /dev/null 2>&1 || return 1
+        if [ "$(curl -s -o /dev/null -w "%{http_code}" http://localhost:$ready_port/adapter/ready)" == "200" ]; then
+            return 0
+        fi
+        sleep 0.2
+    done
+    return 1
+}
+
 function stop() {
     # 1. Try stopping via PID file
     if [ -f "$PID_FILE" ]; then
         PID=$(cat "$PID_FILE")
         if ps -p "$PID" > /dev/null 2>&1; then
-            echo "🛑 Stopping Adapter (PID: $PID)..."
-            # Kill the process group to ensure children (like Flask reloader) are also killed
-            kill -TERM -"$PID" 2>/dev/null || kill -TERM "$PID"
+            WAIT=5
+            if supervised; then
+                # The supervisor drains its workers' open streams before exiting
+                echo "🛑 Stopping Adapter supervisor (PID: $PID), draining open streams..."
+                kill -TERM "$PID"
+                WAIT=$DRAIN_WAIT
+            else
+                echo "🛑 Stopping Adapter (PID: $PID)..."
+                # Kill the process group to ensure children (like Flask reloader) are also killed
+                kill -TERM -"$PID" 2>/dev/null || kill -TERM "$PID"
+            fi
             
             # Wait for it to die
-            for i in {1..5}; do
+            for i in $(seq 1 $WAIT); do
                 if ! ps -p "$PID" > /dev/null 2>&1; then
                     echo "✅ Adapter stopped"
                     rm "$PID_FILE"
@@ -80,7 +119,8 @@ function stop() {
                 echo "⚠️  Process didn't stop, force killing..."
                 kill -9 -"$PID" 2>/dev/null || kill -9 "$PID"
                 sleep 1
-                rm "$PID_FILE"
+                rm -f "$PID_FILE"
+                rm -rf "$RUN_DIR"
                 echo "✅ Adapter force stopped"
             fi
         else
@@ -100,11 +140,28 @@ function stop() {
     fi
 }
 
+function reload() {
+    if [ -f "$PID_FILE" ] && ps -p "$(cat "$PID_FILE")" > /dev/null 2>&1 && supervised; then
+        # New workers start on the same port; the old ones finish their streams, then exit
+        kill -HUP "$(cat "$PID_FILE")"
+        echo "🔄 Reload requested: new workers are starting, the previous ones drain their open streams"
+        echo "   Follow it with: $0 status"
+    else
+        echo "⚠️  Not running with multiple workers (ADAPTER_WORKERS), restarting instead"
+        stop
+        sleep 1
+        start
+    fi
+}
+
 function status() {
     if [ -f "$PID_FILE" ]; then
         PID=$(cat "$PID_FILE")
         if ps -p "$PID" > /dev/null 2>&1; then
             echo "✅ Adapter is RUNNING (PID: $PID)"
+            if supervised; then
+                $PYTHON_CMD supervisor.py status
+            fi
             return 0
         else
             echo "❌ Adapter is STOPPED (PID file exists but process is dead)"
@@ -117,6 +174,11 @@ function status() {
 }
 
 function health() {
+    if supervised; then
+        echo "🔍 Checking health of each worker..."
+        $PYTHON_CMD supervisor.py health
+        return
+    fi
     echo "🔍 Checking health on port $PORT..."
     if command -v curl >/dev/null 2>&1; then
         RESPONSE=$(curl -s -o /dev/null -w "%{http_code}" http://localhost:$PORT/v1beta/models)
@@ -149,6 +211,9 @@ case "$1" in
         sleep 1
         start
         ;;
+    reload)
+        reload
+        ;;
     status)
         status
         ;;
@@ -159,7 +224,7 @@ case "$1" in
         logs
         ;;
     *)
-        echo "Usage: $0 {start|stop|restart|status|health|logs}"
+        echo "Usage: $0 {start|stop|restart|reload|status|health|logs}"
         exit 1
         ;;
 esac
@@ -0,0 +1,240 @@
+"""
+Multimodal parts: inlineData/fileData translation and spooling of large blobs.
+
+Gemini parts become OpenAI content parts:
+  inlineData image/*        -> image_url with a data: URL
+  inlineData audio/wav, mp3 -> input_audio
+  inlineData anything else  -> file with file_data (PDFs and other documents)
+  fileData                  -> image_url (images) or file with file_id (the URI)
+
+Only Gemini and Vertex AI read a file_id that is a Gemini file URI; for other
+providers fit_capabilities turns such parts into a text note with the URI.
+
+A base64 blob of MEDIA_SPOOL_KB (default 256) or more is moved out of the
+parsed request as soon as it is parsed, into a SpooledTemporaryFile (in memory
+up to 1 MB, on disk beyond), and replaced by a short BlobRef string. The
+translation cache, token counting, captures, cache keys and logs then only
+ever see that reference; the data URL is rebuilt right before the upstream
+call (materialize) and dropped with it. Identical blobs resent on every turn
+are stored once. MEDIA_SPOOL=false keeps blobs inline.
+
+MEDIA_MAX_MB (default 50) limits the decoded media of one request; larger
+requests fail with HTTP 400. Parts a routed model is known not to accept
+(LiteLLM model info, by the part's mime type) are replaced with a short text note.
+"""
+import os
+import hashlib
+import tempfile
+import threading
+import functools
+import weakref
+
+import adapter_log
+from startup import litellm
+
+SPOOL_MEMORY_BYTES = 1024 * 1024
+# Prompt tokens assumed per media part (tokenizers only count text)
+MEDIA_PART_TOKENS = 1024
+AUDIO_FORMATS = {'audio/wav': 'wav', 'audio/x-wav': 'wav', 'audio/mpeg': 'mp3', 'audio/mp3': 'mp3'}
+# LiteLLM providers that accept a Gemini file URI as file_id
+FILE_URI_PROVIDERS = {'gemini', 'vertex_ai', 'vertex_ai_beta'}
+
+class MediaTooLarge(ValueError):
+    status_code = 400
+
+class Blob:
+    """One spooled base64 blob"""
+
+    def __init__(self, digest, encoded):
+        self.digest = digest
+        self.size = len(encoded)
+        self._lock = threading.Lock()
+        self._file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+        self._file.write(encoded)
+
+    def read(self):
+        with self._lock:
+            self._file.seek(0)
+            return self._file.read().decode('ascii')
+
+class BlobRef(str):
+    """Stands in for a spooled blob wherever the request goes; materialize() puts prefix + data back"""
+
+    def __new__(cls, blob, prefix=''):
+        ref = super().__new__(cls, f"spool:{blob.digest}:{blob.size}")
+        ref.blob = blob
+        ref.prefix = prefix
+        return ref
+
+_blobs = weakref.WeakValueDictionary()  # digest -> Blob, while anything still refers to it
+_blobs_lock = threading.Lock()
+
+def spool_enabled():
+    return os.getenv('MEDIA_SPOOL', 'true').lower() != 'false'
+
+def _spool(data):
+    encoded = data.encode('ascii')
+    digest = hashlib.blake2b(encoded, digest_size=16).hexdigest()
+    with _blobs_lock:
+        blob = _blobs.get(digest)
+        if blob is None:
+            blob = _blobs[digest] = Blob(digest, encoded)
+    return BlobRef(blob)
+
+def spool_request(google_req):
+    """
+    Replaces large inlineData blobs of a parsed request with BlobRefs, in place,
+    and enforces MEDIA_MAX_MB. Returns the number of media parts.
+    """
+    count = 0
+    total = 0
+    threshold = int(os.getenv('MEDIA_SPOOL_KB', '256')) * 1024 if spool_enabled() else None
+    for content in google_req.get('contents') or ():
+        for part in content.get('parts') or ():
+            if 'inlineData' in part:
+                inline = part['inlineData']
+                data = inline.get('data') or ''
+                count += 1
+                size = data.blob.size if isinstance(data, BlobRef) else len(data)
+                total += size * 3 // 4
+                if threshold is not None and size >= threshold and not isinstance(data, BlobRef):
+                    inline['data'] = _spool(data)
+            elif 'fileData' in part:
+                count += 1
+    limit = float(os.getenv('MEDIA_MAX_MB', '50')) * 1024 * 1024
+    if total > limit:
+        raise MediaTooLarge(f"Request media is {total / 1024 / 1024:.1f} MB, over the {limit / 1024 / 1024:.0f} MB limit")
+    return count
+
+def _data(data, prefix):
+    if isinstance(data, BlobRef):
+        return BlobRef(data.blob, prefix)
+    return prefix + data
+
+def openai_part(part):
+    """The OpenAI content part of a Gemini inlineData/fileData part, or None for other parts"""
+    if 'inlineData' in part:
+        inline = part['inlineData']
+        mime_type = inline.get('mimeType') or 'application/octet-stream'
+        data = inline.get('data') or ''
+        if mime_type.startswith('image/'):
+            return {"type": "image_url", "image_url": {"url": _data(data, f"data:{mime_type};base64,")}}
+        if mime_type in AUDIO_FORMATS:
+            return {"type": "input_audio", "input_audio": {"data": _data(data, ''), "format": AUDIO_FORMATS[mime_type]}}
+        return {"type": "file", "file": {"file_data": _data(data, f"data:{mime_type};base64,")}}
+    if 'fileData' in part:
+        file_data = part['fileData']
+        mime_type = file_data.get('mimeType') or ''
+        if mime_type.startswith('image/'):
+            return {"type": "image_url", "image_url": {"url": file_data.get('fileUri')}}
+        file = {"file_id": file_data.get('fileUri')}
+        if mime_type:
+            file["format"] = mime_type
+        return {"type": "file", "file": file}
+    return None
+
+def _file_mime_type(file):
+    if file.get('format'):
+        return file['format']
+    data = file.get('file_data') or ''
+    prefix = data.prefix if isinstance(data, BlobRef) else data
+    if not prefix.startswith('data:'):
+        return ''
+    return prefix[len('data:'):].split(';', 1)[0]
+
+def _kind(part):
+    """The capability a media part needs, None when LiteLLM has no flag for it"""
+    kind = part.get('type')
+    if kind != 'file':
+        return 'audio' if kind == 'input_audio' else 'vision'
+    mime_type = _file_mime_type(part.get('file') or {})
+    if mime_type == 'application/pdf':
+        return 'pdf'
+    return {'image': 'vision', 'audio': 'audio', 'video': 'video'}.get(mime_type.split('/', 1)[0])
+
+@functools.lru_cache(maxsize=1024)
+def _unsupported(model, kind):
+    """True when LiteLLM knows the model and doesn't list this kind of input; unknown models get everything"""
+    if kind is None:
+        return False
+    try:
+        info = litellm.get_model_info(model)
+    except Exception:
+        return False
+    key = {'vision': 'supports_vision', 'pdf': 'supports_pdf_input', 'audio': 'supports_audio_input',
+           'video': 'supports_video_input'}[kind]
+    return not info.get(key)
+
+@functools.lru_cache(maxsize=1024)
+def _reads_file_uris(model):
+    try:
+        provider = litellm.get_llm_provider(model)[1]
+    except Exception:
+        return True
+    return provider in FILE_URI_PROVIDERS
+
+def _file_uri_note(part, model):
+    """The text note replacing a file URI part, None when model can read the URI"""
+    file = part.get('file') if part.get('type') == 'file' else None
+    if not file or 'file_id' not in file or _reads_file_uris(model):
+        return None
+    return {"type": "text", "text": f"[{file.get('format') or 'file'} attachment {file['file_id']} omitted: {model} can't read file URIs]"}
+
+def fit_capabilities(openai_req, model):
+    """Replaces media parts the routed model can't accept with a text note; messages are per-request copies"""
+    for i, message in enumerate(openai_req['messages']):
+        content = message.get('content')
+        if not isinstance(content, list):
+            continue
+        kept = []
+        for part in content:
+            if part.get('type') == 'text':
+                kept.append(part)
+                continue
+            note = _file_uri_note(part, model)
+            if note is None and _unsupported(model, _kind(part)):
+                note = {"type": "text", "text": f"[{part.get('type')} attachment omitted: {model} does not accept it]"}
+            if note is not None:
+                adapter_log.debug("Dropping unsupported media part", model=model, type=part.get('type'))
+                part = note
+            kept.append(part)
+        openai_req['messages'][i] = dict(message, content=kept)
+    return openai_req
+
+def _materialize_value(value, resolved):
+    if isinstance(value, BlobRef):
+        # A blob resent on every turn is read into one string per call, not one per occurrence
+        key = (value.blob.digest, value.prefix)
+        if key not in resolved:
+            resolved[key] = value.prefix + value.blob.read()
+        return resolved[key]
+    if isinstance(value, dict):
+        return {k: _materialize_value(v, resolved) for k, v in value.items()}
+    return value
+
+def materialize(openai_req):
+    """openai_req with every BlobRef replaced by its data, for the upstream call only"""
+    messages = openai_req['messages']
+    if not any(isinstance(m.get('content'), list) for m in messages):
+        return openai_req
+    blobs = {}
+    resolved = []
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, list) and any(part.get('type') != 'text' for part in content):
+            message = dict(message, content=[_materialize_value(part, blobs) for part in content])
+        resolved.append(message)
+    return dict(openai_req, messages=resolved)
+
+def text_view(message):
+    """(message with only its text parts, number of media parts), for token counting"""
+    content = message.get('content')
+    if not isinstance(content, list):
+        return message, 0
+    text = "".join(part.get('text', '') for part in content if part.get('type') == 'text')
+    return dict(message, content=text), sum(1 for part in content if part.get('type') != 'text')
+
+def stats():
+    with _blobs_lock:
+        blobs = list(_blobs.values())
+    return {"spooled_blobs": len(blobs), "spooled_bytes": sum(b.size for b in blobs)}
@@ -0,0 +1,225 @@
+"""
+Low-overhead metrics registry served at /metrics in the Prometheus text format.
+
+Counters and histograms are labeled by target model. Every thread writes to its
+own shard (a plain dict only that thread mutates), so recording takes no lock
+and never serializes requests. A scrape sums the shards; shards of threads that
+have exited (Flask runs each request on a new thread) are folded into one
+retired shard. METRICS=false turns recording off.
+
+Recorded per target model:
+  adapter_requests_total{model,stream}        adapter_errors_total{model,kind}  (kind: rate_limit | error)
+  adapter_translation_seconds{model}          adapter_upstream_ttft_seconds{model}
+  adapter_stream_duration_seconds{model}      adapter_request_duration_seconds{model}
+  adapter_output_tokens_per_second{model}     adapter_prompt_tokens_total{model}
+  adapter_candidates_tokens_total{model}      adapter_upstream_cancelled_total{model}
+  adapter_tokens_saved_total{model}  (estimate: the model's average response length minus what was streamed)
+Admission queue metrics (per provider) are registered by admission.py.
+"""
+import os
+import bisect
+import threading
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TOKEN_RATE_BUCKETS = (1, 5, 10, 20, 35, 50, 75, 100, 150, 200, 300, 500, 1000)
+
+enabled = os.getenv('METRICS', 'true').lower() != 'false'
+
+_local = threading.local()
+_shards_lock = threading.Lock()
+_shards = []      # (thread, shard) pairs of threads that have recorded something
+_retired = {}     # merged values of exited threads
+_metrics = []
+
+def _shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = {}
+        with _shards_lock:
+            if len(_shards) >= 64:
+                _retire_dead_shards()
+            _shards.append((threading.current_thread(), shard))
+    return shard
+
+def _merge(target, shard):
+    for key, value in list(shard.items()):
+        if isinstance(value, list):
+            cell = target.get(key)
+            if cell is None:
+                target[key] = list(value)
+            else:
+                for i, v in enumerate(value):
+                    cell[i] += v
+        else:
+            target[key] = target.get(key, 0) + value
+
+def _retire_dead_shards():
+    """Folds shards of exited threads into _retired (caller holds _shards_lock)"""
+    alive = []
+    for thread, shard in _shards:
+        if thread.is_alive():
+            alive.append((thread, shard))
+        else:
+            _merge(_retired, shard)
+    _shards[:] = alive
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        _metrics.append(self)
+
+    def inc(self, labels, amount=1):
+        if not enabled:
+            return
+        shard = _shard()
+        key = (self.name, labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def samples(self, values):
+        for (name, labels), value in values:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        _metrics.append(self)
+
+    def observe(self, labels, value):
+        if not enabled:
+            return
+        shard = _shard()
+        key = (self.name, labels)
+        cell = shard.get(key)
+        if cell is None:
+            # One count per bucket plus +Inf, then the sum
+            cell = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def samples(self, values):
+        for (name, labels), cell in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), cell[:-1]):
+                cumulative += count
+                le = bound if bound == '+Inf' else _number(bound)
+                yield f"{self.name}_bucket{_labels(self.labelnames + ('le',), labels + (le,))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(cell[-1])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+class Gauge:
+    """Current values read from a callback at scrape time, {labels: value}"""
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, labelnames, collect):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.collect = collect
+        _metrics.append(self)
+
+    def samples(self, values):
+        for labels, value in sorted(self.collect().items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + '}'
+
+def snapshot():
+    """Sum of all shards, {(name, labels): value}"""
+    with _shards_lock:
+        _retire_dead_shards()
+        total = {}
+        _merge(total, _retired)
+        for _, shard in _shards:
+            _merge(total, shard)
+    return total
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    values = snapshot()
+    lines = []
+    for metric in _metrics:
+        mine = sorted((k, v) for k, v in values.items() if k[0] == metric.name)
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples(mine))
+    return "\n".join(lines) + "\n"
+
+def reset():
+    """Clears every recorded value (tests)"""
+    global _local
+    with _shards_lock:
+        _shards.clear()
+        _retired.clear()
+        _local = threading.local()
+
+REQUESTS = Counter('adapter_requests_total', 'generateContent requests by target model', ('model', 'stream'))
+ERRORS = Counter('adapter_errors_total', 'Failed requests; kind is rate_limit for upstream 429s', ('model', 'kind'))
+TRANSLATION = Histogram('adapter_translation_seconds', 'Request parsing, translation and context fitting', ('model',))
+UPSTREAM_TTFT = Histogram('adapter_upstream_ttft_seconds', 'Upstream call start to first streamed chunk', ('model',))
+STREAM_DURATION = Histogram('adapter_stream_duration_seconds', 'Streaming response duration', ('model',))
+REQUEST_DURATION = Histogram('adapter_request_duration_seconds', 'Non-streaming request duration', ('model',))
+TOKEN_RATE = Histogram('adapter_output_tokens_per_second', 'Candidate tokens per second after the first chunk', ('model',), TOKEN_RATE_BUCKETS)
+UPSTREAM_CANCELLED = Counter('adapter_upstream_cancelled_total', 'Upstream streams closed before they finished (client gone)', ('model',))
+TOKENS_SAVED = Counter('adapter_tokens_saved_total', 'Estimated output tokens not generated thanks to cancelled streams', ('model',))
+PROMPT_TOKENS = Counter('adapter_prompt_tokens_total', 'Prompt tokens reported by the provider', ('model',))
+CANDIDATE_TOKENS = Counter('adapter_candidates_tokens_total', 'Candidate tokens reported by the provider', ('model',))
+CACHED_PROMPT_TOKENS = Counter('adapter_cached_prompt_tokens_total', 'Prompt tokens the provider served from its prompt cache', ('model',))
+EMBEDDING_INPUTS = Counter('adapter_embedding_inputs_total', 'Embedding inputs by source: cache or upstream', ('model', 'source'))
+
+# Moving average of candidate tokens per response, by model; estimates what a cancelled stream would have cost
+_average_output = {}
+
+def record_usage(model, usage_meta, generation_seconds=None):
+    """Token counters (and output rate, when the generation time is known) from a Gemini usageMetadata dict"""
+    labels = (model,)
+    prompt = usage_meta.get('promptTokenCount') or 0
+    candidates = usage_meta.get('candidatesTokenCount') or 0
+    average = _average_output.get(model)
+    _average_output[model] = candidates if average is None else average * 0.9 + candidates * 0.1
+    PROMPT_TOKENS.inc(labels, prompt)
+    CANDIDATE_TOKENS.inc(labels, candidates)
+    cached = usage_meta.get('cachedContentTokenCount')
+    if cached:
+        CACHED_PROMPT_TOKENS.inc(labels, cached)
+    if generation_seconds and candidates:
+        TOKEN_RATE.observe(labels, candidates / generation_seconds)
+
+def record_cancellation(model, streamed_tokens):
+    """Counts a cancelled upstream stream and the output tokens it likely saved"""
+    labels = (model,)
+    UPSTREAM_CANCELLED.inc(labels)
+    saved = int(_average_output.get(model, 0) - streamed_tokens)
+    if saved > 0:
+        TOKENS_SAVED.inc(labels, saved)
+
+def cancellation_stats():
+    """Totals over all models, for /adapter/stats"""
+    values = snapshot()
+    return {
+        "upstream_cancelled": sum(v for (name, _), v in values.items() if name == UPSTREAM_CANCELLED.name),
+        "tokens_saved_estimate": sum(v for (name, _), v in values.items() if name == TOKENS_SAVED.name),
+    }
+
+def record_error(model, e):
+    kind = 'rate_limit' if getattr(e, 'status_code', None) == 429 else 'error'
+    ERRORS.inc((model, kind))
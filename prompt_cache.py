@@ -0,0 +1,68 @@
+"""
+Provider prompt caching: byte-stable request prefixes and cache breakpoints.
+
+Every Gemini CLI turn resends the same system instruction and tool
+declarations. Providers with automatic prefix caching (OpenAI, DeepSeek) only
+reuse a prefix that is byte-identical, so tools are sent sorted by name;
+everything else in the translation is already deterministic (memoized
+translations, insertion-ordered JSON, call ids derived from tool names).
+
+Providers that need explicit markers (routing `cache_markers`, Anthropic by
+default) get `cache_control` breakpoints, which LiteLLM passes through, on:
+  - the last tool          -> caches the tool declarations
+  - the system message     -> caches tools + system instruction
+  - the last message       -> the whole request is the prefix of the next turn
+That is three of the four breakpoints Anthropic allows.
+
+The provider's cached prompt tokens are reported as
+usageMetadata.cachedContentTokenCount and counted in metrics.
+PROMPT_CACHE=false turns off both the sorting and the markers.
+"""
+import os
+
+EPHEMERAL = {"type": "ephemeral"}
+
+def enabled():
+    return os.getenv('PROMPT_CACHE', 'true').lower() != 'false'
+
+def _tool_name(tool):
+    return tool.get('function', {}).get('name') or ''
+
+def stable_tools(tools):
+    """Tools in a deterministic order, whatever order the MCP servers registered them in"""
+    if not enabled() or not tools:
+        return tools
+    return sorted(tools, key=_tool_name)
+
+def add_breakpoints(openai_req):
+    """
+    Marks the stable prefixes of a prepared request in place. Its messages and
+    tools must be copies (build_openai_request makes them), not the shared
+    translation cache entries.
+    """
+    if not enabled():
+        return openai_req
+    tools = openai_req.get('tools')
+    if tools:
+        tools[-1]['cache_control'] = EPHEMERAL
+    messages = openai_req['messages']
+    for message in messages:
+        if message.get('role') == 'system':
+            message['cache_control'] = EPHEMERAL
+            break
+    if messages and messages[-1].get('role') != 'system':
+        messages[-1]['cache_control'] = EPHEMERAL
+    return openai_req
+
+def _get(obj, name):
+    if obj is None:
+        return None
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+def cached_tokens(usage):
+    """Prompt tokens the provider served from its cache, from a LiteLLM usage object (0 if unknown)"""
+    cached = _get(_get(usage, 'prompt_tokens_details'), 'cached_tokens')
+    if cached is None:
+        # Provider fields LiteLLM doesn't always normalize
+        cached = _get(usage, 'cache_read_input_tokens') or _get(usage, 'prompt_cache_hit_tokens')
+    return cached if isinstance(cached, int) else 0
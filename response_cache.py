@@ -0,0 +1,221 @@
+"""
+Exact-match response cache for generateContent / streamGenerateContent.
+
+Opt-in with RESPONSE_CACHE=true. Entries are keyed on the canonicalized OpenAI
+request produced by google_to_openai_request (api_key excluded) plus the
+response kind ('json' or 'stream'). Only deterministic requests are cached:
+temperature 0, or requests marked with the `X-Adapter-Cache: force` header.
+`X-Adapter-Cache: off` bypasses the cache.
+
+Streaming entries hold the exact SSE frames that were sent, including the
+usage chunk and the final functionCall chunk, and are replayed as-is.
+
+Tiers:
+  memory - LRU with TTL, bounded by RESPONSE_CACHE_MB and RESPONSE_CACHE_ENTRY_KB
+  disk   - optional SQLite file (RESPONSE_CACHE_DB), bounded by RESPONSE_CACHE_DB_MB,
+           which survives `manage_adapter.sh restart`
+"""
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+
+import codec
+from translation_cache import LRUCache
+
+CACHE_HEADER = 'X-Adapter-Cache'
+
+def cache_key(kind, openai_req):
+    """Stable key of a translated request; the API key never takes part in it"""
+    canonical = {k: v for k, v in openai_req.items() if k != 'api_key'}
+    data = json.dumps([kind, canonical], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+def is_cacheable(openai_req, headers):
+    """True for deterministic requests: temperature 0 or explicitly marked by the client"""
+    mode = (headers.get(CACHE_HEADER) or '').lower()
+    if mode == 'off':
+        return False
+    if mode == 'force':
+        return True
+    return openai_req.get('temperature') == 0
+
+class DiskTier:
+    """SQLite-backed tier shared by all threads of the process"""
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, payload BLOB NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, expires REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT payload, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < time.time():
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            return row[0]
+
+    def put(self, key, payload, ttl):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, payload, size, created, expires) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now + ttl)
+            )
+            self._db.execute("DELETE FROM responses WHERE expires < ?", (now,))
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                # Drop the oldest entries until the file is back under its cap
+                for old_key, size in self._db.execute("SELECT key, size FROM responses ORDER BY created").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                    total -= size
+            self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"path": self.path, "entries": entries, "bytes": size, "max_bytes": self.max_bytes}
+
+class ResponseCache:
+    """Two-tier cache of serialized responses"""
+
+    def __init__(self, max_bytes, ttl, max_entry_bytes, db_path=None, db_max_bytes=0):
+        self.ttl = ttl
+        self.max_entry_bytes = max_entry_bytes
+        self.memory = LRUCache(max_bytes)
+        self.disk = DiskTier(db_path, db_max_bytes) if db_path else None
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "too_large": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _memory_get(self, key):
+        entry = self.memory.get(key)
+        if entry is not None:
+            expires, payload = entry
+            if expires >= time.time():
+                self._count("hits")
+                self._count("memory_hits")
+                return payload
+            self.memory.pop(key)
+        return None
+
+    def _loaded(self, key, payload):
+        """The payload of a lookup as an object, counting a disk hit or a miss"""
+        if payload is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        self._count("disk_hits")
+        # Promote to memory with a fresh TTL
+        self.memory.put(key, (time.time() + self.ttl, payload), len(payload))
+        return codec.loads(payload)
+
+    def get(self, key):
+        """Returns the cached payload (a JSON-compatible object) or None"""
+        payload = self._memory_get(key)
+        if payload is not None:
+            return codec.loads(payload)
+        return self._loaded(key, self.disk.get(key) if self.disk is not None else None)
+
+    async def aget(self, key):
+        """get() for the ASGI mode: the disk tier is read in a worker thread"""
+        payload = self._memory_get(key)
+        if payload is not None:
+            return codec.loads(payload)
+        return self._loaded(key, await asyncio.to_thread(self.disk.get, key) if self.disk is not None else None)
+
+    def _memory_put(self, key, value):
+        """Stores value in memory; returns its payload for the disk tier, None if it is too large"""
+        payload = codec.dumps_bytes(value)
+        if len(payload) > self.max_entry_bytes:
+            self._count("too_large")
+            return None
+        self.memory.put(key, (time.time() + self.ttl, payload), len(payload))
+        self._count("stores")
+        return payload
+
+    def put(self, key, value):
+        payload = self._memory_put(key, value)
+        if payload is not None and self.disk is not None:
+            self.disk.put(key, payload, self.ttl)
+
+    async def aput(self, key, value):
+        """put() for the ASGI mode: the disk tier is written in a worker thread"""
+        payload = self._memory_put(key, value)
+        if payload is not None and self.disk is not None:
+            await asyncio.to_thread(self.disk.put, key, payload, self.ttl)
+
+    def record_stream(self, key, frames):
+        """Passes SSE frames through, storing them once the stream completes without error"""
+        recorded = []
+        for frame in frames:
+            recorded.append(frame)
+            yield frame
+        self.put(key, recorded)
+
+    async def arecord_stream(self, key, frames):
+        """Async variant of record_stream for the ASGI serving mode"""
+        recorded = []
+        async for frame in frames:
+            recorded.append(frame)
+            yield frame
+        await self.aput(key, recorded)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats["memory"] = self.memory.stats()
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
+
+_cache = None
+_configured = False
+
+def configure(enabled=None):
+    """(Re)creates the process-wide cache from the RESPONSE_CACHE* environment variables"""
+    global _cache, _configured
+    if enabled is None:
+        enabled = os.getenv('RESPONSE_CACHE', '').lower() == 'true'
+    _configured = True
+    if not enabled:
+        _cache = None
+        return None
+    _cache = ResponseCache(
+        max_bytes=int(float(os.getenv('RESPONSE_CACHE_MB', '64')) * 1024 * 1024),
+        ttl=float(os.getenv('RESPONSE_CACHE_TTL', '3600')),
+        max_entry_bytes=int(float(os.getenv('RESPONSE_CACHE_ENTRY_KB', '1024')) * 1024),
+        db_path=os.getenv('RESPONSE_CACHE_DB') or None,
+        db_max_bytes=int(float(os.getenv('RESPONSE_CACHE_DB_MB', '512')) * 1024 * 1024),
+    )
+    return _cache
+
+def get_cache():
+    """Returns the process-wide cache, or None when caching is disabled"""
+    if not _configured:
+        return configure()
+    return _cache
@@ -0,0 +1,337 @@
+"""
+Provider routing table: model name -> LiteLLM model, credentials, endpoint and limits.
+
+The table is declarative and compiled once (and again on SIGHUP): regexes are
+compiled, API keys read from the environment and every resolved model name is
+memoized, so a request pays one dict lookup instead of prefix chains and
+os.getenv calls.
+
+ROUTING_FILE names a JSON file extending the built-in table:
+  {
+    "providers": {
+      "vllm": {"api_key_env": "VLLM_API_KEY", "api_base": "http://gpu-box:8000/v1",
+               "pooled": true, "limits": {"max_input_tokens": 32000}}
+    },
+    "routes": [
+      {"prefix": "local-", "model": "openai/{rest}", "provider": "vllm"},
+      {"regex": "^llama-(?P<size>\\\\d+)b$", "model": "groq/llama3-{size}b-8192"}
+    ],
+    "fallbacks": {"groq/llama-3.3-70b-versatile": ["deepseek/deepseek-chat"]}
+  }
+Routes are tried in order, file routes first, and the first match wins.
+`model` is a template over the requested name ({model}), what follows a
+matched prefix ({rest}) and named regex groups. The provider defaults to the
+LiteLLM prefix of the resulting model. Provider entries are merged into the
+built-in ones of the same name; `limits` override the context fitting limits.
+`fallbacks` maps target model prefixes to the models hedging.py may race
+against them. Providers marked `cache_markers` (Anthropic) get explicit
+prompt-caching breakpoints (prompt_cache.py). `embed_batch_size` is the most
+inputs one embedding call of the provider may carry (embeddings.py).
+
+Providers marked `pooled` (the OpenAI-compatible ones) get one long-lived
+OpenAI SDK client per serving mode with a keep-alive connection pool
+(ROUTING_MAX_CONNECTIONS, ROUTING_KEEPALIVE_S), handed to LiteLLM with every
+call. Pools survive reloads unless the key or base URL of the provider changed;
+a replaced pool's clients are closed once nothing uses it any more (the old
+table and the requests still holding its routes are gone).
+ROUTING_WARMUP=true opens a connection to every pooled provider with a key at
+startup.
+"""
+import os
+import re
+import json
+import signal
+import asyncio
+import weakref
+import threading
+
+import httpx
+from dotenv import load_dotenv
+
+import adapter_log
+from startup import litellm
+
+# Checked after the ROUTING_FILE routes; reproduces the historical routing rules
+DEFAULT_ROUTES = [
+    # Normalize github_copilot/ to github/ for litellm
+    {"prefix": "github_copilot/", "model": "github/{rest}"},
+    # Model already has provider prefix (e.g., "deepseek/deepseek-chat")
+    {"regex": "/", "model": "{model}"},
+    # OpenAI models (gpt-4, gpt-3.5-turbo, gpt-4o-mini, o1-preview, etc.)
+    {"prefix": "gpt-", "model": "openai/{model}"},
+    {"prefix": "o1-", "model": "openai/{model}"},
+    # No prefix and not OpenAI, assume Google Gemini
+    {"prefix": "", "model": "gemini/{model}"},
+]
+
+DEFAULT_PROVIDERS = {
+    'github': {'api_key_env': 'GITHUB_API_KEY', 'pooled': True},
+    'openai': {'api_key_env': 'OPENAI_API_KEY', 'api_base_env': 'OPENAI_API_BASE', 'pooled': True,
+               'embed_batch_size': 2048},
+    'groq': {'api_key_env': 'GROQ_API_KEY', 'pooled': True},
+    'anthropic': {'api_key_env': 'ANTHROPIC_API_KEY', 'cache_markers': True},
+    'deepseek': {'api_key_env': 'DEEPSEEK_API_KEY', 'pooled': True},
+    'together_ai': {'api_key_env': 'TOGETHER_API_KEY', 'pooled': True},
+    'gemini': {'api_key_env': 'GEMINI_API_KEY', 'embed_batch_size': 100},
+}
+
+OPENAI_DEFAULT_BASE = 'https://api.openai.com/v1'
+MAX_MEMOIZED = 4096
+TIMEOUT = httpx.Timeout(600.0, connect=10.0)
+
+class Route:
+    """Where one requested model name goes"""
+    __slots__ = ('target_model', 'provider', 'api_key', 'api_base', 'limits', 'pool', 'fallbacks', 'cache_markers',
+                 'embed_batch_size')
+
+    def __init__(self, target_model, provider, api_key=None, api_base=None, limits=None, pool=None, fallbacks=(),
+                 cache_markers=False, embed_batch_size=None):
+        self.target_model = target_model
+        self.provider = provider
+        self.api_key = api_key
+        self.api_base = api_base
+        self.limits = limits or {}
+        self.pool = pool
+        self.fallbacks = fallbacks
+        self.cache_markers = cache_markers
+        self.embed_batch_size = embed_batch_size
+
+class ClientPool:
+    """Long-lived OpenAI SDK clients of one provider, sharing keep-alive connections across requests"""
+
+    def __init__(self, api_key, api_base, max_connections, keepalive, provider=None):
+        self.api_key = api_key
+        self._api_base = api_base
+        self.provider = provider
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive,
+        )
+        self._lock = threading.Lock()
+        self._sync = None
+        self._async = {}  # event loop -> client; an httpx.AsyncClient can't move between loops
+        # (loop or None, client) of every client made; closed when the pool is garbage collected
+        self._clients = []
+        # Not at exit: the process takes the connections with it, and logging may be shut down
+        weakref.finalize(self, _close_clients, self._clients).atexit = False
+
+    @property
+    def api_base(self):
+        """The configured endpoint, else LiteLLM's, looked up on first use so compiling the table doesn't import LiteLLM"""
+        if self._api_base is None:
+            self._api_base = _default_api_base(self.provider) or ''
+        return self._api_base
+
+    def sync_client(self):
+        if self._sync is None:
+            from openai import OpenAI
+            with self._lock:
+                if self._sync is None:
+                    self._sync = OpenAI(
+                        api_key=self.api_key or 'unset',
+                        base_url=self.api_base,
+                        max_retries=0,  # LiteLLM does the retrying
+                        http_client=httpx.Client(limits=self.limits, timeout=TIMEOUT),
+                    )
+                    self._clients.append((None, self._sync))
+        return self._sync
+
+    def async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async.get(loop)
+        if client is None:
+            from openai import AsyncOpenAI
+            client = self._async[loop] = AsyncOpenAI(
+                api_key=self.api_key or 'unset',
+                base_url=self.api_base,
+                max_retries=0,
+                http_client=httpx.AsyncClient(limits=self.limits, timeout=TIMEOUT),
+            )
+            self._clients.append((loop, client))
+        return client
+
+    def warm_up(self):
+        """Opens (and keeps) one connection; any HTTP answer will do"""
+        self.sync_client().with_options(max_retries=0).get('/models', cast_to=httpx.Response)
+
+    async def awarm_up(self):
+        await self.async_client().with_options(max_retries=0).get('/models', cast_to=httpx.Response)
+
+def _close_clients(clients):
+    """Closes the clients of a pool nobody uses any more; async ones on their own loop"""
+    for loop, client in clients:
+        try:
+            if loop is None:
+                client.close()
+            elif loop.is_running():
+                asyncio.run_coroutine_threadsafe(client.close(), loop)
+        except Exception as e:
+            adapter_log.debug("Closing a replaced client pool failed", error=f"{type(e).__name__}: {e}")
+    if clients:
+        adapter_log.info("Closed replaced client pool", clients=len(clients))
+
+class RoutingTable:
+    """Compiled routes and providers with a memo of resolved model names"""
+
+    def __init__(self, routes, providers, pools=None, fallbacks=None):
+        self.routes = [_compile_route(r) for r in routes]
+        self.fallbacks = dict(fallbacks or {})
+        self.providers = {}
+        previous_pools = pools or {}
+        self.pools = {}
+        max_connections = int(os.getenv('ROUTING_MAX_CONNECTIONS', '20'))
+        keepalive = float(os.getenv('ROUTING_KEEPALIVE_S', '300'))
+        for name, spec in providers.items():
+            api_key = os.getenv(spec['api_key_env']) if spec.get('api_key_env') else None
+            api_base = spec.get('api_base') or (os.getenv(spec['api_base_env']) if spec.get('api_base_env') else None)
+            pool = None
+            if spec.get('pooled'):
+                key = (name, api_key, api_base, max_connections, keepalive)
+                pool = previous_pools.get(key) or ClientPool(api_key, api_base, max_connections, keepalive, name)
+                self.pools[key] = pool
+            self.providers[name] = (api_key, api_base, spec.get('limits') or {}, pool, bool(spec.get('cache_markers')),
+                                    spec.get('embed_batch_size'))
+        self._resolved = {}
+
+    def resolve(self, model):
+        route = self._resolved.get(model)
+        if route is None:
+            route = self._match(model)
+            if len(self._resolved) >= MAX_MEMOIZED:
+                self._resolved.clear()
+            self._resolved[model] = route
+        return route
+
+    def _match(self, model):
+        for kind, pattern, template, provider in self.routes:
+            if kind == 'prefix':
+                if not model.startswith(pattern):
+                    continue
+                fields = {'rest': model[len(pattern):]}
+            else:
+                found = pattern.search(model)
+                if found is None:
+                    continue
+                fields = {'rest': model[found.end():], **found.groupdict()}
+            target_model = template.format(model=model, **fields)
+            name = provider or target_model.split('/', 1)[0]
+            api_key, api_base, limits, pool, cache_markers, embed_batch_size = self.providers.get(
+                name, (None, None, None, None, False, None))
+            return Route(target_model, name, api_key, api_base, limits, pool, self._fallbacks(target_model), cache_markers,
+                         embed_batch_size)
+        return Route(model, None)
+
+    def _fallbacks(self, target_model):
+        # Longest matching target model prefix
+        matches = [prefix for prefix in self.fallbacks if target_model.startswith(prefix)]
+        return tuple(self.fallbacks[max(matches, key=len)]) if matches else ()
+
+def _compile_route(spec):
+    if 'regex' in spec:
+        return ('regex', re.compile(spec['regex']), spec['model'], spec.get('provider'))
+    return ('prefix', spec.get('prefix', ''), spec['model'], spec.get('provider'))
+
+def _default_api_base(provider):
+    """LiteLLM's endpoint for an OpenAI-compatible provider"""
+    if provider == 'openai':
+        return OPENAI_DEFAULT_BASE
+    try:
+        return litellm.get_llm_provider(f"{provider}/model")[3]
+    except Exception:
+        return None
+
+def _load_routing_file():
+    path = os.getenv('ROUTING_FILE')
+    if not path:
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        adapter_log.warning("Could not load ROUTING_FILE", path=path, error=str(e))
+        return {}
+
+_table = None
+_configure_lock = threading.Lock()
+_reload_requested = threading.Event()
+
+def configure():
+    """(Re)compiles the routing table from the defaults, ROUTING_FILE and the environment"""
+    with _configure_lock:
+        return _configure()
+
+def _configure():
+    global _table
+    extra = _load_routing_file()
+    providers = {name: dict(spec) for name, spec in DEFAULT_PROVIDERS.items()}
+    for name, spec in extra.get('providers', {}).items():
+        providers.setdefault(name, {}).update(spec)
+    try:
+        table = RoutingTable(extra.get('routes', []) + DEFAULT_ROUTES, providers,
+                             _table.pools if _table else None, extra.get('fallbacks'))
+    except (KeyError, TypeError, re.error) as e:
+        adapter_log.error("Invalid routing table, keeping the previous one", error=f"{type(e).__name__}: {e}")
+        if _table is None:
+            _table = RoutingTable(DEFAULT_ROUTES, DEFAULT_PROVIDERS)
+        return _table
+    _table = table  # a single assignment, so requests see either the old or the new table
+    adapter_log.info("Routing table compiled", routes=len(table.routes), providers=len(table.providers))
+    return table
+
+def resolve(model):
+    """Route of the model name from the request path"""
+    return (_table or configure()).resolve(model)
+
+def upstream_kwargs(route, is_async=False):
+    """Extra litellm.completion / acompletion (or embedding) arguments for the route: its pooled client or endpoint"""
+    if route is None:
+        return {}
+    if route.pool is not None and route.pool.api_base:
+        return {'client': route.pool.async_client() if is_async else route.pool.sync_client()}
+    if route.api_base:
+        return {'api_base': route.api_base}
+    return {}
+
+def _pools_to_warm():
+    return [pool for pool in (_table or configure()).pools.values() if pool.api_key and pool.api_base]
+
+def warm_up():
+    """Opens a connection to every pooled provider that has an API key"""
+    for pool in _pools_to_warm():
+        try:
+            pool.warm_up()
+        except Exception as e:
+            adapter_log.warning("Provider warm-up failed", api_base=pool.api_base, error=f"{type(e).__name__}: {e}")
+
+async def awarm_up():
+    for pool in _pools_to_warm():
+        try:
+            await pool.awarm_up()
+        except Exception as e:
+            adapter_log.warning("Provider warm-up failed", api_base=pool.api_base, error=f"{type(e).__name__}: {e}")
+
+def warmup_enabled():
+    return os.getenv('ROUTING_WARMUP', '').lower() == 'true'
+
+def _reload(signum, frame):
+    # Only wakes the reloader: the handler interrupts the main thread wherever it is
+    _reload_requested.set()
+
+def _reloader():
+    while True:
+        _reload_requested.wait()
+        _reload_requested.clear()
+        try:
+            # Keys may have been rotated in .env as well
+            load_dotenv(override=True)
+            configure()
+        except Exception as e:
+            adapter_log.error("Routing table reload failed", error=f"{type(e).__name__}: {e}")
+
+def install_reload_handler():
+    """Recompiles the table on SIGHUP (only possible from the main thread, and not on Windows)"""
+    if hasattr(signal, 'SIGHUP') and threading.current_thread() is threading.main_thread():
+        if signal.getsignal(signal.SIGHUP) is not _reload:
+            threading.Thread(target=_reloader, name='routing-reload', daemon=True).start()
+        signal.signal(signal.SIGHUP, _reload)
@@ -0,0 +1,290 @@
+"""
+In-flight request coalescing (single-flight) for identical upstream calls.
+
+Opt-in with SINGLE_FLIGHT=true. Requests are identified by the same canonical
+key as the response cache (the translated request without api_key). While one
+upstream call for a key is running, identical requests attach to it instead of
+opening another LiteLLM call.
+
+Streaming: the upstream stream is pumped by a producer (a thread for Flask, a
+task for ASGI) into a shared frame list. Every subscriber reads the list from
+the start with its own cursor, so late joiners get the full response. A
+subscriber that disconnects only detaches itself; the upstream stream is closed
+when the last subscriber is gone, by that subscriber (see cancel_scope) rather
+than at the next upstream frame.
+"""
+import os
+import asyncio
+import threading
+import contextvars
+
+import adapter_log
+import cancel_scope
+
+class Flight:
+    """One in-flight upstream call shared by its subscribers"""
+
+    def __init__(self):
+        self.frames = []
+        self.done = False
+        self.cancelled = False
+        self.error = None
+        self.result = None
+        self.subscribers = 1
+        self.cond = threading.Condition()
+        self.scope = cancel_scope.Scope()
+        # Async flights only
+        self.changed = None
+        self.task = None
+
+class Counters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values = {"leaders": 0, "joined": 0, "cancelled": 0}
+
+    def add(self, name):
+        with self._lock:
+            self.values[name] += 1
+
+    def snapshot(self, in_flight):
+        with self._lock:
+            stats = dict(self.values)
+        stats["in_flight"] = in_flight
+        return stats
+
+class SingleFlight:
+    """Thread-based single-flight group for the Flask serving mode"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.counters = Counters()
+
+    def _attach(self, key):
+        """Returns (flight, is_leader)"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                with flight.cond:
+                    if not flight.cancelled:
+                        flight.subscribers += 1
+                        self.counters.add("joined")
+                        return flight, False
+            flight = Flight()
+            self._flights[key] = flight
+            self.counters.add("leaders")
+            return flight, True
+
+    def _finish(self, key, flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        with flight.cond:
+            flight.done = True
+            flight.cond.notify_all()
+
+    def _pump(self, key, flight, make_frames):
+        """Producer thread: copies upstream frames into the flight until done or abandoned"""
+        frames = None
+        try:
+            frames = make_frames()
+            for frame in frames:
+                with flight.cond:
+                    if flight.subscribers == 0:
+                        flight.cancelled = True
+                        break
+                    flight.frames.append(frame)
+                    flight.cond.notify_all()
+        except Exception as e:
+            flight.error = e
+        finally:
+            if flight.cancelled:
+                self.counters.add("cancelled")
+                adapter_log.info("All subscribers left, closing upstream stream")
+            if frames is not None and hasattr(frames, 'close'):
+                frames.close()
+            self._finish(key, flight)
+
+    def stream(self, key, make_frames):
+        """Yields the frames of the upstream stream for key, starting it if nobody else has"""
+        flight, leader = self._attach(key)
+        if leader:
+            # The pump runs in the leader's context, so its log events carry the leader's request id
+            context = contextvars.copy_context()
+            context.run(cancel_scope.enter, flight.scope)
+            threading.Thread(target=context.run, args=(self._pump, key, flight, make_frames), daemon=True).start()
+        else:
+            adapter_log.info("Joined in-flight stream", key=key[:12])
+        position = 0
+        try:
+            while True:
+                with flight.cond:
+                    while position >= len(flight.frames) and not flight.done:
+                        flight.cond.wait()
+                    pending = flight.frames[position:]
+                    finished = flight.done
+                position += len(pending)
+                for frame in pending:
+                    yield frame
+                if finished:
+                    break
+            if flight.error is not None:
+                raise flight.error
+        finally:
+            with flight.cond:
+                flight.subscribers -= 1
+                abandoned = flight.subscribers == 0 and not flight.done
+                if abandoned:
+                    # Nobody may join from here on; the pump counts the cancel when it ends
+                    flight.cancelled = True
+            if abandoned:
+                flight.scope.cancel()
+
+    def call(self, key, fn):
+        """Returns fn(), sharing one call among identical concurrent callers"""
+        flight, leader = self._attach(key)
+        if leader:
+            try:
+                flight.result = fn()
+            except Exception as e:
+                flight.error = e
+            finally:
+                self._finish(key, flight)
+        else:
+            adapter_log.info("Joined in-flight request", key=key[:12])
+            with flight.cond:
+                while not flight.done:
+                    flight.cond.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def stats(self):
+        return self.counters.snapshot(len(self._flights))
+
+class AsyncSingleFlight:
+    """Event-loop single-flight group for the ASGI serving mode (one loop, no locks)"""
+
+    def __init__(self):
+        self._flights = {}
+        self._calls = {}
+        self.counters = Counters()
+
+    def _attach(self, key):
+        flight = self._flights.get(key)
+        if flight is not None and not flight.cancelled:
+            flight.subscribers += 1
+            self.counters.add("joined")
+            return flight, False
+        flight = Flight()
+        flight.changed = asyncio.Event()
+        self._flights[key] = flight
+        self.counters.add("leaders")
+        return flight, True
+
+    def _notify(self, flight):
+        flight.changed.set()
+        flight.changed = asyncio.Event()
+
+    async def _pump(self, key, flight, make_frames):
+        frames = None
+        try:
+            frames = make_frames()
+            async for frame in frames:
+                flight.frames.append(frame)
+                self._notify(flight)
+        except asyncio.CancelledError:
+            flight.cancelled = True
+        except Exception as e:
+            flight.error = e
+        finally:
+            if frames is not None:
+                await frames.aclose()
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.done = True
+            self._notify(flight)
+
+    async def stream(self, key, make_frames):
+        """Async generator over the frames of the upstream stream for key"""
+        flight, leader = self._attach(key)
+        if leader:
+            flight.task = asyncio.ensure_future(self._pump(key, flight, make_frames))
+        else:
+            adapter_log.info("Joined in-flight stream", key=key[:12])
+        position = 0
+        try:
+            while True:
+                if position < len(flight.frames):
+                    frame = flight.frames[position]
+                    position += 1
+                    yield frame
+                    continue
+                if flight.done:
+                    break
+                await flight.changed.wait()
+            if flight.error is not None:
+                raise flight.error
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Nobody may join from here on: the pump only notices the cancel at its next await
+                flight.cancelled = True
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                self.counters.add("cancelled")
+                adapter_log.info("All subscribers left, closing upstream stream")
+                flight.task.cancel()
+
+    async def call(self, key, fn):
+        """Awaits fn(), sharing one call among identical concurrent callers"""
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+
+            def forget(done, key=key):
+                if self._calls.get(key) is done:
+                    del self._calls[key]
+            future.add_done_callback(forget)
+            self.counters.add("leaders")
+        else:
+            adapter_log.info("Joined in-flight request", key=key[:12])
+            self.counters.add("joined")
+        # Shielded, so one caller going away doesn't cancel the call for the others
+        return await asyncio.shield(future)
+
+    def stats(self):
+        return self.counters.snapshot(len(self._flights) + len(self._calls))
+
+_flights = None
+_async_flights = None
+
+def enabled():
+    return os.getenv('SINGLE_FLIGHT', '').lower() == 'true'
+
+def get_flights():
+    """The process-wide thread-based group, or None when single-flight is disabled"""
+    global _flights
+    if not enabled():
+        return None
+    if _flights is None:
+        _flights = SingleFlight()
+    return _flights
+
+def get_async_flights():
+    """The process-wide event-loop group, or None when single-flight is disabled"""
+    global _async_flights
+    if not enabled():
+        return None
+    if _async_flights is None:
+        _async_flights = AsyncSingleFlight()
+    return _async_flights
+
+def stats():
+    result = {"enabled": enabled()}
+    if _flights is not None:
+        result["threads"] = _flights.stats()
+    if _async_flights is not None:
+        result["async"] = _async_flights.stats()
+    return result
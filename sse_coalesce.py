@@ -0,0 +1,160 @@
+"""
+Streaming output stage: text frames from a precomputed template, and optional
+coalescing of small text deltas into fewer SSE frames.
+
+Opt-in with SSE_COALESCE_MS (default 0, off). While text deltas arrive less
+than SSE_COALESCE_MS apart, they are merged into one frame until it has been
+held that long or holds SSE_COALESCE_BYTES (default 1024) characters of text.
+The first text of a stream always goes out at once, so TTFT is unchanged, and
+any other frame (tool call, finish, usage) flushes the held text first, so the
+frame order is kept. Held text goes out when its window ends even if no
+upstream chunk follows: timed() and atimed() wake the stream up at that point.
+"""
+import os
+import time
+import queue
+import asyncio
+import threading
+import contextvars
+
+import codec
+
+_MARKER = "\x00text\x00"
+_templates = {}  # codec name -> (head, tail) of a text frame around its JSON string
+
+def _template():
+    template = _templates.get(codec.name)
+    if template is None:
+        frame = "data: " + codec.dumps({"candidates": [{"content": {"parts": [{"text": _MARKER}], "role": "model"}, "index": 0}]}) + "\n\n"
+        head, tail = frame.split(codec.dumps(_MARKER))
+        template = _templates[codec.name] = (head, tail)
+    return template
+
+def text_frame(text):
+    """The SSE frame of a text delta, identical to sse_frame() of the equivalent chunk dict"""
+    head, tail = _template()
+    return head + codec.dumps(text) + tail
+
+def window():
+    """(seconds, characters) of the coalescing window; seconds is 0 when coalescing is off"""
+    return float(os.getenv('SSE_COALESCE_MS', '0')) / 1000, int(os.getenv('SSE_COALESCE_BYTES', '1024'))
+
+def new_coalescer():
+    """A Coalescer for one stream, or None when coalescing is off"""
+    seconds, max_chars = window()
+    return Coalescer(seconds, max_chars) if seconds > 0 else None
+
+class Coalescer:
+    """Merges the text deltas of one stream"""
+
+    def __init__(self, seconds, max_chars):
+        self.seconds = seconds
+        self.max_chars = max_chars
+        self.texts = []
+        self.size = 0
+        self.held_since = None
+        self.last_arrival = None
+
+    def add(self, text, now=None):
+        """Frames to send for a text delta: none while it is held"""
+        now = time.perf_counter() if now is None else now
+        last, self.last_arrival = self.last_arrival, now
+        if last is None or (not self.texts and now - last >= self.seconds):
+            # First text, or a slow stream: nothing to wait for
+            return [text_frame(text)]
+        if not self.texts:
+            self.held_since = now
+        self.texts.append(text)
+        self.size += len(text)
+        if self.size >= self.max_chars or now - self.held_since >= self.seconds:
+            return self.flush()
+        return []
+
+    def deadline(self):
+        """perf_counter() time at which the held text is due, None when nothing is held"""
+        return self.held_since + self.seconds if self.texts else None
+
+    def flush(self):
+        """The held text as one frame, if any"""
+        if not self.texts:
+            return []
+        frame = text_frame("".join(self.texts))
+        self.texts = []
+        self.size = 0
+        return [frame]
+
+_END = object()
+
+def _timeout(coalescer):
+    deadline = coalescer.deadline()
+    return None if deadline is None else max(0.0, deadline - time.perf_counter())
+
+def timed(chunks, coalescer):
+    """
+    The upstream chunks, with None whenever the coalescer's held text is due
+    before the next chunk arrived. The chunks themselves unless coalescing.
+    """
+    return chunks if coalescer is None else _timed(chunks, coalescer)
+
+def _timed(chunks, coalescer):
+    events = queue.SimpleQueue()
+    stopped = threading.Event()
+
+    def read():
+        try:
+            for chunk in chunks:
+                if stopped.is_set():
+                    return
+                events.put((chunk, None))
+            events.put((_END, None))
+        except Exception as e:
+            events.put((None, e))
+    threading.Thread(target=contextvars.copy_context().run, args=(read,), daemon=True).start()
+    try:
+        while True:
+            try:
+                chunk, error = events.get(timeout=_timeout(coalescer))
+            except queue.Empty:
+                yield None
+                continue
+            if error is not None:
+                raise error
+            if chunk is _END:
+                return
+            yield chunk
+    finally:
+        stopped.set()
+
+def atimed(chunks, coalescer):
+    """timed() for the ASGI mode: the next chunk is awaited without being cancelled at the deadline"""
+    return chunks if coalescer is None else _atimed(chunks, coalescer)
+
+async def _atimed(chunks, coalescer):
+    iterator = chunks.__aiter__()
+
+    async def next_chunk():
+        try:
+            return await iterator.__anext__()
+        except StopAsyncIteration:
+            return _END
+    pending = None
+    try:
+        while True:
+            timeout = _timeout(coalescer)
+            if pending is None and timeout is None:
+                # Nothing held: no deadline to wake up for
+                chunk = await next_chunk()
+            else:
+                if pending is None:
+                    pending = asyncio.ensure_future(next_chunk())
+                done, _ = await asyncio.wait((pending,), timeout=timeout)
+                if not done:
+                    yield None
+                    continue
+                chunk, pending = pending.result(), None
+            if chunk is _END:
+                return
+            yield chunk
+    finally:
+        if pending is not None:
+            pending.cancel()
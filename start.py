@@ -38,8 +38,16 @@ def main():
         if value:
             os.environ[key] = value
     
+    # Pick the serving mode: the Flask dev server (default) or the async ASGI server
+    server_mode = os.getenv("ADAPTER_SERVER", "flask").lower()
+    script_name = "asgi_adapter.py" if server_mode == "asgi" else "adapter.py"
+
+    # Several workers run under the supervisor, which shares the port between them
+    if os.getenv("ADAPTER_WORKERS", "1").lower() != "1":
+        script_name = "supervisor.py"
+    
     # Path to the adapter script
-    adapter_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "adapter.py")
+    adapter_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), script_name)
     
     # Run the adapter
     # We use os.execv to replace the current process with the adapter process.
@@ -0,0 +1,126 @@
+"""
+Fast cold start: the adapter listens before LiteLLM is imported.
+
+Importing litellm takes seconds (it pulls in every provider module), so no
+module imports it at load time. They use the `litellm` proxy from here, which
+imports the real module on first attribute access and then forwards to it, so
+litellm.completion is looked up on every call, exactly like a plain import.
+
+begin() starts a background thread that imports litellm and, with
+ROUTING_WARMUP=true, opens the provider connections; the port is already
+listening meanwhile. LITELLM_PRELOAD=false skips the background import and the
+first request pays for it instead (and the adapter counts as ready without
+it). ready() is what /adapter/ready reports: 200 once upstream clients are
+usable, 503 before. The server entry points call begin(), never an import: the
+ASGI lifespan warms its providers on the event loop instead, and calls
+warm_done() when that finishes.
+
+    from startup import litellm   # drop-in for `import litellm`
+    startup.on_load(fn)           # fn(module) right after the import
+    startup.begin(warm_up=None)   # background import; warm_up() runs after it
+    startup.begin(warming=True)   # the caller warms up and then calls warm_done()
+    startup.readiness()           # {"ready": ..., "litellm_loaded": ..., ...}
+"""
+import os
+import time
+import threading
+import importlib
+
+import adapter_log
+
+STARTED = time.monotonic()
+
+_lock = threading.Lock()
+_module = None
+_hooks = []
+_state = {"litellm_load_s": None, "warm": True, "ready_s": None}
+
+def load():
+    """The litellm module, importing it (once, whichever thread asks first) if needed"""
+    global _module
+    if _module is None:
+        with _lock:
+            if _module is None:
+                start = time.monotonic()
+                module = importlib.import_module('litellm')
+                for hook in _hooks:
+                    hook(module)
+                _module = module
+                _state["litellm_load_s"] = round(time.monotonic() - start, 3)
+                adapter_log.info("LiteLLM loaded", seconds=_state["litellm_load_s"])
+                _mark_ready()
+    return _module
+
+def loaded():
+    return _module is not None
+
+def on_load(hook):
+    """Runs hook(litellm) when it is imported, or now if it already is"""
+    _hooks.append(hook)
+    if _module is not None:
+        hook(_module)
+    return hook
+
+class _LazyModule:
+    """Stands in for the litellm module until its first use"""
+
+    def __getattr__(self, name):
+        return getattr(load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(load(), name, value)
+
+    def __repr__(self):
+        return f"<lazy module 'litellm' ({'loaded' if loaded() else 'not loaded'})>"
+
+litellm = _LazyModule()
+
+def preload_enabled():
+    return os.getenv('LITELLM_PRELOAD', 'true').lower() != 'false'
+
+def begin(warm_up=None, warming=False):
+    """Loads litellm and then runs warm_up() in a background thread"""
+    _state["warm"] = warm_up is None and not warming
+    if not preload_enabled() and warm_up is None:
+        _mark_ready()
+        return None
+
+    def run():
+        if preload_enabled():
+            try:
+                load()
+            except Exception as e:
+                adapter_log.error("LiteLLM import failed", error=f"{type(e).__name__}: {e}")
+                return
+        if warm_up is not None:
+            try:
+                warm_up()
+            finally:
+                warm_done()
+
+    thread = threading.Thread(target=run, name="startup", daemon=True)
+    thread.start()
+    return thread
+
+def warm_done():
+    """Marks the provider warm-up as finished (ASGI mode runs it on the event loop)"""
+    _state["warm"] = True
+    _mark_ready()
+
+def _mark_ready():
+    if _state["ready_s"] is None and _state["warm"] and (_module is not None or not preload_enabled()):
+        _state["ready_s"] = round(time.monotonic() - STARTED, 3)
+
+def ready():
+    return _state["ready_s"] is not None
+
+def readiness():
+    """Served at /adapter/ready"""
+    return {
+        "ready": ready(),
+        "litellm_loaded": loaded(),
+        "providers_warm": _state["warm"],
+        "litellm_load_s": _state["litellm_load_s"],
+        "ready_after_s": _state["ready_s"],
+        "uptime_s": round(time.monotonic() - STARTED, 3),
+    }
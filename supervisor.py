@@ -0,0 +1,520 @@
+"""
+Multi-worker serving: a supervisor process and N adapter workers on one port.
+
+start.py runs this instead of a single adapter process when ADAPTER_WORKERS is
+more than 1, or `auto` (one worker per CPU core). The supervisor binds
+ADAPTER_HOST:ADAPTER_PORT (default 0.0.0.0:5001) once and hands the listening
+socket to every worker, which serves it with the server of ADAPTER_SERVER
+(flask or asgi); the kernel spreads new connections over the workers.
+
+- A worker that exits is started again, with a growing delay while it keeps
+  crashing right after start.
+- Every ADAPTER_HEALTH_INTERVAL_S (default 5) each worker is probed on its own
+  private port (GET /adapter/ready); one failing ADAPTER_HEALTH_FAILURES
+  (default 3) probes in a row, or not ready within ADAPTER_STARTUP_S (default
+  60), is replaced. A worker only starts taking connections from the shared
+  socket once it is ready, so the others serve them meanwhile.
+- SIGHUP reloads without downtime: .env is re-read and a new generation of
+  workers is started. Once all of them answer their probe, the old workers stop
+  accepting and exit when their open requests, SSE streams included, are done,
+  or after ADAPTER_DRAIN_S (default 300). If the new generation doesn't come
+  up, the old one keeps serving.
+- SIGTERM/SIGINT drain every worker the same way, then exit.
+
+Workers write their load (active requests, open streams, totals, RSS) to
+ADAPTER_RUN_DIR (default .adapter_run) every second, which
+`python supervisor.py status` and `python supervisor.py health` report.
+
+Usage:
+    python supervisor.py [run|status|health]
+"""
+import os
+import sys
+import json
+import glob
+import time
+import signal
+import socket
+import threading
+import subprocess
+import urllib.request
+import concurrent.futures
+
+from dotenv import load_dotenv
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HEALTH_PATH = "/adapter/ready"
+
+def worker_count():
+    value = os.getenv('ADAPTER_WORKERS', '1').lower()
+    if value == 'auto':
+        return os.cpu_count() or 1
+    return max(1, int(value))
+
+def server_mode():
+    return os.getenv('ADAPTER_SERVER', 'flask').lower()
+
+def run_dir():
+    return os.getenv('ADAPTER_RUN_DIR', os.path.join(HERE, '.adapter_run'))
+
+def drain_seconds():
+    return float(os.getenv('ADAPTER_DRAIN_S', '300'))
+
+def log(message, **fields):
+    # The supervisor doesn't import the adapter, so it logs in adapter_log's text format itself
+    details = " ".join(f"{k}={v}" for k, v in fields.items())
+    print(f"INFO: [supervisor] {message} {details}".rstrip(), flush=True)
+
+def write_json(path, payload):
+    """Replaces path atomically, so readers never see a partial file"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(payload, f)
+    os.replace(tmp, path)
+
+def read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def rss_mb():
+    """Resident set size of this process in MB (Linux; 0 elsewhere)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+def probe(port, timeout=5):
+    """True if the worker behind port answers its health request"""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}{HEALTH_PATH}", timeout=timeout) as response:
+            return response.status == 200
+    except Exception:
+        return False
+
+# ---- Worker side ----
+
+class Load:
+    """In-flight counters of one worker, kept by its WSGI or ASGI middleware"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.streams = 0
+        self.requests = 0
+        self.draining = False
+
+    def begin(self):
+        with self.lock:
+            self.active += 1
+            self.requests += 1
+
+    def stream_started(self):
+        with self.lock:
+            self.streams += 1
+
+    def end(self, streaming):
+        with self.lock:
+            self.active -= 1
+            if streaming:
+                self.streams -= 1
+
+    def snapshot(self):
+        with self.lock:
+            return {"active": self.active, "streams": self.streams, "requests": self.requests, "draining": self.draining}
+
+    def wsgi(self, app):
+        from werkzeug.wsgi import ClosingIterator
+
+        def middleware(environ, start_response):
+            self.begin()
+            streaming = []
+
+            def tracking_start_response(status, headers, exc_info=None):
+                if not streaming and any(k.lower() == 'content-type' and v.startswith('text/event-stream') for k, v in headers):
+                    streaming.append(True)
+                    self.stream_started()
+                return start_response(status, headers, exc_info)
+            try:
+                body = app(environ, tracking_start_response)
+            except BaseException:
+                self.end(bool(streaming))
+                raise
+            # The server closes the body when the response is done, or the client went away
+            return ClosingIterator(body, lambda: self.end(bool(streaming)))
+        return middleware
+
+    def asgi(self, app, untracked_port=None):
+        async def middleware(scope, receive, send):
+            if scope['type'] != 'http' or (scope.get('server') or (None, None))[1] == untracked_port:
+                return await app(scope, receive, send)
+            self.begin()
+            streaming = False
+
+            async def tracking_send(message):
+                nonlocal streaming
+                if message['type'] == 'http.response.start' and any(
+                        k.lower() == b'content-type' and v.startswith(b'text/event-stream') for k, v in message.get('headers', [])):
+                    streaming = True
+                    self.stream_started()
+                await send(message)
+            try:
+                await app(scope, receive, tracking_send)
+            finally:
+                self.end(streaming)
+        return middleware
+
+def report_load(path, info, load, stopped):
+    """Writes this worker's status file every second"""
+    while not stopped.is_set():
+        write_json(path, dict(info, **load.snapshot(), rss_mb=round(rss_mb(), 1), heartbeat=time.time()))
+        stopped.wait(1)
+
+def wait_until_ready(deadline):
+    import startup
+    while not startup.ready() and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+def wait_until_idle(load, deadline):
+    while load.snapshot()["active"] > 0 and time.monotonic() < deadline:
+        time.sleep(0.1)
+
+def serve_flask(listener, load, report):
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    from adapter import app, start_background
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    host, port = listener.getsockname()[:2]
+    server = make_server(host, port, load.wsgi(app), threaded=True, fd=listener.fileno())
+    # Probes come in on a private port, so they reach this worker and don't count as load
+    health = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=health.serve_forever, name="health", daemon=True).start()
+    report(health.socket.getsockname()[1])
+    start_background()
+    wait_until_ready(time.monotonic() + float(os.getenv('ADAPTER_STARTUP_S', '60')))
+
+    def drain(signum, frame):
+        load.draining = True
+        threading.Thread(target=server.shutdown, daemon=True).start()
+    signal.signal(signal.SIGTERM, drain)
+    signal.signal(signal.SIGINT, drain)
+
+    server.serve_forever()
+    # Stop accepting: the other workers keep the shared socket open
+    server.server_close()
+    listener.close()
+    wait_until_idle(load, time.monotonic() + drain_seconds())
+
+def serve_asgi(listener, load, report):
+    import uvicorn
+    import asgi_adapter
+    health = socket.create_server(('127.0.0.1', 0))
+    health_port = health.getsockname()[1]
+
+    class Server(uvicorn.Server):
+        def handle_exit(self, sig, frame):
+            load.draining = True
+            super().handle_exit(sig, frame)
+
+    config = uvicorn.Config(load.asgi(asgi_adapter.app, untracked_port=health_port), log_level='warning', lifespan='on',
+                            timeout_graceful_shutdown=drain_seconds())
+    report(health_port)
+    # The lifespan startup waits until ready: uvicorn only accepts after it
+    asgi_adapter.wait_ready_at_startup = True
+    # uvicorn stops accepting on SIGTERM and waits for open connections, up to the drain timeout
+    Server(config).run(sockets=[listener, health])
+
+def run_worker():
+    listener = socket.socket(fileno=int(os.environ['ADAPTER_LISTEN_FD']))
+    load = Load()
+    path = os.path.join(run_dir(), f"worker-{os.getpid()}.json")
+    info = {"pid": os.getpid(), "slot": int(os.environ.get('ADAPTER_WORKER_SLOT', '0')),
+            "generation": int(os.environ.get('ADAPTER_GENERATION', '1')), "started": time.time()}
+
+    stopped = threading.Event()
+    reporter = threading.Thread(target=report_load, args=(path, info, load, stopped), name="load-report", daemon=True)
+
+    def report(health_port):
+        info["health_port"] = health_port
+        reporter.start()
+    try:
+        if server_mode() == 'asgi':
+            serve_asgi(listener, load, report)
+        else:
+            serve_flask(listener, load, report)
+    finally:
+        stopped.set()
+        if reporter.is_alive():
+            reporter.join(2)
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+# ---- Supervisor side ----
+
+class Worker:
+    def __init__(self, slot, generation, proc):
+        self.slot = slot
+        self.generation = generation
+        self.proc = proc
+        self.started = time.monotonic()
+        self.failures = 0
+        self.ready = False
+        self.retire_deadline = None
+
+    @property
+    def pid(self):
+        return self.proc.pid
+
+    def status(self):
+        return read_json(os.path.join(run_dir(), f"worker-{self.pid}.json"))
+
+    def health_port(self):
+        status = self.status()
+        return status.get("health_port") if status else None
+
+class Supervisor:
+    def __init__(self):
+        self.count = worker_count()
+        self.host = os.getenv('ADAPTER_HOST', '0.0.0.0')
+        self.port = int(os.getenv('ADAPTER_PORT', '5001'))
+        self.generation = 0
+        self.workers = {}  # slot -> Worker of the current generation
+        self.retiring = []
+        self.respawn_at = {}  # slot -> monotonic time its replacement is due
+        self.crashes = {}  # slot -> consecutive crashes right after start
+        self.restarts = 0
+        self.reloads = 0
+        self.started = time.time()
+        self.reload_requested = False
+        self.stopping = False
+        self.last_probe = time.monotonic()
+        self.probes = concurrent.futures.ThreadPoolExecutor(max_workers=min(32, self.count))
+
+    def spawn(self, slot):
+        env = dict(os.environ, ADAPTER_LISTEN_FD=str(self.listener.fileno()), ADAPTER_WORKER_SLOT=str(slot),
+                   ADAPTER_GENERATION=str(self.generation), ADAPTER_RUN_DIR=run_dir())
+        proc = subprocess.Popen([sys.executable, "-u", os.path.abspath(__file__), "worker"], env=env,
+                                pass_fds=(self.listener.fileno(),))
+        log("Worker started", slot=slot, pid=proc.pid, generation=self.generation)
+        return Worker(slot, self.generation, proc)
+
+    def retire(self, worker):
+        """Asks a worker to stop accepting and exit once its open requests are done"""
+        if worker.proc.poll() is None:
+            worker.proc.send_signal(signal.SIGTERM)
+        worker.retire_deadline = time.monotonic() + drain_seconds() + 10
+        self.retiring.append(worker)
+
+    def on_reload(self, signum, frame):
+        self.reload_requested = True
+
+    def on_stop(self, signum, frame):
+        self.stopping = True
+
+    def run(self):
+        os.makedirs(run_dir(), exist_ok=True)
+        self.listener = socket.create_server((self.host, self.port), backlog=2048)
+        self.listener.set_inheritable(True)
+        signal.signal(signal.SIGHUP, self.on_reload)
+        signal.signal(signal.SIGTERM, self.on_stop)
+        signal.signal(signal.SIGINT, self.on_stop)
+
+        self.generation = 1
+        self.workers = {slot: self.spawn(slot) for slot in range(self.count)}
+        log("Supervisor listening", host=self.host, port=self.port, workers=self.count, server=server_mode())
+        stop_handled = False
+        while self.workers or self.retiring or not self.stopping:
+            if self.stopping and not stop_handled:
+                stop_handled = True
+                log("Stopping, draining workers", workers=len(self.workers))
+                for worker in self.workers.values():
+                    self.retire(worker)
+                self.workers = {}
+                self.respawn_at = {}
+            if self.reload_requested and not self.stopping:
+                self.reload()
+            self.check_workers()
+            self.check_retiring()
+            self.write_status()
+            time.sleep(0.2)
+        self.listener.close()
+        try:
+            os.unlink(os.path.join(run_dir(), "supervisor.json"))
+            os.rmdir(run_dir())
+        except OSError:
+            pass
+        log("Supervisor stopped")
+
+    def reload(self):
+        """Starts a new generation and retires the current one once the new one is healthy"""
+        self.reload_requested = False
+        load_dotenv(override=True)
+        old = self.workers
+        self.generation += 1
+        log("Reloading", generation=self.generation)
+        new = {slot: self.spawn(slot) for slot in range(self.count)}
+        deadline = time.monotonic() + float(os.getenv('ADAPTER_STARTUP_S', '60'))
+        while time.monotonic() < deadline and not self.stopping:
+            if any(w.proc.poll() is not None for w in new.values()):
+                break
+            ports = [w.health_port() for w in new.values()]
+            if all(ports) and all(self.probes.map(probe, ports)):
+                self.workers = new
+                self.respawn_at = {}
+                for worker in old.values():
+                    self.retire(worker)
+                self.reloads += 1
+                log("Reloaded, draining previous generation", generation=self.generation, draining=len(old))
+                return
+            time.sleep(0.2)
+        log("Reload failed, keeping the running workers", generation=self.generation)
+        for worker in new.values():
+            worker.proc.kill()
+            worker.proc.wait()
+            self.forget(worker)
+
+    def replace(self, worker, reason):
+        log("Replacing worker", slot=worker.slot, pid=worker.pid, reason=reason)
+        self.retire(worker)
+        self.workers[worker.slot] = self.spawn(worker.slot)
+        self.restarts += 1
+
+    def check_workers(self):
+        now = time.monotonic()
+        for slot, due in list(self.respawn_at.items()):
+            if now >= due:
+                del self.respawn_at[slot]
+                self.workers[slot] = self.spawn(slot)
+        for slot, worker in list(self.workers.items()):
+            code = worker.proc.poll()
+            if code is None:
+                continue
+            self.forget(worker)
+            del self.workers[slot]
+            self.restarts += 1
+            # Back off when a worker keeps dying right after it started
+            crashed_early = now - worker.started < 10
+            self.crashes[slot] = self.crashes.get(slot, 0) + 1 if crashed_early else 0
+            delay = min(30, 2 ** self.crashes[slot] - 1)
+            log("Worker exited, restarting", slot=slot, pid=worker.pid, code=code, delay=delay)
+            self.respawn_at[slot] = now + delay
+
+        if now - self.last_probe < float(os.getenv('ADAPTER_HEALTH_INTERVAL_S', '5')):
+            return
+        self.last_probe = now
+        startup = float(os.getenv('ADAPTER_STARTUP_S', '60'))
+        workers = list(self.workers.values())
+        ports = [w.health_port() for w in workers]
+        results = self.probes.map(lambda port: probe(port) if port else None, ports)
+        for worker, healthy in zip(workers, results):
+            if not worker.ready and not healthy:
+                # No status file yet, or still loading LiteLLM
+                if now - worker.started > startup:
+                    self.replace(worker, "not ready after startup")
+                continue
+            worker.ready = True
+            worker.failures = 0 if healthy else worker.failures + 1
+            if worker.failures >= int(os.getenv('ADAPTER_HEALTH_FAILURES', '3')):
+                self.replace(worker, "failed health probes")
+
+    def check_retiring(self):
+        now = time.monotonic()
+        for worker in list(self.retiring):
+            if worker.proc.poll() is not None:
+                self.retiring.remove(worker)
+                self.forget(worker)
+                log("Worker retired", slot=worker.slot, pid=worker.pid, generation=worker.generation)
+            elif now > worker.retire_deadline:
+                log("Worker still draining past the deadline, killing", pid=worker.pid)
+                worker.proc.kill()
+
+    def forget(self, worker):
+        """Removes the status file a killed worker couldn't remove itself"""
+        try:
+            os.unlink(os.path.join(run_dir(), f"worker-{worker.pid}.json"))
+        except OSError:
+            pass
+
+    def write_status(self):
+        write_json(os.path.join(run_dir(), "supervisor.json"), {
+            "pid": os.getpid(), "host": self.host, "port": self.port, "server": server_mode(),
+            "workers": self.count, "generation": self.generation, "reloads": self.reloads,
+            "restarts": self.restarts, "started": self.started, "stopping": self.stopping,
+            "retiring": [w.pid for w in self.retiring],
+        })
+
+# ---- status / health ----
+
+def running_status():
+    """(supervisor status, [worker status]) of the running supervisor, or (None, [])"""
+    supervisor = read_json(os.path.join(run_dir(), "supervisor.json"))
+    if supervisor is None or not pid_alive(supervisor["pid"]):
+        return None, []
+    workers = [w for w in (read_json(p) for p in glob.glob(os.path.join(run_dir(), "worker-*.json")))
+               if w is not None and pid_alive(w["pid"])]
+    return supervisor, sorted(workers, key=lambda w: (w["generation"], w["slot"]))
+
+def print_status():
+    supervisor, workers = running_status()
+    if supervisor is None:
+        print("❌ Supervisor is not running")
+        return 1
+    uptime = int(time.time() - supervisor["started"])
+    print(f"✅ Supervisor PID {supervisor['pid']}: {supervisor['workers']} {supervisor['server']} workers on "
+          f"{supervisor['host']}:{supervisor['port']}, generation {supervisor['generation']}, up {uptime}s, "
+          f"{supervisor['reloads']} reloads, {supervisor['restarts']} restarts")
+    print(f"   {'slot':>4} {'pid':>7} {'gen':>4} {'state':<9} {'active':>6} {'streams':>7} {'requests':>8} {'rss MB':>7} {'heartbeat':>9}")
+    for w in workers:
+        state = "draining" if w["draining"] or w["pid"] in supervisor["retiring"] else "serving"
+        print(f"   {w['slot']:>4} {w['pid']:>7} {w['generation']:>4} {state:<9} {w['active']:>6} {w['streams']:>7} "
+              f"{w['requests']:>8} {w['rss_mb']:>7.0f} {time.time() - w['heartbeat']:>8.1f}s")
+    return 0
+
+def print_health():
+    supervisor, workers = running_status()
+    if supervisor is None:
+        print("❌ Supervisor is not running")
+        return 1
+    serving = [w for w in workers if not w["draining"] and w["pid"] not in supervisor["retiring"]]
+    healthy = 0
+    for w in serving:
+        started = time.perf_counter()
+        ok = probe(w["health_port"])
+        healthy += ok
+        mark = "✅" if ok else "❌"
+        print(f"{mark} worker {w['slot']} (PID {w['pid']}): {'healthy' if ok else 'not ready'} "
+              f"in {(time.perf_counter() - started) * 1000:.0f} ms, {w['active']} active, {w['streams']} streams")
+    print(f"{healthy}/{supervisor['workers']} workers healthy")
+    return 0 if serving and healthy == len(serving) else 1
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else "run"
+    if command == "worker":
+        run_worker()
+    elif command == "status":
+        sys.exit(print_status())
+    elif command == "health":
+        sys.exit(print_health())
+    else:
+        load_dotenv()
+        Supervisor().run()
+
+if __name__ == '__main__':
+    main(sys.argv)
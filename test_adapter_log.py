@@ -0,0 +1,49 @@
+import os
+import json
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+from benchmarks import fake_litellm
+
+fake_litellm.FAKE_CHUNK_DELAY = 0
+fake_litellm.install()
+
+import adapter_log
+import startup
+from adapter import app
+
+# Loaded up front, as a serving process does, so the load isn't logged inside a request
+startup.load()
+
+STREAM_PATH = "/v1beta/models/groq/fake-model:streamGenerateContent?alt=sse"
+REQUEST_BODY = {"contents": [{"role": "user", "parts": [{"text": "Hello"}]}]}
+
+def logged_events(tmp_path, headers=None, **config):
+    """Runs one streaming request with the given log config and returns (response, events)"""
+    log_file = tmp_path / "adapter.jsonl"
+    adapter_log.configure(log_file=str(log_file), **config)
+    try:
+        response = app.test_client().post(STREAM_PATH, json=REQUEST_BODY, headers=headers or {})
+        response.get_data()
+    finally:
+        adapter_log.shutdown()
+        adapter_log.configure()
+    return response, [json.loads(line) for line in log_file.read_text().splitlines()]
+
+def test_info_level_has_no_payload_or_chunk_events(tmp_path):
+    response, events = logged_events(tmp_path, level="INFO", headers={"X-Request-Id": "req-1"})
+    assert response.headers["X-Request-Id"] == "req-1"
+    assert [e["msg"] for e in events] == ["Incoming request", "Received request"]
+    assert all(e["request_id"] == "req-1" for e in events)
+
+def test_debug_level_logs_chunks_with_request_id(tmp_path):
+    response, events = logged_events(tmp_path, level="DEBUG")
+    request_id = response.headers["X-Request-Id"]
+    chunks = [e for e in events if e["msg"] == "Yielding text chunk"]
+    assert len(chunks) == fake_litellm.FAKE_CHUNKS
+    assert all(e["request_id"] == request_id and e["level"] == "DEBUG" for e in chunks)
+    assert any(e["msg"] == "Request body" and e["body"] == REQUEST_BODY for e in events)
+
+def test_unsampled_requests_skip_debug_events(tmp_path):
+    _, events = logged_events(tmp_path, level="DEBUG", sample_rate=0.0)
+    assert events and all(e["level"] != "DEBUG" for e in events)
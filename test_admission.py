@@ -0,0 +1,104 @@
+import os
+import time
+import threading
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+from benchmarks import fake_litellm
+
+fake_litellm.FAKE_CHUNK_DELAY = 0
+fake_litellm.install()
+
+import httpx
+import litellm
+import pytest
+
+import admission
+import routing
+from adapter import app
+
+JSON_PATH = "/v1/models/groq/fake-model:generateContent"
+REQUEST_BODY = {"contents": [{"role": "user", "parts": [{"text": "Hello"}]}]}
+OPENAI_REQ = {"model": "groq/fake-model", "messages": [{"role": "user", "content": "Hello"}]}
+
+@pytest.fixture(autouse=True)
+def fresh_providers():
+    admission.reset()
+    yield
+    admission.reset()
+
+def route(**limits):
+    return routing.Route("groq/fake-model", "test", limits=limits)
+
+def test_clients_take_turns_within_the_concurrency_limit():
+    r = route(concurrency=1)
+    deadline = time.monotonic() + 5
+    holder = admission.ticket(r, OPENAI_REQ, "holder", deadline)
+    queued = [admission.ticket(r, OPENAI_REQ, client, deadline) for client in ("a", "a", "a", "b")]
+    order = []
+    ticket = holder
+    while True:
+        ticket.release()
+        waiting = [t for t in queued if t.admitted and t not in order]
+        if not waiting:
+            break
+        ticket = waiting[0]
+        order.append(ticket)
+    assert [t.client for t in order] == ["a", "b", "a", "a"]
+    assert admission.stats()["test"] == {"limits": {"concurrency": 1}, "active": 0, "queued": 0,
+                                         "clients_waiting": 0, "paused_for": 0.0}
+
+def test_queued_stream_sends_keepalives_then_frames(monkeypatch):
+    monkeypatch.setattr(admission, "KEEPALIVE", 0.05)
+    r = route(concurrency=1)
+    holder = admission.ticket(r, OPENAI_REQ, "holder", time.monotonic() + 5)
+    stream = admission.stream(r, OPENAI_REQ, "client", lambda ticket: iter(["data: {}\n\n"]))
+    assert next(stream) == admission.KEEPALIVE_FRAME
+    threading.Timer(0.1, holder.release).start()
+    assert [frame for frame in stream if frame != admission.KEEPALIVE_FRAME] == ["data: {}\n\n"]
+    assert admission.get_provider(r).active == 0
+
+def test_queued_stream_starts_with_a_data_frame_by_default():
+    assert admission.KEEPALIVE == 0
+    r = route(concurrency=1)
+    holder = admission.ticket(r, OPENAI_REQ, "holder", time.monotonic() + 5)
+    stream = admission.stream(r, OPENAI_REQ, "client", lambda ticket: iter(["data: {}\n\n"]))
+    threading.Timer(0.1, holder.release).start()
+    assert list(stream) == ["data: {}\n\n"]
+
+def test_request_fails_with_429_at_its_deadline(monkeypatch):
+    monkeypatch.setattr(admission, "DEADLINE", 0.05)
+    r = route(concurrency=1)
+    holder = admission.ticket(r, OPENAI_REQ, "holder", time.monotonic() + 5)
+    with pytest.raises(admission.QueueTimeout):
+        admission.call(r, OPENAI_REQ, "client", lambda ticket: None)
+    holder.release()
+    assert admission.stats()["test"]["queued"] == 0
+
+def test_rate_limited_call_is_retried_after_retry_after(monkeypatch):
+    calls = []
+
+    def rate_limited_once(stream=False, **kwargs):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            response = httpx.Response(429, headers={"retry-after": "0.2"}, request=httpx.Request("POST", "http://groq"))
+            raise litellm.RateLimitError("slow down", llm_provider="groq", model="fake-model", response=response)
+        return fake_litellm.make_response()
+
+    monkeypatch.setattr(litellm, "completion", rate_limited_once)
+    response = app.test_client().post(JSON_PATH, json=REQUEST_BODY)
+    assert response.status_code == 200 and len(calls) == 2
+    assert calls[1] - calls[0] >= 0.2
+
+def test_rate_limit_headers_pause_the_provider():
+    provider = admission.get_provider(route())
+    provider.observe_headers({"llm_provider-x-ratelimit-remaining-requests": "0",
+                              "llm_provider-x-ratelimit-reset-requests": "1m30.5s"})
+    assert 90 < provider.stats()["paused_for"] <= 90.5
+    assert admission.retry_after({"retry-after-ms": "250"}) == 0.25
+
+def test_tool_definitions_count_towards_the_token_cost():
+    tool = {"type": "function", "function": {"name": "search", "description": "Searches the web " * 50,
+                                             "parameters": {"type": "object", "properties": {"query": {"type": "string"}}}}}
+    with_tools = dict(OPENAI_REQ, tools=[tool])
+    assert admission.estimate_tokens(with_tools) > admission.estimate_tokens(OPENAI_REQ) + 100
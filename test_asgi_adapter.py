@@ -0,0 +1,55 @@
+import os
+import json
+import asyncio
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+from benchmarks import fake_litellm
+
+fake_litellm.FAKE_CHUNK_DELAY = 0
+fake_litellm.install()
+
+from adapter import app as flask_app
+from asgi_adapter import app as asgi_app
+
+REQUEST_BODY = {"contents": [{"role": "user", "parts": [{"text": "Hello"}]}]}
+
+def call_asgi(method, path, body=b"", query_string=b""):
+    """Runs one request through the ASGI app, returning (status, body bytes)"""
+    scope = {"type": "http", "method": method, "path": path, "query_string": query_string, "headers": []}
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        # The client stays connected until the response is complete
+        await asyncio.Event().wait()
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi_app(scope, receive, send))
+    status = sent[0]["status"]
+    return status, b"".join(m.get("body", b"") for m in sent[1:])
+
+def test_stream_bytes_match_flask():
+    path = "/v1beta/models/groq/fake-model:streamGenerateContent"
+    flask_resp = flask_app.test_client().post(path + "?alt=sse", json=REQUEST_BODY)
+    status, body = call_asgi("POST", path, json.dumps(REQUEST_BODY).encode(), b"alt=sse")
+    assert status == 200
+    assert body == flask_resp.data
+    assert body.count(b"data: ") == fake_litellm.FAKE_CHUNKS + 2
+
+def test_generate_content_non_streaming():
+    status, body = call_asgi("POST", "/v1/models/groq/fake-model:generateContent", json.dumps(REQUEST_BODY).encode())
+    assert status == 200
+    resp = json.loads(body)
+    assert resp["candidates"][0]["finishReason"] == "STOP"
+    assert resp["usageMetadata"]["totalTokenCount"] == 10 + fake_litellm.FAKE_CHUNKS
+
+def test_list_models_and_unknown_route():
+    status, body = call_asgi("GET", "/v1beta/models")
+    assert status == 200 and json.loads(body)["models"]
+    status, _ = call_asgi("GET", "/v1beta/unknown")
+    assert status == 404
@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import signal
+import argparse
+import threading
+import urllib.request
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import litellm
+import pytest
+
+import batch_jobs
+from adapter import app as flask_app
+from test_asgi_adapter import call_asgi
+from benchmarks import replay
+from benchmarks.fake_litellm import make_response
+
+CREATE_PATH = "/v1beta/models/groq/batch-model:batchGenerateContent"
+
+def item(text, key=None):
+    request = {"contents": [{"role": "user", "parts": [{"text": text}]}]}
+    return {"key": key, "request": request} if key else request
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setenv("BATCH_DIR", str(tmp_path))
+    monkeypatch.setenv("BATCH_CONCURRENCY", "4")
+    yield tmp_path
+    assert batch_jobs.wait_idle(10)
+
+@pytest.fixture
+def upstream(monkeypatch):
+    prompts = []
+    release = threading.Event()
+    release.set()
+
+    def completion(messages, **kwargs):
+        release.wait(10)
+        prompts.append(messages[-1]["content"])
+        if "fail" in messages[-1]["content"]:
+            raise ValueError("upstream rejected the prompt")
+        return make_response(2)
+    monkeypatch.setattr(litellm, "completion", completion)
+    yield type("Upstream", (), {"prompts": prompts, "release": release})
+    release.set()
+
+def results(job_id, offset=0):
+    resp = flask_app.test_client().get(f"/v1beta/batches/{job_id}:results?offset={offset}")
+    assert resp.mimetype == "application/jsonl"
+    return [json.loads(line) for line in resp.data.decode().splitlines()]
+
+def test_gemini_batch_runs_and_streams_results(store, upstream):
+    body = {"batch": {"displayName": "eval", "inputConfig": {"requests": {"requests": [
+        {"request": item(f"prompt {i}"), "metadata": {"key": f"k{i}"}} for i in range(10)] + [
+        {"request": item("please fail"), "metadata": {"key": "bad"}}]}}}}
+    op = flask_app.test_client().post(CREATE_PATH, json=body).get_json()
+    assert op["metadata"]["displayName"] == "eval" and op["metadata"]["batchStats"]["requestCount"] == 11
+    job_id = op["name"].split("/")[1]
+    assert batch_jobs.wait_idle(10)
+
+    status, polled = call_asgi("GET", f"/v1/batches/{job_id}")
+    polled = json.loads(polled)
+    assert status == 200 and polled["done"] and polled["metadata"]["state"] == "BATCH_STATE_SUCCEEDED"
+    assert polled["metadata"]["batchStats"]["successfulRequestCount"] == 10
+    assert polled["metadata"]["batchStats"]["failedRequestCount"] == 1
+
+    lines = results(job_id)
+    assert sorted(line["key"] for line in lines) == sorted([f"k{i}" for i in range(10)] + ["bad"])
+    by_key = {line["key"]: line for line in lines}
+    assert by_key["k3"]["response"]["candidates"][0]["content"]["parts"][0]["text"] == "token0 token1 "
+    assert "upstream rejected" in by_key["bad"]["error"]["message"]
+    assert results(job_id, offset=9) == lines[9:]
+    assert flask_app.test_client().get("/v1beta/batches").get_json()["operations"][0]["name"] == op["name"]
+
+def test_jsonl_file_bodies_and_invalid_batches(store, upstream):
+    jsonl = "\n".join(json.dumps(item(f"line {i}", f"line-{i}")) for i in range(3)) + "\n"
+    status, body = call_asgi("POST", CREATE_PATH, jsonl.encode())
+    assert status == 200
+    assert batch_jobs.wait_idle(10)
+    assert sorted(line["key"] for line in results(json.loads(body)["name"].split("/")[1])) == ["line-0", "line-1", "line-2"]
+
+    client = flask_app.test_client()
+    assert client.post(CREATE_PATH, json={"requests": []}).status_code == 400
+    duplicate = client.post(CREATE_PATH, json={"requests": [item("a", "same"), item("b", "same")]})
+    assert duplicate.status_code == 400 and duplicate.get_json()["error"]["status"] == "INVALID_ARGUMENT"
+    assert client.get("/v1beta/batches/missing").status_code == 404
+
+def test_cancel_stops_pending_items(store, upstream, monkeypatch):
+    monkeypatch.setenv("BATCH_CONCURRENCY", "1")
+    upstream.release.clear()
+    op = flask_app.test_client().post(CREATE_PATH, json={"requests": [item(f"slow {i}") for i in range(5)]}).get_json()
+    job_id = op["name"].split("/")[1]
+    flask_app.test_client().post(f"/v1beta/batches/{job_id}:cancel")
+    upstream.release.set()
+    assert batch_jobs.wait_idle(10)
+    polled = flask_app.test_client().get(f"/v1beta/batches/{job_id}").get_json()
+    assert polled["metadata"]["state"] == "BATCH_STATE_CANCELLED"
+    assert len(results(job_id)) <= 1
+
+def test_resume_skips_finished_items_and_drops_a_cut_line(store, upstream):
+    op = flask_app.test_client().post(CREATE_PATH, json={"requests": [item(f"resume {i}") for i in range(4)]}).get_json()
+    job_id = op["name"].split("/")[1]
+    assert batch_jobs.wait_idle(10)
+    # As if the process died after two results, in the middle of writing a third
+    path = store / job_id / "results.jsonl"
+    lines = path.read_text().splitlines(keepends=True)
+    path.write_text("".join(lines[:2]) + lines[2][:20])
+    job = json.loads((store / job_id / "job.json").read_text())
+    (store / job_id / "job.json").write_text(json.dumps(dict(job, state="BATCH_STATE_RUNNING")))
+    upstream.prompts.clear()
+
+    batch_jobs.resume()
+    assert batch_jobs.wait_idle(10)
+    assert len(upstream.prompts) == 2
+    keys = [line["key"] for line in results(job_id)]
+    assert sorted(keys) == ["0", "1", "2", "3"]
+
+@pytest.fixture(scope="module")
+def mock():
+    proc = replay.start_mock(argparse.Namespace(ttft=0.2, tokens=3, rate=0, tool_calls=0, rate_limit=0))
+    yield
+    proc.terminate()
+    proc.wait()
+
+def http(port, path, body=None, content_type="application/json"):
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=body, headers={"Content-Type": content_type})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.read()
+
+@pytest.mark.parametrize("mode, port", [("flask", 5241), ("asgi", 5242)])
+def test_job_survives_an_adapter_restart_against_the_mock_provider(mock, tmp_path, monkeypatch, mode, port):
+    monkeypatch.setenv("BATCH_DIR", str(tmp_path))
+    monkeypatch.setenv("BATCH_CONCURRENCY", "2")
+    monkeypatch.setenv("BATCH_SCAN_S", "0.2")
+    jsonl = "".join(json.dumps(item(f"eval {i}", f"e{i}")) + "\n" for i in range(20))
+    proc = replay.start_adapter(mode, port)
+    try:
+        job_id = json.loads(http(port, "/v1beta/models/openai/mock-model:batchGenerateContent",
+                                 jsonl.encode(), "application/jsonl"))["name"].split("/")[1]
+        # Killed while the job is half done
+        deadline = time.monotonic() + 30
+        while not 4 <= len(http(port, f"/v1beta/batches/{job_id}:results").splitlines()):
+            assert time.monotonic() < deadline, "no progress"
+            time.sleep(0.05)
+    finally:
+        proc.send_signal(signal.SIGKILL)
+        proc.wait()
+
+    proc = replay.start_adapter(mode, port)
+    try:
+        deadline = time.monotonic() + 60
+        while not json.loads(http(port, f"/v1beta/batches/{job_id}"))["done"]:
+            assert time.monotonic() < deadline, "job not resumed"
+            time.sleep(0.2)
+        lines = [json.loads(line) for line in http(port, f"/v1beta/batches/{job_id}:results").splitlines()]
+        assert sorted(line["key"] for line in lines) == sorted(f"e{i}" for i in range(20))
+        assert all("response" in line for line in lines)
+    finally:
+        proc.terminate()
+        proc.wait()
@@ -0,0 +1,65 @@
+import os
+import json
+import time
+import socket
+import argparse
+import urllib.request
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import pytest
+
+import metrics
+from adapter import cancel_upstream_stream, new_stream_state
+from benchmarks import replay
+
+STREAM_PATH = "/v1beta/models/openai/mock-model:streamGenerateContent?alt=sse"
+REQUEST_BODY = json.dumps({"contents": [{"role": "user", "parts": [{"text": "Hello"}]}]}).encode()
+
+@pytest.fixture(scope="module")
+def slow_mock():
+    # 400 tokens at 20/s: the upstream stream would run for 20 seconds
+    proc = replay.start_mock(argparse.Namespace(ttft=0.05, tokens=400, rate=20, tool_calls=0, rate_limit=0))
+    yield
+    proc.terminate()
+    proc.wait()
+
+def get_json(port, path):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=5) as response:
+        return json.loads(response.read())
+
+def open_stream_and_hang_up(port):
+    """Starts a streaming request, reads until the first data frame, then closes the socket"""
+    sock = socket.create_connection(("127.0.0.1", port), timeout=10)
+    sock.sendall(f"POST {STREAM_PATH} HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(REQUEST_BODY)}\r\n\r\n".encode("ascii") + REQUEST_BODY)
+    received = b""
+    while b"data: " not in received:
+        received += sock.recv(4096)
+    sock.close()
+
+@pytest.mark.parametrize("mode, port", [("flask", 5211), ("asgi", 5212)])
+def test_client_disconnect_closes_upstream_stream(slow_mock, mode, port):
+    adapter = replay.start_adapter(mode, port)
+    try:
+        open_stream_and_hang_up(port)
+        closed_at = time.monotonic() + 3
+        while get_json(replay.MOCK_PORT, "/mock/stats")["open_streams"] > 0:
+            assert time.monotonic() < closed_at, "upstream stream still open after the client left"
+            time.sleep(0.05)
+        cancellations = get_json(port, "/adapter/stats")["cancellations"]
+        assert cancellations["upstream_cancelled"] >= 1
+        assert cancellations["tokens_saved_estimate"] >= 0
+    finally:
+        adapter.terminate()
+        adapter.wait()
+
+def test_tokens_saved_counts_streamed_tokens_not_chunks():
+    model = "test/cancelled-model"
+    metrics.record_usage(model, {"candidatesTokenCount": 100})
+    state = new_stream_state()
+    # 10 chunks carrying 200 characters: about 50 tokens streamed
+    state["chunks"], state["output_chars"] = 10, 200
+    before = metrics.cancellation_stats()["tokens_saved_estimate"]
+    cancel_upstream_stream(model, state)
+    assert metrics.cancellation_stats()["tokens_saved_estimate"] - before == 50
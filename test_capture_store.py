@@ -0,0 +1,60 @@
+import os
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+from benchmarks import fake_litellm
+
+fake_litellm.FAKE_CHUNK_DELAY = 0
+fake_litellm.install()
+
+import capture_store
+from adapter import app
+
+STREAM_PATH = "/v1beta/models/groq/fake-model:streamGenerateContent?alt=sse"
+JSON_PATH = "/v1/models/groq/fake-model:generateContent"
+REQUEST_BODY = {"contents": [{"role": "user", "parts": [{"text": "Hello"}]}]}
+
+def post(path):
+    response = app.test_client().post(path, json=REQUEST_BODY)
+    response.get_data()
+    return response
+
+def test_stream_and_json_responses_are_captured(tmp_path, monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "secret")
+    store = capture_store.configure(True, directory=str(tmp_path))
+    stream_resp = post(STREAM_PATH)
+    json_resp = post(JSON_PATH)
+    store.flush()
+    records = list(capture_store.load(str(tmp_path)))
+    capture_store.configure(False)
+
+    assert [r["stream"] for r in records] == [True, False]
+    stream, plain = records
+    assert stream["request_id"] == stream_resp.headers["X-Request-Id"]
+    assert "".join(stream["frames"]).encode() == stream_resp.data
+    assert stream["google_request"] == REQUEST_BODY
+    assert "api_key" not in stream["openai_request"]
+    assert {"translate_ms", "ttfb_ms", "total_ms"} <= set(stream["timings"])
+    assert plain["google_response"] == json_resp.get_json()
+    assert store.stats()["written"] == 2
+
+def test_sampling_by_model(tmp_path, monkeypatch):
+    monkeypatch.setenv("CAPTURE_MODELS", "openai/,deepseek/")
+    store = capture_store.configure(True, directory=str(tmp_path))
+    post(JSON_PATH)
+    store.flush()
+    capture_store.configure(False)
+    assert store.stats()["captured"] == 0
+    assert list(capture_store.load(str(tmp_path))) == []
+
+def test_records_over_the_byte_budget_are_dropped(tmp_path, monkeypatch):
+    monkeypatch.setenv("CAPTURE_QUEUE_MB", "0.001")
+    store = capture_store.configure(True, directory=str(tmp_path))
+    store.submit({"small": "x"}, capture_store.record_size({"small": "x"}))
+    large = {"frames": ["data: " + "y" * 2000]}
+    store.submit(large, capture_store.record_size(large))
+    store.flush()
+    capture_store.configure(False)
+    assert store.stats()["dropped"] == 1 and store.stats()["written"] == 1
+    assert store.stats()["queued_bytes"] == 0
+    assert [r for r in capture_store.load(str(tmp_path))] == [{"small": "x"}]
@@ -0,0 +1,42 @@
+import os
+import json
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import pytest
+
+import codec
+import sse_coalesce
+from adapter import app, sse_frame
+
+REQUEST_BODY = {"contents": [{"role": "user", "parts": [{"text": "Hello"}]}]}
+
+@pytest.fixture(params=["json", "orjson", "msgspec"])
+def each_codec(request, monkeypatch):
+    monkeypatch.setenv("JSON_CODEC", request.param)
+    codec.configure()
+    if codec.name != request.param:
+        pytest.skip(f"{request.param} is not installed")
+    yield codec.name
+    monkeypatch.undo()
+    codec.configure()
+
+def test_round_trip_and_errors(each_codec):
+    value = {"text": "héllo \"🌍\"\n", "n": [1, 2.5, None, True], "nested": {"a": {}}}
+    assert codec.loads(codec.dumps(value)) == value
+    assert json.loads(codec.dumps_bytes(value).decode("utf-8")) == value
+    with pytest.raises(ValueError):
+        codec.loads(b'{"truncated": ')
+
+def test_text_frame_template_follows_the_codec(each_codec):
+    for text in ["tok ", 'quote " and \\ slash\n', "héllo 🌍"]:
+        payload = {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}]}
+        assert sse_coalesce.text_frame(text) == sse_frame(payload)
+
+def test_request_body_is_parsed_by_the_codec_whatever_the_content_type(monkeypatch):
+    parsed = []
+    real_loads = codec.loads
+    monkeypatch.setattr(codec, "loads", lambda data: parsed.append(data) or real_loads(data))
+    response = app.test_client().post("/v1/models/groq/fake-model:generateContent",
+                                      data=json.dumps({"contents": "not a list"}), content_type="text/plain")
+    assert parsed and response.status_code == 500 and response.json["error"]["status"] == "INTERNAL"
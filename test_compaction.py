@@ -0,0 +1,84 @@
+import os
+import json
+import threading
+from types import SimpleNamespace
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import litellm
+import pytest
+
+import adapter
+import admission
+import compaction
+from benchmarks.bench_translation import make_request, make_turn
+
+MODEL = "groq/compaction-model"
+
+@pytest.fixture
+def summarizer(monkeypatch):
+    monkeypatch.setenv("COMPACTION", "true")
+    monkeypatch.setenv("COMPACTION_TOKENS", "1500")
+    calls = []
+    release = threading.Event()
+    release.set()
+
+    def completion(model, messages, **kwargs):
+        calls.append((model, messages))
+        release.wait(10)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"summary #{len(calls)}"))])
+    monkeypatch.setattr(litellm, "completion", completion)
+    yield SimpleNamespace(calls=calls, release=release)
+    release.set()
+    compaction.wait_idle(10)
+
+def session(turns, tag):
+    google_req = make_request(turns, [])
+    google_req["contents"][0]["parts"][0]["text"] += f" ({tag})"
+    return google_req
+
+def test_summary_is_built_in_the_background_and_spliced_into_later_turns(summarizer, monkeypatch):
+    monkeypatch.setenv("COMPACTION_MODEL", "deepseek/deepseek-chat")
+    summarizer.release.clear()
+    google_req = session(12, "splice")
+
+    # Over the threshold: the turn goes out uncompacted while the summary is computed
+    _, first = adapter.build_openai_request(google_req, MODEL)
+    assert len(first["messages"]) == 1 + 36
+    assert compaction.stats()["pending"] == 1
+    summarizer.release.set()
+    assert compaction.wait_idle(10)
+    model, messages = summarizer.calls[0]
+    assert model == "deepseek/deepseek-chat" and "Step 0:" in messages[1]["content"]
+    assert "Step 8:" not in messages[1]["content"]
+
+    google_req = json.loads(json.dumps(google_req))  # every request arrives as a new parsed object
+    google_req["contents"].extend(make_turn(12))
+    misses = compaction.stats()["cache"]["misses"]
+    _, second = adapter.build_openai_request(google_req, MODEL)
+    rest = second["messages"][1:]
+    # The summary leads the first kept user turn rather than being a user turn of its own
+    assert rest[0]["role"] == "user" and rest[0]["content"].startswith(compaction.SUMMARY_PREFIX + "summary #1\n\nStep 8:")
+    # The last 4 user prompts (with their tool call/response pairs) stay verbatim
+    assert len(rest) == 5 * 3 and rest[1]["tool_calls"][0]["id"] == rest[2]["tool_call_id"]
+    assert "deepseek" in admission.stats()
+    # Only the lookup that found the summary counted
+    assert compaction.stats()["cache"]["misses"] == misses
+
+def test_prefix_never_ends_inside_an_unanswered_tool_call():
+    history = [
+        {"role": "user", "content": "a"},
+        {"role": "assistant", "content": None, "tool_calls": [{"id": "call_x", "function": {"name": "x", "arguments": "{}"}}]},
+        {"role": "user", "content": "interjection"},
+        {"role": "tool", "tool_call_id": "call_x", "content": "{}"},
+        {"role": "user", "content": "b"},
+    ]
+    assert compaction._boundaries(history) == [4]
+
+def test_short_sessions_and_disabled_compaction_are_untouched(summarizer, monkeypatch):
+    _, short = adapter.build_openai_request(session(3, "short"), MODEL)
+    assert len(short["messages"]) == 1 + 9
+    monkeypatch.setenv("COMPACTION", "false")
+    _, off = adapter.build_openai_request(session(12, "off"), MODEL)
+    assert len(off["messages"]) == 1 + 36
+    assert not summarizer.calls
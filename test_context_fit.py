@@ -0,0 +1,61 @@
+import os
+import json
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import adapter
+import context_fit
+import token_counting
+from benchmarks.bench_translation import make_request, make_tools
+
+MODEL = "github/gpt-4o"
+
+def fitted(google_req, model=MODEL):
+    openai_req = adapter.google_to_openai_request(json.loads(json.dumps(google_req)), model)
+    return openai_req, context_fit.fit_request(openai_req, model)
+
+def total_tokens(openai_req, model=MODEL):
+    tokens = sum(token_counting.count_message_tokens(model, m) for m in openai_req["messages"])
+    return tokens + sum(token_counting.count_tool_tokens(model, t) for t in openai_req.get("tools", []))
+
+def test_long_history_fits_budget_and_keeps_latest_turn():
+    google_req = make_request(60, make_tools(10))
+    google_req["contents"].append({"role": "user", "parts": [{"text": "What changed in module_59?"}]})
+    original, result = fitted(google_req)
+
+    budget = context_fit.get_model_limits(MODEL)["max_input_tokens"] * (1 - context_fit.SAFETY_MARGIN)
+    assert total_tokens(original) > budget
+    assert total_tokens(result) <= budget
+    assert result["messages"][0]["role"] == "system"
+    assert result["messages"][1]["role"] == "user"
+    assert result["messages"][-1] == original["messages"][-1]
+    # Every tool response still follows the assistant message that called it
+    for i, message in enumerate(result["messages"]):
+        if message["role"] == "tool":
+            assert result["messages"][i - 1]["role"] in ("assistant", "tool")
+
+def test_tools_ranked_by_latest_user_turn():
+    tools = make_tools(150)
+    tools[0]["functionDeclarations"].append({
+        "name": "get_weather",
+        "description": "Get the weather forecast for a city.",
+        "parameters": {"type": "object", "properties": {"city": {"type": "string"}}},
+    })
+    google_req = {"contents": [{"role": "user", "parts": [{"text": "What's the weather in Amsterdam?"}]}], "tools": tools}
+    original, result = fitted(google_req)
+    names = [t["function"]["name"] for t in result["tools"]]
+    assert len(names) < len(original["tools"])
+    assert "get_weather" in names
+
+def test_small_requests_and_unknown_models_are_untouched():
+    google_req = {"contents": [{"role": "user", "parts": [{"text": "hi"}]}]}
+    original, result = fitted(google_req)
+    assert result is original
+    original, result = fitted(make_request(60, []), "unknown-provider/model")
+    assert result is original
+
+def test_max_tokens_clamped_to_model_output_limit():
+    google_req = {"contents": [{"role": "user", "parts": [{"text": "hi"}]}],
+                  "generationConfig": {"maxOutputTokens": 100000}}
+    _, result = fitted(google_req)
+    assert result["max_tokens"] == context_fit.MODEL_LIMITS["github/"]["max_output_tokens"]
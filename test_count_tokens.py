@@ -0,0 +1,54 @@
+import os
+import json
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import litellm
+
+import adapter
+import token_counting
+from adapter import app as flask_app
+from test_asgi_adapter import call_asgi
+from benchmarks.bench_translation import make_request, make_tools
+
+def no_upstream(**kwargs):
+    raise AssertionError("countTokens must not call the provider")
+
+def test_counts_match_in_both_modes_and_include_tools_and_system(monkeypatch):
+    monkeypatch.setattr(litellm, "completion", no_upstream)
+    google_req = make_request(5, make_tools(3))
+    path = "/v1beta/models/gpt-4o:countTokens"
+
+    flask_total = flask_app.test_client().post(path, json=google_req).get_json()["totalTokens"]
+    status, body = call_asgi("POST", path, json.dumps(google_req).encode())
+    assert status == 200 and json.loads(body) == {"totalTokens": flask_total}
+
+    openai_req = adapter.google_to_openai_request(google_req, "openai/gpt-4o")
+    assert flask_total == token_counting.count_request_tokens("openai/gpt-4o", openai_req["messages"], openai_req["tools"])
+
+    bare = {"contents": google_req["contents"]}
+    bare_total = flask_app.test_client().post("/v1/models/gpt-4o:countTokens", json=bare).get_json()["totalTokens"]
+    assert 0 < bare_total < flask_total
+
+    wrapped = {"generateContentRequest": dict(google_req, model="models/gpt-4o")}
+    assert flask_app.test_client().post(path, json=wrapped).get_json()["totalTokens"] == flask_total
+
+def test_growing_history_only_tokenizes_new_turns(monkeypatch):
+    calls = []
+    token_counter = litellm.token_counter
+
+    def counting(**kwargs):
+        calls.append(kwargs)
+        return token_counter(**kwargs)
+    monkeypatch.setattr(litellm, "token_counter", counting)
+
+    google_req = make_request(20, make_tools(5))
+    google_req["contents"].append({"role": "user", "parts": [{"text": "count these tokens, round 1"}]})
+    first = flask_app.test_client().post("/v1beta/models/gpt-4o:countTokens", json=google_req).get_json()["totalTokens"]
+    calls.clear()
+
+    google_req["contents"].append({"role": "model", "parts": [{"text": "Counted."}]})
+    google_req["contents"].append({"role": "user", "parts": [{"text": "and again, round 2"}]})
+    second = flask_app.test_client().post("/v1beta/models/gpt-4o:countTokens", json=google_req).get_json()["totalTokens"]
+    assert second > first
+    assert len(calls) == 2
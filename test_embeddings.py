@@ -0,0 +1,106 @@
+import os
+import json
+import threading
+from types import SimpleNamespace
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import litellm
+import pytest
+
+import embeddings
+from adapter import app as flask_app
+from test_asgi_adapter import call_asgi
+
+MODEL_PATH = "/v1beta/models/openai/text-embedding-3-small"
+
+def vector(text):
+    return [float(len(text)), float(sum(map(ord, text)) % 97)]
+
+@pytest.fixture
+def upstream(monkeypatch):
+    monkeypatch.setenv("EMBED_BATCH_WINDOW_MS", "0")
+    monkeypatch.delenv("EMBED_CACHE_DB", raising=False)
+    embeddings.configure()
+    calls = []
+
+    def embedding(model, input, **kwargs):
+        calls.append((model, list(input), kwargs.get("dimensions")))
+        return SimpleNamespace(data=[{"index": i, "embedding": vector(text)} for i, text in enumerate(input)])
+
+    async def aembedding(model, input, **kwargs):
+        return embedding(model, input, **kwargs)
+    monkeypatch.setattr(litellm, "embedding", embedding)
+    monkeypatch.setattr(litellm, "aembedding", aembedding)
+    yield calls
+    monkeypatch.undo()
+    embeddings.configure()
+
+def batch_body(texts, dimensions=None):
+    requests = [{"content": {"parts": [{"text": t}]}} for t in texts]
+    if dimensions:
+        for r in requests:
+            r["outputDimensionality"] = dimensions
+    return {"requests": requests}
+
+def test_concurrent_single_requests_share_one_upstream_call(upstream, monkeypatch):
+    monkeypatch.setenv("EMBED_BATCH_WINDOW_MS", "200")
+    results = {}
+
+    def one(text):
+        body = {"content": {"parts": [{"text": text}]}}
+        results[text] = flask_app.test_client().post(MODEL_PATH + ":embedContent", json=body).get_json()
+    threads = [threading.Thread(target=one, args=(f"concurrent {i}",)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(upstream) == 1 and sorted(upstream[0][1]) == sorted(results)
+    assert all(body == {"embedding": {"values": vector(text)}} for text, body in results.items())
+
+def test_batches_are_chunked_deduplicated_and_cached_in_both_modes(upstream, monkeypatch):
+    monkeypatch.setenv("EMBED_BATCH_MAX", "3")
+    texts = ["a", "bb", "a", "ccc", "dddd", "eeeee", "ffffff", "ggggggg"]
+    resp = flask_app.test_client().post(MODEL_PATH + ":batchEmbedContents", json=batch_body(texts, 16))
+    assert resp.get_json() == {"embeddings": [{"values": vector(t)} for t in texts]}
+    assert [len(sent) for _, sent, _ in upstream] == [3, 3, 1]
+    assert all(model == "openai/text-embedding-3-small" and dims == 16 for model, _, dims in upstream)
+
+    # Unchanged documents are served from the cache, whichever mode asks
+    upstream.clear()
+    status, body = call_asgi("POST", MODEL_PATH + ":batchEmbedContents", json.dumps(batch_body(texts + ["new"], 16)).encode())
+    assert status == 200 and json.loads(body)["embeddings"][-1] == {"values": vector("new")}
+    assert upstream == [("openai/text-embedding-3-small", ["new"], 16)]
+
+    # Another dimensionality is another vector
+    call_asgi("POST", MODEL_PATH + ":batchEmbedContents", json.dumps(batch_body(["a"], 8)).encode())
+    assert upstream[-1][1:] == (["a"], 8)
+
+def test_disk_tier_survives_a_restart(upstream, monkeypatch, tmp_path):
+    monkeypatch.setenv("EMBED_CACHE_DB", str(tmp_path / "embeddings.db"))
+    embeddings.configure()
+    body = {"content": {"parts": [{"text": "persisted document"}]}}
+    first = flask_app.test_client().post(MODEL_PATH + ":embedContent", json=body).get_json()
+    embeddings.configure()
+    assert flask_app.test_client().post(MODEL_PATH + ":embedContent", json=body).get_json() == first
+    assert len(upstream) == 1
+
+def test_upstream_errors_reach_every_waiting_request(upstream, monkeypatch):
+    def failing(model, input, **kwargs):
+        raise litellm.RateLimitError("slow down", llm_provider="openai", model=model)
+    monkeypatch.setattr(litellm, "embedding", failing)
+    resp = flask_app.test_client().post(MODEL_PATH + ":batchEmbedContents", json=batch_body(["x", "y"]))
+    assert resp.status_code == 429
+    assert resp.get_json()["error"]["status"] == "RESOURCE_EXHAUSTED"
+    assert embeddings.get_cache().get(embeddings.content_hash("openai/text-embedding-3-small", None, "x").hex()) is None
+
+def test_invalid_batches_are_client_errors(upstream):
+    client = flask_app.test_client()
+    empty = client.post(MODEL_PATH + ":batchEmbedContents", json={"requests": []})
+    assert empty.status_code == 400 and empty.get_json()["error"]["status"] == "INVALID_ARGUMENT"
+    mixed = batch_body(["a", "b"], 8)
+    mixed["requests"][1]["outputDimensionality"] = 16
+    status, body = call_asgi("POST", MODEL_PATH + ":batchEmbedContents", json.dumps(mixed).encode())
+    assert status == 400 and json.loads(body)["error"]["status"] == "INVALID_ARGUMENT"
+    assert not upstream
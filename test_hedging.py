@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import threading
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+from benchmarks import fake_litellm
+
+fake_litellm.FAKE_CHUNK_DELAY = 0
+fake_litellm.install()
+
+import litellm
+import pytest
+
+import hedging
+import routing
+from adapter import app
+from test_asgi_adapter import call_asgi
+
+STREAM_PATH = "/v1beta/models/groq/primary:streamGenerateContent"
+REQUEST_BODY = {"contents": [{"role": "user", "parts": [{"text": "Hello"}]}]}
+
+@pytest.fixture(autouse=True)
+def hedged_routes(tmp_path, monkeypatch):
+    path = tmp_path / "routing.json"
+    path.write_text(json.dumps({"fallbacks": {"groq/primary": ["deepseek/fallback"]}}))
+    monkeypatch.setenv("ROUTING_FILE", str(path))
+    monkeypatch.setenv("HEDGING", "true")
+    monkeypatch.setenv("HEDGE_DEFAULT_MS", "50")
+    monkeypatch.setenv("HEDGE_MIN_MS", "10")
+    routing.configure()
+    yield
+    monkeypatch.undo()
+    routing.configure()
+
+def provider(primary_delay=0.0, primary_error=None):
+    """Fake upstream answering with its model name; the primary is slow or failing"""
+    def chunks(model):
+        if model == "groq/primary":
+            if primary_error is not None:
+                raise primary_error
+            time.sleep(primary_delay)
+        yield fake_litellm.make_chunk(content=model)
+        yield fake_litellm.make_chunk(finish_reason="stop")
+
+    def completion(stream=False, model=None, **kwargs):
+        return chunks(model)
+
+    async def acompletion(stream=False, model=None, **kwargs):
+        async def generate():
+            for chunk in chunks(model):
+                yield chunk
+        return generate()
+    return completion, acompletion
+
+def texts(body):
+    frames = [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+    return "".join(p.get("text", "") for f in frames for c in f.get("candidates", []) for p in c.get("content", {}).get("parts", []))
+
+def test_slow_primary_is_hedged_and_fallback_wins(monkeypatch):
+    completion, _ = provider(primary_delay=0.5)
+    monkeypatch.setattr(litellm, "completion", completion)
+    started = time.perf_counter()
+    body = app.test_client().post(STREAM_PATH + "?alt=sse", json=REQUEST_BODY).get_data(as_text=True)
+    assert texts(body) == "deepseek/fallback"
+    assert time.perf_counter() - started < 0.4
+    assert hedging.stats()["counts"]["hedged"] >= 1
+
+def test_fast_primary_is_not_hedged(monkeypatch):
+    completion, _ = provider()
+    monkeypatch.setattr(litellm, "completion", completion)
+    assert texts(app.test_client().post(STREAM_PATH + "?alt=sse", json=REQUEST_BODY).get_data(as_text=True)) == "groq/primary"
+
+def test_primary_5xx_falls_back_immediately_in_asgi_mode(monkeypatch):
+    error = litellm.InternalServerError("boom", llm_provider="groq", model="primary")
+    _, acompletion = provider(primary_error=error)
+    monkeypatch.setattr(litellm, "acompletion", acompletion)
+    monkeypatch.setenv("HEDGE_DEFAULT_MS", "5000")
+    status, body = call_asgi("POST", STREAM_PATH, json.dumps(REQUEST_BODY).encode(), b"alt=sse")
+    assert status == 200 and texts(body.decode()) == "deepseek/fallback"
+    assert hedging.stats()["counts"]["fallback_after_error"] >= 1
+
+def test_threshold_follows_observed_ttft(monkeypatch):
+    monkeypatch.setenv("HEDGE_MIN_SAMPLES", "10")
+    for ms in range(1, 101):
+        hedging.record_ttft("test/ttft-model", ms / 1000)
+    assert hedging.threshold("test/ttft-model") == pytest.approx(0.091)
+
+def test_keepalive_comments_do_not_delay_the_hedge():
+    def keepalives():
+        for _ in range(20):
+            time.sleep(0.02)
+            yield ": queued\n\n"
+
+    def fallback():
+        yield "data: fallback\n\n"
+    started = time.perf_counter()
+    frames = [f for f in hedging.stream([("groq/primary", keepalives), ("deepseek/fallback", fallback)])
+              if not f.startswith(":")]
+    assert frames == ["data: fallback\n\n"]
+    assert time.perf_counter() - started < 0.3
+
+def test_losing_stream_is_closed_when_the_fallback_wins(monkeypatch):
+    closed = threading.Event()
+
+    class StalledPrimary:
+        def __iter__(self):
+            closed.wait(10)
+            raise ConnectionError("stream closed")
+
+        def close(self):
+            closed.set()
+
+    fallback, _ = provider()
+    monkeypatch.setattr(litellm, "completion",
+                        lambda model=None, **kwargs: StalledPrimary() if model == "groq/primary" else fallback(model=model))
+    body = app.test_client().post(STREAM_PATH + "?alt=sse", json=REQUEST_BODY).get_data(as_text=True)
+    assert texts(body) == "deepseek/fallback"
+    assert closed.wait(1)
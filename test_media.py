@@ -0,0 +1,131 @@
+import os
+import json
+import base64
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import litellm
+import pytest
+
+import adapter
+import media
+from adapter import app as flask_app
+from test_asgi_adapter import call_asgi
+from benchmarks.fake_litellm import make_response
+
+IMAGE = base64.b64encode(b"\x89PNG\r\n" + os.urandom(400 * 1024)).decode()
+PDF = base64.b64encode(b"%PDF-1.4 " + b"x" * 1000).decode()
+
+def image_request(tag, data=IMAGE):
+    return {"contents": [{"role": "user", "parts": [
+        {"text": f"What is in this picture? ({tag})"},
+        {"inlineData": {"mimeType": "image/png", "data": data}},
+    ]}]}
+
+@pytest.fixture
+def upstream(monkeypatch):
+    requests = []
+
+    def completion(stream=False, **kwargs):
+        requests.append(kwargs)
+        return make_response(3)
+
+    async def acompletion(stream=False, **kwargs):
+        requests.append(kwargs)
+        return make_response(3)
+    monkeypatch.setattr(litellm, "completion", completion)
+    monkeypatch.setattr(litellm, "acompletion", acompletion)
+    return requests
+
+def test_parts_translate_to_openai_content_parts():
+    messages = adapter.translate_content({"role": "user", "parts": [
+        {"text": "Compare "},
+        {"inlineData": {"mimeType": "application/pdf", "data": PDF}},
+        {"text": "with"},
+        {"fileData": {"mimeType": "image/jpeg", "fileUri": "https://example.com/a.jpg"}},
+        {"inlineData": {"mimeType": "audio/wav", "data": "UklGRg=="}},
+    ]})
+    assert messages == [{"role": "user", "content": [
+        {"type": "text", "text": "Compare "},
+        {"type": "file", "file": {"file_data": "data:application/pdf;base64," + PDF}},
+        {"type": "text", "text": "with"},
+        {"type": "image_url", "image_url": {"url": "https://example.com/a.jpg"}},
+        {"type": "input_audio", "input_audio": {"data": "UklGRg==", "format": "wav"}},
+    ]}]
+
+    # A file read by a tool comes back beside its functionResponse
+    tool = adapter.translate_content({"role": "user", "parts": [
+        {"functionResponse": {"name": "read_file", "response": {"output": "Binary content provided"}}},
+        {"inlineData": {"mimeType": "image/png", "data": "iVBORw=="}},
+    ]})
+    assert [m["role"] for m in tool] == ["tool", "user"]
+    assert tool[1]["content"][0]["image_url"]["url"] == "data:image/png;base64,iVBORw=="
+
+def test_large_blobs_are_spooled_and_only_materialized_for_the_upstream_call(monkeypatch):
+    monkeypatch.setenv("MEDIA_SPOOL_KB", "64")
+    _, openai_req = adapter.build_openai_request(image_request("spool"), "openai/gpt-4o")
+    url = openai_req["messages"][-1]["content"][1]["image_url"]["url"]
+    assert isinstance(url, media.BlobRef) and len(url) < 100
+    assert media.stats()["spooled_bytes"] >= len(IMAGE)
+
+    resolved = media.materialize(openai_req)
+    assert resolved["messages"][-1]["content"][1]["image_url"]["url"] == "data:image/png;base64," + IMAGE
+    assert openai_req["messages"][-1]["content"][1]["image_url"]["url"] is url
+
+    monkeypatch.setenv("MEDIA_SPOOL", "false")
+    _, inline = adapter.build_openai_request(image_request("inline"), "openai/gpt-4o")
+    assert not isinstance(inline["messages"][-1]["content"][1]["image_url"]["url"], media.BlobRef)
+
+def test_image_reaches_the_provider_in_both_modes(upstream, monkeypatch):
+    monkeypatch.setenv("MEDIA_SPOOL_KB", "64")
+    path = "/v1beta/models/openai/gpt-4o:generateContent"
+    assert flask_app.test_client().post(path, json=image_request("flask")).status_code == 200
+    status, _ = call_asgi("POST", path, json.dumps(image_request("asgi")).encode())
+    assert status == 200
+    for sent in upstream:
+        assert sent["messages"][-1]["content"][1]["image_url"]["url"] == "data:image/png;base64," + IMAGE
+
+def test_oversized_media_is_rejected(upstream, monkeypatch):
+    monkeypatch.setenv("MEDIA_MAX_MB", "0.1")
+    resp = flask_app.test_client().post("/v1beta/models/openai/gpt-4o:generateContent", json=image_request("big"))
+    assert resp.status_code == 400
+    assert resp.get_json()["error"]["status"] == "INVALID_ARGUMENT"
+    assert not upstream
+
+def test_parts_the_model_cannot_take_become_a_note(monkeypatch):
+    media._unsupported.cache_clear()
+    monkeypatch.setattr(litellm, "get_model_info", lambda model: {"supports_vision": True, "supports_pdf_input": False})
+    google_req = image_request("pdf", "iVBORw==")
+    google_req["contents"][0]["parts"].append({"inlineData": {"mimeType": "application/pdf", "data": PDF}})
+    _, openai_req = adapter.build_openai_request(google_req, "openai/no-pdf-model")
+    image, note = openai_req["messages"][-1]["content"][1:]
+    assert image["type"] == "image_url"
+    assert note == {"type": "text", "text": "[file attachment omitted: openai/no-pdf-model does not accept it]"}
+    media._unsupported.cache_clear()
+
+def test_file_uris_reach_only_gemini_and_other_routes_get_a_note(monkeypatch):
+    media._unsupported.cache_clear()
+    monkeypatch.setattr(litellm, "get_model_info", lambda model: {"supports_vision": True, "supports_pdf_input": True})
+    uri = "https://generativelanguage.googleapis.com/v1beta/files/abc"
+    google_req = {"contents": [{"role": "user", "parts": [
+        {"text": "Summarize"},
+        {"fileData": {"mimeType": "application/pdf", "fileUri": uri}},
+    ]}]}
+    _, gemini_req = adapter.build_openai_request(google_req, "gemini/gemini-1.5-pro")
+    assert gemini_req["messages"][-1]["content"][1] == {"type": "file", "file": {"file_id": uri, "format": "application/pdf"}}
+    _, openai_req = adapter.build_openai_request(google_req, "openai/gpt-4o")
+    assert openai_req["messages"][-1]["content"][1] == {
+        "type": "text", "text": f"[application/pdf attachment {uri} omitted: openai/gpt-4o can't read file URIs]"}
+    media._unsupported.cache_clear()
+
+def test_file_parts_need_the_capability_of_their_mime_type(monkeypatch):
+    media._unsupported.cache_clear()
+    monkeypatch.setattr(litellm, "get_model_info", lambda model: {"supports_audio_input": True, "supports_pdf_input": False})
+    google_req = {"contents": [{"role": "user", "parts": [
+        {"text": "Transcribe"},
+        {"inlineData": {"mimeType": "audio/ogg", "data": "T2dnUw=="}},
+        {"inlineData": {"mimeType": "text/csv", "data": "YSxi"}},
+    ]}]}
+    _, openai_req = adapter.build_openai_request(google_req, "openai/audio-model")
+    assert [part["type"] for part in openai_req["messages"][-1]["content"]] == ["text", "file", "file"]
+    media._unsupported.cache_clear()
@@ -0,0 +1,66 @@
+import os
+import threading
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+from benchmarks import fake_litellm
+
+fake_litellm.FAKE_CHUNK_DELAY = 0
+fake_litellm.install()
+
+import litellm
+import admission
+import metrics
+from adapter import app
+
+STREAM_PATH = "/v1beta/models/groq/fake-model:streamGenerateContent?alt=sse"
+JSON_PATH = "/v1/models/groq/fake-model:generateContent"
+REQUEST_BODY = {"contents": [{"role": "user", "parts": [{"text": "Hello"}]}]}
+
+def scrape():
+    response = app.test_client().get("/metrics")
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    samples = {}
+    for line in response.get_data(as_text=True).splitlines():
+        if not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+def test_requests_latency_and_tokens_per_model():
+    metrics.reset()
+    app.test_client().post(STREAM_PATH, json=REQUEST_BODY).get_data()
+    app.test_client().post(JSON_PATH, json=REQUEST_BODY)
+    samples = scrape()
+    model = 'model="groq/fake-model"'
+    assert samples[f'adapter_requests_total{{{model},stream="true"}}'] == 1
+    assert samples[f'adapter_requests_total{{{model},stream="false"}}'] == 1
+    assert samples[f'adapter_translation_seconds_count{{{model}}}'] == 2
+    assert samples[f'adapter_upstream_ttft_seconds_count{{{model}}}'] == 1
+    assert samples[f'adapter_stream_duration_seconds_bucket{{{model},le="+Inf"}}'] == 1
+    assert samples[f'adapter_request_duration_seconds_count{{{model}}}'] == 1
+    assert samples[f'adapter_prompt_tokens_total{{{model}}}'] == 20
+    assert samples[f'adapter_candidates_tokens_total{{{model}}}'] == 2 * fake_litellm.FAKE_CHUNKS
+
+def test_rate_limits_are_counted_separately(monkeypatch):
+    metrics.reset()
+    monkeypatch.setattr(admission, "RETRIES", 0)
+
+    def rate_limited(**kwargs):
+        raise litellm.RateLimitError("slow down", llm_provider="groq", model="fake-model")
+
+    monkeypatch.setattr(litellm, "completion", rate_limited)
+    app.test_client().post(JSON_PATH, json=REQUEST_BODY)
+    app.test_client().post(STREAM_PATH, json=REQUEST_BODY).get_data()
+    assert scrape()['adapter_errors_total{model="groq/fake-model",kind="rate_limit"}'] == 2
+    admission.reset()
+
+def test_values_of_exited_threads_are_kept():
+    metrics.reset()
+    threads = [threading.Thread(target=metrics.REQUESTS.inc, args=(("m", "true"),)) for _ in range(100)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert metrics.snapshot()[("adapter_requests_total", ("m", "true"))] == 100
+    assert metrics.snapshot()[("adapter_requests_total", ("m", "true"))] == 100
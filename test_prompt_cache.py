@@ -0,0 +1,76 @@
+import os
+import json
+from types import SimpleNamespace
+
+import pytest
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import adapter
+import metrics
+import prompt_cache
+import routing
+import translation_cache
+from benchmarks.fake_litellm import make_chunk
+from benchmarks.bench_translation import make_request, make_tools
+
+ANTHROPIC_MODEL = "anthropic/claude-sonnet-4-5"
+
+@pytest.fixture(autouse=True)
+def recompile_after(monkeypatch):
+    yield
+    monkeypatch.undo()
+    routing.configure()
+
+def test_tool_order_does_not_change_the_prefix_bytes():
+    google_req = make_request(3, make_tools(6))
+    shuffled = json.loads(json.dumps(google_req))
+    declarations = shuffled["tools"][0]["functionDeclarations"]
+    declarations.reverse()
+
+    first = adapter.google_to_openai_request(google_req, "deepseek/deepseek-chat")
+    second = adapter.google_to_openai_request(shuffled, "deepseek/deepseek-chat")
+    assert json.dumps(first["tools"]) == json.dumps(second["tools"])
+    assert json.dumps(first["messages"]) == json.dumps(second["messages"])
+
+def test_breakpoints_only_for_marked_providers_and_never_on_cached_translations(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "anthropic-key")
+    routing.configure()
+    google_req = make_request(4, make_tools(5))
+
+    _, openai_req = adapter.build_openai_request(google_req, ANTHROPIC_MODEL)
+    marked = [m["role"] for m in openai_req["messages"] if "cache_control" in m]
+    assert marked == ["system", openai_req["messages"][-1]["role"]]
+    assert [("cache_control" in t) for t in openai_req["tools"]] == [False] * 4 + [True]
+
+    # The shared translation is untouched, so other routes see no markers
+    messages, tools = translation_cache.get_cache().translate(
+        google_req, adapter.translate_system_instruction, adapter.translate_content, adapter.translate_tool_block)
+    assert not any("cache_control" in m for m in messages) and not any("cache_control" in t for t in tools)
+    _, plain = adapter.build_openai_request(google_req, "deepseek/deepseek-chat")
+    assert not any("cache_control" in m for m in plain["messages"] + plain["tools"])
+
+    monkeypatch.setenv("PROMPT_CACHE", "false")
+    _, off = adapter.build_openai_request(google_req, ANTHROPIC_MODEL)
+    assert not any("cache_control" in m for m in off["messages"] + off["tools"])
+
+def test_cached_tokens_reach_usage_metadata_and_metrics():
+    usage = SimpleNamespace(prompt_tokens=1200, completion_tokens=30, total_tokens=1230,
+                            prompt_tokens_details=SimpleNamespace(cached_tokens=1024))
+    state = adapter.new_stream_state()
+    frames = adapter.translate_stream_chunk(SimpleNamespace(choices=[], usage=usage), state)
+    assert '"cachedContentTokenCount"' in frames[0].replace(" ", "")
+    assert state["usage"]["cachedContentTokenCount"] == 1024
+
+    response = SimpleNamespace(choices=[make_chunk("hi", "stop").choices[0]], usage=SimpleNamespace(
+        prompt_tokens=50, completion_tokens=1, total_tokens=51, cache_read_input_tokens=40))
+    response.choices[0].message = SimpleNamespace(content="hi", tool_calls=None)
+    assert adapter.openai_to_google_response(response)["usageMetadata"]["cachedContentTokenCount"] == 40
+
+    before = metrics.snapshot().get((metrics.CACHED_PROMPT_TOKENS.name, ("cached-model",)), 0)
+    metrics.record_usage("cached-model", state["usage"])
+    assert metrics.snapshot()[(metrics.CACHED_PROMPT_TOKENS.name, ("cached-model",))] == before + 1024
+
+    no_cache = SimpleNamespace(prompt_tokens=5, completion_tokens=1, total_tokens=6)
+    assert "cachedContentTokenCount" not in adapter.translate_usage(no_cache)
+    assert prompt_cache.cached_tokens({"prompt_tokens_details": {"cached_tokens": 7}}) == 7
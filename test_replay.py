@@ -0,0 +1,50 @@
+import os
+import json
+import asyncio
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+from benchmarks import mock_provider
+from benchmarks.replay import load_requests
+
+REQUEST_BODY = {"contents": [{"role": "user", "parts": [{"text": "Hello"}]}]}
+
+def call_mock(body):
+    """Runs one chat completion through the mock provider's ASGI app, returning (status, body bytes)"""
+    scope = {"type": "http", "method": "POST", "path": "/v1/chat/completions", "headers": []}
+    messages = [{"type": "http.request", "body": json.dumps(body).encode(), "more_body": False}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.Event().wait()
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(mock_provider.app(scope, receive, send))
+    return sent[0]["status"], b"".join(m.get("body", b"") for m in sent[1:])
+
+def test_mock_streams_openai_chunks_with_tool_call(monkeypatch):
+    monkeypatch.setattr(mock_provider, "config", mock_provider.MockConfig(ttft=0, tokens=3, rate=0, tool_calls=1, rate_limit=0))
+    tools = [{"type": "function", "function": {"name": "list_files", "parameters": {}}}]
+    status, body = call_mock({"model": "mock-model", "stream": True, "messages": [], "tools": tools})
+    events = [line[len("data: "):] for line in body.decode().split("\n\n") if line]
+    assert status == 200 and events[-1] == "[DONE]"
+    chunks = [json.loads(e) for e in events[:-1]]
+    assert [c["choices"][0]["delta"].get("content") for c in chunks[:3]] == ["tok0 ", "tok1 ", "tok2 "]
+    assert chunks[3]["choices"][0]["delta"]["tool_calls"][0]["function"]["name"] == "list_files"
+    assert chunks[-1]["usage"]["completion_tokens"] == 3
+
+def test_mock_injects_rate_limits(monkeypatch):
+    monkeypatch.setattr(mock_provider, "config", mock_provider.MockConfig(ttft=0, tokens=1, rate=0, tool_calls=0, rate_limit=1))
+    status, body = call_mock({"model": "mock-model", "messages": []})
+    assert status == 429 and json.loads(body)["error"]["type"] == "rate_limit_error"
+
+def test_load_requests_accepts_captures_jsonl_and_json(tmp_path):
+    (tmp_path / "requests.jsonl").write_text(
+        json.dumps({"google_request": REQUEST_BODY}) + "\n" + json.dumps(REQUEST_BODY) + "\n" + json.dumps({"title": "x"}) + "\n")
+    (tmp_path / "google_request.json").write_text(json.dumps(REQUEST_BODY))
+    bodies = load_requests([str(tmp_path / "requests.jsonl"), str(tmp_path / "google_request.json")])
+    assert bodies == [REQUEST_BODY] * 3
@@ -0,0 +1,85 @@
+import os
+import json
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+from benchmarks import fake_litellm
+
+fake_litellm.FAKE_CHUNK_DELAY = 0
+fake_litellm.install()
+
+import response_cache
+from adapter import app
+from test_asgi_adapter import call_asgi
+
+STREAM_PATH = "/v1beta/models/groq/fake-model:streamGenerateContent?alt=sse"
+TOOLS = [{"functionDeclarations": [{"name": "list_files", "description": "List files",
+                                    "parameters": {"type": "object", "properties": {"path": {"type": "string"}}}}]}]
+
+def request_body(temperature):
+    return {"contents": [{"role": "user", "parts": [{"text": "List /tmp"}]}],
+            "tools": TOOLS, "generationConfig": {"temperature": temperature}}
+
+def post(path, body, headers=None):
+    response = app.test_client().post(path, json=body, headers=headers or {})
+    response.get_data()  # drain streams so they complete (and get recorded)
+    return response
+
+def test_stream_replay_is_byte_identical(tmp_path):
+    cache = response_cache.configure(True)
+    calls = fake_litellm.calls
+    first = post(STREAM_PATH, request_body(0)).data
+    second = post(STREAM_PATH, request_body(0)).data
+    assert fake_litellm.calls == calls + 1
+    assert second == first
+    assert b'"functionCall"' in second and b'"usageMetadata"' in second
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    response_cache.configure(False)
+
+def test_only_deterministic_requests_are_cached():
+    cache = response_cache.configure(True)
+    calls = fake_litellm.calls
+    post(STREAM_PATH, request_body(0.7))
+    post(STREAM_PATH, request_body(0.7))
+    assert fake_litellm.calls == calls + 2
+    post(STREAM_PATH, request_body(0.7), {"X-Adapter-Cache": "force"})
+    post(STREAM_PATH, request_body(0.7), {"X-Adapter-Cache": "force"})
+    assert fake_litellm.calls == calls + 3
+    post(STREAM_PATH, request_body(0), {"X-Adapter-Cache": "off"})
+    assert fake_litellm.calls == calls + 4
+    assert cache.stats()["stores"] == 1
+    response_cache.configure(False)
+
+def test_disk_tier_survives_restart(tmp_path, monkeypatch):
+    monkeypatch.setenv("RESPONSE_CACHE_DB", str(tmp_path / "cache.sqlite3"))
+    response_cache.configure(True)
+    path = "/v1/models/groq/fake-model:generateContent"
+    first = post(path, request_body(0)).get_json()
+
+    # A new process starts with an empty memory tier
+    cache = response_cache.configure(True)
+    calls = fake_litellm.calls
+    assert post(path, request_body(0)).get_json() == first
+    assert fake_litellm.calls == calls
+    assert cache.stats()["disk_hits"] == 1
+    stats = app.test_client().get("/adapter/stats").get_json()
+    assert stats["response_cache"]["hits"] == 1
+    response_cache.configure(False)
+
+def test_api_key_is_not_part_of_the_key():
+    req = {"model": "groq/x", "messages": [{"role": "user", "content": "hi"}], "temperature": 0}
+    assert response_cache.cache_key("json", dict(req, api_key="a")) == response_cache.cache_key("json", dict(req, api_key="b"))
+    assert response_cache.cache_key("json", req) != response_cache.cache_key("stream", req)
+
+def test_asgi_mode_uses_the_disk_tier_off_the_event_loop(tmp_path, monkeypatch):
+    monkeypatch.setenv("RESPONSE_CACHE_DB", str(tmp_path / "cache.sqlite3"))
+    response_cache.configure(True)
+    status, first = call_asgi("POST", STREAM_PATH.split("?")[0], json.dumps(request_body(0)).encode(), b"alt=sse")
+    assert status == 200
+
+    cache = response_cache.configure(True)
+    calls = fake_litellm.calls
+    status, second = call_asgi("POST", STREAM_PATH.split("?")[0], json.dumps(request_body(0)).encode(), b"alt=sse")
+    assert status == 200 and second == first and fake_litellm.calls == calls
+    assert cache.stats()["disk_hits"] == 1
+    response_cache.configure(False)
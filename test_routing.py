@@ -0,0 +1,82 @@
+import os
+import gc
+import json
+import time
+import signal
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import pytest
+
+import routing
+import context_fit
+
+@pytest.fixture(autouse=True)
+def recompile_after(monkeypatch):
+    yield
+    monkeypatch.undo()
+    routing.configure()
+
+def test_default_table_keeps_historical_routing(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "groq-key")
+    monkeypatch.setenv("GEMINI_API_KEY", "gemini-key")
+    routing.configure()
+    assert routing.resolve("github_copilot/gpt-4o").target_model == "github/gpt-4o"
+    assert routing.resolve("deepseek/deepseek-chat").target_model == "deepseek/deepseek-chat"
+    assert routing.resolve("gpt-4o-mini").target_model == "openai/gpt-4o-mini"
+    assert routing.resolve("o1-preview").target_model == "openai/o1-preview"
+    gemini = routing.resolve("gemini-2.5-pro")
+    assert (gemini.target_model, gemini.api_key, gemini.pool) == ("gemini/gemini-2.5-pro", "gemini-key", None)
+    groq = routing.resolve("groq/llama-3.1-8b-instant")
+    assert groq.api_key == "groq-key" and groq.pool.api_base == "https://api.groq.com/openai/v1"
+    assert routing.upstream_kwargs(groq)["client"] is groq.pool.sync_client()
+
+@pytest.mark.skipif(not hasattr(signal, "SIGHUP"), reason="no SIGHUP on this platform")
+def test_routing_file_is_reloaded_on_sighup(tmp_path, monkeypatch):
+    path = tmp_path / "routing.json"
+    path.write_text(json.dumps({
+        "providers": {"vllm": {"api_base": "http://gpu-box:8000/v1", "pooled": True, "limits": {"max_input_tokens": 100}}},
+        "routes": [{"regex": "^local-(?P<name>.+)$", "model": "openai/{name}", "provider": "vllm"}],
+    }))
+    monkeypatch.setenv("ROUTING_FILE", str(path))
+    routing.configure()
+    routing.install_reload_handler()
+    route = routing.resolve("local-llama")
+    assert (route.target_model, route.provider, route.limits) == ("openai/llama", "vllm", {"max_input_tokens": 100})
+    assert routing.upstream_kwargs(route)["client"].base_url == "http://gpu-box:8000/v1/"
+    pool = route.pool
+
+    path.write_text(json.dumps({
+        "providers": {"vllm": {"api_base": "http://gpu-box:8000/v1", "pooled": True}},
+        "routes": [{"prefix": "mine-", "model": "openai/{rest}", "provider": "vllm"}],
+    }))
+    os.kill(os.getpid(), signal.SIGHUP)
+    deadline = time.monotonic() + 5
+    while routing.resolve("local-llama").target_model != "gemini/local-llama":
+        assert time.monotonic() < deadline, "routing table not reloaded"
+        time.sleep(0.01)
+    assert routing.resolve("mine-llama").pool is pool
+
+def test_replaced_pool_is_closed_once_its_last_route_is_gone(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "old-key")
+    routing.configure()
+    route = routing.resolve("groq/llama-3.1-8b-instant")
+    client = routing.upstream_kwargs(route)["client"]
+    monkeypatch.setenv("GROQ_API_KEY", "new-key")
+    routing.configure()
+    gc.collect()
+    # A request still holding the old route keeps its pool open
+    assert routing.resolve("groq/llama-3.1-8b-instant").pool is not route.pool
+    assert not client.is_closed()
+    del route
+    gc.collect()
+    assert client.is_closed()
+
+def test_route_limits_take_precedence_in_context_fitting():
+    messages = [
+        {"role": "user", "content": "word " * 400},
+        {"role": "assistant", "content": "ok"},
+        {"role": "user", "content": "Hello"},
+    ]
+    fitted = context_fit.fit_request({"model": "groq/x", "messages": messages}, "groq/x", {"max_input_tokens": 100})
+    assert fitted["messages"] == messages[-1:]
@@ -0,0 +1,141 @@
+import os
+import json
+import asyncio
+import threading
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+from benchmarks import fake_litellm
+
+fake_litellm.FAKE_CHUNK_DELAY = 0
+fake_litellm.install()
+
+import litellm
+import pytest
+
+import single_flight
+from adapter import app, stream_frames
+from asgi_adapter import astream_frames
+
+STREAM_PATH = "/v1beta/models/groq/fake-model:streamGenerateContent?alt=sse"
+REQUEST_BODY = {"contents": [{"role": "user", "parts": [{"text": "Hello"}]}]}
+OPENAI_REQ = {"model": "groq/fake-model", "messages": [{"role": "user", "content": "Hello"}]}
+
+def test_concurrent_streams_share_one_upstream_call(monkeypatch):
+    monkeypatch.setenv("SINGLE_FLIGHT", "true")
+    monkeypatch.setattr(fake_litellm, "FAKE_CHUNK_DELAY", 0.01)
+    calls = fake_litellm.calls
+    bodies = []
+
+    def client():
+        bodies.append(app.test_client().post(STREAM_PATH, json=REQUEST_BODY).get_data())
+
+    threads = [threading.Thread(target=client) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert fake_litellm.calls == calls + 1
+    assert len(set(bodies)) == 1
+    assert bodies[0].count(b"data: ") == fake_litellm.FAKE_CHUNKS + 2
+    assert single_flight.stats()["threads"]["in_flight"] == 0
+
+def test_early_disconnect_does_not_break_other_subscribers(monkeypatch):
+    monkeypatch.setattr(fake_litellm, "FAKE_CHUNK_DELAY", 0.01)
+    flights = single_flight.AsyncSingleFlight()
+
+    async def read(limit=None):
+        frames = []
+        stream = flights.stream("key", lambda: astream_frames(OPENAI_REQ))
+        async for frame in stream:
+            frames.append(frame)
+            if len(frames) == limit:
+                await stream.aclose()
+                break
+        return frames
+
+    async def main():
+        return await asyncio.gather(read(), read(limit=2), read())
+
+    calls = fake_litellm.calls
+    full, partial, other = asyncio.run(main())
+    assert fake_litellm.calls == calls + 1
+    assert len(partial) == 2
+    assert full == other and len(full) == fake_litellm.FAKE_CHUNKS + 2
+    assert flights.stats()["cancelled"] == 0
+
+def test_upstream_closed_when_all_subscribers_leave(monkeypatch):
+    monkeypatch.setattr(fake_litellm, "FAKE_CHUNK_DELAY", 0.01)
+    flights = single_flight.AsyncSingleFlight()
+
+    async def main():
+        stream = flights.stream("key", lambda: astream_frames(OPENAI_REQ))
+        first = await stream.__anext__()
+        await stream.aclose()
+        await asyncio.sleep(0.05)
+        return first
+
+    assert json.loads(asyncio.run(main())[len("data: "):])["candidates"]
+    assert flights.stats() == {"leaders": 1, "joined": 0, "cancelled": 1, "in_flight": 0}
+
+class StalledStream:
+    """Upstream stream that sends one chunk, then nothing until it is closed"""
+
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        yield fake_litellm.make_chunk("Hello")
+        if not self.closed.wait(10):
+            yield fake_litellm.make_chunk(finish_reason="stop")
+        raise ConnectionError("stream closed")
+
+    def close(self):
+        self.closed.set()
+
+def test_stalled_upstream_closed_when_the_last_thread_subscriber_leaves(monkeypatch):
+    upstream = StalledStream()
+    monkeypatch.setattr(litellm, "completion", lambda **kwargs: upstream)
+    flights = single_flight.SingleFlight()
+    stream = flights.stream("key", lambda: stream_frames(OPENAI_REQ))
+    assert next(stream).startswith("data: ")
+    stream.close()
+    assert upstream.closed.wait(1)
+    for _ in range(100):
+        if flights.stats()["in_flight"] == 0:
+            break
+        threading.Event().wait(0.01)
+    assert flights.stats() == {"leaders": 1, "joined": 0, "cancelled": 1, "in_flight": 0}
+
+def test_join_right_after_the_last_subscriber_left_starts_a_new_flight():
+    flights = single_flight.AsyncSingleFlight()
+
+    async def upstream():
+        for i in range(5):
+            await asyncio.sleep(0.01)
+            yield i
+
+    async def main():
+        leader = flights.stream("key", upstream)
+        await leader.__anext__()
+        await leader.aclose()
+        # Same tick: the abandoned flight's pump hasn't seen its cancel yet
+        return [frame async for frame in flights.stream("key", upstream)]
+
+    assert asyncio.run(main()) == [0, 1, 2, 3, 4]
+    assert flights.stats() == {"leaders": 2, "joined": 0, "cancelled": 1, "in_flight": 0}
+
+def test_failing_to_start_the_upstream_stream_ends_the_flight():
+    flights = single_flight.AsyncSingleFlight()
+
+    def broken():
+        raise ValueError("no stream")
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                async for _ in flights.stream("key", broken):
+                    pass
+
+    asyncio.run(asyncio.wait_for(main(), 5))
+    assert flights.stats()["in_flight"] == 0
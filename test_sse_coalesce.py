@@ -0,0 +1,69 @@
+import os
+import json
+import time
+import asyncio
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+from benchmarks.fake_litellm import make_chunk, make_tool_call_delta
+
+import litellm
+
+import adapter
+import asgi_adapter
+import sse_coalesce
+
+def test_text_frame_matches_generic_serialization():
+    for text in ["tok ", 'quote " and \\ slash\n', "héllo 🌍", ""]:
+        payload = {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}]}
+        assert sse_coalesce.text_frame(text) == adapter.sse_frame(payload)
+
+def test_first_delta_is_immediate_then_merged_within_the_window():
+    c = sse_coalesce.Coalescer(0.010, 1024)
+    assert c.add("a", now=0.0) == [sse_coalesce.text_frame("a")]
+    assert c.add("b", now=0.001) == []
+    assert c.add("c", now=0.005) == []
+    assert c.add("d", now=0.012) == [sse_coalesce.text_frame("bcd")]
+    # A slow stream is not held back
+    assert c.add("e", now=0.100) == [sse_coalesce.text_frame("e")]
+
+def test_byte_limit_flushes_early():
+    c = sse_coalesce.Coalescer(10, 4)
+    c.add("first", now=0)
+    assert c.add("ab", now=0) == [] and c.add("cd", now=0) == [sse_coalesce.text_frame("abcd")]
+
+def test_other_frames_flush_held_text_first(monkeypatch):
+    monkeypatch.setenv("SSE_COALESCE_MS", "60000")
+    state = adapter.new_stream_state()
+    frames = []
+    for chunk in [make_chunk(content="one "), make_chunk(content="two "), make_chunk(content="three "),
+                  make_chunk(tool_calls=[make_tool_call_delta(0, "ls", "{}")]), make_chunk(finish_reason="tool_calls")]:
+        frames += adapter.translate_stream_chunk(chunk, state)
+    frames += adapter.flush_stream_text(state)
+    parts = [json.loads(f[len("data: "):])["candidates"][0].get("content", {}).get("parts") for f in frames]
+    assert parts == [[{"text": "one "}], [{"text": "two three "}], [{"functionCall": {"name": "ls", "args": {}}}], None]
+
+def test_held_text_goes_out_at_the_window_end_without_another_chunk(monkeypatch):
+    monkeypatch.setenv("SSE_COALESCE_MS", "50")
+
+    def chunks():
+        yield make_chunk(content="a")
+        yield make_chunk(content="b")
+        time.sleep(0.4)
+        yield make_chunk(finish_reason="stop")
+
+    async def achunks():
+        yield make_chunk(content="a")
+        yield make_chunk(content="b")
+        await asyncio.sleep(0.4)
+        yield make_chunk(finish_reason="stop")
+    monkeypatch.setattr(litellm, "completion", lambda **kwargs: chunks())
+    monkeypatch.setattr(litellm, "acompletion", lambda **kwargs: asyncio.sleep(0, achunks()))
+    openai_req = {"model": "groq/coalesce-test", "messages": [{"role": "user", "content": "hi"}]}
+
+    async def collect():
+        return [(f, time.perf_counter()) async for f in asgi_adapter.astream_frames(openai_req)]
+    for frames in ([(f, time.perf_counter()) for f in adapter.stream_frames(openai_req)], asyncio.run(collect())):
+        assert [f for f, _ in frames[:2]] == [sse_coalesce.text_frame("a"), sse_coalesce.text_frame("b")]
+        # "b" did not wait for the finish chunk
+        assert frames[2][1] - frames[1][1] > 0.2
@@ -0,0 +1,47 @@
+import os
+import sys
+import json
+import threading
+import subprocess
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import litellm
+
+import startup
+from adapter import app as flask_app
+from test_asgi_adapter import call_asgi
+
+def test_adapter_imports_without_litellm():
+    code = ("import sys, adapter, asgi_adapter, routing; "
+            "assert 'litellm' not in sys.modules; "
+            "assert routing.resolve('groq/llama3').pool is not None; "
+            "assert 'litellm' not in sys.modules; "
+            "assert routing.resolve('groq/llama3').pool.api_base == 'https://api.groq.com/openai/v1'; "
+            "assert 'litellm' in sys.modules")
+    env = dict(os.environ, LITELLM_PRELOAD="false", GROQ_API_KEY="groq-key")
+    subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)), env=env, check=True)
+
+def test_proxy_forwards_to_the_current_module_attributes(monkeypatch):
+    def completion(**kwargs):
+        return "patched"
+    monkeypatch.setattr(litellm, "completion", completion)
+    assert startup.litellm.completion is completion
+    assert startup.loaded()
+
+def test_ready_after_load_and_warm_up(monkeypatch):
+    monkeypatch.setattr(startup, "_state", {"litellm_load_s": None, "warm": True, "ready_s": None})
+    warm = threading.Event()
+    thread = startup.begin(warm.wait)
+
+    assert flask_app.test_client().get("/adapter/ready").status_code == 503
+    status, body = call_asgi("GET", "/adapter/ready")
+    assert status == 503 and json.loads(body)["providers_warm"] is False
+
+    warm.set()
+    thread.join(10)
+    response = flask_app.test_client().get("/adapter/ready")
+    assert response.status_code == 200
+    assert response.get_json()["ready"] and response.get_json()["litellm_loaded"]
+    status, body = call_asgi("GET", "/adapter/ready")
+    assert status == 200 and json.loads(body)["ready_after_s"] is not None
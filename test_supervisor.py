@@ -0,0 +1,83 @@
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import argparse
+import subprocess
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import pytest
+
+import supervisor
+from benchmarks import replay
+
+STREAM_PATH = "/v1beta/models/openai/mock-model:streamGenerateContent?alt=sse"
+REQUEST_BODY = json.dumps({"contents": [{"role": "user", "parts": [{"text": "Hello"}]}]}).encode()
+
+@pytest.fixture(scope="module")
+def mock():
+    # 30 tokens at 15/s: a stream stays open for about 2 seconds
+    proc = replay.start_mock(argparse.Namespace(ttft=0.05, tokens=30, rate=15, tool_calls=0, rate_limit=0))
+    yield
+    proc.terminate()
+    proc.wait()
+
+def wait_for(condition, timeout, message):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, message
+        time.sleep(0.1)
+
+def open_stream(port):
+    sock = socket.create_connection(("127.0.0.1", port), timeout=20)
+    sock.sendall(f"POST {STREAM_PATH} HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(REQUEST_BODY)}\r\nConnection: close\r\n\r\n".encode("ascii") + REQUEST_BODY)
+    return sock
+
+def read_all(sock):
+    received = b""
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            return received
+        received += data
+
+@pytest.mark.parametrize("mode, port", [("flask", 5231), ("asgi", 5232)])
+def test_reload_drains_open_streams_and_crashed_workers_restart(mock, tmp_path, monkeypatch, mode, port):
+    monkeypatch.setenv("ADAPTER_RUN_DIR", str(tmp_path))
+    env = dict(os.environ, ADAPTER_WORKERS="2", ADAPTER_SERVER=mode, ADAPTER_HOST="127.0.0.1", ADAPTER_PORT=str(port),
+               ADAPTER_HEALTH_INTERVAL_S="0.5", OPENAI_API_BASE=f"http://127.0.0.1:{replay.MOCK_PORT}/v1",
+               OPENAI_API_KEY="mock", LOG_LEVEL="WARNING")
+    proc = subprocess.Popen([sys.executable, "supervisor.py"], cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+    try:
+        wait_for(lambda: len(supervisor.running_status()[1]) == 2, 60, "workers didn't start")
+        wait_for(lambda: all(supervisor.probe(w["health_port"]) for w in supervisor.running_status()[1]), 60,
+                 "workers didn't get ready")
+        first = {w["pid"] for w in supervisor.running_status()[1]}
+
+        # A stream open during the reload is finished by its old worker
+        sock = open_stream(port)
+        wait_for(lambda: sum(w["streams"] for w in supervisor.running_status()[1]) == 1, 10, "stream not seen")
+        proc.send_signal(signal.SIGHUP)
+        wait_for(lambda: supervisor.running_status()[0]["generation"] == 2 and supervisor.running_status()[0]["reloads"] == 1,
+                 60, "reload didn't complete")
+        body = read_all(sock).decode()
+        assert body.count("tok") == 30 and '"finishReason": "STOP"' in body.replace('":"', '": "')
+        wait_for(lambda: not first & {w["pid"] for w in supervisor.running_status()[1]}, 10, "old workers didn't exit")
+
+        # New connections go to the new generation
+        assert read_all(open_stream(port)).count(b"tok") == 30
+
+        # A killed worker is replaced
+        victim = supervisor.running_status()[1][0]["pid"]
+        os.kill(victim, signal.SIGKILL)
+        wait_for(lambda: supervisor.running_status()[0]["restarts"] >= 1
+                 and len(supervisor.running_status()[1]) == 2, 60, "worker not restarted")
+        assert victim not in {w["pid"] for w in supervisor.running_status()[1]}
+    finally:
+        proc.terminate()
+        proc.wait(30)
+    assert supervisor.running_status() == (None, [])
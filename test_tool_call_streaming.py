@@ -0,0 +1,40 @@
+import os
+import json
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+from benchmarks.fake_litellm import make_chunk, make_tool_call_delta
+
+import adapter
+
+def translate(chunks):
+    """Frames per chunk, decoded"""
+    state = adapter.new_stream_state()
+    return [[json.loads(f[len("data: "):]) for f in adapter.translate_stream_chunk(c, state)] for c in chunks]
+
+def calls(frames):
+    return [p["functionCall"] for f in frames for c in f.get("candidates", []) for p in c.get("content", {}).get("parts", [])
+            if "functionCall" in p]
+
+def test_tool_call_is_emitted_when_its_arguments_close():
+    frames = translate([
+        make_chunk(tool_calls=[make_tool_call_delta(0, "read_file", '{"path": "/a}{')]),
+        make_chunk(tool_calls=[make_tool_call_delta(0, None, '", "opts": {"n": [1]}')]),
+        make_chunk(tool_calls=[make_tool_call_delta(0, None, '}')]),
+        make_chunk(tool_calls=[make_tool_call_delta(1, "list_dir", '{"path": "/b"}')]),
+        make_chunk(finish_reason="tool_calls"),
+    ])
+    assert [calls(f) for f in frames[:2]] == [[], []]
+    assert calls(frames[2]) == [{"name": "read_file", "args": {"path": "/a}{", "opts": {"n": [1]}}}]
+    assert calls(frames[3]) == [{"name": "list_dir", "args": {"path": "/b"}}]
+    assert calls(frames[4]) == [] and frames[4][0]["candidates"][0]["finishReason"] == "STOP"
+
+def test_next_index_completes_a_call_and_leftovers_go_with_the_finish():
+    frames = translate([
+        make_chunk(tool_calls=[make_tool_call_delta(0, "first", '"not an object"')]),
+        make_chunk(tool_calls=[make_tool_call_delta(1, "second", '{"path": ')]),
+        make_chunk(finish_reason="tool_calls"),
+    ])
+    assert calls(frames[0]) == []
+    assert calls(frames[1]) == [{"name": "first", "args": {}}]
+    assert calls(frames[2]) == [{"name": "second", "args": {}}]
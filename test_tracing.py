@@ -0,0 +1,68 @@
+import os
+import json
+import time
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+from benchmarks import fake_litellm
+
+fake_litellm.FAKE_CHUNK_DELAY = 0
+fake_litellm.install()
+
+import tracing
+from adapter import app
+
+STREAM_PATH = "/v1beta/models/groq/fake-model:streamGenerateContent?alt=sse"
+JSON_PATH = "/v1/models/groq/fake-model:generateContent"
+REQUEST_BODY = {"contents": [{"role": "user", "parts": [{"text": "Hello"}]}]}
+
+def test_non_streaming_response_has_server_timing():
+    traceparent = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+    response = app.test_client().post(JSON_PATH, json=REQUEST_BODY, headers={"traceparent": traceparent})
+    assert response.headers["X-Trace-Id"] == "0af7651916cd43dd8448eb211c80319c"
+    phases = [entry.split(";")[0] for entry in response.headers["Server-Timing"].split(", ")]
+    assert phases == ["parse", "translate", "context_fit", "prepare", "upstream", "total"]
+
+def test_stream_trailer_and_otlp_export(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRACE_FILE", str(tmp_path / "traces.jsonl"))
+    monkeypatch.setenv("TRACE_STREAM_TRAILER", "true")
+    tracing.configure()
+    try:
+        response = app.test_client().post(STREAM_PATH, json=REQUEST_BODY)
+        body = response.get_data(as_text=True)
+        tracing.flush()
+    finally:
+        monkeypatch.delenv("TRACE_FILE")
+        tracing.configure()
+
+    trailer = body.rstrip("\n").rsplit("\n\n", 1)[1]
+    assert trailer.startswith(": server-timing ") and "upstream_ttfb;dur=" in trailer and "stream;dur=" in trailer
+    exported = [json.loads(line) for line in (tmp_path / "traces.jsonl").read_text().splitlines()]
+    spans = exported[0]["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    root = spans[0]
+    assert root["traceId"] == response.headers["X-Trace-Id"] and root["name"] == "generateContent"
+    assert [s["name"] for s in spans[1:]] == ["parse", "translate", "context_fit", "prepare", "upstream_setup", "upstream_ttfb", "stream"]
+    assert all(s["parentSpanId"] == root["spanId"] for s in spans[1:])
+    assert int(root["endTimeUnixNano"]) >= int(spans[-1]["endTimeUnixNano"])
+
+def test_only_slowest_requests_are_profiled(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRACE_PROFILE_SLOWEST", "10")
+    monkeypatch.setenv("TRACE_PROFILE_INTERVAL_MS", "1")
+    monkeypatch.setenv("TRACE_PROFILE_DIR", str(tmp_path))
+    tracing.configure()
+    try:
+        for _ in range(30):
+            tracing.finish(tracing.start("fast"))
+        slow = tracing.start("slow")
+        deadline = time.time() + 0.1
+        while time.time() < deadline:
+            sum(range(1000))
+        tracing.finish(slow)
+    finally:
+        monkeypatch.delenv("TRACE_PROFILE_SLOWEST")
+        tracing.configure()
+
+    # A fast trace could be profiled too if the sampler happened to catch it, but never most of them
+    profiles = os.listdir(tmp_path)
+    assert f"{slow.trace_id}.folded" in profiles and len(profiles) <= 3
+    assert "test_only_slowest_requests_are_profiled" in (tmp_path / f"{slow.trace_id}.folded").read_text()
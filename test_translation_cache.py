@@ -0,0 +1,55 @@
+import os
+import json
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import adapter
+import media
+import translation_cache
+from benchmarks.bench_translation import make_request, make_tools
+
+def translate(google_req):
+    return adapter.google_to_openai_request(json.loads(json.dumps(google_req)), "groq/test-model")
+
+def test_incremental_translation_matches_uncached():
+    tools = make_tools(5)
+    translation_cache.configure(0)
+    expected = [translate(make_request(turns, tools)) for turns in range(1, 8)]
+
+    cache = translation_cache.configure(16)
+    actual = [translate(make_request(turns, tools)) for turns in range(1, 8)]
+    assert actual == expected
+    # Every turn after the first request only translates its 3 new contents
+    assert cache.stats()["turns_translated"] == 3 * 7
+
+def test_diverged_history_is_retranslated():
+    tools = make_tools(2)
+    cache = translation_cache.configure(16)
+    req = make_request(4, tools)
+    translate(req)
+    req["contents"][5]["parts"][0]["functionResponse"]["response"] = {"output": "rewritten"}
+    translation_cache.configure(0)
+    expected = translate(req)
+    translation_cache._cache = cache
+    assert translate(req) == expected
+    assert cache.stats()["turns_reused"] == 5
+
+def test_memory_cap_evicts_least_recent_conversation():
+    cache = translation_cache.configure(0.05)
+    for i in range(50):
+        req = make_request(3, [])
+        req["contents"][0]["parts"][0]["text"] = f"conversation {i}"
+        translate(req)
+    stats = cache.stats()
+    assert stats["bytes"] <= stats["max_bytes"]
+    assert stats["evictions"] > 0
+    translation_cache.configure()
+
+def test_size_of_multimodal_messages_counts_part_data_and_spooled_blobs():
+    blob = media.BlobRef(media.Blob("d" * 32, b"x" * 500000), "data:image/png;base64,")
+    text = {"role": "user", "content": "describe " * 100}
+    parts = {"role": "user", "content": [{"type": "text", "text": "describe " * 100},
+                                         {"type": "image_url", "image_url": {"url": "data:image/png;base64," + "A" * 3000}}]}
+    spooled = {"role": "user", "content": [{"type": "image_url", "image_url": {"url": blob}}]}
+    assert translation_cache.estimate_size([parts]) > translation_cache.estimate_size([text]) + 2 * 3000
+    assert translation_cache.estimate_size([spooled]) >= 500000
@@ -0,0 +1,82 @@
+"""
+Local token counting for routed models.
+
+Counts go through LiteLLM's tokenizer selection (tiktoken for OpenAI-style
+models, bundled HuggingFace tokenizers where LiteLLM ships them). Tokenizer
+downloads are disabled unless ALLOW_TOKENIZER_DOWNLOAD=true, so counting never
+blocks a request on the network; LiteLLM then falls back to tiktoken.
+
+Per-message counts are memoized twice: by object identity, which is free for
+messages reused from the translation cache, and by content hash for everything
+else, so repeat turns never re-run the tokenizer.
+"""
+import os
+import json
+
+import adapter_log
+import media
+import startup
+from startup import litellm
+from translation_cache import LRUCache, content_hash
+
+# Number of memoized counts kept per memo table
+MEMO_ENTRIES = 100000
+# Estimate used where the tokenizer fails or the text isn't kept
+CHARS_PER_TOKEN = 4
+
+@startup.on_load
+def _disable_downloads(module):
+    module.disable_hf_tokenizer_download = os.getenv('ALLOW_TOKENIZER_DOWNLOAD', '').lower() != 'true'
+
+# Plain dict on the hot path (single lookups are atomic under the GIL); cleared when full
+_by_identity = {}
+_by_hash = LRUCache(MEMO_ENTRIES)
+
+def _tokenize_count(model, **kwargs):
+    """Runs the tokenizer, falling back to a 4-chars-per-token estimate"""
+    try:
+        return litellm.token_counter(model=model, **kwargs)
+    except Exception as e:
+        adapter_log.debug("Token counting failed, estimating", model=model, error=type(e).__name__)
+        return len(json.dumps(kwargs)) // CHARS_PER_TOKEN
+
+def _memoized(model, kind, obj, count_fn):
+    # The identity entry holds a reference to obj, so its id can't be reused while cached
+    key = (model, kind, id(obj))
+    entry = _by_identity.get(key)
+    if entry is not None and entry[0] is obj:
+        return entry[1]
+    hash_key = (model, kind, content_hash(obj))
+    tokens = _by_hash.get(hash_key)
+    if tokens is None:
+        tokens = count_fn()
+        _by_hash.put(hash_key, tokens, 1)
+    if len(_by_identity) >= MEMO_ENTRIES:
+        _by_identity.clear()
+    _by_identity[key] = (obj, tokens)
+    return tokens
+
+def _count_message(model, message):
+    # Media parts get a flat estimate: tokenizers only count text, and spooled blobs aren't read here
+    text_message, media_parts = media.text_view(message)
+    return _tokenize_count(model, messages=[text_message]) + media_parts * media.MEDIA_PART_TOKENS
+
+def count_message_tokens(model, message):
+    """Tokens of one OpenAI chat message, including per-message overhead"""
+    return _memoized(model, 'message', message, lambda: _count_message(model, message))
+
+def count_tool_tokens(model, tool):
+    """Tokens of one OpenAI tool definition"""
+    return _memoized(model, 'tool', tool, lambda: _tokenize_count(model, text=json.dumps(tool['function'])))
+
+def count_request_tokens(model, messages, tools=()):
+    """Tokens of a whole chat request, from the memoized message and tool counts"""
+    return sum(count_message_tokens(model, m) for m in messages) + sum(count_tool_tokens(model, t) for t in tools)
+
+def count_text_tokens(model, text):
+    """Tokens of a plain string (not memoized)"""
+    return _tokenize_count(model, text=text)
+
+def stats():
+    """Memo table counters"""
+    return {"identity_entries": len(_by_identity), "hash": _by_hash.stats()}
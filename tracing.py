@@ -0,0 +1,329 @@
+"""
+Per-request tracing: phase spans, Server-Timing and OTLP JSON export.
+
+Every sampled request (TRACE_SAMPLE_RATE, default 1.0) gets a trace whose
+spans cover the phases of the request pipeline:
+  parse           request body parsing
+  translate       google_to_openai_request
+  context_fit     context_fit.fit_request
+  prepare         copies for LiteLLM and credentials
+  queue           waiting for the provider's admission queue (only when it had to wait)
+  upstream_setup  litellm.completion until it returns (client setup, request sent, response headers)
+  upstream_ttfb   from there to the first streamed chunk
+  stream          first chunk to the last SSE frame
+  upstream        a whole non-streaming completion
+The trace id is returned in the X-Trace-Id header; an incoming W3C
+`traceparent` header continues the caller's trace. Non-streaming responses
+carry a Server-Timing header. Streaming responses end with an SSE comment
+line `: server-timing ...` when TRACE_STREAM_TRAILER=true (off by default, as
+not every SSE client ignores comment lines).
+
+TRACE_FILE appends each finished trace as one OTLP/JSON ExportTraceServiceRequest
+per line (the format of the OpenTelemetry file exporter), written by a
+background thread.
+
+TRACE_PROFILE_SLOWEST=N samples the stacks of traced requests every
+TRACE_PROFILE_INTERVAL_MS (default 10) and keeps the profile only for
+requests in the slowest N% of recent ones, as collapsed stacks (flamegraph
+format) in TRACE_PROFILE_DIR/<trace_id>.folded. In the ASGI mode, samples are
+only attributed while a single traced request is active on the event loop.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import random
+import threading
+import contextvars
+import collections
+
+import adapter_log
+
+TRACE_ID_HEADER = 'X-Trace-Id'
+DEFAULT_PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "debug_logs", "profiles")
+
+_current = contextvars.ContextVar('adapter_trace', default=None)
+
+def _random_hex(nbytes):
+    return '%0*x' % (nbytes * 2, random.getrandbits(nbytes * 8))
+
+class Span:
+    __slots__ = ('name', 'span_id', 'start', 'end', 'attributes')
+
+    def __init__(self, name, start, end=None, attributes=None):
+        self.name = name
+        self.span_id = _random_hex(8)
+        self.start = start
+        self.end = end
+        self.attributes = attributes or {}
+
+    def duration_ms(self):
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+class Trace:
+    """Spans of one request; times are perf_counter() seconds, converted to wall clock on export"""
+
+    def __init__(self, name, trace_id=None, parent_span_id=None):
+        self.trace_id = trace_id or _random_hex(16)
+        self.parent_span_id = parent_span_id
+        self.wall_start = time.time()
+        self.root = Span(name, time.perf_counter())
+        self.spans = []
+        self.finished = False
+        self.thread_id = threading.get_ident()
+        self.stacks = None
+
+    def add_span(self, name, start, end=None, **attributes):
+        span = Span(name, start, end if end is not None else time.perf_counter(), attributes)
+        self.spans.append(span)
+        return span
+
+    def server_timing(self):
+        """Server-Timing header value: one entry per phase plus the total so far"""
+        entries = [f"{s.name};dur={s.duration_ms():.2f}" for s in self.spans]
+        entries.append(f"total;dur={self.root.duration_ms():.2f}")
+        return ", ".join(entries)
+
+    def _nanos(self, t):
+        return str(int((self.wall_start + (t - self.root.start)) * 1e9))
+
+    def _otlp_span(self, span, parent_id):
+        otlp = {
+            "traceId": self.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 2 if span is self.root else 1,  # SERVER for the request, INTERNAL for phases
+            "startTimeUnixNano": self._nanos(span.start),
+            "endTimeUnixNano": self._nanos(span.end),
+            "attributes": [_otlp_attribute(k, v) for k, v in span.attributes.items()],
+        }
+        if parent_id:
+            otlp["parentSpanId"] = parent_id
+        return otlp
+
+    def to_otlp(self):
+        spans = [self._otlp_span(self.root, self.parent_span_id)]
+        spans.extend(self._otlp_span(s, self.root.span_id) for s in self.spans)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", "gemini-litellm-adapter")]},
+            "scopeSpans": [{"scope": {"name": "adapter.tracing"}, "spans": spans}],
+        }]}
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+def parse_traceparent(header):
+    """(trace_id, parent_span_id) from a W3C traceparent header, or (None, None)"""
+    parts = (header or '').split('-')
+    if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+        return parts[1], parts[2]
+    return None, None
+
+class _NullSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _SpanContext:
+    __slots__ = ('trace', 'name', 'attributes', 'start')
+
+    def __init__(self, trace, name, attributes):
+        self.trace = trace
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add_span(self.name, self.start, **self.attributes)
+        return False
+
+def span(name, **attributes):
+    """Context manager recording a phase of the current trace (a no-op when there is none)"""
+    trace = _current.get()
+    if trace is None or trace.finished:
+        return _NULL_SPAN
+    return _SpanContext(trace, name, attributes)
+
+def current():
+    return _current.get()
+
+def activate(trace):
+    """Makes trace the current one, e.g. in a stream generator that runs after the view returned"""
+    _current.set(trace)
+
+def start(name, traceparent=None, **attributes):
+    """Starts and binds the trace of a request; returns None (and binds nothing) if it isn't sampled"""
+    if _sample_rate < 1.0 and random.random() >= _sample_rate:
+        _current.set(None)
+        return None
+    trace_id, parent_span_id = parse_traceparent(traceparent)
+    trace = Trace(name, trace_id, parent_span_id)
+    trace.root.attributes.update(attributes)
+    trace.root.attributes["request_id"] = adapter_log.request_id()
+    _current.set(trace)
+    if _profiler is not None:
+        _profiler.register(trace)
+    return trace
+
+def finish(trace, **attributes):
+    """Ends the trace: exports it and decides whether its profile is kept"""
+    if trace is None or trace.finished:
+        return
+    trace.finished = True
+    trace.root.end = time.perf_counter()
+    trace.root.attributes.update(attributes)
+    if _profiler is not None:
+        _profiler.unregister(trace)
+    if _exporter is not None:
+        _exporter.submit(trace)
+
+class Exporter:
+    """Background writer of OTLP/JSON lines; drops traces when CAPACITY are already waiting"""
+
+    CAPACITY = 1000
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self._queue = queue.Queue(maxsize=self.CAPACITY)
+        self.dropped = 0
+        threading.Thread(target=self._run, name="trace-exporter", daemon=True).start()
+
+    def submit(self, trace):
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        with open(self.path, 'a') as f:
+            while True:
+                trace = self._queue.get()
+                try:
+                    f.write(json.dumps(trace.to_otlp(), separators=(',', ':')) + "\n")
+                    if self._queue.empty():
+                        f.flush()
+                except Exception as e:
+                    adapter_log.warning("Trace export failed", error=f"{type(e).__name__}: {e}")
+                finally:
+                    self._queue.task_done()
+
+    def flush(self):
+        self._queue.join()
+
+class Profiler:
+    """Stack sampler for traced requests; keeps the profiles of the slowest ones"""
+
+    def __init__(self, slowest_percent, interval, directory, window=200):
+        self.slowest_percent = slowest_percent
+        self.interval = interval
+        self.directory = directory
+        self.durations = collections.deque(maxlen=window)
+        self.kept = 0
+        self._lock = threading.Lock()
+        self._active = {}  # thread id -> traces being sampled on it
+        threading.Thread(target=self._run, name="trace-profiler", daemon=True).start()
+
+    def register(self, trace):
+        trace.stacks = collections.Counter()
+        with self._lock:
+            self._active.setdefault(trace.thread_id, []).append(trace)
+
+    def unregister(self, trace):
+        with self._lock:
+            traces = self._active.get(trace.thread_id, [])
+            if trace in traces:
+                traces.remove(trace)
+            if not traces:
+                self._active.pop(trace.thread_id, None)
+        duration = trace.root.end - trace.root.start
+        if self._is_slow(duration) and trace.stacks:
+            self._save(trace)
+        self.durations.append(duration)
+        trace.stacks = None
+
+    def _is_slow(self, duration):
+        if len(self.durations) < 20:
+            return False
+        ordered = sorted(self.durations)
+        threshold = ordered[min(len(ordered) - 1, int(len(ordered) * (100 - self.slowest_percent) / 100))]
+        return duration >= threshold
+
+    def _save(self, trace):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        path = os.path.join(self.directory, f"{trace.trace_id}.folded")
+        with open(path, 'w') as f:
+            for stack, count in trace.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        trace.root.attributes["profile"] = path
+        self.kept += 1
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                targets = {tid: traces[0] for tid, traces in self._active.items() if len(traces) == 1}
+            if not targets:
+                continue
+            frames = sys._current_frames()
+            for tid, trace in targets.items():
+                frame = frames.get(tid)
+                stacks = trace.stacks
+                if frame is None or stacks is None:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stacks[";".join(reversed(names))] += 1
+
+_sample_rate = 1.0
+_exporter = None
+_profiler = None
+
+def configure():
+    """(Re)reads the TRACE_* environment variables"""
+    global _sample_rate, _exporter, _profiler
+    _sample_rate = float(os.getenv('TRACE_SAMPLE_RATE', '1.0'))
+    path = os.getenv('TRACE_FILE')
+    _exporter = Exporter(path) if path else None
+    slowest = float(os.getenv('TRACE_PROFILE_SLOWEST', '0'))
+    _profiler = Profiler(
+        slowest,
+        float(os.getenv('TRACE_PROFILE_INTERVAL_MS', '10')) / 1000,
+        os.getenv('TRACE_PROFILE_DIR') or DEFAULT_PROFILE_DIR,
+    ) if slowest > 0 else None
+
+def stream_trailer_enabled():
+    return os.getenv('TRACE_STREAM_TRAILER', '').lower() == 'true'
+
+def stream_trailer(trace):
+    """SSE comment carrying the timing of a finished stream"""
+    return f": server-timing {trace.server_timing()}\n\n"
+
+def flush():
+    """Blocks until every finished trace is exported"""
+    if _exporter is not None:
+        _exporter.flush()
+
+configure()
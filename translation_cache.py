@@ -0,0 +1,264 @@
+"""
+Incremental translation cache for google_to_openai_request.
+
+The Gemini CLI resends the whole conversation, system instruction and every
+MCP tool declaration on every turn. The last translation of each conversation
+is kept in a byte-capped LRU, so a growing history only pays translation for
+the new suffix of the conversation.
+
+Cached translations are shared between requests and must be treated as
+read-only by everything downstream of google_to_openai_request.
+
+Configured with TRANSLATION_CACHE_MB (default 64, 0 disables the cache).
+"""
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_MB = 64
+# Rough per-entry bookkeeping cost (key, tuple, OrderedDict node) in bytes
+ENTRY_OVERHEAD = 200
+
+class LRUCache:
+    """Thread-safe LRU map bounded by the approximate byte size of its values"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the cached value (marking it recently used) or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, key):
+        """Returns the cached value or None, without counting a hit or miss or marking it used"""
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def put(self, key, value, size):
+        """Stores value, evicting least recently used entries beyond max_bytes"""
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+            self._entries[key] = (value, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+
+    def pop(self, key):
+        """Removes key if present"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.total_bytes -= entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Counters for debugging and benchmarks"""
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+def content_hash(*objs):
+    """Returns a digest of one or more JSON-compatible objects"""
+    data = json.dumps(objs, separators=(',', ':')).encode('utf-8')
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+def _content_size(content):
+    """(characters of a message's content, bytes of the spooled media blobs it refers to)"""
+    if not isinstance(content, list):
+        return len(content or ''), 0
+    size = blobs = 0
+    for part in content:
+        # text, or the url/data/file_data string under image_url, input_audio or file
+        for value in part.values():
+            for v in value.values() if isinstance(value, dict) else (value,):
+                if isinstance(v, str):
+                    size += len(v)
+                    blob = getattr(v, 'blob', None)
+                    if blob is not None:
+                        blobs += blob.size
+    return size, blobs
+
+def estimate_size(messages):
+    """Approximate bytes held by translated messages (and the raw turn kept beside them)"""
+    size = blobs = 0
+    for m in messages:
+        content_size, blob_size = _content_size(m.get('content'))
+        size += ENTRY_OVERHEAD + content_size
+        blobs += blob_size
+        for tc in m.get('tool_calls') or ():
+            size += ENTRY_OVERHEAD + len(tc['function']['arguments'])
+    # The raw Google turn is kept too, to detect where a new request diverges; it shares the blobs
+    return 2 * size + blobs
+
+def estimate_tools_size(tools):
+    """Approximate bytes held by translated tool definitions"""
+    size = 0
+    for tool in tools:
+        size += 4 * ENTRY_OVERHEAD + len(tool['function'].get('description') or '')
+    return 2 * size
+
+def translate_uncached(google_req, translate_system, translate_content, translate_tools):
+    """Plain translation of the system instruction, contents and tools"""
+    messages = []
+    system_instruction = google_req.get('systemInstruction', {})
+    if system_instruction:
+        messages.extend(translate_system(system_instruction))
+    for content in google_req.get('contents', []):
+        messages.extend(translate_content(content))
+    tools = []
+    for tool in google_req.get('tools', []):
+        tools.extend(translate_tools(tool))
+    return messages, tools
+
+class Conversation:
+    """The last translated state of one conversation"""
+    __slots__ = ('system_instruction', 'system_messages', 'google_tools', 'tools',
+                 'contents', 'history', 'boundaries', 'sizes')
+
+    def __init__(self, system_instruction, system_messages, google_tools, tools,
+                 contents, history, boundaries, sizes):
+        self.system_instruction = system_instruction
+        self.system_messages = system_messages
+        self.google_tools = google_tools
+        self.tools = tools
+        self.contents = contents
+        # Translated messages of all turns; turn i ends at history[boundaries[i]]
+        self.history = history
+        self.boundaries = boundaries
+        # Cumulative approximate bytes through turn i
+        self.sizes = sizes
+
+class TranslationCache:
+    """
+    Per-conversation incremental translation.
+
+    A conversation is keyed on the hash of its system instruction and first
+    turn. Each request is compared against the conversation's previous request
+    with plain equality (no re-serialization), the translated messages of the
+    unchanged prefix are reused and only the new suffix is translated.
+    """
+
+    def __init__(self, max_bytes):
+        self.lru = LRUCache(max_bytes)
+        self.turns_reused = 0
+        self.turns_translated = 0
+
+    def translate(self, google_req, translate_system, translate_content, translate_tools):
+        """Returns (messages, tools) for google_req, reusing earlier translations"""
+        system_instruction = google_req.get('systemInstruction', {})
+        contents = google_req.get('contents', [])
+        google_tools = google_req.get('tools', [])
+        if not contents:
+            return translate_uncached(google_req, translate_system, translate_content, translate_tools)
+
+        key = content_hash(system_instruction, contents[0])
+        prev = self.lru.get(key)
+
+        # 1. System instruction and tool declarations rarely change within a session
+        if prev is not None and prev.system_instruction == system_instruction:
+            system_messages = prev.system_messages
+        else:
+            system_messages = translate_system(system_instruction) if system_instruction else []
+        if prev is not None and prev.google_tools == google_tools:
+            tools = prev.tools
+        else:
+            tools = []
+            for tool in google_tools:
+                tools.extend(translate_tools(tool))
+
+        # 2. Longest unchanged prefix of the history
+        reused = 0
+        if prev is not None:
+            old_contents = prev.contents
+            limit = min(len(contents), len(old_contents))
+            while reused < limit and contents[reused] == old_contents[reused]:
+                reused += 1
+        if reused:
+            history = prev.history[:prev.boundaries[reused - 1]]
+            boundaries = prev.boundaries[:reused]
+            sizes = prev.sizes[:reused]
+        else:
+            history, boundaries, sizes = [], [], []
+
+        # 3. Translate only the new suffix
+        total = sizes[-1] if sizes else 0
+        for content in contents[reused:]:
+            turn_messages = translate_content(content)
+            history.extend(turn_messages)
+            boundaries.append(len(history))
+            total += estimate_size(turn_messages)
+            sizes.append(total)
+        self.turns_reused += reused
+        self.turns_translated += len(contents) - reused
+
+        conversation = Conversation(system_instruction, system_messages, google_tools, tools,
+                                    contents, history, boundaries, sizes)
+        self.lru.put(key, conversation, total + estimate_size(system_messages) + estimate_tools_size(tools))
+        return system_messages + history, list(tools)
+
+    def stats(self):
+        stats = self.lru.stats()
+        stats["turns_reused"] = self.turns_reused
+        stats["turns_translated"] = self.turns_translated
+        return stats
+
+class NullTranslationCache:
+    """Used when the cache is disabled: always translates everything"""
+
+    def translate(self, google_req, translate_system, translate_content, translate_tools):
+        return translate_uncached(google_req, translate_system, translate_content, translate_tools)
+
+    def stats(self):
+        return {}
+
+_cache = None
+
+def configure(max_mb=None):
+    """(Re)creates the process-wide cache; max_mb defaults to TRANSLATION_CACHE_MB"""
+    global _cache
+    if max_mb is None:
+        max_mb = float(os.getenv('TRANSLATION_CACHE_MB', DEFAULT_MAX_MB))
+    if max_mb > 0:
+        _cache = TranslationCache(int(max_mb * 1024 * 1024))
+    else:
+        _cache = NullTranslationCache()
+    return _cache
+
+def get_cache():
+    """Returns the process-wide cache, creating it on first use"""
+    if _cache is None:
+        return configure()
+    return _cache